@@ -0,0 +1,320 @@
+"""
+Approximate nearest-neighbour index module.
+Index IVF (inverted file) thuần NumPy cho face embeddings 128 chiều:
+k-means chia không gian thành các cụm, mỗi truy vấn chỉ quét n_probe cụm gần nhất.
+"""
+
+import os
+import logging
+from typing import Dict, List, Mapping, Optional, Tuple
+import numpy as np
+
+from backend.gallery import FaceGallery
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản định dạng file index
+INDEX_FORMAT_VERSION = 1
+
+# Số dòng tối đa xử lý mỗi lần khi gán cụm (giới hạn bộ nhớ ma trận khoảng cách)
+_ASSIGN_CHUNK_SIZE = 16384
+
+
+def _assign_to_centroids(data: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """
+    Gán mỗi vector vào centroid gần nhất (xử lý theo chunk).
+    """
+    centroid_gallery = FaceGallery(centroids)
+    assignments = np.empty(data.shape[0], dtype=np.int64)
+    for start in range(0, data.shape[0], _ASSIGN_CHUNK_SIZE):
+        chunk = data[start:start + _ASSIGN_CHUNK_SIZE]
+        assignments[start:start + len(chunk)], _ = centroid_gallery.nearest(chunk)
+    return assignments
+
+
+def kmeans(
+    data: np.ndarray,
+    num_clusters: int,
+    num_iterations: int = 20,
+    seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    K-means (Lloyd) thuần NumPy.
+
+    Args:
+        data: Ma trận (N, D) float32
+        num_clusters: Số cụm (<= N)
+        num_iterations: Số vòng lặp tối đa
+        seed: Seed cho khởi tạo ngẫu nhiên
+
+    Returns:
+        - centroids: Ma trận (num_clusters, D) float32
+        - assignments: Cụm của từng vector (N,)
+    """
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    n = data.shape[0]
+    if not 1 <= num_clusters <= n:
+        raise ValueError(f"Số cụm phải trong khoảng [1, {n}], nhận được: {num_clusters}")
+
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(n, num_clusters, replace=False)].copy()
+    assignments = _assign_to_centroids(data, centroids)
+
+    for iteration in range(num_iterations):
+        # Trung bình mỗi cụm: sắp xếp theo cụm rồi cộng dồn từng đoạn
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=num_clusters)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        non_empty = counts > 0
+
+        sums = np.add.reduceat(data[order], starts[non_empty], axis=0)
+        centroids[non_empty] = sums / counts[non_empty, None]
+
+        # Cụm rỗng: khởi tạo lại bằng điểm ngẫu nhiên
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = data[rng.choice(n, len(empty), replace=False)]
+
+        new_assignments = _assign_to_centroids(data, centroids)
+        changed = int(np.count_nonzero(new_assignments != assignments))
+        assignments = new_assignments
+        if changed == 0:
+            logger.debug(f"K-means hội tụ sau {iteration + 1} vòng lặp")
+            break
+
+    return centroids, assignments
+
+
+class IVFIndex:
+    """
+    Index IVF-Flat: centroids k-means + danh sách vector (float32) theo từng cụm.
+
+    Mỗi vector mang một id nguyên do người gọi quy định (ví dụ chỉ số trong gallery).
+    Tìm kiếm: chọn n_probe centroid gần nhất, tính khoảng cách chính xác tới các vector
+    trong những cụm đó bằng một phép nhân ma trận, lấy top-k.
+    """
+
+    def __init__(self, num_lists: int = 0, num_probes: int = 8, dim: int = 128):
+        self.num_lists = num_lists
+        self.num_probes = num_probes
+        self.dim = dim
+        self.centroids: Optional[np.ndarray] = None
+        self._list_vectors: List[np.ndarray] = []
+        self._list_ids: List[np.ndarray] = []
+        self._list_norms: List[np.ndarray] = []
+
+    def __len__(self) -> int:
+        return int(sum(len(ids) for ids in self._list_ids))
+
+    @property
+    def is_trained(self) -> bool:
+        return self.centroids is not None
+
+    def build(self, embeddings: np.ndarray, ids: Optional[np.ndarray] = None, seed: int = 0) -> None:
+        """
+        Huấn luyện centroids bằng k-means và đưa toàn bộ vector vào index.
+
+        Args:
+            embeddings: Ma trận (N, D)
+            ids: Id của từng vector (mặc định 0..N-1)
+            seed: Seed cho k-means
+        """
+        data = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if data.ndim != 2 or data.shape[0] == 0:
+            raise ValueError("Cần ít nhất 1 embedding để build index.")
+
+        self.dim = data.shape[1]
+        n = data.shape[0]
+        num_lists = self.num_lists if self.num_lists > 0 else max(1, int(round(np.sqrt(n))))
+        num_lists = min(num_lists, n)
+
+        # Với gallery lớn, chỉ cần một mẫu để học centroids
+        max_training_points = 256 * num_lists
+        rng = np.random.default_rng(seed)
+        training = data if n <= max_training_points else data[rng.choice(n, max_training_points, replace=False)]
+
+        self.centroids, _ = kmeans(training, num_lists, seed=seed)
+        self.num_lists = num_lists
+        self._list_vectors = [np.zeros((0, self.dim), dtype=np.float32) for _ in range(num_lists)]
+        self._list_ids = [np.zeros(0, dtype=np.int64) for _ in range(num_lists)]
+        self._list_norms = [np.zeros(0, dtype=np.float32) for _ in range(num_lists)]
+
+        self.add(data, np.arange(n, dtype=np.int64) if ids is None else ids)
+        logger.info(f"Đã build IVF index: {n} vectors, {num_lists} cụm")
+
+    def add(self, embeddings: np.ndarray, ids: np.ndarray) -> None:
+        """
+        Thêm vector vào index đã huấn luyện (không học lại centroids).
+
+        Args:
+            embeddings: Ma trận (M, D) hoặc vector (D,)
+            ids: Id tương ứng (M,)
+        """
+        if not self.is_trained:
+            raise ValueError("Index chưa được build. Gọi build() trước khi add().")
+
+        data = np.ascontiguousarray(np.atleast_2d(embeddings), dtype=np.float32)
+        ids = np.atleast_1d(np.asarray(ids, dtype=np.int64))
+        if data.shape[0] != ids.shape[0]:
+            raise ValueError(f"Số id ({ids.shape[0]}) không khớp số vector ({data.shape[0]})")
+        if data.shape[1] != self.dim:
+            raise ValueError(f"Số chiều vector ({data.shape[1]}) khác số chiều index ({self.dim})")
+
+        assignments = _assign_to_centroids(data, self.centroids)
+        norms = np.einsum("ij,ij->i", data, data)
+        for list_id in np.unique(assignments):
+            mask = assignments == list_id
+            self._list_vectors[list_id] = np.concatenate((self._list_vectors[list_id], data[mask]))
+            self._list_ids[list_id] = np.concatenate((self._list_ids[list_id], ids[mask]))
+            self._list_norms[list_id] = np.concatenate((self._list_norms[list_id], norms[mask]))
+
+    def vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Toàn bộ vector trong index và id tương ứng (theo thứ tự cụm).
+        """
+        if not len(self):
+            return np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.int64)
+        return np.concatenate(self._list_vectors), np.concatenate(self._list_ids)
+
+    def retrain_if_outgrown(self, num_lists: int = 0, seed: int = 0) -> bool:
+        """
+        Học lại centroids khi index đã lớn hơn nhiều so với lúc build: số cụm phù hợp hiện tại
+        (num_lists, mặc định sqrt(N), không quá N) đạt gấp đôi số cụm đang dùng. Index build từ
+        vài vector rồi được add() dần sẽ không bị kẹt mãi ở 1 cụm; số cụm tăng gấp đôi mỗi lần
+        nên chi phí học lại được chia đều cho các lần add.
+
+        Returns:
+            True nếu đã học lại
+        """
+        n = len(self)
+        target = min(num_lists if num_lists > 0 else max(1, int(round(np.sqrt(n)))), n)
+        if not self.is_trained or target < 2 * self.num_lists:
+            return False
+
+        data, ids = self.vectors()
+        previous = self.num_lists
+        self.num_lists = target
+        self.build(data, ids, seed=seed)
+        logger.info(f"Đã học lại IVF index: {previous} -> {target} cụm")
+        return True
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int,
+        num_probes: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tìm k vector gần nhất (xấp xỉ) cho một query.
+
+        Args:
+            query: Vector (D,)
+            k: Số kết quả
+            num_probes: Số cụm cần quét (mặc định self.num_probes)
+
+        Returns:
+            - ids: Mảng id (<= k phần tử), sắp xếp theo khoảng cách tăng dần
+            - distances: Khoảng cách Euclidean tương ứng
+        """
+        if not self.is_trained:
+            raise ValueError("Index chưa được build.")
+        if k < 1:
+            raise ValueError(f"k phải >= 1, nhận được: {k}")
+
+        query = np.asarray(query, dtype=np.float32).reshape(-1)
+        num_probes = min(num_probes or self.num_probes, self.num_lists)
+
+        centroid_sq = FaceGallery(self.centroids).squared_distances(query)
+        if num_probes < self.num_lists:
+            probes = np.argpartition(centroid_sq, num_probes - 1)[:num_probes]
+        else:
+            probes = np.arange(self.num_lists)
+
+        probes = [p for p in probes if len(self._list_ids[p])]
+        if not probes:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64)
+
+        vectors = np.concatenate([self._list_vectors[p] for p in probes])
+        ids = np.concatenate([self._list_ids[p] for p in probes])
+        norms = np.concatenate([self._list_norms[p] for p in probes])
+
+        squared = norms - 2.0 * (vectors @ query) + float(query @ query)
+        np.maximum(squared, 0.0, out=squared)
+
+        k = min(k, len(ids))
+        top = np.argpartition(squared, k - 1)[:k] if k < len(ids) else np.arange(len(ids))
+        top = top[np.argsort(squared[top], kind="stable")]
+
+        return ids[top], np.sqrt(squared[top]).astype(np.float64)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Các mảng mô tả index (định dạng của save()), để ghi chung vào file khác.
+        """
+        if not self.is_trained:
+            raise ValueError("Index chưa được build, không có gì để lưu.")
+
+        vectors, ids = self.vectors()
+        return {
+            "version": np.array(INDEX_FORMAT_VERSION),
+            "num_probes": np.array(self.num_probes),
+            "centroids": self.centroids,
+            "counts": np.array([len(list_ids) for list_ids in self._list_ids], dtype=np.int64),
+            "vectors": vectors,
+            "ids": ids
+        }
+
+    @classmethod
+    def from_arrays(cls, data: Mapping[str, np.ndarray]) -> "IVFIndex":
+        """
+        Tạo lại index từ các mảng của to_arrays() (dict hoặc file .npz đã mở).
+
+        Raises:
+            ValueError: Nếu phiên bản định dạng không được hỗ trợ
+        """
+        if int(data["version"]) != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Phiên bản index không được hỗ trợ: {int(data['version'])}")
+        centroids = np.asarray(data["centroids"], dtype=np.float32)
+        counts = np.asarray(data["counts"])
+        vectors = np.asarray(data["vectors"], dtype=np.float32)
+        ids = np.asarray(data["ids"], dtype=np.int64)
+
+        index = cls(num_lists=centroids.shape[0], num_probes=int(data["num_probes"]), dim=centroids.shape[1])
+        index.centroids = centroids
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        index._list_vectors = [vectors[bounds[i]:bounds[i + 1]].copy() for i in range(len(counts))]
+        index._list_ids = [ids[bounds[i]:bounds[i + 1]].copy() for i in range(len(counts))]
+        index._list_norms = [np.einsum("ij,ij->i", v, v) for v in index._list_vectors]
+        return index
+
+    def save(self, path: str) -> None:
+        """
+        Lưu index ra file .npz (ghi file tạm rồi rename).
+        """
+        arrays = self.to_arrays()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{path}.tmp.{os.getpid()}.npz"
+        try:
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(cls, path: str) -> "IVFIndex":
+        """
+        Đọc index đã lưu bằng save().
+
+        Raises:
+            FileNotFoundError: Nếu file không tồn tại
+            ValueError: Nếu file không đúng định dạng
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"File index '{path}' không tồn tại.")
+
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays(data)
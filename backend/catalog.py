@@ -0,0 +1,509 @@
+"""
+Image catalog module.
+Chỉ mục SQLite của ảnh đã thu thập trong data/raw/user/: mỗi ảnh một dòng gồm đường dẫn, content
+hash, kích thước, thời điểm chụp, khung khuôn mặt, các chỉ số analyze_environment và difference
+hash. Đếm ảnh (/collect, /train), chọn ảnh huấn luyện và tìm ảnh gần trùng đọc từ catalog thay vì
+quét thư mục ở mỗi request.
+
+Ảnh nằm trong các thư mục shard (xem backend/image_store.py) hoặc ngay trong thư mục gốc (bố cục
+cũ). Catalog lưu mtime của từng thư mục và chỉ quét lại thư mục có mtime khác lần đối chiếu trước
+(ảnh được thêm / xóa bằng tay), nên mỗi truy vấn chỉ tốn một os.stat cho mỗi thư mục shard thay vì
+liệt kê toàn bộ ảnh. Đối chiếu thủ công:
+    python -m backend.catalog [--data-dir data/raw/user] [--rebuild]
+"""
+
+import os
+import argparse
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+USER_DATA_DIR = os.path.join("data", "raw", "user")
+
+VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# Phiên bản schema - tăng khi thay đổi cấu trúc bảng (catalog cũ được build lại từ thư mục)
+SCHEMA_VERSION = 2
+
+# Thời gian chờ khoá ghi của SQLite (nhiều worker cùng ghi)
+SQLITE_TIMEOUT_SECONDS = 30.0
+
+# mtime của thư mục có độ phân giải thô (tick của kernel): nếu thư mục đổi trong khoảng này
+# quanh lúc quét thì có thể còn file được tạo cùng tick mà không làm đổi mtime - không tin
+# mtime đó, lần truy vấn sau quét lại
+RACY_WINDOW_NS = 1_000_000_000
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Các chỉ số của analyze_environment được lưu thành cột riêng
+ENVIRONMENT_COLUMNS = (
+    "brightness", "blur_score", "face_size_ratio",
+    "is_too_dark", "is_too_bright", "is_too_blurry", "is_face_too_small",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    directory TEXT NOT NULL,
+    content_hash TEXT,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    captured_at REAL NOT NULL,
+    dhash INTEGER,
+    face_top INTEGER,
+    face_right INTEGER,
+    face_bottom INTEGER,
+    face_left INTEGER,
+    brightness REAL,
+    blur_score REAL,
+    face_size_ratio REAL,
+    is_too_dark INTEGER,
+    is_too_bright INTEGER,
+    is_too_blurry INTEGER,
+    is_face_too_small INTEGER
+);
+CREATE INDEX IF NOT EXISTS images_captured_at ON images (captured_at, path);
+CREATE INDEX IF NOT EXISTS images_directory ON images (directory);
+CREATE TABLE IF NOT EXISTS directories (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+_COLUMNS = (
+    "path", "directory", "content_hash", "size", "mtime_ns", "captured_at", "dhash",
+    "face_top", "face_right", "face_bottom", "face_left",
+) + ENVIRONMENT_COLUMNS
+
+
+@dataclass
+class CatalogEntry:
+    """
+    Một ảnh đã thu thập. path tương đối so với thư mục dữ liệu (gồm cả thư mục shard).
+    Ảnh được thêm khi đối chiếu thư mục (không qua /collect) chưa có content_hash, dhash,
+    face_box và environment; captured_at lấy theo mtime của file.
+    """
+    path: str
+    size: int
+    mtime_ns: int
+    captured_at: float
+    content_hash: Optional[str] = None
+    dhash: Optional[int] = None
+    face_box: Optional[Tuple[int, int, int, int]] = None
+    environment: Optional[Dict[str, Any]] = None
+
+
+def catalog_path_for(data_dir: str) -> str:
+    """
+    File catalog của một thư mục dữ liệu: nằm cạnh thư mục (data/raw/user -> data/raw/user.catalog.db),
+    không nằm trong thư mục để file journal của SQLite không làm đổi mtime của thư mục.
+    """
+    return os.path.normpath(data_dir) + ".catalog.db"
+
+
+def describe_file(filepath: str) -> Tuple[int, int, str]:
+    """
+    (size, mtime_ns, SHA-256) của một file.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        stat = os.fstat(f.fileno())
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+def _to_signed64(value: Optional[int]) -> Optional[int]:
+    # SQLite INTEGER là số có dấu 64 bit; difference hash là số không dấu 64 bit
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def _to_unsigned64(value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
+
+
+def _entry_row(entry: CatalogEntry) -> Tuple[Any, ...]:
+    face_box = entry.face_box if entry.face_box is not None else (None, None, None, None)
+    environment = entry.environment or {}
+    values = []
+    for column in ENVIRONMENT_COLUMNS:
+        value = environment.get(column)
+        # Giá trị từ numpy (np.bool_, np.float64) được đổi về kiểu Python
+        if value is not None:
+            value = int(bool(value)) if column.startswith("is_") else float(value)
+        values.append(value)
+    return (
+        entry.path, os.path.dirname(entry.path), entry.content_hash, entry.size, entry.mtime_ns, entry.captured_at,
+        _to_signed64(entry.dhash), *[None if v is None else int(v) for v in face_box], *values
+    )
+
+
+def _row_entry(row: Tuple[Any, ...]) -> CatalogEntry:
+    record = dict(zip(_COLUMNS, row))
+    face_box = None
+    if record["face_top"] is not None:
+        face_box = (record["face_top"], record["face_right"], record["face_bottom"], record["face_left"])
+    environment = None
+    if record["brightness"] is not None:
+        environment = {
+            column: bool(record[column]) if column.startswith("is_") else record[column]
+            for column in ENVIRONMENT_COLUMNS
+        }
+    return CatalogEntry(
+        path=record["path"],
+        size=record["size"],
+        mtime_ns=record["mtime_ns"],
+        captured_at=record["captured_at"],
+        content_hash=record["content_hash"],
+        dhash=_to_unsigned64(record["dhash"]),
+        face_box=face_box,
+        environment=environment
+    )
+
+
+# Các file catalog đã tạo schema trong process này
+_initialized_catalogs = set()
+
+
+def _initialize_schema(conn: sqlite3.Connection) -> None:
+    # WAL: đọc không bị chặn bởi ghi của worker khác
+    conn.execute("PRAGMA journal_mode=WAL")
+    version = None
+    if conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'meta'").fetchone():
+        version = conn.execute("SELECT value FROM meta WHERE key = 'schema_version'").fetchone()
+    if version is not None and int(version[0]) == SCHEMA_VERSION:
+        return
+    with conn:
+        for table in ("images", "directories", "meta"):
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+    conn.executescript(_SCHEMA)
+    with conn:
+        conn.execute("INSERT INTO meta (key, value) VALUES ('schema_version', ?)", (str(SCHEMA_VERSION),))
+
+
+def _bump_generation(conn: sqlite3.Connection) -> None:
+    # Số thế hệ tăng sau mỗi lần ghi: process khác biết catalog đã đổi bằng một truy vấn nhỏ
+    conn.execute(
+        "INSERT INTO meta (key, value) VALUES ('generation', '1') "
+        "ON CONFLICT (key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+    )
+
+
+def _parent_directories(directory: str) -> List[str]:
+    """
+    Thư mục gốc ("") và các thư mục cha của một thư mục tương đối, từ gốc xuống.
+    """
+    parts = directory.split(os.sep) if directory else []
+    return [""] + [os.path.join(*parts[:i + 1]) for i in range(len(parts))]
+
+
+class ImageCatalog:
+    """
+    Catalog SQLite của một thư mục ảnh.
+
+    Mỗi thao tác mở một kết nối ngắn (an toàn giữa các thread, các worker process và khi thư
+    mục làm việc thay đổi); ghi trong một transaction. Các truy vấn tự đối chiếu lại thư mục
+    nếu mtime của thư mục đã đổi từ lần đối chiếu trước.
+    """
+
+    def __init__(self, data_dir: str = USER_DATA_DIR, db_path: Optional[str] = None):
+        self.data_dir = data_dir
+        self.db_path = db_path or catalog_path_for(data_dir)
+        # Thư mục tương đối -> mtime đã lưu trong catalog mà process này thấy ở lần đối chiếu
+        # gần nhất (add() dùng để biết thư mục có còn khớp catalog trước khi ghi hay không)
+        self._verified: Dict[str, Optional[int]] = {}
+        self._verified_db: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        key = os.path.abspath(self.db_path)
+        initialize = key not in _initialized_catalogs or not os.path.exists(self.db_path)
+        conn = sqlite3.connect(self.db_path, timeout=SQLITE_TIMEOUT_SECONDS)
+        try:
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if initialize:
+                _initialize_schema(conn)
+                _initialized_catalogs.add(key)
+            if self._verified_db != key:
+                # Thư mục làm việc (hoặc db) đã đổi: những gì đã thấy không còn đúng
+                self._verified, self._verified_db = {}, key
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _directory_mtime(self, directory: str = "") -> Optional[int]:
+        try:
+            stat = os.stat(os.path.join(self.data_dir, directory))
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return stat.st_mtime_ns
+
+    def _scan_directory(self, directory: str) -> Tuple[Dict[str, os.stat_result], List[str]]:
+        """
+        (ảnh, thư mục con) ngay trong một thư mục (không đệ quy), đường dẫn tương đối.
+        """
+        files, subdirectories = {}, []
+        try:
+            with os.scandir(os.path.join(self.data_dir, directory)) as entries:
+                for entry in entries:
+                    path = os.path.join(directory, entry.name) if directory else entry.name
+                    if entry.is_dir():
+                        if not entry.name.startswith("."):
+                            subdirectories.append(path)
+                    elif entry.is_file() and os.path.splitext(entry.name.lower())[1] in VALID_EXTENSIONS:
+                        files[path] = entry.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            pass
+        return files, subdirectories
+
+    def sync(self, force: bool = False) -> bool:
+        """
+        Đối chiếu catalog với thư mục: thêm ảnh mới, xóa dòng của ảnh đã mất, cập nhật ảnh đã đổi.
+        Chỉ các thư mục có mtime khác lần đối chiếu trước (và thư mục con mới) được quét lại.
+
+        Args:
+            force: Quét lại mọi thư mục kể cả khi mtime không đổi
+
+        Returns:
+            True nếu đã quét lại ít nhất một thư mục
+        """
+        with self._lock, self._connect() as conn:
+            stored = dict(conn.execute("SELECT path, mtime_ns FROM directories"))
+            mtimes = {directory: self._directory_mtime(directory) for directory in stored or [""]}
+            if mtimes.get("") is None and not stored:
+                # Thư mục chưa tồn tại và catalog rỗng: không có gì để đối chiếu
+                return False
+            stale = [
+                directory for directory, mtime in mtimes.items()
+                if force or mtime is None or mtime != stored.get(directory)
+            ]
+            self._verified = {directory: stored[directory] for directory in stored if directory not in stale}
+            if not stale:
+                return False
+
+            scan_started = time.time_ns()
+            added = removed = changed = 0
+            queue, seen = list(stale), set()
+            while queue:
+                directory = queue.pop()
+                if directory in seen:
+                    continue
+                seen.add(directory)
+                mtime = mtimes[directory] if directory in mtimes else self._directory_mtime(directory)
+
+                if mtime is None:
+                    # Thư mục đã bị xóa: bỏ mọi ảnh và thư mục con của nó
+                    prefix = directory + os.sep if directory else ""
+                    removed += conn.execute(
+                        "DELETE FROM images WHERE directory = ? OR substr(directory, 1, ?) = ?",
+                        (directory, len(prefix), prefix)
+                    ).rowcount
+                    conn.execute(
+                        "DELETE FROM directories WHERE path = ? OR substr(path, 1, ?) = ?",
+                        (directory, len(prefix), prefix)
+                    )
+                    self._verified.pop(directory, None)
+                    continue
+
+                files, subdirectories = self._scan_directory(directory)
+                queue.extend(subdirectory for subdirectory in subdirectories if subdirectory not in stored)
+                known = {
+                    path: (size, mtime_ns)
+                    for path, size, mtime_ns in conn.execute(
+                        "SELECT path, size, mtime_ns FROM images WHERE directory = ?", (directory,)
+                    )
+                }
+                missing = [(path,) for path in known if path not in files]
+                modified = [
+                    (stat.st_size, stat.st_mtime_ns, path)
+                    for path, stat in files.items()
+                    if path in known and known[path] != (stat.st_size, stat.st_mtime_ns)
+                ]
+                new = [
+                    _entry_row(CatalogEntry(path, stat.st_size, stat.st_mtime_ns, stat.st_mtime_ns / 1e9))
+                    for path, stat in files.items() if path not in known
+                ]
+                conn.executemany("DELETE FROM images WHERE path = ?", missing)
+                # Nội dung đã đổi: hash cũ không còn đúng
+                conn.executemany(
+                    "UPDATE images SET size = ?, mtime_ns = ?, content_hash = NULL, dhash = NULL WHERE path = ?",
+                    modified
+                )
+                conn.executemany(
+                    f"INSERT INTO images ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    new
+                )
+                added, removed, changed = added + len(new), removed + len(missing), changed + len(modified)
+
+                # mtime quá gần lúc quét: chưa tin, lần sau quét lại thư mục này
+                if mtime >= scan_started - RACY_WINDOW_NS:
+                    mtime = None
+                conn.execute(
+                    "INSERT OR REPLACE INTO directories (path, mtime_ns) VALUES (?, ?)", (directory, mtime)
+                )
+                self._verified[directory] = mtime
+
+            if added or removed or changed:
+                _bump_generation(conn)
+
+        logger.info(
+            f"Đã đối chiếu catalog '{self.db_path}': {len(seen)} thư mục "
+            f"(+{added}, -{removed}, ~{changed} ảnh)"
+        )
+        return True
+
+    def _record_write(self, conn: sqlite3.Connection, directory: str) -> None:
+        """
+        Ghi nhận mtime mới của các thư mục chứa ảnh vừa ghi (và thư mục shard vừa tạo) nếu trước
+        khi ghi chúng vẫn khớp catalog, để lần đối chiếu sau không phải quét lại.
+        """
+        parent_verified = False
+        for path in _parent_directories(directory):
+            row = conn.execute("SELECT mtime_ns FROM directories WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                # Thư mục chưa có trong catalog: chỉ tin nếu được tạo trong thư mục cha đã khớp
+                verified = parent_verified and path != ""
+            else:
+                verified = path in self._verified and row[0] == self._verified[path]
+            if verified:
+                mtime = self._directory_mtime(path)
+                conn.execute("INSERT OR REPLACE INTO directories (path, mtime_ns) VALUES (?, ?)", (path, mtime))
+                self._verified[path] = mtime
+            parent_verified = verified
+
+    def add(self, entry: CatalogEntry) -> int:
+        """
+        Thêm (hoặc thay) một ảnh vừa lưu vào thư mục, trong một transaction.
+
+        Gọi sync() trước khi ghi file: nếu catalog đang đồng bộ với thư mục thì mtime mới của
+        thư mục (do chính file này) được ghi nhận luôn, không phải quét lại thư mục.
+
+        Returns:
+            Tổng số ảnh sau khi thêm (đọc trong cùng transaction)
+        """
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO images ({', '.join(_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                _entry_row(entry)
+            )
+            self._record_write(conn, os.path.dirname(entry.path))
+            _bump_generation(conn)
+            total = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        return total
+
+    def rename(self, moves: Dict[str, str]) -> None:
+        """
+        Đổi đường dẫn của các ảnh đã di chuyển (giữ nguyên metadata), trong một transaction.
+        """
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE images SET path = ?, directory = ? WHERE path = ?",
+                [(new, os.path.dirname(new), old) for old, new in moves.items()]
+            )
+            _bump_generation(conn)
+
+    def remove(self, paths: Iterable[str]) -> None:
+        with self._lock, self._connect() as conn:
+            conn.executemany("DELETE FROM images WHERE path = ?", [(path,) for path in paths])
+            _bump_generation(conn)
+
+    def set_dhashes(self, dhashes: Dict[str, int]) -> None:
+        """
+        Lưu difference hash đã tính cho các ảnh (ảnh thêm khi đối chiếu chưa có).
+        """
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "UPDATE images SET dhash = ? WHERE path = ?",
+                [(_to_signed64(dhash), path) for path, dhash in dhashes.items()]
+            )
+            _bump_generation(conn)
+
+    def generation(self) -> int:
+        """
+        Số thế hệ của catalog: tăng mỗi khi có ảnh được thêm, xóa, đổi tên hoặc cập nhật hash
+        (bởi bất kỳ process nào). Không đối chiếu thư mục.
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        return int(row[0]) if row is not None else 0
+
+    def count(self) -> int:
+        self.sync()
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def paths(self) -> List[str]:
+        """
+        Đường dẫn (tương đối, gồm thư mục shard) các ảnh theo thứ tự thu thập.
+        """
+        self.sync()
+        with self._connect() as conn:
+            return [row[0] for row in conn.execute("SELECT path FROM images ORDER BY captured_at, path")]
+
+    def entries(self) -> List[CatalogEntry]:
+        """
+        Toàn bộ ảnh theo thứ tự thu thập.
+        """
+        self.sync()
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM images ORDER BY captured_at, path")
+            return [_row_entry(row) for row in rows]
+
+    def get(self, path: str) -> Optional[CatalogEntry]:
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM images WHERE path = ?", (path,)).fetchone()
+        return _row_entry(row) if row is not None else None
+
+
+# Catalog của data/raw/user/ (module singleton)
+image_catalog = ImageCatalog()
+
+
+def catalog_for(data_dir: str) -> ImageCatalog:
+    """
+    Catalog của một thư mục ảnh: singleton image_catalog nếu là data/raw/user/.
+    """
+    if os.path.normpath(data_dir) == os.path.normpath(image_catalog.data_dir):
+        return image_catalog
+    return ImageCatalog(data_dir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Đối chiếu catalog ảnh đã thu thập với thư mục")
+    parser.add_argument("--data-dir", default=USER_DATA_DIR, help="Thư mục ảnh")
+    parser.add_argument("--rebuild", action="store_true", help="Xóa catalog và build lại từ thư mục")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    catalog = ImageCatalog(args.data_dir)
+    if args.rebuild:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(catalog.db_path + suffix):
+                os.remove(catalog.db_path + suffix)
+    catalog.sync(force=True)
+    logger.info(f"Catalog '{catalog.db_path}': {catalog.count()} ảnh")
+
+
+if __name__ == "__main__":
+    main()
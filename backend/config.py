@@ -0,0 +1,234 @@
+"""
+Runtime configuration for the backend.
+Các giá trị cấu hình được đọc từ biến môi trường (tiền tố FACE_) khi import module,
+nếu không có sẽ dùng giá trị mặc định bên dưới.
+"""
+
+import os
+
+
+def _env_str(name: str, default: str) -> str:
+    """Đọc biến môi trường dạng chuỗi (đã strip, lower-case)."""
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower()
+
+
+def _env_int(name: str, default: int) -> int:
+    """
+    Đọc biến môi trường dạng số nguyên.
+
+    Raises:
+        ValueError: Nếu giá trị không phải là số nguyên hợp lệ
+    """
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Biến môi trường {name} phải là số nguyên, nhận được: {value!r}")
+
+
+def _env_float(name: str, default: float) -> float:
+    """
+    Đọc biến môi trường dạng số thực.
+
+    Raises:
+        ValueError: Nếu giá trị không phải là số thực hợp lệ
+    """
+    value = os.environ.get(name)
+    if value is None or value.strip() == "":
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Biến môi trường {name} phải là số thực, nhận được: {value!r}")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    """
+    Đọc biến môi trường dạng bool ("1", "true", "yes", "on" = True).
+
+    Raises:
+        ValueError: Nếu giá trị không nhận dạng được
+    """
+    value = _env_str(name, "")
+    if value == "":
+        return default
+    if value in ("1", "true", "yes", "on"):
+        return True
+    if value in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Biến môi trường {name} phải là true/false, nhận được: {value!r}")
+
+
+# ============================================================================
+# Executor cho tác vụ CPU-bound (dlib/OpenCV)
+# ============================================================================
+
+# Loại executor: "thread" (ThreadPoolExecutor) hoặc "process" (ProcessPoolExecutor).
+# "process" cho phép tận dụng nhiều core khi dlib giữ GIL, đổi lại chi phí pickle dữ liệu.
+EXECUTOR_KIND = _env_str("FACE_EXECUTOR_KIND", "thread")
+
+# Số worker của executor (mặc định = số core CPU)
+EXECUTOR_WORKERS = max(1, _env_int("FACE_EXECUTOR_WORKERS", os.cpu_count() or 1))
+
+
+# ============================================================================
+# Warm-up model khi khởi động
+# ============================================================================
+
+# Chạy detect + encode trên một ảnh mẫu trong mỗi worker trước khi báo sẵn sàng (/api/v1/ready)
+WARMUP_ENABLED = _env_bool("FACE_WARMUP_ENABLED", True)
+
+# Số lượt warm-up mỗi worker: lượt đầu đo thời gian "cold", các lượt sau đo "warm"
+WARMUP_ROUNDS = max(1, _env_int("FACE_WARMUP_ROUNDS", 3))
+
+# Ảnh dùng để warm-up (rỗng = ảnh tổng hợp 640x480 sinh sẵn trong code)
+WARMUP_IMAGE = os.environ.get("FACE_WARMUP_IMAGE", "").strip()
+
+
+# ============================================================================
+# Trích xuất embedding khi huấn luyện / tải dữ liệu
+# ============================================================================
+
+# Số process dùng để trích xuất embedding song song (1 = tuần tự)
+EXTRACTION_WORKERS = max(1, _env_int("FACE_EXTRACTION_WORKERS", 1))
+
+
+# Kiểu dữ liệu embeddings trong model artifact (models/user_model.bin): float32 hoặc float16
+MODEL_DTYPE = _env_str("FACE_MODEL_DTYPE", "float32")
+
+# Kiểm tra checksum khi tải model artifact (đọc toàn bộ file, chậm hơn với mô hình lớn)
+MODEL_VERIFY_CHECKSUM = _env_bool("FACE_MODEL_VERIFY_CHECKSUM", False)
+
+
+# ============================================================================
+# Phát hiện khuôn mặt khi xác thực
+# ============================================================================
+
+# Cạnh dài mục tiêu khi decode JPEG upload (0 = decode đủ kích thước). Ảnh lớn hơn ít nhất
+# 2 lần được decode thu nhỏ 1/2, 1/4 hoặc 1/8 trong miền DCT, cạnh dài kết quả vẫn >= giá trị này.
+# Không áp dụng cho /api/v1/collect (ảnh lưu làm dữ liệu huấn luyện giữ nguyên độ phân giải).
+DECODE_MAX_DIMENSION = max(0, _env_int("FACE_DECODE_MAX_DIM", 0))
+
+# Cạnh dài tối đa (pixel) của ảnh dùng để chạy HOG detector (0 = detect trên ảnh gốc).
+# Ảnh lớn hơn được thu nhỏ trước khi detect; embedding vẫn tính trên ảnh gốc.
+DETECTION_MAX_DIMENSION = max(0, _env_int("FACE_DETECTION_MAX_DIM", 0))
+
+# Detect trên ảnh grayscale (HOG chỉ dùng gradient độ sáng)
+DETECTION_GRAYSCALE = _env_bool("FACE_DETECTION_GRAYSCALE", False)
+
+# Số lần upsample khi detect trên ảnh đã thu nhỏ (1 = mặc định của face_recognition)
+DETECTION_UPSAMPLE = max(0, _env_int("FACE_DETECTION_UPSAMPLE", 1))
+
+# Detector khi xác thực / thu thập (xem backend/detectors.py): hog, hog:<upsample>, cnn, haar, lbp
+# hoặc dạng lọc trước "haar>hog". Các endpoint có thể ghi đè bằng tham số `detector`.
+DETECTOR = _env_str("FACE_DETECTOR", "hog")
+
+# Detector khi huấn luyện (data/raw/user/) và tải dữ liệu myface/
+TRAINING_DETECTOR = _env_str("FACE_TRAINING_DETECTOR", "hog")
+
+# Thư mục chứa file cascade OpenCV ngoài cv2.data.haarcascades (cần cho LBP cascade)
+CASCADE_DIR = os.environ.get("FACE_CASCADE_DIR", "").strip()
+
+
+# ============================================================================
+# Phân tích môi trường (độ sáng / độ nét)
+# ============================================================================
+
+# Cạnh dài tối đa (pixel) của ảnh xám dùng để tính brightness / blur_score (0 = toàn bộ ảnh
+# gốc). Lưu ý: ảnh thu nhỏ cho phương sai Laplacian lớn hơn, ngưỡng mờ 100 được hiệu chỉnh
+# cho ảnh gốc.
+ENV_MAX_DIMENSION = max(0, _env_int("FACE_ENV_MAX_DIM", 0))
+
+# Chỉ phân tích vùng khuôn mặt (cộng lề) thay vì toàn khung hình
+ENV_FACE_ROI = _env_bool("FACE_ENV_FACE_ROI", False)
+
+
+# ============================================================================
+# Loại bỏ ảnh gần trùng khi thu thập (/api/v1/collect)
+# ============================================================================
+
+# Chế độ mặc định: "off" (lưu mọi ảnh), "recent" (so với FACE_DEDUP_RECENT ảnh mới nhất)
+# hoặc "all" (so với mọi ảnh đã lưu). Endpoint có thể ghi đè bằng tham số `dedupe`.
+DEDUP_MODE = _env_str("FACE_DEDUP_MODE", "off")
+
+# Số ảnh mới nhất được so sánh ở chế độ "recent"
+DEDUP_RECENT = max(1, _env_int("FACE_DEDUP_RECENT", 20))
+
+# Số bit khác nhau tối đa giữa hai difference hash 64 bit để coi là gần trùng
+DEDUP_HASH_DISTANCE = max(0, _env_int("FACE_DEDUP_HASH_DISTANCE", 6))
+
+# Khoảng cách embedding tối đa để coi là gần trùng (so với ngưỡng xác thực 0.5)
+DEDUP_EMBEDDING_DISTANCE = max(0.0, _env_float("FACE_DEDUP_EMBEDDING_DISTANCE", 0.2))
+
+
+# ============================================================================
+# Lưu ảnh thu thập (/api/v1/collect)
+# ============================================================================
+
+# "original": lưu nguyên bytes ảnh đã upload (không encode lại, không mất chất lượng);
+# "reencode": encode lại JPEG với FACE_COLLECT_JPEG_QUALITY, thu nhỏ về FACE_COLLECT_MAX_DIM
+COLLECT_STORE = _env_str("FACE_COLLECT_STORE", "original")
+
+# Chất lượng JPEG khi encode lại (1-100)
+COLLECT_JPEG_QUALITY = min(100, max(1, _env_int("FACE_COLLECT_JPEG_QUALITY", 90)))
+
+# Cạnh dài tối đa (pixel) của ảnh encode lại (0 = giữ nguyên kích thước)
+COLLECT_MAX_DIMENSION = max(0, _env_int("FACE_COLLECT_MAX_DIM", 0))
+
+# fsync file ảnh và thư mục sau khi lưu. Chạy ở thread nền, không nằm trong thời gian
+# trả lời request (ảnh vẫn được ghi atomic bằng file tạm + rename khi tắt)
+COLLECT_FSYNC = _env_bool("FACE_COLLECT_FSYNC", False)
+
+
+# ============================================================================
+# Tải lại dữ liệu huấn luyện (hot reload)
+# ============================================================================
+
+# Chu kỳ (giây) kiểm tra thay đổi trong myface/ để tải lại gallery ở background (0 = tắt)
+GALLERY_POLL_SECONDS = max(0, _env_int("FACE_GALLERY_POLL_SECONDS", 10))
+
+# Dùng chung gallery giữa các worker process: một worker build models/known_faces.bin,
+# các worker khác memmap chỉ đọc và tải lại khi có generation mới
+GALLERY_SHARED = _env_bool("FACE_GALLERY_SHARED", False)
+
+
+# ============================================================================
+# Nhận dạng 1:N (IVF index)
+# ============================================================================
+
+# Số cụm k-means của IVF index (0 = tự động ~ sqrt(số embedding))
+ANN_NUM_LISTS = max(0, _env_int("FACE_ANN_NUM_LISTS", 0))
+
+# Số cụm gần nhất được quét cho mỗi truy vấn (tăng để tăng recall, giảm tốc độ)
+ANN_NUM_PROBES = max(1, _env_int("FACE_ANN_NUM_PROBES", 8))
+
+
+# ============================================================================
+# API
+# ============================================================================
+
+# Số ảnh tối đa trong một request /api/v1/face/verify/batch
+MAX_BATCH_SIZE = max(1, _env_int("FACE_MAX_BATCH_SIZE", 50))
+
+# Bật đo thời gian từng giai đoạn (header Server-Timing) và metrics trên /metrics
+METRICS_ENABLED = _env_bool("FACE_METRICS_ENABLED", True)
+
+
+# ============================================================================
+# Xác thực qua WebSocket (luồng frame)
+# ============================================================================
+
+# Chạy detector đầy đủ mỗi N frame; các frame giữa chỉ bám theo khuôn mặt (1 = detect mọi frame)
+STREAM_DETECT_EVERY = max(1, _env_int("FACE_STREAM_DETECT_EVERY", 5))
+
+# Cạnh dài (pixel) của ảnh xám dùng để bám khuôn mặt giữa các frame
+STREAM_TRACK_MAX_DIMENSION = max(32, _env_int("FACE_STREAM_TRACK_MAX_DIM", 320))
+
+# Chênh lệch trung bình tối đa (mức xám 0-255) của vùng mặt so với lần tính embedding trước
+# để dùng lại embedding cũ (0 = luôn tính lại)
+STREAM_REENCODE_DIFF = max(0, _env_int("FACE_STREAM_REENCODE_DIFF", 4))
@@ -4,19 +4,81 @@ Handles loading face embeddings from training images in the myface/ directory.
 """
 
 import os
+import hashlib
 import logging
-from functools import lru_cache
-from typing import List, Tuple
+from functools import partial
+from typing import List, Optional, Tuple
 import numpy as np
-import face_recognition
+
+from backend import config
+from backend.lazy_imports import lazy_import
+from backend.detectors import DEFAULT_DETECTOR, get_detector, is_default_detector
+from backend.parallel import map_files_ordered
+from backend.gallery_store import GalleryStore, directory_manifest
+from backend.image_store import iter_image_files
+from backend.shared_gallery import SharedGallery
+from backend.training import extraction_settings_key
+
+# dlib + model được import ở lần dùng đầu tiên (xem backend/lazy_imports.py)
+face_recognition = lazy_import("face_recognition")
 
 logger = logging.getLogger(__name__)
 
+# Thư mục ảnh huấn luyện cho verification
+MYFACE_DIR = "myface"
+
+# Các extension hợp lệ
+VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# File gallery dùng chung giữa các worker khi bật FACE_GALLERY_SHARED
+SHARED_GALLERY_PATH = os.path.join("models", "known_faces.bin")
+
+
+def load_encoding_from_file(filepath: str, detector: str = DEFAULT_DETECTOR) -> Tuple[int, Optional[np.ndarray]]:
+    """
+    Đọc một ảnh và trích xuất face embedding nếu ảnh có đúng 1 khuôn mặt.
+    Là hàm cấp module để có thể chạy trong worker process.
+    
+    Args:
+        filepath: Đường dẫn file ảnh
+        detector: Chuỗi detector (xem backend/detectors.py)
+        
+    Returns:
+        - num_faces: Số khuôn mặt phát hiện được
+        - encoding: Face embedding (128-d) nếu có đúng 1 khuôn mặt, ngược lại None
+    """
+    # Tải ảnh
+    image = face_recognition.load_image_file(filepath)
+    
+    # Tìm vị trí khuôn mặt
+    if is_default_detector(detector):
+        face_locations = face_recognition.face_locations(image)
+    else:
+        face_locations = get_detector(detector).detect(image)
+    
+    if len(face_locations) != 1:
+        return len(face_locations), None
+    
+    # Trích xuất face embedding
+    face_encodings = face_recognition.face_encodings(image, face_locations)
+    
+    if len(face_encodings) == 0:
+        return 1, None
+    
+    return 1, face_encodings[0]
+
 
-def load_known_face_encodings() -> Tuple[List[np.ndarray], List[str]]:
+def load_known_face_encodings(
+    workers: Optional[int] = None,
+    detector: Optional[str] = None
+) -> Tuple[List[np.ndarray], List[str]]:
     """
     Tải tất cả ảnh từ thư mục myface/ và trích xuất face embeddings.
     
+    Args:
+        workers: Số process trích xuất song song (mặc định FACE_EXTRACTION_WORKERS)
+        detector: Chuỗi detector (mặc định FACE_TRAINING_DETECTOR)
+    
     Returns:
         - known_encodings: Danh sách face embeddings (128-d vectors)
         - used_files: Danh sách tên file đã xử lý thành công
@@ -25,7 +87,7 @@ def load_known_face_encodings() -> Tuple[List[np.ndarray], List[str]]:
         - FileNotFoundError: Nếu thư mục myface/ không tồn tại
         - ValueError: Nếu không tìm thấy ảnh hợp lệ nào
     """
-    myface_dir = "myface"
+    myface_dir = MYFACE_DIR
     logger.info(f"Đang tải dữ liệu huấn luyện từ thư mục '{myface_dir}/'...")
     
     # Kiểm tra thư mục tồn tại
@@ -37,18 +99,11 @@ def load_known_face_encodings() -> Tuple[List[np.ndarray], List[str]]:
         logger.error(f"'{myface_dir}/' không phải là thư mục")
         raise FileNotFoundError(f"'{myface_dir}/' không phải là thư mục.")
     
-    # Các extension hợp lệ
-    valid_extensions = {'.jpg', '.jpeg', '.png'}
-    
     known_encodings = []
     used_files = []
     
-    # Quét thư mục và filter file theo extension
-    image_files = [
-        f for f in os.listdir(myface_dir)
-        if os.path.isfile(os.path.join(myface_dir, f)) and
-        os.path.splitext(f.lower())[1] in valid_extensions
-    ]
+    # Quét thư mục (kể cả thư mục shard con) và filter file theo extension
+    image_files = [path for path, _ in iter_image_files(myface_dir, VALID_EXTENSIONS)]
     
     if not image_files:
         logger.error(f"Không tìm thấy ảnh hợp lệ nào trong thư mục '{myface_dir}/'")
@@ -57,36 +112,33 @@ def load_known_face_encodings() -> Tuple[List[np.ndarray], List[str]]:
     
     logger.info(f"Tìm thấy {len(image_files)} file ảnh: {image_files}")
     
-    # Xử lý từng ảnh
-    for filename in image_files:
-        filepath = os.path.join(myface_dir, filename)
+    # Xử lý từng ảnh (song song nếu cấu hình nhiều worker), kết quả giữ đúng thứ tự file
+    filepaths = [os.path.join(myface_dir, filename) for filename in image_files]
+    workers = config.EXTRACTION_WORKERS if workers is None else workers
+    
+    load = partial(load_encoding_from_file, detector=detector or config.TRAINING_DETECTOR)
+    
+    for filepath, result, error in map_files_ordered(load, filepaths, workers):
+        filename = os.path.relpath(filepath, myface_dir)
+        
+        if error is not None:
+            logger.error(f"Lỗi khi xử lý '{filename}': {str(error)}. Bỏ qua.")
+            continue
+        
+        num_faces, encoding = result
         
-        try:
-            # Tải ảnh
-            image = face_recognition.load_image_file(filepath)
-            
-            # Tìm vị trí khuôn mặt
-            face_locations = face_recognition.face_locations(image)
-            
-            # Bỏ qua ảnh nếu không có hoặc có nhiều hơn 1 khuôn mặt
-            if len(face_locations) == 0:
-                logger.warning(f"Không tìm thấy khuôn mặt trong '{filename}'. Bỏ qua.")
-                continue
-            elif len(face_locations) > 1:
-                logger.warning(f"Phát hiện {len(face_locations)} khuôn mặt trong '{filename}'. Bỏ qua.")
-                continue
-            
-            # Trích xuất face embedding
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-            
-            if len(face_encodings) > 0:
-                known_encodings.append(face_encodings[0])
-                used_files.append(filename)
-                logger.info(f"Đã tải thành công: {filename}")
-            
-        except Exception as e:
-            logger.error(f"Lỗi khi xử lý '{filename}': {str(e)}. Bỏ qua.")
+        # Bỏ qua ảnh nếu không có hoặc có nhiều hơn 1 khuôn mặt
+        if num_faces == 0:
+            logger.warning(f"Không tìm thấy khuôn mặt trong '{filename}'. Bỏ qua.")
             continue
+        elif num_faces > 1:
+            logger.warning(f"Phát hiện {num_faces} khuôn mặt trong '{filename}'. Bỏ qua.")
+            continue
+        
+        if encoding is not None:
+            known_encodings.append(encoding)
+            used_files.append(filename)
+            logger.info(f"Đã tải thành công: {filename}")
     
     # Kiểm tra có ít nhất 1 ảnh hợp lệ
     if len(known_encodings) == 0:
@@ -98,13 +150,61 @@ def load_known_face_encodings() -> Tuple[List[np.ndarray], List[str]]:
     return known_encodings, used_files
 
 
-@lru_cache(maxsize=1)
+def _extract_known_faces() -> Tuple[List[np.ndarray], List[str]]:
+    # Tra cứu load_known_face_encodings lúc gọi (không bind sẵn) để có thể patch khi test
+    return load_known_face_encodings()
+
+
+def _known_faces_manifest() -> Tuple:
+    return directory_manifest(MYFACE_DIR, VALID_EXTENSIONS)
+
+
+def _known_faces_source_key() -> str:
+    """
+    Dấu vân tay của myface/ và settings trích xuất: gallery dùng chung được build lại khi khác.
+    """
+    source = repr((_known_faces_manifest(), extraction_settings_key(config.TRAINING_DETECTOR)))
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+# Gallery memmap dùng chung giữa các worker (chỉ dùng khi bật FACE_GALLERY_SHARED)
+shared_known_faces = SharedGallery(
+    SHARED_GALLERY_PATH, _extract_known_faces, _known_faces_source_key, name="dữ liệu huấn luyện"
+)
+
+
+def _load_known_faces():
+    if config.GALLERY_SHARED:
+        return shared_known_faces.load()
+    return _extract_known_faces()
+
+
+def _known_faces_fingerprint() -> Tuple:
+    # Chế độ dùng chung: generation mới do worker khác build (file bị thay) cũng kích hoạt tải lại
+    if config.GALLERY_SHARED:
+        return _known_faces_manifest(), shared_known_faces.file_identity()
+    return _known_faces_manifest()
+
+
+# Snapshot dữ liệu huấn luyện dùng chung, tự tải lại khi thư mục myface/ thay đổi
+known_faces_store = GalleryStore(_load_known_faces, _known_faces_fingerprint, name="dữ liệu huấn luyện")
+
+
 def get_known_faces_cache() -> Tuple[List[np.ndarray], List[str]]:
     """
     Cached version của load_known_face_encodings để tránh tải lại.
     
+    Dữ liệu được giữ trong known_faces_store: khi myface/ thay đổi (hoặc gọi reload),
+    snapshot mới được build ở background và thay thế nguyên tử; trong lúc đó các request
+    vẫn dùng snapshot cũ. Khi bật FACE_GALLERY_SHARED, embeddings là FaceGallery memmap
+    dùng chung giữa các worker (xem backend/shared_gallery.py).
+    
     Returns:
-        - known_encodings: Danh sách face embeddings (128-d vectors)
+        - known_encodings: Danh sách face embeddings (128-d vectors) hoặc FaceGallery
         - used_files: Danh sách tên file đã xử lý thành công
     """
-    return load_known_face_encodings()
+    return known_faces_store.get()
+
+
+# Giữ API tương thích với lru_cache cũ
+get_known_faces_cache.cache_clear = known_faces_store.clear
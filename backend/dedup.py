@@ -0,0 +1,396 @@
+"""
+Near-duplicate detection module.
+Phát hiện ảnh gần trùng (ảnh chụp liên tiếp gần như giống hệt nhau) trong data/raw/user/
+bằng difference hash 64 bit (lọc nhanh) kết hợp khoảng cách face embedding (xác nhận).
+
+Loại bỏ ảnh gần trùng trong thư mục đã có:
+    python -m backend.dedup [--data-dir data/raw/user] [--dry-run]
+"""
+
+import os
+import argparse
+import logging
+import shutil
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+import cv2
+
+from backend import config
+from backend.catalog import catalog_for, image_catalog
+from backend.embedding_cache import EmbeddingCache, STATUS_OK
+from backend.training import EMBEDDING_CACHE_PATH, extraction_settings_key, extract_embedding_from_file
+
+logger = logging.getLogger(__name__)
+
+# Chế độ kiểm tra gần trùng
+DEDUP_OFF = "off"
+DEDUP_RECENT = "recent"
+DEDUP_ALL = "all"
+DEDUP_MODES = (DEDUP_OFF, DEDUP_RECENT, DEDUP_ALL)
+
+USER_DATA_DIR = image_catalog.data_dir
+
+# Ảnh gần trùng được chuyển vào đây (ngoài data/raw/user/ nên không được dùng khi huấn luyện)
+DUPLICATES_DIR = os.path.join("data", "raw", "user_duplicates")
+
+# Difference hash trên lưới (HASH_SIZE + 1) x HASH_SIZE ảnh xám -> HASH_SIZE^2 bit
+HASH_SIZE = 8
+
+
+@dataclass
+class Sample:
+    """
+    Một ảnh đã lưu: difference hash và face embedding (None nếu chưa biết).
+    """
+    filename: str
+    dhash: int
+    encoding: Optional[np.ndarray] = None
+
+
+@dataclass
+class DuplicateMatch:
+    """
+    Ảnh đã lưu gần trùng với ảnh mới.
+    embedding_distance là None nếu một trong hai ảnh không có embedding (chỉ so sánh hash).
+    """
+    filename: str
+    hash_distance: int
+    embedding_distance: Optional[float] = None
+
+
+def image_dhash(image: np.ndarray) -> int:
+    """
+    Difference hash 64 bit của ảnh (BGR hoặc xám): so sánh độ sáng các ô liền kề theo hàng
+    trên ảnh thu nhỏ 9x8, nên gần như không đổi khi ảnh bị nén lại hoặc đổi độ phân giải.
+    """
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = small[:, 1:] > small[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def file_dhash(filepath: str) -> int:
+    """
+    Difference hash của một file ảnh (decode thu nhỏ 1/4 dạng xám, đủ cho lưới 9x8).
+
+    Raises:
+        ValueError: Nếu không đọc được ảnh
+    """
+    image = cv2.imread(filepath, cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    if image is None:
+        raise ValueError(f"Không đọc được ảnh '{filepath}'.")
+    return image_dhash(image)
+
+
+def hash_distance(a: int, b: int) -> int:
+    """
+    Số bit khác nhau giữa hai hash (khoảng cách Hamming).
+    """
+    return bin(a ^ b).count("1")
+
+
+def find_near_duplicate(
+    dhash: int,
+    encoding: Optional[np.ndarray],
+    samples: Sequence[Sample],
+    max_hash_distance: Optional[int] = None,
+    max_embedding_distance: Optional[float] = None
+) -> Optional[DuplicateMatch]:
+    """
+    Tìm ảnh đã lưu gần trùng nhất với ảnh mới.
+
+    Một ảnh là gần trùng khi hash cách không quá max_hash_distance bit và (nếu cả hai ảnh
+    đều có embedding) embedding cách không quá max_embedding_distance.
+
+    Args:
+        dhash: Difference hash của ảnh mới
+        encoding: Face embedding của ảnh mới (None = chỉ so sánh hash)
+        samples: Các ảnh đã lưu cần so sánh
+        max_hash_distance: Mặc định FACE_DEDUP_HASH_DISTANCE
+        max_embedding_distance: Mặc định FACE_DEDUP_EMBEDDING_DISTANCE
+
+    Returns:
+        Ảnh gần trùng nhất (hash gần nhất, sau đó embedding gần nhất), hoặc None
+    """
+    if max_hash_distance is None:
+        max_hash_distance = config.DEDUP_HASH_DISTANCE
+    if max_embedding_distance is None:
+        max_embedding_distance = config.DEDUP_EMBEDDING_DISTANCE
+
+    best = None
+    for sample in samples:
+        bits = hash_distance(dhash, sample.dhash)
+        if bits > max_hash_distance:
+            continue
+
+        distance = None
+        if encoding is not None and sample.encoding is not None:
+            distance = float(np.linalg.norm(np.asarray(sample.encoding) - np.asarray(encoding)))
+            if distance > max_embedding_distance:
+                continue
+
+        if best is None or (bits, distance or 0.0) < (best.hash_distance, best.embedding_distance or 0.0):
+            best = DuplicateMatch(sample.filename, bits, distance)
+    return best
+
+
+def _catalog_hashes(data_dir: str) -> List[Tuple[str, int]]:
+    """
+    (tên file, difference hash) các ảnh trong catalog theo thứ tự thu thập.
+    Hash đọc từ catalog; ảnh chưa có hash (thêm khi đối chiếu thư mục) được tính từ file và
+    lưu lại vào catalog. Ảnh không đọc được bị bỏ qua.
+    """
+    catalog = catalog_for(data_dir)
+    hashes = []
+    computed = {}
+    for entry in catalog.entries():
+        dhash = entry.dhash
+        if dhash is None:
+            try:
+                dhash = computed[entry.path] = file_dhash(os.path.join(data_dir, entry.path))
+            except Exception as e:
+                logger.warning(f"Bỏ qua '{entry.path}': {str(e)}")
+                continue
+        hashes.append((entry.path, dhash))
+    if computed:
+        catalog.set_dhashes(computed)
+    return hashes
+
+
+def _load_embedding_cache() -> EmbeddingCache:
+    """
+    Embedding cache của lần huấn luyện trước (rỗng nếu chưa huấn luyện hoặc khác settings).
+    """
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, extraction_settings_key(config.TRAINING_DETECTOR))
+    cache.load()
+    return cache
+
+
+def _cached_encoding(cache: EmbeddingCache, filepath: str, data_dir: str) -> Optional[np.ndarray]:
+    entry = cache.get(cache.lookup_hash(filepath, data_dir))
+    if entry is None or entry.status != STATUS_OK:
+        return None
+    return entry.embedding
+
+
+class DuplicateIndex:
+    """
+    Hash và embedding của các ảnh đã lưu trong một thư mục, dùng khi thu thập ảnh mới.
+
+    Index được build khi dùng lần đầu: hash đọc từ catalog ảnh, embedding lấy từ embedding cache
+    huấn luyện (ảnh chưa có trong cache chỉ được so sánh bằng hash). Ảnh lưu sau đó được
+    thêm vào qua add(); ảnh bị xóa khỏi thư mục được loại khi gặp lại. Trước mỗi lần tìm, nếu
+    số thế hệ của catalog đã đổi (ảnh do worker process khác thu thập, ảnh bị xóa...) thì index
+    được đồng bộ lại theo catalog; chỉ ảnh mới phải tra embedding.
+    """
+
+    def __init__(self, data_dir: str = USER_DATA_DIR):
+        self.data_dir = data_dir
+        self._samples: List[Sample] = []
+        self._filenames = set()
+        self._loaded = False
+        self._generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def _ensure_loaded(self) -> None:
+        with self._lock:
+            if not os.path.isdir(self.data_dir):
+                if not self._loaded:
+                    self._loaded = True
+                    logger.info(f"Đã build index ảnh gần trùng: 0 ảnh trong '{self.data_dir}/'")
+                return
+            catalog = catalog_for(self.data_dir)
+            generation = catalog.generation()
+            if self._loaded and generation == self._generation:
+                return
+
+            # Giữ lại sample đã có (embedding tính lúc thu thập), chỉ tra cache cho ảnh mới
+            known = {sample.filename: sample for sample in self._samples}
+            samples = []
+            cache = None
+            for filename, dhash in _catalog_hashes(self.data_dir):
+                sample = known.get(filename)
+                if sample is None or sample.dhash != dhash:
+                    if cache is None:
+                        cache = _load_embedding_cache()
+                    filepath = os.path.join(self.data_dir, filename)
+                    try:
+                        sample = Sample(filename, dhash, _cached_encoding(cache, filepath, self.data_dir))
+                    except Exception as e:
+                        logger.warning(f"Bỏ qua '{filename}' khi build index ảnh gần trùng: {str(e)}")
+                        continue
+                samples.append(sample)
+            self._samples = samples
+            self._filenames = {sample.filename for sample in samples}
+            self._generation = generation
+            if self._loaded:
+                logger.debug(f"Đã đồng bộ index ảnh gần trùng theo catalog: {len(samples)} ảnh")
+            else:
+                self._loaded = True
+                logger.info(f"Đã build index ảnh gần trùng: {len(samples)} ảnh trong '{self.data_dir}/'")
+
+    def find(
+        self,
+        dhash: int,
+        encoding: Optional[np.ndarray],
+        mode: str = DEDUP_ALL,
+        recent: Optional[int] = None
+    ) -> Optional[DuplicateMatch]:
+        """
+        Tìm ảnh đã lưu gần trùng với ảnh mới.
+
+        Args:
+            dhash: Difference hash của ảnh mới
+            encoding: Face embedding của ảnh mới
+            mode: DEDUP_RECENT (chỉ `recent` ảnh mới nhất) hoặc DEDUP_ALL
+            recent: Số ảnh mới nhất ở chế độ DEDUP_RECENT (mặc định FACE_DEDUP_RECENT)
+        """
+        self._ensure_loaded()
+        while True:
+            with self._lock:
+                samples = list(self._samples)
+            if mode == DEDUP_RECENT:
+                samples = samples[-(recent or config.DEDUP_RECENT):]
+
+            match = find_near_duplicate(dhash, encoding, samples)
+            if match is None or os.path.exists(os.path.join(self.data_dir, match.filename)):
+                return match
+            self.remove(match.filename)
+
+    def add(self, filename: str, dhash: int, encoding: Optional[np.ndarray]) -> None:
+        """
+        Thêm ảnh vừa lưu. Không làm gì nếu index chưa build (lần build sau sẽ quét thấy ảnh).
+        """
+        with self._lock:
+            if not self._loaded or filename in self._filenames:
+                return
+            self._samples.append(Sample(filename, dhash, encoding))
+            self._filenames.add(filename)
+
+    def remove(self, filename: str) -> None:
+        with self._lock:
+            self._samples = [sample for sample in self._samples if sample.filename != filename]
+            self._filenames.discard(filename)
+
+
+# Index dùng chung cho /api/v1/collect
+duplicate_index = DuplicateIndex()
+
+
+def dedupe_directory(
+    data_dir: str = USER_DATA_DIR,
+    mode: str = DEDUP_ALL,
+    recent: Optional[int] = None,
+    detector: Optional[str] = None
+) -> Tuple[List[str], List[Tuple[str, DuplicateMatch]]]:
+    """
+    Tìm các ảnh gần trùng trong một thư mục, giữ lại ảnh được thu thập sớm nhất.
+
+    Hash đọc từ catalog ảnh (tính từ file nếu chưa có); embedding chỉ được trích xuất (hoặc lấy từ embedding cache)
+    cho các ảnh có hash đủ gần với một ảnh đã giữ.
+
+    Args:
+        data_dir: Thư mục ảnh
+        mode: DEDUP_RECENT (so với `recent` ảnh giữ lại gần nhất) hoặc DEDUP_ALL
+        recent: Mặc định FACE_DEDUP_RECENT
+        detector: Detector khi trích xuất embedding (mặc định FACE_TRAINING_DETECTOR)
+
+    Returns:
+        - kept: Tên các ảnh được giữ lại
+        - duplicates: (tên ảnh gần trùng, ảnh giữ lại mà nó trùng với)
+
+    Raises:
+        FileNotFoundError: Nếu thư mục không tồn tại
+    """
+    if not os.path.isdir(data_dir):
+        raise FileNotFoundError(f"Thư mục '{data_dir}/' không tồn tại.")
+    detector = detector or config.TRAINING_DETECTOR
+    recent = recent or config.DEDUP_RECENT
+
+    cache = _load_embedding_cache()
+    encodings: Dict[str, Optional[np.ndarray]] = {}
+
+    def encoding_for(filename: str) -> Optional[np.ndarray]:
+        if filename not in encodings:
+            filepath = os.path.join(data_dir, filename)
+            encoding = None
+            try:
+                entry = cache.get(cache.lookup_hash(filepath, data_dir))
+                if entry is not None:
+                    encoding = entry.embedding
+                else:
+                    _, _, encoding = extract_embedding_from_file(filepath, detector=detector)
+            except Exception as e:
+                logger.warning(f"Không trích xuất được embedding từ '{filename}': {str(e)}")
+            encodings[filename] = encoding
+        return encodings[filename]
+
+    kept: List[Sample] = []
+    duplicates: List[Tuple[str, DuplicateMatch]] = []
+    for filename, dhash in _catalog_hashes(data_dir):
+        window = kept[-recent:] if mode == DEDUP_RECENT else kept
+        # Lọc bằng hash trước, chỉ trích xuất embedding cho các ứng viên
+        candidates = [s for s in window if hash_distance(dhash, s.dhash) <= config.DEDUP_HASH_DISTANCE]
+        match = None
+        if candidates:
+            for sample in candidates:
+                sample.encoding = encoding_for(sample.filename)
+            match = find_near_duplicate(dhash, encoding_for(filename), candidates)
+
+        if match is None:
+            kept.append(Sample(filename, dhash))
+        else:
+            duplicates.append((filename, match))
+
+    return [sample.filename for sample in kept], duplicates
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Loại bỏ ảnh gần trùng trong thư mục dữ liệu thu thập")
+    parser.add_argument("--data-dir", default=USER_DATA_DIR, help="Thư mục ảnh cần lọc")
+    parser.add_argument("--mode", choices=(DEDUP_RECENT, DEDUP_ALL), default=DEDUP_ALL,
+                        help="So với mọi ảnh đã giữ (all) hoặc chỉ các ảnh gần nhất (recent)")
+    parser.add_argument("--recent", type=int, default=None, help="Số ảnh gần nhất ở chế độ recent")
+    parser.add_argument("--move-to", default=DUPLICATES_DIR, help="Thư mục chứa ảnh gần trùng bị loại")
+    parser.add_argument("--delete", action="store_true", help="Xóa ảnh gần trùng thay vì di chuyển")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ liệt kê, không thay đổi file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    kept, duplicates = dedupe_directory(args.data_dir, args.mode, args.recent)
+
+    for filename, match in duplicates:
+        distance = "n/a" if match.embedding_distance is None else f"{match.embedding_distance:.3f}"
+        logger.info(
+            f"'{filename}' gần trùng với '{match.filename}' "
+            f"(hash: {match.hash_distance} bit, embedding: {distance})"
+        )
+        if args.dry_run:
+            continue
+        filepath = os.path.join(args.data_dir, filename)
+        if args.delete:
+            os.remove(filepath)
+        else:
+            # Giữ nguyên thư mục shard bên trong thư mục đích
+            target = os.path.join(args.move_to, filename)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.move(filepath, target)
+
+    if not args.dry_run:
+        catalog_for(args.data_dir).remove(filename for filename, _ in duplicates)
+
+    action = "tìm thấy" if args.dry_run else ("đã xóa" if args.delete else f"đã chuyển vào '{args.move_to}/'")
+    logger.info(f"Giữ lại {len(kept)} ảnh, {action} {len(duplicates)} ảnh gần trùng.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Face detector backends.
+Các detector có thể chọn qua chuỗi cấu hình (FACE_DETECTOR, FACE_TRAINING_DETECTOR hoặc tham số
+`detector` của endpoint):
+
+- "hog", "hog:2": dlib HOG của face_recognition (số sau dấu ":" là số lần upsample)
+- "cnn", "cnn:0": dlib CNN (chính xác hơn, rất chậm nếu không có GPU)
+- "haar", "lbp": cascade của OpenCV trên ảnh xám (nhanh, kém chính xác hơn)
+- "haar>hog", "lbp>cnn", ...: cascade lọc trước - detector rẻ (bên trái) loại ảnh không có
+  khuôn mặt, detector đắt (bên phải) chỉ chạy khi bộ lọc thấy ít nhất một khuôn mặt
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+
+from backend import config
+from backend.lazy_imports import lazy_import
+from backend import metrics
+
+# dlib + model được import ở lần dùng đầu tiên (xem backend/lazy_imports.py)
+face_recognition = lazy_import("face_recognition")
+
+FaceLocation = Tuple[int, int, int, int]
+
+# Detector mặc định (giống hành vi face_recognition.face_locations(image))
+DEFAULT_DETECTOR = "hog"
+
+DLIB_MODELS = ("hog", "cnn")
+
+# File cascade của OpenCV. Gói opencv-python chỉ kèm Haar cascade (cv2.data.haarcascades);
+# LBP cascade lấy từ thư mục FACE_CASCADE_DIR.
+CASCADE_FILES = {
+    "haar": "haarcascade_frontalface_default.xml",
+    "lbp": "lbpcascade_frontalface_improved.xml",
+}
+
+# Tham số detectMultiScale
+CASCADE_SCALE_FACTOR = 1.1
+CASCADE_MIN_NEIGHBORS = 5
+CASCADE_MIN_SIZE = 20
+
+# Khi làm bộ lọc trước: nới ngưỡng để ít bỏ sót khuôn mặt, chạy trên ảnh xám thu nhỏ
+PREFILTER_MIN_NEIGHBORS = 2
+PREFILTER_MAX_DIMENSION = 480
+
+CASCADE_SEPARATOR = ">"
+
+
+class FaceDetector:
+    """
+    Giao diện chung: detect(image) trả về danh sách (top, right, bottom, left) theo ảnh đầu vào.
+    Ảnh đầu vào là RGB hoặc ảnh xám 2 chiều.
+    """
+
+    name = ""
+
+    def detect(self, image) -> List[FaceLocation]:
+        raise NotImplementedError
+
+    @property
+    def settings_key(self) -> str:
+        """Chuỗi mô tả tham số detector (dùng trong key của embedding cache)."""
+        return f"detector={self.name}"
+
+
+class DlibDetector(FaceDetector):
+    """
+    dlib HOG / CNN qua face_recognition.face_locations.
+    """
+
+    def __init__(self, model: str = "hog", upsample: int = 1):
+        self.model = model
+        self.upsample = upsample
+        self.name = model if upsample == 1 else f"{model}:{upsample}"
+
+    def detect(self, image) -> List[FaceLocation]:
+        return face_recognition.face_locations(
+            image, number_of_times_to_upsample=self.upsample, model=self.model
+        )
+
+    @property
+    def settings_key(self) -> str:
+        return f"detector={self.model};upsample={self.upsample}"
+
+
+class _CascadeFileCache(threading.local):
+    # CascadeClassifier không an toàn khi dùng chung giữa các thread: mỗi thread một bản
+    def __init__(self):
+        self.classifiers: Dict[str, "cv2.CascadeClassifier"] = {}
+
+
+_cascade_cache = _CascadeFileCache()
+
+
+def cascade_path(kind: str) -> str:
+    """
+    Đường dẫn file cascade: tìm trong FACE_CASCADE_DIR rồi trong cv2.data.haarcascades.
+
+    Raises:
+        FileNotFoundError: Nếu không tìm thấy file
+    """
+    filename = CASCADE_FILES[kind]
+    directories = [config.CASCADE_DIR] if config.CASCADE_DIR else []
+    bundled = getattr(getattr(cv2, "data", None), "haarcascades", None)
+    if bundled:
+        directories.append(bundled)
+    for directory in directories:
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(
+        f"Không tìm thấy file cascade '{filename}'. "
+        f"Đặt FACE_CASCADE_DIR tới thư mục chứa file (gói opencv-python không kèm LBP cascade)."
+    )
+
+
+def _load_cascade(path: str) -> "cv2.CascadeClassifier":
+    classifier = _cascade_cache.classifiers.get(path)
+    if classifier is None:
+        classifier = cv2.CascadeClassifier(path)
+        if classifier.empty():
+            raise FileNotFoundError(f"Không đọc được file cascade '{path}'.")
+        _cascade_cache.classifiers[path] = classifier
+    return classifier
+
+
+class CascadeDetector(FaceDetector):
+    """
+    Haar / LBP cascade của OpenCV trên ảnh xám (thu nhỏ nếu max_dimension > 0).
+    path mặc định tìm qua cascade_path(kind) khi detect lần đầu.
+    """
+
+    def __init__(self, kind: str, min_neighbors: int = CASCADE_MIN_NEIGHBORS, max_dimension: int = 0,
+                 path: Optional[str] = None):
+        self.kind = kind
+        self.path = path
+        self.name = kind
+        self.min_neighbors = min_neighbors
+        self.max_dimension = max_dimension
+
+    def detect(self, image) -> List[FaceLocation]:
+        if self.path is None:
+            self.path = cascade_path(self.kind)
+        classifier = _load_cascade(self.path)
+        height, width = image.shape[:2]
+        scale = 1.0
+        if self.max_dimension > 0 and max(height, width) > self.max_dimension:
+            scale = self.max_dimension / max(height, width)
+            small_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+            image = cv2.resize(image, small_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+
+        boxes = classifier.detectMultiScale(
+            gray,
+            scaleFactor=CASCADE_SCALE_FACTOR,
+            minNeighbors=self.min_neighbors,
+            minSize=(CASCADE_MIN_SIZE, CASCADE_MIN_SIZE)
+        )
+        return [
+            (
+                max(0, int(round(y / scale))),
+                min(width, int(round((x + w) / scale))),
+                min(height, int(round((y + h) / scale))),
+                max(0, int(round(x / scale)))
+            )
+            for x, y, w, h in boxes
+        ]
+
+    @property
+    def settings_key(self) -> str:
+        return f"detector={self.kind};min_neighbors={self.min_neighbors};max_dim={self.max_dimension}"
+
+
+class PrefilterDetector(FaceDetector):
+    """
+    Chạy detector rẻ trước; ảnh không có khuôn mặt bị loại mà không chạy detector đắt.
+    Vị trí khuôn mặt trả về luôn lấy từ detector đắt.
+    """
+
+    def __init__(self, prefilter: FaceDetector, detector: FaceDetector):
+        self.prefilter = prefilter
+        self.detector = detector
+        self.name = f"{prefilter.name}{CASCADE_SEPARATOR}{detector.name}"
+
+    def detect(self, image) -> List[FaceLocation]:
+        with metrics.stage("prefilter"):
+            candidates = self.prefilter.detect(image)
+        if not candidates:
+            return []
+        return self.detector.detect(image)
+
+    @property
+    def settings_key(self) -> str:
+        return f"prefilter=({self.prefilter.settings_key});{self.detector.settings_key}"
+
+
+def _parse_single(spec: str, upsample: int, prefilter: bool) -> FaceDetector:
+    name, _, option = spec.partition(":")
+    if name in DLIB_MODELS:
+        if option:
+            try:
+                upsample = int(option)
+            except ValueError:
+                raise ValueError(f"Số lần upsample không hợp lệ trong detector '{spec}'.")
+            if upsample < 0:
+                raise ValueError(f"Số lần upsample không hợp lệ trong detector '{spec}'.")
+        return DlibDetector(name, upsample)
+    if name in CASCADE_FILES and not option:
+        # Tìm file cascade ngay khi cấu hình để lỗi hiện ra lúc khởi động / thành 400, không phải khi detect
+        try:
+            path = cascade_path(name)
+        except FileNotFoundError as e:
+            raise ValueError(str(e))
+        if prefilter:
+            return CascadeDetector(name, PREFILTER_MIN_NEIGHBORS, PREFILTER_MAX_DIMENSION, path=path)
+        return CascadeDetector(name, path=path)
+    raise ValueError(
+        f"Detector không hợp lệ: '{spec}'. Hỗ trợ: hog, hog:<upsample>, cnn, cnn:<upsample>, "
+        f"haar, lbp hoặc dạng lọc trước '<haar|lbp>{CASCADE_SEPARATOR}<detector>'."
+    )
+
+
+_detectors: Dict[Tuple[str, int], FaceDetector] = {}
+_detectors_lock = threading.Lock()
+
+
+def get_detector(spec: str = DEFAULT_DETECTOR, upsample: int = 1) -> FaceDetector:
+    """
+    Tạo (và cache) detector theo chuỗi cấu hình.
+
+    Args:
+        spec: Chuỗi detector (xem đầu module)
+        upsample: Số lần upsample mặc định cho detector dlib không ghi rõ ":<upsample>"
+
+    Returns:
+        FaceDetector
+
+    Raises:
+        ValueError: Nếu chuỗi detector không hợp lệ hoặc không tìm thấy file cascade
+    """
+    spec = spec.strip().lower()
+    key = (spec, upsample)
+    detector = _detectors.get(key)
+    if detector is not None:
+        return detector
+
+    parts = spec.split(CASCADE_SEPARATOR)
+    if len(parts) == 1:
+        detector = _parse_single(parts[0], upsample, prefilter=False)
+    elif len(parts) == 2 and parts[0] in CASCADE_FILES:
+        detector = PrefilterDetector(
+            _parse_single(parts[0], upsample, prefilter=True),
+            _parse_single(parts[1], upsample, prefilter=False)
+        )
+    else:
+        raise ValueError(
+            f"Detector không hợp lệ: '{spec}'. Bộ lọc trước phải là haar hoặc lbp, "
+            f"ví dụ 'haar{CASCADE_SEPARATOR}hog'."
+        )
+
+    with _detectors_lock:
+        return _detectors.setdefault(key, detector)
+
+
+def is_default_detector(spec: str) -> bool:
+    """
+    True nếu spec là detector mặc định (face_recognition.face_locations(image) nguyên bản).
+    """
+    return spec.strip().lower() == DEFAULT_DETECTOR
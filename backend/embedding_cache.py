@@ -0,0 +1,191 @@
+"""
+Persistent embedding cache module.
+Lưu kết quả trích xuất embedding theo content hash của từng ảnh để lần huấn luyện
+sau chỉ phải xử lý ảnh mới hoặc ảnh đã thay đổi.
+"""
+
+import os
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Phiên bản định dạng file cache - tăng khi thay đổi cấu trúc
+CACHE_FORMAT_VERSION = 1
+
+# Trạng thái trích xuất được cache (lỗi đọc file không được cache vì có thể là lỗi tạm thời)
+STATUS_OK = "ok"
+STATUS_NO_FACE = "no_face"
+STATUS_MULTIPLE_FACES = "multiple_faces"
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class CacheEntry:
+    """
+    Kết quả trích xuất của một ảnh, định danh bằng content hash.
+    """
+    content_hash: str
+    status: str
+    num_faces: int
+    embedding: Optional[np.ndarray]
+    size: int = -1
+    mtime_ns: int = -1
+
+
+def compute_file_hash(filepath: str) -> str:
+    """
+    Tính SHA-256 của nội dung file (đọc theo từng chunk).
+
+    Args:
+        filepath: Đường dẫn file
+
+    Returns:
+        Chuỗi hex SHA-256
+    """
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Cache embedding lưu trên đĩa dạng .npz, gắn với bộ tham số detector/encoder.
+
+    Cache bị bỏ qua toàn bộ nếu settings_key khác với lúc ghi, vì embedding
+    phụ thuộc vào detector/encoder đã dùng.
+    """
+
+    def __init__(self, path: str, settings_key: str):
+        self.path = path
+        self.settings_key = settings_key
+        self._entries: Dict[str, CacheEntry] = {}
+        self._by_filename: Dict[str, CacheEntry] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self) -> None:
+        """
+        Đọc cache từ đĩa. File không tồn tại, hỏng hoặc khác settings sẽ được bỏ qua.
+        """
+        self._entries = {}
+        self._by_filename = {}
+
+        if not os.path.exists(self.path):
+            logger.info(f"Chưa có embedding cache tại '{self.path}'")
+            return
+
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                version = int(data["version"])
+                settings_key = str(data["settings"])
+                if version != CACHE_FORMAT_VERSION or settings_key != self.settings_key:
+                    logger.info("Embedding cache được tạo với settings khác. Bỏ qua cache cũ.")
+                    return
+
+                hashes = data["hashes"]
+                statuses = data["statuses"]
+                num_faces = data["num_faces"]
+                embeddings = data["embeddings"]
+                filenames = data["filenames"]
+                sizes = data["sizes"]
+                mtimes = data["mtimes"]
+        except Exception as e:
+            logger.warning(f"Không đọc được embedding cache '{self.path}': {str(e)}. Bỏ qua.")
+            return
+
+        for i in range(len(hashes)):
+            status = str(statuses[i])
+            entry = CacheEntry(
+                content_hash=str(hashes[i]),
+                status=status,
+                num_faces=int(num_faces[i]),
+                embedding=embeddings[i].copy() if status == STATUS_OK else None,
+                size=int(sizes[i]),
+                mtime_ns=int(mtimes[i])
+            )
+            self._entries[entry.content_hash] = entry
+            self._by_filename[str(filenames[i])] = entry
+
+        logger.info(f"Đã tải embedding cache: {len(self._entries)} entries")
+
+    def lookup_hash(self, filepath: str, data_dir: str) -> str:
+        """
+        Lấy content hash của file. Nếu kích thước và mtime không đổi so với lần
+        cache trước thì dùng lại hash đã lưu thay vì đọc lại file.
+
+        Args:
+            filepath: Đường dẫn file
+            data_dir: Thư mục ảnh - entry được tra theo đường dẫn tương đối với thư mục này
+                (cùng khóa với save(), gồm cả thư mục shard YYYY/MM/DD/)
+        """
+        filename = os.path.relpath(filepath, data_dir)
+        stat = os.stat(filepath)
+        cached = self._by_filename.get(filename)
+        if cached is not None and cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns:
+            return cached.content_hash
+        return compute_file_hash(filepath)
+
+    def get(self, content_hash: str) -> Optional[CacheEntry]:
+        """
+        Tìm entry theo content hash (đếm hit/miss).
+        """
+        entry = self._entries.get(content_hash)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def save(self, entries: Dict[str, CacheEntry], dim: int = 128) -> None:
+        """
+        Ghi cache mới chỉ gồm các entries được truyền vào (ảnh đã xóa sẽ bị loại bỏ).
+        Ghi ra file tạm rồi rename để không bao giờ để lại file cache dở dang.
+
+        Args:
+            entries: Mapping đường dẫn tương đối (với thư mục ảnh) -> CacheEntry của các ảnh hiện có
+            dim: Số chiều embedding
+        """
+        filenames = list(entries.keys())
+        items = [entries[f] for f in filenames]
+
+        embeddings = np.zeros((len(items), dim), dtype=np.float64)
+        for i, entry in enumerate(items):
+            if entry.embedding is not None:
+                embeddings[i] = entry.embedding
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_path = f"{self.path}.tmp.{os.getpid()}.npz"
+        try:
+            np.savez(
+                tmp_path,
+                version=np.array(CACHE_FORMAT_VERSION),
+                settings=np.array(self.settings_key),
+                filenames=np.array(filenames, dtype=str),
+                hashes=np.array([e.content_hash for e in items], dtype=str),
+                statuses=np.array([e.status for e in items], dtype=str),
+                num_faces=np.array([e.num_faces for e in items], dtype=np.int32),
+                sizes=np.array([e.size for e in items], dtype=np.int64),
+                mtimes=np.array([e.mtime_ns for e in items], dtype=np.int64),
+                embeddings=embeddings
+            )
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._entries = {e.content_hash: e for e in items}
+        self._by_filename = dict(entries)
+        logger.info(f"Đã lưu embedding cache: {len(items)} entries vào '{self.path}'")
@@ -0,0 +1,120 @@
+"""
+Executor layer for CPU-bound face processing.
+Toàn bộ công việc dlib/OpenCV của các endpoint được đẩy vào executor này
+để event loop của asyncio chỉ xử lý I/O.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+from backend import config
+from backend import warmup
+from backend.parallel import START_METHOD
+
+logger = logging.getLogger(__name__)
+
+VALID_EXECUTOR_KINDS = {"thread", "process"}
+
+_executor: Optional[Executor] = None
+_executor_lock = threading.Lock()
+
+
+def create_executor(
+    kind: str,
+    max_workers: int,
+    initializer: Optional[Callable[[], None]] = None
+) -> Executor:
+    """
+    Tạo executor theo loại được cấu hình.
+
+    Args:
+        kind: "thread" hoặc "process"
+        max_workers: Số worker tối đa
+        initializer: Hàm chạy một lần trong mỗi worker process trước tác vụ đầu tiên
+            (chỉ dùng với "process"; các thread dùng chung model của process chính)
+
+    Returns:
+        Executor tương ứng
+
+    Raises:
+        ValueError: Nếu loại executor hoặc số worker không hợp lệ
+    """
+    if kind not in VALID_EXECUTOR_KINDS:
+        raise ValueError(
+            f"Loại executor không hợp lệ: {kind!r}. "
+            f"Giá trị hợp lệ: {sorted(VALID_EXECUTOR_KINDS)}"
+        )
+
+    if max_workers < 1:
+        raise ValueError(f"Số worker phải >= 1, nhận được: {max_workers}")
+
+    if kind == "process":
+        # Pool được tạo lười khi server đã có nhiều thread: khởi động worker bằng spawn, không fork
+        mp_context = multiprocessing.get_context(START_METHOD)
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context, initializer=initializer)
+
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="face-worker")
+
+
+def get_executor() -> Executor:
+    """
+    Lấy executor dùng chung của process (khởi tạo lười ở lần gọi đầu tiên).
+
+    Returns:
+        Executor được cấu hình bởi FACE_EXECUTOR_KIND và FACE_EXECUTOR_WORKERS
+    """
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # Mỗi worker process tự warm-up model trước khi nhận request đầu tiên
+                initializer = warmup.initialize_worker if config.WARMUP_ENABLED else None
+                _executor = create_executor(config.EXECUTOR_KIND, config.EXECUTOR_WORKERS, initializer)
+                logger.info(
+                    f"Đã khởi tạo executor: kind={config.EXECUTOR_KIND}, "
+                    f"workers={config.EXECUTOR_WORKERS}"
+                )
+
+    return _executor
+
+
+def shutdown_executor(wait: bool = True) -> None:
+    """
+    Dừng executor dùng chung (nếu đã khởi tạo).
+
+    Args:
+        wait: Chờ các tác vụ đang chạy hoàn tất trước khi trả về
+    """
+    global _executor
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+
+    if executor is not None:
+        executor.shutdown(wait=wait)
+        logger.info("Đã dừng executor")
+
+
+async def run_in_executor(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Chạy hàm CPU-bound trong executor dùng chung và chờ kết quả mà không chặn event loop.
+
+    Với executor loại "process", func và các tham số phải pickle được
+    (hàm cấp module, numpy array, bytes, ...).
+
+    Args:
+        func: Hàm cần chạy
+        *args, **kwargs: Tham số truyền cho func
+
+    Returns:
+        Kết quả của func. Exception do func raise được raise lại nguyên vẹn.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs) if kwargs else functools.partial(func, *args)
+    return await loop.run_in_executor(get_executor(), call)
@@ -3,10 +3,19 @@ Face recognition logic module.
 Handles face processing and comparison functions.
 """
 
+import struct
 import numpy as np
 import cv2
-import face_recognition
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional, Union
+
+from backend import config
+from backend.lazy_imports import lazy_import
+from backend import metrics
+from backend.detectors import DEFAULT_DETECTOR, get_detector, is_default_detector
+from backend.gallery import FaceGallery, gallery_from_encodings
+
+# dlib + model được import ở lần dùng đầu tiên (xem backend/lazy_imports.py)
+face_recognition = lazy_import("face_recognition")
 
 # Magic bytes cho các định dạng ảnh
 IMAGE_MAGIC_BYTES = {
@@ -41,12 +50,92 @@ def validate_image_magic_bytes(file_bytes: bytes) -> bool:
     return False
 
 
-def load_image_bgr_from_bytes(file_bytes: bytes) -> np.ndarray:
+# Marker SOF (Start Of Frame) của JPEG chứa kích thước ảnh; C4 (DHT), C8 (JPG), CC (DAC) không phải SOF
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+# Hệ số giảm khi decode JPEG trong miền DCT (libjpeg scale 1/2, 1/4, 1/8)
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def read_image_dimensions(file_bytes: bytes) -> Optional[Tuple[int, int]]:
+    """
+    Đọc kích thước ảnh từ header JPEG (segment SOF) hoặc PNG (chunk IHDR) mà không decode ảnh.
+    
+    Args:
+        file_bytes: Dữ liệu ảnh dạng bytes
+        
+    Returns:
+        (width, height), hoặc None nếu không đọc được header
+    """
+    data = memoryview(file_bytes)
+    
+    # PNG: signature 8 byte, sau đó chunk IHDR (length 4 byte, type 4 byte, width, height)
+    if len(data) >= 24 and bytes(data[:8]) == IMAGE_MAGIC_BYTES['png'][0] and bytes(data[12:16]) == b'IHDR':
+        width, height = struct.unpack(">II", data[16:24])
+        return width, height
+    
+    if len(data) < 4 or bytes(data[:2]) != b'\xFF\xD8':
+        return None
+    
+    # JPEG: duyệt các segment cho tới SOF
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        position += 2
+        
+        # Byte đệm 0xFF và các marker không có payload
+        if marker == 0xFF:
+            position -= 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            continue
+        # Gặp SOS/EOI trước SOF: header không hợp lệ
+        if marker in (0xD9, 0xDA):
+            return None
+        
+        (length,) = struct.unpack(">H", data[position:position + 2])
+        if marker in JPEG_SOF_MARKERS:
+            if position + 7 > len(data):
+                return None
+            height, width = struct.unpack(">HH", data[position + 3:position + 7])
+            return width, height
+        position += length
+    
+    return None
+
+
+def reduced_decode_flag(width: int, height: int, max_dimension: int) -> Tuple[int, int]:
+    """
+    Chọn flag decode JPEG thu nhỏ lớn nhất mà cạnh dài sau khi giảm vẫn >= max_dimension.
+    
+    Returns:
+        (flag cho cv2.imdecode, hệ số giảm); (IMREAD_COLOR, 1) nếu không cần giảm
+    """
+    if max_dimension > 0:
+        longest = max(width, height)
+        for factor, flag in REDUCED_DECODE_FLAGS:
+            if longest // factor >= max_dimension:
+                return flag, factor
+    return cv2.IMREAD_COLOR, 1
+
+
+def load_image_bgr_from_bytes(file_bytes: bytes, max_dimension: int = 0) -> np.ndarray:
     """
     Decode image từ bytes thành numpy array (BGR format).
     
+    Với max_dimension > 0 và ảnh JPEG lớn hơn nhiều so với cần thiết, ảnh được decode thu nhỏ
+    trực tiếp trong miền DCT (IMREAD_REDUCED_COLOR_2/4/8): nhanh hơn và tốn ít bộ nhớ hơn nhiều
+    so với decode đủ kích thước rồi mới thu nhỏ. Cạnh dài của ảnh kết quả vẫn >= max_dimension.
+    
     Args:
         file_bytes: Dữ liệu ảnh dạng bytes
+        max_dimension: Cạnh dài mong muốn tối thiểu (0 = luôn decode đủ kích thước)
         
     Returns:
         image_bgr: Ảnh dạng numpy array (BGR)
@@ -60,8 +149,15 @@ def load_image_bgr_from_bytes(file_bytes: bytes) -> np.ndarray:
         # Chuyển bytes thành numpy array
         nparr = np.frombuffer(file_bytes, np.uint8)
         
+        # Chọn mức decode thu nhỏ dựa trên kích thước trong header (chỉ JPEG hỗ trợ giảm trong miền DCT)
+        flag = cv2.IMREAD_COLOR
+        if max_dimension > 0 and file_bytes[:2] == b'\xFF\xD8':
+            dimensions = read_image_dimensions(file_bytes)
+            if dimensions is not None:
+                flag, _ = reduced_decode_flag(dimensions[0], dimensions[1], max_dimension)
+        
         # Decode thành ảnh BGR
-        image_bgr = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        image_bgr = cv2.imdecode(nparr, flag)
         
         if image_bgr is None:
             raise ValueError("Không đọc được ảnh từ dữ liệu upload. Đảm bảo file là ảnh hợp lệ.")
@@ -72,13 +168,14 @@ def load_image_bgr_from_bytes(file_bytes: bytes) -> np.ndarray:
         raise ValueError(f"Không đọc được ảnh từ dữ liệu upload: {str(e)}")
 
 
-def read_image_from_upload(file_bytes: bytes) -> np.ndarray:
+def read_image_from_upload(file_bytes: bytes, max_dimension: int = 0) -> np.ndarray:
     """
     Chuyển đổi bytes từ upload thành numpy array (BGR format).
     Alias for load_image_bgr_from_bytes for backward compatibility.
     
     Args:
         file_bytes: Dữ liệu ảnh dạng bytes
+        max_dimension: Cạnh dài mong muốn tối thiểu khi decode thu nhỏ (0 = đủ kích thước)
         
     Returns:
         image_bgr: Ảnh dạng numpy array (BGR)
@@ -86,29 +183,131 @@ def read_image_from_upload(file_bytes: bytes) -> np.ndarray:
     Raises:
         ValueError: Nếu không đọc được ảnh
     """
-    return load_image_bgr_from_bytes(file_bytes)
+    return load_image_bgr_from_bytes(file_bytes, max_dimension)
 
 
-def extract_single_face_embedding(
-    image_rgb: np.ndarray
-) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
+def downscaled_gray(
+    image: np.ndarray,
+    max_dimension: int = 0,
+    color_code: int = cv2.COLOR_BGR2GRAY
+) -> np.ndarray:
     """
-    Detect face và extract embedding từ ảnh chứa đúng 1 khuôn mặt.
+    Ảnh xám uint8 có cạnh dài không vượt quá max_dimension.
+    
+    Thu nhỏ (INTER_AREA) trước rồi mới chuyển sang xám, nên không tạo bản sao đủ độ phân giải.
+    
+    Args:
+        image: Ảnh màu (BGR hoặc RGB theo color_code) hoặc ảnh xám
+        max_dimension: Cạnh dài tối đa (0 = giữ nguyên kích thước)
+        color_code: Mã chuyển màu của OpenCV sang ảnh xám
+        
+    Returns:
+        Ảnh xám 2 chiều
+    """
+    height, width = image.shape[:2]
+    if max_dimension > 0 and max(height, width) > max_dimension:
+        scale = max_dimension / max(height, width)
+        small_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        image = cv2.resize(image, small_size, interpolation=cv2.INTER_AREA)
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, color_code)
+    return image
+
+
+def detect_face_locations(
+    image_rgb: np.ndarray,
+    max_dimension: int = 0,
+    grayscale: bool = False,
+    upsample: int = 1,
+    gray: Optional[np.ndarray] = None,
+    detector: str = DEFAULT_DETECTOR
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Phát hiện vị trí khuôn mặt, có thể trên bản thu nhỏ của ảnh.
+    
+    Chi phí HOG tỉ lệ với số pixel: ảnh 12MP thu về cạnh dài 1024 nhanh hơn hàng chục lần.
+    Tọa độ được quy đổi lại theo ảnh gốc để tính embedding trên ảnh độ phân giải đầy đủ.
     
     Args:
         image_rgb: Ảnh dạng RGB numpy array
+        max_dimension: Cạnh dài tối đa của ảnh dùng để detect (0 = không thu nhỏ)
+        grayscale: Detect trên ảnh grayscale
+        upsample: Số lần upsample khi detect trên ảnh đã xử lý
+        gray: Ảnh xám đã thu nhỏ theo max_dimension (downscaled_gray) để dùng lại khi grayscale=True
+        detector: Chuỗi detector (xem backend/detectors.py), mặc định dlib HOG
         
     Returns:
-        - embedding: Face embedding (128-d vector)
-        - location: Tọa độ khuôn mặt (top, right, bottom, left)
+        Danh sách tọa độ (top, right, bottom, left) theo ảnh gốc
         
     Raises:
-        ValueError: Nếu không có hoặc có nhiều hơn 1 khuôn mặt
+        ValueError: Nếu chuỗi detector không hợp lệ
+    """
+    height, width = image_rgb.shape[:2]
+    scale = max_dimension / max(height, width) if max_dimension > 0 else 1.0
+    default_detector = is_default_detector(detector)
+    
+    # Đường mặc định: detect trực tiếp trên ảnh gốc
+    if scale >= 1.0 and not grayscale:
+        if default_detector:
+            return face_recognition.face_locations(image_rgb)
+        return get_detector(detector).detect(image_rgb)
+    
+    if grayscale and gray is not None:
+        detect_image = gray
+    elif grayscale:
+        detect_image = downscaled_gray(image_rgb, max_dimension, cv2.COLOR_RGB2GRAY)
+    else:
+        small_size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        detect_image = cv2.resize(image_rgb, small_size, interpolation=cv2.INTER_AREA)
+    
+    if default_detector:
+        locations = face_recognition.face_locations(detect_image, number_of_times_to_upsample=upsample)
+    else:
+        locations = get_detector(detector, upsample).detect(detect_image)
+    
+    # Quy đổi tọa độ về ảnh gốc (tỉ lệ riêng từng trục do làm tròn kích thước)
+    scale_y = height / detect_image.shape[0]
+    scale_x = width / detect_image.shape[1]
+    return [
+        (
+            max(0, int(round(top * scale_y))),
+            min(width, int(round(right * scale_x))),
+            min(height, int(round(bottom * scale_y))),
+            max(0, int(round(left * scale_x)))
+        )
+        for top, right, bottom, left in locations
+    ]
+
+
+def detect_single_face(
+    image_rgb: np.ndarray,
+    gray: Optional[np.ndarray] = None,
+    detector: Optional[str] = None
+) -> Tuple[int, int, int, int]:
+    """
+    Detect vị trí khuôn mặt duy nhất trong ảnh theo cấu hình FACE_DETECTION_*.
+    
+    Args:
+        image_rgb: Ảnh dạng RGB numpy array
+        gray: Ảnh xám đã thu nhỏ theo FACE_DETECTION_MAX_DIM (dùng lại khi detect grayscale)
+        detector: Chuỗi detector (mặc định FACE_DETECTOR)
         
-    Validates: Requirements 1.1, 1.2, 1.3, 2.3, 3.3
+    Returns:
+        Tọa độ khuôn mặt (top, right, bottom, left)
+        
+    Raises:
+        ValueError: Nếu không có hoặc có nhiều hơn 1 khuôn mặt, hoặc detector không hợp lệ
     """
     # Tìm vị trí khuôn mặt
-    face_locations = face_recognition.face_locations(image_rgb)
+    with metrics.stage("detect"):
+        face_locations = detect_face_locations(
+            image_rgb,
+            max_dimension=config.DETECTION_MAX_DIMENSION,
+            grayscale=config.DETECTION_GRAYSCALE,
+            upsample=config.DETECTION_UPSAMPLE,
+            gray=gray,
+            detector=detector or config.DETECTOR
+        )
     
     # Validate số lượng khuôn mặt - đúng 1 khuôn mặt
     if len(face_locations) == 0:
@@ -123,8 +322,28 @@ def extract_single_face_embedding(
             f"Vui lòng để CHỈ MỘT người trong ảnh để xác thực chính xác."
         )
     
-    # Trích xuất face embedding
-    face_encodings = face_recognition.face_encodings(image_rgb, face_locations)
+    return face_locations[0]
+
+
+def encode_face(
+    image_rgb: np.ndarray,
+    face_location: Tuple[int, int, int, int]
+) -> np.ndarray:
+    """
+    Tính face embedding tại vị trí khuôn mặt đã biết (không chạy detector).
+    
+    Args:
+        image_rgb: Ảnh dạng RGB numpy array
+        face_location: Tọa độ khuôn mặt (top, right, bottom, left)
+        
+    Returns:
+        Face embedding (128-d vector)
+        
+    Raises:
+        ValueError: Nếu không trích xuất được embedding
+    """
+    with metrics.stage("encode"):
+        face_encodings = face_recognition.face_encodings(image_rgb, [face_location])
     
     if len(face_encodings) == 0:
         raise ValueError(
@@ -132,11 +351,42 @@ def extract_single_face_embedding(
             "Hãy thử với ảnh rõ nét hơn."
         )
     
-    return face_encodings[0], face_locations[0]
+    return face_encodings[0]
+
+
+def extract_single_face_embedding(
+    image_rgb: np.ndarray,
+    gray: Optional[np.ndarray] = None,
+    detector: Optional[str] = None
+) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
+    """
+    Detect face và extract embedding từ ảnh chứa đúng 1 khuôn mặt.
+    
+    Nếu cấu hình FACE_DETECTION_MAX_DIM > 0, detect trên ảnh thu nhỏ rồi tính embedding
+    trên ảnh gốc với vị trí đã quy đổi (known_face_locations).
+    
+    Args:
+        image_rgb: Ảnh dạng RGB numpy array
+        gray: Ảnh xám đã thu nhỏ theo FACE_DETECTION_MAX_DIM (dùng lại khi detect grayscale)
+        detector: Chuỗi detector (mặc định FACE_DETECTOR)
+        
+    Returns:
+        - embedding: Face embedding (128-d vector)
+        - location: Tọa độ khuôn mặt (top, right, bottom, left)
+        
+    Raises:
+        ValueError: Nếu không có hoặc có nhiều hơn 1 khuôn mặt
+        
+    Validates: Requirements 1.1, 1.2, 1.3, 2.3, 3.3
+    """
+    face_location = detect_single_face(image_rgb, gray, detector)
+    return encode_face(image_rgb, face_location), face_location
 
 
 def extract_single_face_encoding(
-    image_rgb: np.ndarray
+    image_rgb: np.ndarray,
+    gray: Optional[np.ndarray] = None,
+    detector: Optional[str] = None
 ) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
     """
     Trích xuất face embedding từ ảnh chứa đúng 1 khuôn mặt.
@@ -144,6 +394,8 @@ def extract_single_face_encoding(
     
     Args:
         image_rgb: Ảnh dạng RGB numpy array
+        gray: Ảnh xám đã thu nhỏ dùng lại khi detect grayscale (xem extract_single_face_embedding)
+        detector: Chuỗi detector (mặc định FACE_DETECTOR)
         
     Returns:
         - encoding: Face embedding (128-d vector)
@@ -152,12 +404,12 @@ def extract_single_face_encoding(
     Raises:
         ValueError: Nếu không có hoặc có nhiều hơn 1 khuôn mặt
     """
-    return extract_single_face_embedding(image_rgb)
+    return extract_single_face_embedding(image_rgb, gray, detector)
 
 
 def compare_with_known_faces(
     unknown_encoding: np.ndarray,
-    known_encodings: List[np.ndarray],
+    known_encodings: Union[List[np.ndarray], FaceGallery],
     threshold: float
 ) -> Tuple[bool, float]:
     """
@@ -165,13 +417,19 @@ def compare_with_known_faces(
     
     Args:
         unknown_encoding: Face embedding của ảnh cần xác thực
-        known_encodings: Danh sách face embeddings từ training data
+        known_encodings: Danh sách face embeddings từ training data, hoặc FaceGallery
+            (ma trận float32 liên tục, khoảng cách tính bằng một phép nhân ma trận)
         threshold: Ngưỡng để xác định khớp
         
     Returns:
         - is_match: True nếu khớp, False nếu không
         - best_distance: Khoảng cách nhỏ nhất tìm được
     """
+    if isinstance(known_encodings, FaceGallery):
+        _, best = known_encodings.nearest(unknown_encoding)
+        best_distance = float(best[0])
+        return best_distance <= threshold, best_distance
+    
     # Tính khoảng cách Euclidean với tất cả face embeddings
     distances = face_recognition.face_distance(known_encodings, unknown_encoding)
     
@@ -184,16 +442,103 @@ def compare_with_known_faces(
     return is_match, best_distance
 
 
+def find_top_k_matches(
+    unknown_encoding: np.ndarray,
+    known_encodings: Union[List[np.ndarray], FaceGallery],
+    k: int
+) -> List[Tuple[int, float]]:
+    """
+    Tìm k embedding gần nhất trong dữ liệu đã học.
+    
+    Args:
+        unknown_encoding: Face embedding của ảnh cần xác thực
+        known_encodings: Danh sách face embeddings hoặc FaceGallery
+        k: Số kết quả cần lấy
+        
+    Returns:
+        Danh sách (index, distance) sắp xếp theo khoảng cách tăng dần
+    """
+    gallery = gallery_from_encodings(known_encodings)
+    indices, distances = gallery.search(unknown_encoding, k)
+    return [(int(i), float(d)) for i, d in zip(indices[0], distances[0])]
+
+
+def compare_batch_with_known_faces(
+    unknown_encodings: np.ndarray,
+    known_encodings: Union[List[np.ndarray], FaceGallery],
+    threshold: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    So sánh nhiều khuôn mặt cùng lúc với dữ liệu đã học bằng một phép tính ma trận.
+    
+    Khoảng cách Euclidean được tính theo công thức
+    ||u - k||^2 = ||u||^2 + ||k||^2 - 2 * u.k cho toàn bộ cặp (M x N) trong một lần.
+    
+    Args:
+        unknown_encodings: Ma trận (M, 128) các face embedding cần xác thực
+        known_encodings: Danh sách N face embeddings từ training data, hoặc FaceGallery
+        threshold: Ngưỡng để xác định khớp
+        
+    Returns:
+        - is_match: Mảng bool (M,), True nếu khoảng cách nhỏ nhất <= threshold
+        - best_distances: Mảng (M,) khoảng cách nhỏ nhất của từng khuôn mặt
+    """
+    unknown = np.atleast_2d(np.asarray(unknown_encodings))
+    
+    if unknown.shape[0] == 0:
+        return np.zeros(0, dtype=bool), np.zeros(0, dtype=np.float64)
+    
+    gallery = gallery_from_encodings(known_encodings)
+    if len(gallery) == 0:
+        raise ValueError("Không có dữ liệu huấn luyện để so sánh.")
+    
+    _, best_distances = gallery.nearest(unknown)
+    is_match = best_distances <= threshold
+    
+    return is_match, best_distances
+
+
+# Lề thêm quanh khuôn mặt khi phân tích môi trường theo ROI (tỉ lệ kích thước face box)
+ENV_ROI_MARGIN = 0.25
+
+
+def gray_statistics(gray: np.ndarray) -> Tuple[float, float]:
+    """
+    Độ sáng trung bình và phương sai Laplacian của ảnh xám uint8.
+    
+    Laplacian 3x3 của ảnh uint8 nằm trong [-1020, 1020] nên được tính ở CV_16S (2 byte/pixel
+    thay vì 8 byte của CV_64F); cv2.meanStdDev tích luỹ bằng double nên kết quả bằng
+    np.var(cv2.Laplacian(gray, cv2.CV_64F)).
+    
+    Returns:
+        (brightness, blur_score)
+    """
+    brightness = float(cv2.mean(gray)[0])
+    _, stddev = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    return brightness, float(stddev[0, 0]) ** 2
+
+
 def analyze_environment(
     image_bgr: np.ndarray,
-    face_box: Tuple[int, int, int, int]
+    face_box: Tuple[int, int, int, int],
+    max_dimension: Optional[int] = None,
+    face_roi: Optional[bool] = None,
+    gray: Optional[np.ndarray] = None
 ) -> Dict:
     """
     Phân tích môi trường xung quanh để đánh giá chất lượng ảnh.
     
+    Mặc định tính trên toàn bộ ảnh gốc. Với max_dimension > 0 và/hoặc face_roi, brightness và
+    blur_score được tính trên ảnh xám có kích thước bị chặn (vùng khuôn mặt cộng lề, thu nhỏ
+    về cạnh dài max_dimension) nên thời gian và bộ nhớ không tăng theo kích thước upload.
+    
     Args:
         image_bgr: Ảnh dạng BGR numpy array
-        face_box: Tọa độ khuôn mặt (top, right, bottom, left)
+        face_box: Tọa độ khuôn mặt (top, right, bottom, left) theo image_bgr
+        max_dimension: Cạnh dài tối đa của ảnh xám dùng để phân tích
+            (None = config.ENV_MAX_DIMENSION, 0 = không thu nhỏ)
+        face_roi: Chỉ phân tích vùng khuôn mặt cộng lề ENV_ROI_MARGIN (None = config.ENV_FACE_ROI)
+        gray: Ảnh xám (toàn khung hình, có thể đã thu nhỏ) đã có sẵn, ví dụ từ bước detect
         
     Returns:
         Dictionary chứa:
@@ -208,18 +553,37 @@ def analyze_environment(
         
     Validates: Requirements 1.4, 1.5, 1.6, 1.7, 1.8, 3.4
     """
-    # Tính brightness (độ sáng trung bình)
-    gray = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2GRAY)
-    brightness = float(np.mean(gray))
+    if max_dimension is None:
+        max_dimension = config.ENV_MAX_DIMENSION
+    if face_roi is None:
+        face_roi = config.ENV_FACE_ROI
+    
+    top, right, bottom, left = face_box
+    image_height, image_width = image_bgr.shape[:2]
     
-    # Tính blur score (phương sai Laplacian)
-    laplacian = cv2.Laplacian(gray, cv2.CV_64F)
-    blur_score = float(np.var(laplacian))
+    # Ảnh nguồn để phân tích: ảnh xám có sẵn hoặc ảnh BGR gốc (tọa độ quy đổi theo tỉ lệ)
+    source = gray if gray is not None else image_bgr
+    source_height, source_width = source.shape[:2]
+    
+    if face_roi:
+        margin_y = int((bottom - top) * ENV_ROI_MARGIN)
+        margin_x = int((right - left) * ENV_ROI_MARGIN)
+        scale_y = source_height / image_height
+        scale_x = source_width / image_width
+        roi_top = max(0, int((top - margin_y) * scale_y))
+        roi_bottom = min(source_height, int(np.ceil((bottom + margin_y) * scale_y)))
+        roi_left = max(0, int((left - margin_x) * scale_x))
+        roi_right = min(source_width, int(np.ceil((right + margin_x) * scale_x)))
+        if roi_bottom > roi_top and roi_right > roi_left:
+            # Cắt theo view, không sao chép
+            source = source[roi_top:roi_bottom, roi_left:roi_right]
+    
+    # Tính brightness (độ sáng trung bình) và blur score (phương sai Laplacian)
+    analysis_gray = downscaled_gray(source, max_dimension)
+    brightness, blur_score = gray_statistics(analysis_gray)
     
     # Tính face size ratio
-    top, right, bottom, left = face_box
     face_area = (bottom - top) * (right - left)
-    image_height, image_width = image_bgr.shape[:2]
     image_area = image_height * image_width
     face_size_ratio = float(face_area / image_area)
     
@@ -0,0 +1,234 @@
+"""
+Face tracking module.
+Bám theo khuôn mặt giữa các frame của một luồng video (WebSocket /api/v1/face/verify/stream)
+để chỉ chạy detector đầy đủ mỗi N frame hoặc khi mất dấu, và dùng lại embedding khi vùng
+mặt gần như không đổi.
+"""
+
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend import config
+from backend import metrics
+from backend.face_processor import detect_single_face, downscaled_gray, encode_face
+
+# Điểm khớp tối thiểu (TM_CCOEFF_NORMED) để coi là còn bám được khuôn mặt
+TRACK_MIN_SCORE = 0.6
+
+# Vùng tìm kiếm quanh vị trí cũ, theo tỉ lệ kích thước khuôn mặt
+TRACK_SEARCH_MARGIN = 0.5
+
+# Kích thước cạnh (pixel) tối thiểu của khuôn mặt trên ảnh bám để dùng template matching
+TRACK_MIN_FACE_SIZE = 8
+
+# Kích thước ảnh thu nhỏ của vùng mặt dùng để so sánh với lần tính embedding trước
+SIGNATURE_SIZE = 32
+
+
+class FaceTracker:
+    """
+    Trạng thái bám khuôn mặt của một luồng frame.
+
+    Mỗi frame: detect đầy đủ (detect_single_face với `detector`, mặc định FACE_DETECTOR) nếu chưa
+    có khuôn mặt, đã đủ detect_every frame kể từ lần detect trước, hoặc template matching trên ảnh
+    xám thu nhỏ bị mất dấu.
+    Embedding chỉ được tính lại khi vùng mặt (thu về SIGNATURE_SIZE) thay đổi quá reencode_diff.
+
+    Đối tượng pickle được (chỉ chứa numpy array nhỏ) để chạy được trong process executor.
+    """
+
+    def __init__(
+        self,
+        detect_every: Optional[int] = None,
+        track_max_dimension: Optional[int] = None,
+        reencode_diff: Optional[int] = None,
+        detector: Optional[str] = None
+    ):
+        self.detector = detector
+        self.detect_every = detect_every or config.STREAM_DETECT_EVERY
+        self.track_max_dimension = track_max_dimension or config.STREAM_TRACK_MAX_DIMENSION
+        self.reencode_diff = config.STREAM_REENCODE_DIFF if reencode_diff is None else reencode_diff
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Quên khuôn mặt đang bám (frame tiếp theo sẽ detect đầy đủ).
+        """
+        self.box: Optional[Tuple[int, int, int, int]] = None
+        self.template: Optional[np.ndarray] = None
+        self.track_size: Optional[Tuple[int, int]] = None
+        self.frames_since_detect = 0
+        self.signature: Optional[np.ndarray] = None
+        self.encoding: Optional[np.ndarray] = None
+
+    def _track(self, gray: np.ndarray) -> Tuple[Optional[Tuple[int, int, int, int]], Optional[float]]:
+        """
+        Tìm template khuôn mặt cũ trong vùng lân cận trên ảnh xám thu nhỏ.
+
+        Returns:
+            (box mới theo ảnh xám hoặc None nếu mất dấu, điểm khớp)
+        """
+        top, right, bottom, left = self.box
+        face_height, face_width = self.template.shape[:2]
+        margin_y = int(face_height * TRACK_SEARCH_MARGIN)
+        margin_x = int(face_width * TRACK_SEARCH_MARGIN)
+        search_top = max(0, top - margin_y)
+        search_left = max(0, left - margin_x)
+        window = gray[search_top:min(gray.shape[0], bottom + margin_y), search_left:min(gray.shape[1], right + margin_x)]
+        if window.shape[0] < face_height or window.shape[1] < face_width:
+            return None, None
+
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(scores)
+        if not np.isfinite(score) or score < TRACK_MIN_SCORE:
+            return None, float(score) if np.isfinite(score) else None
+
+        new_top, new_left = search_top + y, search_left + x
+        return (new_top, new_left + face_width, new_top + face_height, new_left), float(score)
+
+    def update(self, image_bgr: np.ndarray) -> Dict[str, Any]:
+        """
+        Xử lý một frame.
+
+        Args:
+            image_bgr: Frame dạng BGR numpy array
+
+        Returns:
+            Dictionary chứa encoding, face_location (top, right, bottom, left theo image_bgr),
+            detected (đã chạy detector), tracked (vị trí lấy từ tracking), track_score,
+            reencoded (đã tính embedding mới)
+
+        Raises:
+            ValueError: Nếu detect không tìm thấy đúng 1 khuôn mặt (trạng thái bám bị xoá)
+        """
+        height, width = image_bgr.shape[:2]
+        with metrics.stage("track"):
+            gray = downscaled_gray(image_bgr, self.track_max_dimension)
+        scale_y = height / gray.shape[0]
+        scale_x = width / gray.shape[1]
+
+        # Độ phân giải luồng thay đổi: bắt đầu lại
+        if self.track_size != gray.shape[:2]:
+            self.reset()
+            self.track_size = gray.shape[:2]
+
+        box, track_score = None, None
+        if self.box is not None and self.frames_since_detect < self.detect_every - 1:
+            with metrics.stage("track"):
+                box, track_score = self._track(gray)
+
+        image_rgb = None
+        detected = box is None
+        if detected:
+            image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+            try:
+                top, right, bottom, left = detect_single_face(image_rgb, detector=self.detector)
+            except ValueError:
+                self.reset()
+                self.track_size = gray.shape[:2]
+                raise
+            face_location = (top, right, bottom, left)
+            box = (
+                int(top / scale_y),
+                int(np.ceil(right / scale_x)),
+                int(np.ceil(bottom / scale_y)),
+                int(left / scale_x)
+            )
+            self.frames_since_detect = 0
+        else:
+            top, right, bottom, left = box
+            face_location = (
+                max(0, int(round(top * scale_y))),
+                min(width, int(round(right * scale_x))),
+                min(height, int(round(bottom * scale_y))),
+                max(0, int(round(left * scale_x)))
+            )
+            self.frames_since_detect += 1
+
+        top, right, bottom, left = box
+        top, left = max(0, top), max(0, left)
+        crop = gray[top:bottom, left:right]
+        box = (top, left + crop.shape[1], top + crop.shape[0], left)
+        if min(crop.shape[:2]) < TRACK_MIN_FACE_SIZE:
+            # Khuôn mặt quá nhỏ trên ảnh bám: không tracking, detect lại ở frame sau
+            self.box, self.template = None, None
+        else:
+            self.box, self.template = box, crop.copy()
+
+        # Dùng lại embedding nếu vùng mặt gần như không đổi so với lần tính trước
+        signature = None
+        if crop.size > 0:
+            signature = cv2.resize(crop, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+        reencoded = True
+        if (
+            self.reencode_diff > 0
+            and self.encoding is not None
+            and self.signature is not None
+            and signature is not None
+            and cv2.mean(cv2.absdiff(signature, self.signature))[0] <= self.reencode_diff
+        ):
+            reencoded = False
+        else:
+            if image_rgb is None:
+                image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+            try:
+                self.encoding = encode_face(image_rgb, face_location)
+            except ValueError:
+                self.reset()
+                self.track_size = gray.shape[:2]
+                raise
+            self.signature = signature
+
+        return {
+            "encoding": self.encoding,
+            "face_location": face_location,
+            "detected": detected,
+            "tracked": not detected,
+            "track_score": track_score,
+            "reencoded": reencoded,
+        }
+
+
+class LatestFrameSlot:
+    """
+    Giữ frame mới nhất chưa được xử lý của một luồng WebSocket.
+
+    Khi client gửi nhanh hơn tốc độ xử lý, frame cũ chưa xử lý bị thay bằng frame mới (đếm
+    vào dropped) thay vì xếp hàng và làm độ trễ tăng dần.
+    """
+
+    def __init__(self):
+        self._item: Any = None
+        self._has_item = False
+        self._closed = False
+        self._event = asyncio.Event()
+        self.dropped = 0
+
+    def put(self, item: Any) -> None:
+        if self._has_item:
+            self.dropped += 1
+        self._item = item
+        self._has_item = True
+        self._event.set()
+
+    def close(self) -> None:
+        """
+        Đóng slot khi client ngắt kết nối: frame chưa xử lý bị bỏ, get() trả về None.
+        """
+        self._closed = True
+        self._event.set()
+
+    async def get(self) -> Any:
+        """
+        Chờ và lấy frame mới nhất; None nếu slot đã đóng.
+        """
+        while not self._has_item or self._closed:
+            if self._closed:
+                return None
+            self._event.clear()
+            await self._event.wait()
+        item, self._item, self._has_item = self._item, None, False
+        return item
@@ -0,0 +1,197 @@
+"""
+Face gallery module.
+Lưu toàn bộ face embeddings dưới dạng một ma trận float32 liên tục (contiguous) kèm
+bình phương chuẩn đã tính sẵn, để tìm khuôn mặt gần nhất bằng một phép nhân ma trận (BLAS).
+"""
+
+import threading
+from typing import List, Optional, Sequence, Tuple, Union
+import numpy as np
+
+from backend import metrics
+
+# Số chiều của face embedding (dlib)
+EMBEDDING_DIM = 128
+
+
+class FaceGallery:
+    """
+    Ma trận embedding (N, 128) float32 + bình phương chuẩn (N,).
+
+    Khoảng cách Euclidean được tính theo ||q - g||^2 = ||q||^2 + ||g||^2 - 2 * q.g,
+    trong đó q.g cho cả gallery là một phép nhân ma trận-vector (sgemv/sgemm).
+    Chi phí mỗi lần so sánh chỉ là một lần đọc tuần tự ma trận, không cấp phát lại gallery.
+    """
+
+    def __init__(self, embeddings: Union[np.ndarray, Sequence[np.ndarray]], labels: Optional[List[str]] = None):
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim == 1 and matrix.size == 0:
+            matrix = matrix.reshape(0, EMBEDDING_DIM)
+        if matrix.ndim != 2:
+            raise ValueError(f"Gallery phải là ma trận 2 chiều (N, D), nhận được shape {matrix.shape}")
+
+        if labels is not None and len(labels) != matrix.shape[0]:
+            raise ValueError(
+                f"Số nhãn ({len(labels)}) không khớp số embedding ({matrix.shape[0]})"
+            )
+
+        self.matrix = np.ascontiguousarray(matrix)
+        self.squared_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+        self.labels = list(labels) if labels is not None else None
+
+    @classmethod
+    def from_arrays(
+        cls,
+        matrix: np.ndarray,
+        squared_norms: np.ndarray,
+        labels: Optional[List[str]] = None
+    ) -> "FaceGallery":
+        """
+        Tạo gallery từ ma trận và bình phương chuẩn đã tính sẵn (ví dụ từ model artifact).
+        Ma trận float32 liên tục (kể cả memmap) được dùng trực tiếp, không copy.
+        """
+        gallery = cls.__new__(cls)
+        gallery.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        gallery.squared_norms = np.asarray(squared_norms, dtype=np.float32)
+        if gallery.matrix.ndim != 2 or gallery.squared_norms.shape != (gallery.matrix.shape[0],):
+            raise ValueError(
+                f"Shape không hợp lệ: ma trận {gallery.matrix.shape}, chuẩn {gallery.squared_norms.shape}"
+            )
+        if labels is not None and len(labels) != gallery.matrix.shape[0]:
+            raise ValueError(
+                f"Số nhãn ({len(labels)}) không khớp số embedding ({gallery.matrix.shape[0]})"
+            )
+        gallery.labels = list(labels) if labels is not None else None
+        return gallery
+
+    def __len__(self) -> int:
+        return self.matrix.shape[0]
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1]
+
+    def squared_distances(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Bình phương khoảng cách từ mỗi query tới toàn bộ gallery.
+
+        Args:
+            queries: Ma trận (M, D) hoặc vector (D,)
+
+        Returns:
+            Ma trận (M, N) float32 (hoặc (N,) nếu queries là vector)
+        """
+        queries_arr = np.asarray(queries, dtype=np.float32)
+        single = queries_arr.ndim == 1
+        queries_2d = np.atleast_2d(queries_arr)
+
+        if queries_2d.shape[1] != self.dim:
+            raise ValueError(
+                f"Số chiều query ({queries_2d.shape[1]}) khác số chiều gallery ({self.dim})"
+            )
+
+        query_norms = np.einsum("ij,ij->i", queries_2d, queries_2d)
+        squared = queries_2d @ self.matrix.T
+        squared *= -2.0
+        squared += query_norms[:, None]
+        squared += self.squared_norms[None, :]
+        # Sai số làm tròn có thể tạo giá trị âm rất nhỏ
+        np.maximum(squared, 0.0, out=squared)
+
+        return squared[0] if single else squared
+
+    def distances(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Khoảng cách Euclidean từ mỗi query tới toàn bộ gallery.
+        """
+        return np.sqrt(self.squared_distances(queries))
+
+    def nearest(self, queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Embedding gần nhất cho mỗi query.
+
+        Returns:
+            - indices: Chỉ số embedding gần nhất (M,)
+            - distances: Khoảng cách tương ứng (M,)
+        """
+        if len(self) == 0:
+            raise ValueError("Gallery rỗng, không có dữ liệu để so sánh.")
+
+        squared = np.atleast_2d(self.squared_distances(queries))
+        indices = np.argmin(squared, axis=1)
+        best = np.sqrt(squared[np.arange(squared.shape[0]), indices])
+        return indices, best.astype(np.float64)
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k embedding gần nhất cho mỗi query, sắp xếp theo khoảng cách tăng dần.
+
+        Args:
+            queries: Ma trận (M, D) hoặc vector (D,)
+            k: Số kết quả cho mỗi query (bị cắt về len(gallery) nếu lớn hơn)
+
+        Returns:
+            - indices: Ma trận (M, k) chỉ số trong gallery
+            - distances: Ma trận (M, k) khoảng cách tương ứng
+        """
+        if len(self) == 0:
+            raise ValueError("Gallery rỗng, không có dữ liệu để so sánh.")
+        if k < 1:
+            raise ValueError(f"k phải >= 1, nhận được: {k}")
+
+        squared = np.atleast_2d(self.squared_distances(queries))
+        k = min(k, len(self))
+
+        if k < len(self):
+            # argpartition O(N) rồi chỉ sort k phần tử đầu
+            candidates = np.argpartition(squared, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.broadcast_to(np.arange(len(self)), squared.shape)
+
+        candidate_sq = np.take_along_axis(squared, candidates, axis=1)
+        order = np.argsort(candidate_sq, axis=1, kind="stable")
+        indices = np.take_along_axis(candidates, order, axis=1)
+        distances = np.sqrt(np.take_along_axis(candidate_sq, order, axis=1)).astype(np.float64)
+
+        return indices, distances
+
+
+# Cache một slot: gallery được build lại chỉ khi danh sách encodings (object) thay đổi
+_gallery_cache: Tuple[Optional[object], Optional[FaceGallery]] = (None, None)
+_gallery_cache_lock = threading.Lock()
+
+
+def gallery_from_encodings(known_encodings: Sequence[np.ndarray], labels: Optional[List[str]] = None) -> FaceGallery:
+    """
+    Lấy FaceGallery cho danh sách encodings từ cache dữ liệu huấn luyện.
+
+    Gallery được build một lần cho mỗi object danh sách encodings (so sánh identity),
+    nên các request liên tiếp trên cùng dữ liệu huấn luyện không tạo lại ma trận.
+
+    Args:
+        known_encodings: Danh sách face embeddings (thường từ get_known_faces_cache)
+        labels: Nhãn (tên file) tương ứng từng embedding
+
+    Returns:
+        FaceGallery
+    """
+    global _gallery_cache
+
+    if isinstance(known_encodings, FaceGallery):
+        return known_encodings
+
+    source, gallery = _gallery_cache
+    if source is known_encodings and gallery is not None:
+        metrics.GALLERY_CACHE_LOOKUPS.inc(result="hit")
+        return gallery
+
+    with _gallery_cache_lock:
+        source, gallery = _gallery_cache
+        if source is known_encodings and gallery is not None:
+            metrics.GALLERY_CACHE_LOOKUPS.inc(result="hit")
+            return gallery
+        gallery = FaceGallery(list(known_encodings), labels)
+        _gallery_cache = (known_encodings, gallery)
+
+    metrics.GALLERY_CACHE_LOOKUPS.inc(result="miss")
+    return gallery
@@ -0,0 +1,242 @@
+"""
+Gallery store module.
+Giữ một snapshot dữ liệu (ví dụ face embeddings đã tải) và cho phép tải lại ở background:
+snapshot mới chỉ được gán khi đã build xong (một phép gán tham chiếu - nguyên tử),
+nên request đang chạy không bị chặn và không bao giờ thấy gallery build dở.
+"""
+
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from backend.image_store import iter_image_files
+
+logger = logging.getLogger(__name__)
+
+
+def directory_manifest(directory: str, extensions: Optional[set] = None) -> Tuple:
+    """
+    Dấu vân tay rẻ của một thư mục (kể cả thư mục con): (đường dẫn tương đối, kích thước, mtime_ns)
+    của các file, đã sắp xếp.
+    Thêm/xoá/ghi đè ảnh đều làm manifest thay đổi mà không cần đọc nội dung file.
+
+    Args:
+        directory: Thư mục cần theo dõi
+        extensions: Chỉ tính các file có extension (chữ thường) trong tập này
+
+    Returns:
+        Tuple có thể so sánh; tuple rỗng nếu thư mục không tồn tại
+    """
+    manifest = [
+        (path, stat.st_size, stat.st_mtime_ns)
+        for path, stat in iter_image_files(directory, extensions)
+    ]
+    return tuple(sorted(manifest))
+
+
+class GalleryStore:
+    """
+    Snapshot + tải lại ở background.
+
+    - get(): trả về snapshot hiện tại (lần đầu tải đồng bộ). Không khoá khi đã có snapshot.
+    - reload(): build snapshot mới trong thread nền, swap khi xong. Lỗi khi build giữ nguyên
+      snapshot cũ. Các yêu cầu reload trong lúc đang build được gộp thành một lần build tiếp theo.
+    - check_for_changes(): so sánh fingerprint hiện tại với fingerprint của snapshot, reload nếu khác.
+    - start_watcher(): thread nền gọi check_for_changes() định kỳ.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], Any],
+        fingerprint: Optional[Callable[[], Hashable]] = None,
+        name: str = "gallery"
+    ):
+        """
+        Args:
+            loader: Hàm build snapshot (chạy ngoài event loop, có thể chậm)
+            fingerprint: Hàm trả về dấu vân tay của dữ liệu nguồn (None = chỉ reload thủ công)
+            name: Tên dùng trong log
+        """
+        self._loader = loader
+        self._fingerprint = fingerprint
+        self.name = name
+
+        self._snapshot: Optional[Tuple[Any, Hashable]] = None
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+
+        self.version = 0
+        self.loaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._reload_thread: Optional[threading.Thread] = None
+        self._reload_pending = False
+
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Đọc / build snapshot
+    # ------------------------------------------------------------------
+
+    def _current_fingerprint(self) -> Hashable:
+        return self._fingerprint() if self._fingerprint is not None else None
+
+    def _build_and_swap(self) -> Any:
+        """
+        Build snapshot mới rồi swap. Gọi khi đang giữ _load_lock.
+        """
+        # Lấy fingerprint trước khi tải: nếu dữ liệu đổi trong lúc tải, lần kiểm tra sau sẽ phát hiện
+        fingerprint = self._current_fingerprint()
+        start = time.perf_counter()
+        value = self._loader()
+
+        self._snapshot = (value, fingerprint)
+        self.version += 1
+        self.loaded_at = time.time()
+        self.last_error = None
+        logger.info(
+            f"Đã tải {self.name} (phiên bản {self.version}) trong {time.perf_counter() - start:.2f}s"
+        )
+        return value
+
+    def get(self) -> Any:
+        """
+        Snapshot hiện tại. Lần gọi đầu (hoặc sau clear()) tải đồng bộ; lỗi khi tải được ném ra
+        và không được cache, lần gọi sau sẽ thử lại.
+        """
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot[0]
+
+        with self._load_lock:
+            snapshot = self._snapshot
+            if snapshot is not None:
+                return snapshot[0]
+            return self._build_and_swap()
+
+    def clear(self) -> None:
+        """
+        Bỏ snapshot hiện tại; lần get() tiếp theo sẽ tải lại đồng bộ.
+        """
+        with self._load_lock:
+            self._snapshot = None
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def is_reloading(self) -> bool:
+        thread = self._reload_thread
+        return thread is not None and thread.is_alive()
+
+    # ------------------------------------------------------------------
+    # Tải lại ở background
+    # ------------------------------------------------------------------
+
+    def _reload_worker(self) -> None:
+        while True:
+            with self._state_lock:
+                self._reload_pending = False
+
+            try:
+                with self._load_lock:
+                    self._build_and_swap()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Tải lại {self.name} thất bại, giữ phiên bản {self.version}: {str(e)}")
+
+            with self._state_lock:
+                if not self._reload_pending:
+                    self._reload_thread = None
+                    return
+
+    def reload(self, wait: bool = False, timeout: Optional[float] = None) -> bool:
+        """
+        Yêu cầu build lại snapshot ở background.
+
+        Args:
+            wait: Chờ lần build hoàn tất
+            timeout: Thời gian chờ tối đa (giây) khi wait=True
+
+        Returns:
+            True nếu đã khởi động thread build mới, False nếu gộp vào lần build đang chạy
+        """
+        with self._state_lock:
+            thread = self._reload_thread
+            if thread is not None:
+                self._reload_pending = True
+                started = False
+            else:
+                thread = threading.Thread(
+                    target=self._reload_worker, name=f"{self.name}-reload", daemon=True
+                )
+                self._reload_thread = thread
+                thread.start()
+                started = True
+
+        if wait:
+            thread.join(timeout)
+        return started
+
+    def check_for_changes(self) -> bool:
+        """
+        Reload nếu fingerprint của dữ liệu nguồn khác fingerprint của snapshot hiện tại.
+
+        Returns:
+            True nếu đã yêu cầu reload
+        """
+        snapshot = self._snapshot
+        if snapshot is None or self._fingerprint is None:
+            return False
+
+        try:
+            fingerprint = self._current_fingerprint()
+        except Exception as e:
+            logger.warning(f"Không đọc được fingerprint của {self.name}: {str(e)}")
+            return False
+
+        if fingerprint == snapshot[1]:
+            return False
+
+        logger.info(f"Phát hiện thay đổi dữ liệu của {self.name}, đang tải lại ở background...")
+        self.reload()
+        return True
+
+    def start_watcher(self, interval: float) -> None:
+        """
+        Khởi động thread nền kiểm tra thay đổi mỗi `interval` giây (không làm gì nếu interval <= 0).
+        """
+        if interval <= 0 or self._fingerprint is None:
+            return
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+
+        self._watcher_stop.clear()
+
+        def watch():
+            while not self._watcher_stop.wait(interval):
+                self.check_for_changes()
+
+        self._watcher = threading.Thread(target=watch, name=f"{self.name}-watcher", daemon=True)
+        self._watcher.start()
+        logger.info(f"Theo dõi thay đổi {self.name} mỗi {interval}s")
+
+    def stop_watcher(self) -> None:
+        self._watcher_stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Trạng thái hiện tại (dùng cho endpoint quản trị).
+        """
+        return {
+            "loaded": self.is_loaded,
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "reloading": self.is_reloading,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,319 @@
+"""
+Identity gallery module.
+Gallery nhiều danh tính cho bài toán nhận dạng 1:N: mỗi embedding gắn với một danh tính,
+tìm kiếm qua IVF index (ann_index). Dữ liệu nguồn nằm trong data/identities/<tên>/*.jpg,
+artifact được lưu cạnh các file mô hình khác trong models/.
+
+Build gallery từ thư mục:
+    python -m backend.identity_gallery [--data-dir data/identities]
+"""
+
+import os
+import argparse
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+from backend import config
+from backend.ann_index import IVFIndex
+from backend.data_loader import load_encoding_from_file
+from backend.parallel import map_files_ordered
+from backend.shared_gallery import exclusive_file_lock, file_identity
+
+logger = logging.getLogger(__name__)
+
+IDENTITY_DATA_DIR = os.path.join("data", "identities")
+IDENTITY_GALLERY_PATH = os.path.join("models", "identity_gallery.npz")
+# Index IVF riêng của định dạng cũ (nay nằm chung trong IDENTITY_GALLERY_PATH)
+IDENTITY_INDEX_PATH = os.path.join("models", "identity_index.npz")
+IDENTITY_LOCK_PATH = f"{IDENTITY_GALLERY_PATH}.lock"
+
+VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+
+class IdentityGallery:
+    """
+    Embeddings gắn nhãn danh tính + IVF index trên các embeddings đó.
+    Id trong index là vị trí của embedding trong danh sách labels/files.
+    """
+
+    def __init__(self, index: IVFIndex, labels: List[str], files: List[str]):
+        self.index = index
+        self.labels = list(labels)
+        self.files = list(files)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def num_identities(self) -> int:
+        return len(set(self.labels))
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        labels: List[str],
+        files: List[str],
+        num_lists: int = 0,
+        num_probes: Optional[int] = None
+    ) -> "IdentityGallery":
+        """
+        Build gallery và IVF index từ embeddings đã trích xuất.
+        """
+        if len(labels) != len(embeddings) or len(files) != len(embeddings):
+            raise ValueError("Số nhãn/file không khớp số embedding.")
+
+        index = IVFIndex(
+            num_lists=num_lists or config.ANN_NUM_LISTS,
+            num_probes=num_probes or config.ANN_NUM_PROBES
+        )
+        index.build(np.asarray(embeddings, dtype=np.float32))
+        return cls(index, labels, files)
+
+    def add(self, embedding: np.ndarray, label: str, filename: str) -> int:
+        """
+        Thêm một embedding vào gallery (insert tăng dần vào index; centroids chỉ được học lại
+        khi gallery đã lớn gấp nhiều lần lúc build - xem IVFIndex.retrain_if_outgrown).
+
+        Returns:
+            Id của embedding vừa thêm
+        """
+        with self._lock:
+            new_id = len(self.labels)
+            self.index.add(embedding, np.array([new_id]))
+            self.labels.append(label)
+            self.files.append(filename)
+            # Gallery bắt đầu từ vài ảnh: chia lại cụm khi số embedding đã tăng nhiều
+            self.index.retrain_if_outgrown(config.ANN_NUM_LISTS)
+        return new_id
+
+    def identify(
+        self,
+        encoding: np.ndarray,
+        top_k: int = 5,
+        num_probes: Optional[int] = None
+    ) -> List[Tuple[str, float, str]]:
+        """
+        Tìm các danh tính gần nhất với một face embedding.
+
+        Mỗi danh tính chỉ xuất hiện một lần, với khoảng cách tới embedding gần nhất của nó.
+
+        Args:
+            encoding: Face embedding (128-d)
+            top_k: Số danh tính cần trả về
+            num_probes: Số cụm IVF cần quét (mặc định theo cấu hình)
+
+        Returns:
+            Danh sách (identity, distance, filename) sắp xếp theo khoảng cách tăng dần
+        """
+        # Lấy dư số vector để sau khi gộp theo danh tính vẫn đủ top_k
+        with self._lock:
+            ids, distances = self.index.search(encoding, top_k * 8, num_probes=num_probes)
+            labels, files = self.labels, self.files
+
+            best: Dict[str, Tuple[float, str]] = {}
+            for vector_id, distance in zip(ids, distances):
+                label = labels[vector_id]
+                if label not in best:
+                    best[label] = (float(distance), files[vector_id])
+
+        ranked = sorted(best.items(), key=lambda item: item[1][0])[:top_k]
+        return [(label, distance, filename) for label, (distance, filename) in ranked]
+
+    def save(self, gallery_path: str = IDENTITY_GALLERY_PATH) -> None:
+        """
+        Lưu nhãn/tên file cùng IVF index vào một file (ghi file tạm rồi rename): process khác
+        đọc file lúc nào cũng thấy nhãn và index của cùng một lần lưu.
+        """
+        with self._lock:
+            labels, files = list(self.labels), list(self.files)
+            index_arrays = self.index.to_arrays()
+
+        directory = os.path.dirname(gallery_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{gallery_path}.tmp.{os.getpid()}.npz"
+        try:
+            np.savez(
+                tmp_path,
+                labels=np.array(labels, dtype=str),
+                files=np.array(files, dtype=str),
+                **index_arrays
+            )
+            os.replace(tmp_path, gallery_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    @classmethod
+    def load(
+        cls,
+        gallery_path: str = IDENTITY_GALLERY_PATH,
+        index_path: str = IDENTITY_INDEX_PATH
+    ) -> "IdentityGallery":
+        """
+        Đọc gallery đã lưu. Gallery lưu theo định dạng cũ (index nằm riêng trong index_path)
+        vẫn đọc được; lần lưu sau sẽ gộp về một file.
+
+        Raises:
+            FileNotFoundError: Nếu chưa build gallery
+            ValueError: Nếu file không đúng định dạng
+        """
+        if not os.path.exists(gallery_path):
+            raise FileNotFoundError(
+                f"Chưa có gallery danh tính '{gallery_path}'. "
+                f"Vui lòng chạy 'python -m backend.identity_gallery' để build."
+            )
+        with np.load(gallery_path, allow_pickle=False) as data:
+            labels = [str(x) for x in data["labels"]]
+            files = [str(x) for x in data["files"]]
+            index = IVFIndex.from_arrays(data) if "centroids" in data.files else None
+        if index is None:
+            index = IVFIndex.load(index_path)
+        if len(index) != len(labels):
+            raise ValueError("Gallery danh tính và index không khớp. Vui lòng build lại.")
+        return cls(index, labels, files)
+
+
+def build_identity_gallery(
+    data_dir: str = IDENTITY_DATA_DIR,
+    workers: Optional[int] = None
+) -> IdentityGallery:
+    """
+    Trích xuất embeddings từ data_dir/<danh tính>/*.jpg và build IdentityGallery.
+
+    Raises:
+        FileNotFoundError: Nếu thư mục không tồn tại
+        ValueError: Nếu không trích xuất được embedding nào
+    """
+    if not os.path.isdir(data_dir):
+        raise FileNotFoundError(f"Thư mục '{data_dir}/' không tồn tại.")
+
+    filepaths, labels = [], []
+    for identity in sorted(os.listdir(data_dir)):
+        identity_dir = os.path.join(data_dir, identity)
+        if not os.path.isdir(identity_dir):
+            continue
+        for filename in sorted(os.listdir(identity_dir)):
+            if os.path.splitext(filename.lower())[1] in VALID_EXTENSIONS:
+                filepaths.append(os.path.join(identity_dir, filename))
+                labels.append(identity)
+
+    logger.info(f"Tìm thấy {len(filepaths)} ảnh của {len(set(labels))} danh tính trong '{data_dir}/'")
+
+    workers = config.EXTRACTION_WORKERS if workers is None else workers
+    label_by_path = dict(zip(filepaths, labels))
+    embeddings, used_labels, used_files = [], [], []
+    for filepath, result, error in map_files_ordered(load_encoding_from_file, filepaths, workers):
+        relative = os.path.relpath(filepath, data_dir)
+        if error is not None:
+            logger.error(f"Lỗi khi xử lý '{relative}': {str(error)}. Bỏ qua.")
+            continue
+        num_faces, encoding = result
+        if num_faces != 1 or encoding is None:
+            logger.warning(f"'{relative}' có {num_faces} khuôn mặt. Bỏ qua.")
+            continue
+        embeddings.append(encoding)
+        used_labels.append(label_by_path[filepath])
+        used_files.append(relative)
+
+    if not embeddings:
+        raise ValueError(f"Không trích xuất được face embedding nào trong '{data_dir}/'.")
+
+    return IdentityGallery.build(np.array(embeddings), used_labels, used_files)
+
+
+_identity_gallery: Optional[IdentityGallery] = None
+# (inode, mtime_ns) của file gallery đã tải, và của bản lưu không đọc được gần nhất
+_identity_gallery_file: Optional[Tuple[int, int]] = None
+_identity_gallery_failed_file: Optional[Tuple[int, int]] = None
+_identity_gallery_lock = threading.Lock()
+_enroll_lock = threading.Lock()
+
+
+def get_identity_gallery() -> IdentityGallery:
+    """
+    Gallery danh tính dùng chung của process (tải lười từ models/ ở lần gọi đầu).
+
+    Nếu file gallery đã được thay (worker khác vừa đăng ký ảnh hoặc build lại) thì tự tải lại;
+    chi phí mỗi lần gọi chỉ là một os.stat. Bản lưu hỏng không thay gallery đang dùng.
+
+    Raises:
+        FileNotFoundError: Nếu chưa build gallery
+        ValueError: Nếu file gallery không đọc được và chưa có gallery nào được tải
+    """
+    global _identity_gallery, _identity_gallery_file, _identity_gallery_failed_file
+
+    current = file_identity(IDENTITY_GALLERY_PATH)
+    gallery = _identity_gallery
+    if gallery is not None and current in (None, _identity_gallery_file, _identity_gallery_failed_file):
+        return gallery
+
+    with _identity_gallery_lock:
+        # Stat trước khi đọc: nếu file đổi trong lúc đọc, lần gọi sau sẽ tải lại
+        current = file_identity(IDENTITY_GALLERY_PATH)
+        if _identity_gallery is not None and current in (None, _identity_gallery_file, _identity_gallery_failed_file):
+            return _identity_gallery
+        try:
+            gallery = IdentityGallery.load()
+        except (FileNotFoundError, ValueError) as e:
+            if _identity_gallery is None:
+                raise
+            _identity_gallery_failed_file = current
+            logger.error(f"Không tải lại được gallery danh tính, giữ bản cũ: {str(e)}")
+            return _identity_gallery
+        _identity_gallery, _identity_gallery_file = gallery, current
+        logger.info(
+            f"Đã tải gallery danh tính: {len(gallery)} embeddings, {gallery.num_identities} danh tính"
+        )
+
+    return gallery
+
+
+def enroll_embedding(encoding: np.ndarray, label: str, filename: str) -> IdentityGallery:
+    """
+    Thêm một embedding vào gallery dùng chung (tạo gallery mới nếu chưa build) và lưu xuống đĩa.
+
+    Mỗi worker process giữ một bản gallery trong bộ nhớ nhưng cùng ghi một file: việc thêm được
+    khoá bằng file lock và gallery được đọc lại từ đĩa trước khi thêm, nên embedding do worker
+    khác đăng ký không bị ghi đè.
+
+    Returns:
+        Gallery sau khi thêm
+    """
+    global _identity_gallery, _identity_gallery_file
+
+    with _enroll_lock, exclusive_file_lock(IDENTITY_LOCK_PATH):
+        try:
+            gallery = IdentityGallery.load()
+        except FileNotFoundError:
+            gallery = IdentityGallery.build(np.array([encoding]), [label], [filename])
+        else:
+            gallery.add(encoding, label, filename)
+        gallery.save()
+        with _identity_gallery_lock:
+            _identity_gallery, _identity_gallery_file = gallery, file_identity(IDENTITY_GALLERY_PATH)
+
+    return gallery
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build gallery danh tính cho /api/v1/face/identify")
+    parser.add_argument("--data-dir", default=IDENTITY_DATA_DIR, help="Thư mục <danh tính>/<ảnh>")
+    parser.add_argument("--workers", type=int, default=None, help="Số process trích xuất song song")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    gallery = build_identity_gallery(args.data_dir, args.workers)
+    gallery.save()
+    logger.info(
+        f"Đã lưu gallery: {len(gallery)} embeddings, {gallery.num_identities} danh tính "
+        f"-> {IDENTITY_GALLERY_PATH}"
+    )
+
+
+if __name__ == "__main__":
+    main()
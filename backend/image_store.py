@@ -0,0 +1,295 @@
+"""
+Image store module.
+Bố cục lưu ảnh thu thập trong data/raw/user/: mỗi ảnh có tên duy nhất theo ULID
+(user_<ULID>.jpg - 48 bit thời gian + 80 bit ngẫu nhiên, sắp xếp theo thời điểm thu thập) và nằm
+trong thư mục shard theo ngày UTC (YYYY/MM/DD/). Hai ảnh thu thập trong cùng một giây không còn
+ghi đè nhau, và không có thư mục nào phải chứa toàn bộ ảnh.
+
+Ảnh được ghi atomic (file tạm ẩn trong cùng thư mục rồi rename): không có lúc nào một ảnh ghi dở
+nằm dưới tên thật. Mặc định lưu nguyên bytes đã upload (FACE_COLLECT_STORE=original); fsync
+(FACE_COLLECT_FSYNC) chạy ở thread nền, không nằm trong thời gian trả lời /collect.
+
+Chuyển ảnh của bố cục cũ (user_YYYYmmdd_HHMMSS.jpg ngay trong data/raw/user/) sang bố cục shard:
+    python -m backend.image_store [--data-dir data/raw/user] [--dry-run]
+"""
+
+import os
+import argparse
+import logging
+import secrets
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+from backend import config
+from backend.catalog import USER_DATA_DIR, VALID_EXTENSIONS, catalog_for
+
+logger = logging.getLogger(__name__)
+
+FILENAME_PREFIX = "user_"
+
+# Bảng mã Crockford base32 của ULID
+_ULID_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_ULID_RANDOM_BITS = 80
+
+# Cách lưu ảnh thu thập (FACE_COLLECT_STORE)
+STORE_ORIGINAL = "original"
+STORE_REENCODE = "reencode"
+STORE_MODES = (STORE_ORIGINAL, STORE_REENCODE)
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Số ảnh đổi tên trong catalog mỗi transaction khi chuyển bố cục
+MIGRATION_BATCH_SIZE = 1000
+
+# ULID cuối cùng đã cấp trong process: (ms, phần ngẫu nhiên) - ULID trong cùng một ms tăng dần
+_last_ulid: Tuple[int, int] = (-1, 0)
+_ulid_lock = threading.Lock()
+
+# Thread nền fsync ảnh đã lưu (tạo khi cần)
+_fsync_executor: Optional[ThreadPoolExecutor] = None
+_fsync_executor_lock = threading.Lock()
+
+
+def new_image_id(timestamp: Optional[float] = None) -> str:
+    """
+    ULID (26 ký tự) cho thời điểm timestamp (mặc định hiện tại).
+    """
+    global _last_ulid
+
+    milliseconds = int((time.time() if timestamp is None else timestamp) * 1000)
+    with _ulid_lock:
+        last_milliseconds, last_random = _last_ulid
+        if milliseconds == last_milliseconds:
+            randomness = (last_random + 1) % (1 << _ULID_RANDOM_BITS)
+        else:
+            randomness = int.from_bytes(os.urandom(_ULID_RANDOM_BITS // 8), "big")
+        _last_ulid = (milliseconds, randomness)
+
+    value = (milliseconds << _ULID_RANDOM_BITS) | randomness
+    return "".join(_ULID_ALPHABET[(value >> shift) & 31] for shift in range(125, -1, -5))
+
+
+def shard_directory(captured_at: float) -> str:
+    """
+    Thư mục shard (tương đối) của ảnh thu thập lúc captured_at: YYYY/MM/DD theo UTC.
+    """
+    return time.strftime(os.path.join("%Y", "%m", "%d"), time.gmtime(captured_at))
+
+
+def image_path(captured_at: float, extension: str = ".jpg", image_id: Optional[str] = None) -> str:
+    """
+    Đường dẫn tương đối của một ảnh mới: YYYY/MM/DD/user_<ULID><extension>.
+    """
+    image_id = image_id or new_image_id(captured_at)
+    return os.path.join(shard_directory(captured_at), f"{FILENAME_PREFIX}{image_id}{extension.lower()}")
+
+
+def iter_image_files(
+    directory: str,
+    extensions: Optional[Set[str]] = VALID_EXTENSIONS
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    (đường dẫn tương đối, stat) các ảnh trong thư mục và các thư mục shard con, theo thứ tự tên.
+    Mỗi thư mục được liệt kê một lần bằng os.scandir. extensions=None: mọi file.
+    """
+    try:
+        entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+    except (FileNotFoundError, NotADirectoryError):
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir():
+                if not entry.name.startswith("."):
+                    for path, stat in iter_image_files(entry.path, extensions):
+                        yield os.path.join(entry.name, path), stat
+            elif entry.is_file() and (extensions is None or os.path.splitext(entry.name.lower())[1] in extensions):
+                yield entry.name, entry.stat()
+        except FileNotFoundError:
+            continue
+
+
+def image_extension(file_bytes: bytes) -> str:
+    """
+    Extension theo magic bytes của ảnh đã validate: .png hoặc .jpg.
+    """
+    return ".png" if bytes(file_bytes[:len(_PNG_SIGNATURE)]) == _PNG_SIGNATURE else ".jpg"
+
+
+def encode_for_storage(image_bgr: np.ndarray, quality: int, max_dimension: int = 0) -> Tuple[bytes, float]:
+    """
+    Encode lại ảnh thành JPEG để lưu (FACE_COLLECT_STORE=reencode).
+
+    Args:
+        image_bgr: Ảnh đã decode
+        quality: Chất lượng JPEG (1-100)
+        max_dimension: Cạnh dài tối đa, ảnh lớn hơn được thu nhỏ (0 = giữ nguyên)
+
+    Returns:
+        (bytes JPEG, tỉ lệ thu nhỏ - 1.0 nếu giữ nguyên kích thước)
+
+    Raises:
+        ValueError: Nếu encode thất bại
+    """
+    scale = 1.0
+    height, width = image_bgr.shape[:2]
+    if max_dimension and max(height, width) > max_dimension:
+        scale = max_dimension / max(height, width)
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        image_bgr = cv2.resize(image_bgr, size, interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode(".jpg", image_bgr, [cv2.IMWRITE_JPEG_QUALITY, int(quality)])
+    if not ok:
+        raise ValueError("Không encode được ảnh JPEG.")
+    return encoded.tobytes(), scale
+
+
+def write_file_atomic(filepath: str, data: bytes) -> os.stat_result:
+    """
+    Ghi data vào file tạm ẩn trong cùng thư mục rồi rename thành filepath (atomic).
+    File tạm có extension .tmp nên không bị catalog / iter_image_files coi là ảnh.
+
+    Returns:
+        stat của file đã ghi
+    """
+    directory, name = os.path.split(filepath)
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.{secrets.token_hex(4)}.tmp")
+    # 0o666 & ~umask như file tạo bằng open() thông thường
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, filepath)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return os.stat(filepath)
+
+
+def _fsync_file(filepath: str) -> None:
+    for path in (filepath, os.path.dirname(filepath) or "."):
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def schedule_fsync(filepath: str) -> Future:
+    """
+    fsync file (và thư mục chứa nó, để rename bền vững) ở thread nền.
+    """
+    global _fsync_executor
+
+    with _fsync_executor_lock:
+        if _fsync_executor is None:
+            _fsync_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-fsync")
+        return _fsync_executor.submit(_fsync_file, filepath)
+
+
+def flush_pending_writes(wait: bool = True) -> None:
+    """
+    Chờ các fsync đang chờ xong (gọi khi tắt server).
+    """
+    global _fsync_executor
+
+    with _fsync_executor_lock:
+        executor, _fsync_executor = _fsync_executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+class ImageStore:
+    """
+    Cấp đường dẫn và ghi ảnh mới trong thư mục dữ liệu theo bố cục shard.
+    """
+
+    def __init__(self, data_dir: str = USER_DATA_DIR):
+        self.data_dir = data_dir
+
+    def allocate(self, extension: str = ".jpg", captured_at: Optional[float] = None) -> str:
+        """
+        Đường dẫn tương đối (duy nhất) cho ảnh mới; thư mục shard được tạo sẵn.
+        """
+        captured_at = time.time() if captured_at is None else captured_at
+        path = image_path(captured_at, extension)
+        os.makedirs(os.path.join(self.data_dir, os.path.dirname(path)), exist_ok=True)
+        return path
+
+    def write(self, path: str, data: bytes) -> os.stat_result:
+        """
+        Ghi ảnh (atomic) vào đường dẫn tương đối đã cấp bởi allocate().
+        fsync được đưa vào thread nền nếu bật FACE_COLLECT_FSYNC.
+        """
+        filepath = os.path.join(self.data_dir, path)
+        stat = write_file_atomic(filepath, data)
+        if config.COLLECT_FSYNC:
+            schedule_fsync(filepath)
+        return stat
+
+
+# Kho ảnh của data/raw/user/ (module singleton)
+image_store = ImageStore()
+
+
+def migrate_flat_images(data_dir: str = USER_DATA_DIR, dry_run: bool = False) -> List[Tuple[str, str]]:
+    """
+    Chuyển các ảnh nằm ngay trong thư mục gốc (bố cục cũ) vào thư mục shard với tên ULID.
+
+    Thời điểm thu thập lấy từ catalog (mtime của file nếu ảnh chưa qua /collect) và được giữ
+    nguyên; dòng catalog được đổi đường dẫn nên content hash, khung khuôn mặt và chỉ số môi
+    trường không phải tính lại. Nếu bị dừng giữa chừng, lần đối chiếu catalog sau sẽ nhận ra
+    các ảnh đã chuyển; chạy lại lệnh để chuyển nốt.
+
+    Returns:
+        Danh sách (đường dẫn cũ, đường dẫn mới)
+
+    Raises:
+        FileNotFoundError: Nếu thư mục không tồn tại
+    """
+    if not os.path.isdir(data_dir):
+        raise FileNotFoundError(f"Thư mục '{data_dir}/' không tồn tại.")
+
+    catalog = catalog_for(data_dir)
+    moves = [
+        (entry.path, image_path(entry.captured_at, os.path.splitext(entry.path)[1]))
+        for entry in catalog.entries() if not os.path.dirname(entry.path)
+    ]
+    if dry_run:
+        return moves
+
+    for start in range(0, len(moves), MIGRATION_BATCH_SIZE):
+        batch = moves[start:start + MIGRATION_BATCH_SIZE]
+        for old, new in batch:
+            target = os.path.join(data_dir, new)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.rename(os.path.join(data_dir, old), target)
+        catalog.rename(dict(batch))
+        logger.info(f"Đã chuyển {start + len(batch)}/{len(moves)} ảnh")
+    catalog.sync()
+    return moves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chuyển ảnh đã thu thập sang bố cục shard theo ngày")
+    parser.add_argument("--data-dir", default=USER_DATA_DIR, help="Thư mục ảnh")
+    parser.add_argument("--dry-run", action="store_true", help="Chỉ liệt kê, không di chuyển file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    moves = migrate_flat_images(args.data_dir, args.dry_run)
+    for old, new in moves:
+        logger.info(f"'{old}' -> '{new}'")
+    action = "cần chuyển" if args.dry_run else "đã chuyển"
+    logger.info(f"{len(moves)} ảnh {action} sang bố cục shard trong '{args.data_dir}/'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Lazy import module.
+Trì hoãn import các thư viện nặng (face_recognition kéo theo dlib và ~100MB model) tới lần
+dùng đầu tiên, để process khởi động và nhận kết nối ngay; model được nạp ở background
+(xem backend/startup.py) hoặc khi request đầu tiên cần tới.
+"""
+
+import importlib
+import logging
+import threading
+import time
+from types import ModuleType
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModule:
+    """
+    Proxy của một module: import thật chỉ xảy ra khi truy cập thuộc tính đầu tiên (thread-safe).
+    Có thể patch như module thường (unittest.mock.patch thay cả proxy).
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module: Optional[ModuleType] = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self) -> ModuleType:
+        """
+        Import module (nếu chưa) và trả về module thật.
+        """
+        module = self._module
+        if module is not None:
+            return module
+
+        with self._lock:
+            if self._module is None:
+                start = time.perf_counter()
+                self._module = importlib.import_module(self._name)
+                self.load_seconds = time.perf_counter() - start
+                logger.info(f"Đã import '{self._name}' trong {self.load_seconds:.2f}s")
+            return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+_lazy_modules: Dict[str, LazyModule] = {}
+_lazy_modules_lock = threading.Lock()
+
+
+def lazy_import(name: str) -> LazyModule:
+    """
+    Proxy dùng chung cho module `name` (mọi nơi gọi cùng tên nhận cùng một proxy).
+    """
+    with _lazy_modules_lock:
+        module = _lazy_modules.get(name)
+        if module is None:
+            module = LazyModule(name)
+            _lazy_modules[name] = module
+        return module
@@ -3,15 +3,22 @@ FastAPI application and endpoints
 Main application file containing REST API endpoints for face recognition
 """
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Query
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import hashlib
+import re
 import cv2
 import numpy as np
 import logging
 import os
+import time
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Any, List, Optional, Tuple
 
 from backend.models import (
     VerifyResponse, 
@@ -20,18 +27,53 @@ from backend.models import (
     TrainingInfo,
     CollectResponse,
     EnvironmentInfo,
-    TrainResponse
+    TrainResponse,
+    BatchVerifyItem,
+    BatchVerifyResponse,
+    MatchInfo,
+    IdentifyCandidate,
+    IdentifyResponse,
+    EnrollResponse,
+    GalleryStatusResponse,
+    StreamVerifyFrame,
+    TrainingJobResponse,
+    ReadinessResponse
 )
-from backend.data_loader import get_known_faces_cache
+from backend.data_loader import get_known_faces_cache, known_faces_store, shared_known_faces
 from backend.face_processor import (
     read_image_from_upload,
+    read_image_dimensions,
     extract_single_face_encoding,
     compare_with_known_faces,
+    compare_batch_with_known_faces,
+    find_top_k_matches,
     validate_image_magic_bytes,
-    analyze_environment
+    analyze_environment,
+    downscaled_gray
 )
-from backend.training import train_personal_model
-from backend.verification import load_trained_model, compare_embeddings
+from backend.detectors import get_detector
+from backend import dedup
+from backend.catalog import CatalogEntry, image_catalog
+from backend.image_store import (
+    STORE_MODES,
+    STORE_REENCODE,
+    encode_for_storage,
+    flush_pending_writes,
+    image_extension,
+    image_store,
+    write_file_atomic
+)
+from backend.face_tracking import FaceTracker, LatestFrameSlot
+from backend import identity_gallery
+from backend.identity_gallery import get_identity_gallery, enroll_embedding
+from backend import training_jobs as training_jobs_module
+from backend.training_jobs import training_jobs
+from backend.executor import run_in_executor, shutdown_executor
+from backend.startup import startup_state
+from backend.serving_model import ServingModel, known_faces_model, model_holder
+from backend import config
+from backend import metrics
+from backend.request_limits import RequestSizeLimitMiddleware, MULTIPART_OVERHEAD
 from backend.exceptions import (
     file_not_found_handler,
     value_error_handler,
@@ -50,6 +92,30 @@ logger = logging.getLogger(__name__)
 # Giới hạn kích thước file upload (10MB)
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB in bytes
 
+# Kích thước mỗi lần đọc file upload (file > 1MB đã được Starlette spool ra đĩa)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Số byte đầu cần có để kiểm tra magic bytes (PNG signature dài nhất: 8 byte)
+MAGIC_BYTES_LENGTH = 8
+
+# Chu kỳ (giây) kiểm tra trạng thái job huấn luyện khi POST /api/v1/train chờ job xong
+TRAINING_JOB_POLL_SECONDS = 1.0
+
+# Mô tả tham số `detector` của các endpoint xử lý ảnh
+DETECTOR_QUERY_DESCRIPTION = (
+    "Detector khuôn mặt: hog, hog:<upsample>, cnn, haar, lbp hoặc lọc trước dạng haar>hog "
+    "(mặc định FACE_DETECTOR)"
+)
+
+# Mô tả tham số `dedupe` của /api/v1/collect
+DEDUPE_QUERY_DESCRIPTION = (
+    "Bỏ qua ảnh gần trùng: off, recent (so với FACE_DEDUP_RECENT ảnh mới nhất) hoặc all "
+    "(mặc định FACE_DEDUP_MODE)"
+)
+
+# Tên danh tính hợp lệ (dùng làm tên thư mục con trong data/identities/)
+IDENTITY_NAME_PATTERN = re.compile(r"[\w\-]{1,64}")
+
 
 # Khởi tạo FastAPI app với metadata
 app = FastAPI(
@@ -60,6 +126,22 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+def _request_body_limit(path: str):
+    """
+    Giới hạn kích thước body theo endpoint (kiểm tra trước khi parse multipart).
+    """
+    if path == "/api/v1/face/verify/batch":
+        max_bytes = config.MAX_BATCH_SIZE * (MAX_FILE_SIZE + MULTIPART_OVERHEAD)
+        return max_bytes, f"Request quá lớn. Tổng kích thước tối đa cho phép là {max_bytes // (1024*1024)}MB."
+    return (
+        MAX_FILE_SIZE + MULTIPART_OVERHEAD,
+        f"File quá lớn. Kích thước tối đa cho phép là {MAX_FILE_SIZE // (1024*1024)}MB."
+    )
+
+
+# Giới hạn kích thước request ngay khi nhận body (nằm trong CORS để response lỗi vẫn có header CORS)
+app.add_middleware(RequestSizeLimitMiddleware, limit_for_path=_request_body_limit)
+
 # Cấu hình CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -67,8 +149,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Cho phép tất cả HTTP methods
     allow_headers=["*"],  # Cho phép tất cả headers
+    expose_headers=["Server-Timing"],  # Cho phép client đọc thời gian từng giai đoạn
 )
 
+# Đo thời gian từng giai đoạn (header Server-Timing) và xuất metrics trên /metrics
+if config.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Đăng ký exception handlers
 # Validates: Requirements 6.1, 6.2, 6.3, 6.4, 6.5, 7.1, 7.2, 7.3, 7.4
 app.add_exception_handler(FileNotFoundError, file_not_found_handler)
@@ -78,11 +165,277 @@ app.add_exception_handler(RequestValidationError, validation_exception_handler)
 app.add_exception_handler(Exception, generic_exception_handler)
 
 
+def _check_magic_bytes(file_bytes: bytearray) -> None:
+    """
+    Validation bằng magic bytes; HTTPException 400 nếu không phải ảnh JPEG/PNG.
+    """
+    if not validate_image_magic_bytes(file_bytes):
+        logger.warning("File không phải là ảnh hợp lệ (magic bytes validation failed)")
+        raise HTTPException(
+            status_code=400,
+            detail="File không phải là ảnh hợp lệ. Vui lòng upload file ảnh thật (.jpg, .jpeg, .png)."
+        )
+
+
+async def _read_validated_upload(file: UploadFile) -> bytearray:
+    """
+    Đọc file upload và kiểm tra content-type, kích thước (max 10MB) và magic bytes.
+    
+    File được đọc theo chunk: magic bytes được kiểm tra ngay ở chunk đầu và việc đọc dừng
+    ngay khi vượt giới hạn kích thước.
+    
+    Args:
+        file: File ảnh upload (jpg, jpeg, png)
+        
+    Returns:
+        Dữ liệu ảnh (một buffer duy nhất, decoder đọc trực tiếp không copy) đã qua validation
+        
+    Raises:
+        HTTPException: 400 nếu file không hợp lệ
+        
+    Validates: Requirements 4.1-4.6
+    """
+    # Validation content-type
+    valid_content_types = {"image/jpeg", "image/jpg", "image/png"}
+    if file.content_type not in valid_content_types:
+        logger.warning(f"Content-type không hợp lệ: {file.content_type}")
+        raise HTTPException(
+            status_code=400,
+            detail="File upload phải là ảnh (.jpg, .jpeg, .png)."
+        )
+    
+    too_large_detail = f"File quá lớn. Kích thước tối đa cho phép là {MAX_FILE_SIZE // (1024*1024)}MB."
+    
+    # Kích thước đã biết sau khi parse multipart: từ chối ngay, không cần đọc
+    if file.size is not None and file.size > MAX_FILE_SIZE:
+        logger.warning(f"File quá lớn: {file.size} bytes (max: {MAX_FILE_SIZE} bytes)")
+        raise HTTPException(status_code=400, detail=too_large_detail)
+    
+    # Đọc theo chunk vào một buffer duy nhất: kiểm tra magic bytes ở chunk đầu và
+    # dừng ngay khi vượt giới hạn thay vì đọc hết file vào bộ nhớ
+    file_bytes = bytearray()
+    magic_checked = False
+    with metrics.stage("read"):
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            
+            if len(file_bytes) + len(chunk) > MAX_FILE_SIZE:
+                logger.warning(f"File quá lớn: > {MAX_FILE_SIZE} bytes")
+                raise HTTPException(status_code=400, detail=too_large_detail)
+            file_bytes += chunk
+            
+            if not magic_checked and len(file_bytes) >= MAGIC_BYTES_LENGTH:
+                _check_magic_bytes(file_bytes)
+                magic_checked = True
+    
+    logger.info(f"Kích thước file: {len(file_bytes)} bytes")
+    
+    # File ngắn hơn header: kiểm tra sau khi đọc hết
+    if not magic_checked:
+        _check_magic_bytes(file_bytes)
+    
+    return file_bytes
+
+
+def _decoded_scale(file_bytes: bytes, width: int, height: int) -> float:
+    """
+    Tỉ lệ giữa kích thước gốc (theo header) và ảnh đã decode; 1.0 nếu ảnh không bị thu nhỏ.
+    So sánh cạnh dài để không phụ thuộc việc xoay ảnh theo EXIF.
+    """
+    dimensions = read_image_dimensions(file_bytes)
+    if dimensions is None or max(dimensions) <= max(width, height):
+        return 1.0
+    return max(dimensions) / max(width, height)
+
+
+def _scale_face_location(
+    face_location: Tuple[int, int, int, int],
+    scale: float,
+    width: int,
+    height: int
+) -> Tuple[int, int, int, int]:
+    """
+    Quy đổi face box từ ảnh đã decode thu nhỏ (width x height) về tọa độ ảnh gốc.
+    """
+    top, right, bottom, left = face_location
+    original_width, original_height = int(round(width * scale)), int(round(height * scale))
+    return (
+        max(0, int(round(top * scale))),
+        min(original_width, int(round(right * scale))),
+        min(original_height, int(round(bottom * scale))),
+        max(0, int(round(left * scale)))
+    )
+
+
+def _process_face_image(
+    file_bytes: bytes,
+    keep_image: bool = False,
+    detector: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Pipeline CPU-bound cho một ảnh upload: decode, BGR->RGB, trích xuất embedding
+    và phân tích môi trường. Được chạy trong executor để không chặn event loop.
+    
+    Args:
+        file_bytes: Dữ liệu ảnh đã được validate
+        keep_image: Trả về cả ảnh BGR đã decode (dùng khi cần lưu ảnh)
+        detector: Chuỗi detector (mặc định FACE_DETECTOR)
+        
+    Returns:
+        Dictionary chứa encoding, face_location, env_info, width, height,
+        timings (thời gian từng giai đoạn, giây) và image_bgr nếu keep_image=True
+        
+    Raises:
+        ValueError: Nếu không đọc được ảnh hoặc số khuôn mặt khác 1
+    """
+    with metrics.collect_stages() as timer:
+        # Chuyển đổi bytes thành ảnh BGR
+        logger.info("Đang đọc và decode ảnh...")
+        # Ảnh lưu làm dữ liệu huấn luyện (keep_image) luôn decode đủ kích thước
+        decode_max_dimension = 0 if keep_image else config.DECODE_MAX_DIMENSION
+        with metrics.stage("decode"):
+            image_bgr = read_image_from_upload(file_bytes, max_dimension=decode_max_dimension)
+        
+        # Lấy kích thước ảnh
+        height, width = image_bgr.shape[:2]
+        logger.info(f"Kích thước ảnh: {width}x{height}")
+        
+        # Nếu đã decode thu nhỏ: tỉ lệ để quy đổi kích thước / face box về ảnh gốc
+        scale = _decoded_scale(file_bytes, width, height) if decode_max_dimension else 1.0
+        
+        # Chuyển đổi BGR sang RGB (face_recognition yêu cầu RGB)
+        with metrics.stage("to_rgb"):
+            image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+        
+        # Ảnh xám thu nhỏ dùng chung cho detect grayscale và phân tích môi trường
+        detection_gray = None
+        if config.DETECTION_GRAYSCALE:
+            with metrics.stage("to_gray"):
+                detection_gray = downscaled_gray(image_bgr, config.DETECTION_MAX_DIMENSION)
+        
+        # Trích xuất face embedding và location
+        logger.info("Đang trích xuất face embedding...")
+        encoding, face_location = extract_single_face_encoding(image_rgb, gray=detection_gray, detector=detector)
+        logger.info(f"Đã trích xuất face embedding thành công. Face location: {face_location}")
+        
+        # Phân tích môi trường (dùng lại ảnh xám của bước detect nếu đủ độ phân giải)
+        logger.info("Đang phân tích môi trường...")
+        environment_gray = None
+        if (
+            detection_gray is not None
+            and config.ENV_MAX_DIMENSION > 0
+            and max(detection_gray.shape) >= config.ENV_MAX_DIMENSION
+        ):
+            environment_gray = detection_gray
+        with metrics.stage("environment"):
+            env_info = analyze_environment(image_bgr, face_location, gray=environment_gray)
+        logger.info(f"Kết quả phân tích môi trường: brightness={env_info['brightness']:.1f}, "
+                    f"blur_score={env_info['blur_score']:.1f}, "
+                    f"face_size_ratio={env_info['face_size_ratio']:.3f}")
+        
+        if scale != 1.0:
+            face_location = _scale_face_location(face_location, scale, width, height)
+            width, height = int(round(width * scale)), int(round(height * scale))
+        
+        result = {
+            "encoding": encoding,
+            "face_location": face_location,
+            "env_info": env_info,
+            "width": width,
+            "height": height,
+            "timings": timer.stages,
+        }
+        
+    if keep_image:
+        result["image_bgr"] = image_bgr
+    
+    return result
+
+
+async def _run_face_pipeline(
+    file_bytes: bytes,
+    keep_image: bool = False,
+    detector: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Chạy _process_face_image trong executor và ghi thời gian từng giai đoạn vào request hiện tại.
+    """
+    processed = await run_in_executor(_process_face_image, file_bytes, keep_image=keep_image, detector=detector)
+    metrics.record_stages(processed.get("timings"))
+    return processed
+
+
+def _serving_model() -> ServingModel:
+    """
+    Mô hình phục vụ xác thực: artifact đã huấn luyện, hoặc gallery myface/ nếu chưa huấn luyện.
+    
+    Raises:
+        FileNotFoundError, ValueError: Chưa huấn luyện và không có dữ liệu myface/
+    """
+    model = model_holder.current()
+    if model is not None:
+        return model
+    known_encodings, used_files = get_known_faces_cache()
+    return known_faces_model(known_encodings, used_files, known_faces_store.version, known_faces_store.loaded_at)
+
+
+def _training_info(model: ServingModel) -> TrainingInfo:
+    return TrainingInfo(
+        num_images=len(model.used_files),
+        used_files_sample=model.used_files[:10],  # Chỉ lấy 10 file đầu tiên
+        model_version=model.version,
+        model_source=model.source
+    )
+
+
+def _check_detector(detector: Optional[str]) -> None:
+    """
+    Kiểm tra tham số detector của request; HTTPException 400 nếu không hợp lệ.
+    """
+    if detector is None:
+        return
+    try:
+        get_detector(detector)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _check_dedupe_mode(dedupe: Optional[str]) -> str:
+    """
+    Chế độ kiểm tra ảnh gần trùng của request; HTTPException 400 nếu không hợp lệ.
+    """
+    mode = (dedupe or config.DEDUP_MODE).strip().lower()
+    if mode not in dedup.DEDUP_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Tham số dedupe không hợp lệ: {dedupe!r}. Giá trị hợp lệ: {', '.join(dedup.DEDUP_MODES)}."
+        )
+    return mode
+
+
+def _build_match_message(is_match: bool, distance: float, threshold: float) -> str:
+    """
+    Tạo message kết quả xác thực bằng tiếng Việt.
+    """
+    if is_match:
+        return (
+            f"Đây là KHUÔN MẶT CỦA BẠN "
+            f"(khoảng cách = {distance:.3f} ≤ ngưỡng {threshold:.3f})."
+        )
+    return (
+        f"Đây KHÔNG PHẢI khuôn mặt của bạn "
+        f"(khoảng cách = {distance:.3f} > ngưỡng {threshold:.3f})."
+    )
+
+
 @app.on_event("startup")
 async def startup_event():
     """
     Khởi tạo hệ thống khi startup.
-    Tạo thư mục cần thiết và tải dữ liệu huấn luyện vào cache.
+    Tạo thư mục cần thiết rồi nạp model, warm-up các worker và tải dữ liệu huấn luyện ở background
+    (xem backend/startup.py).
     Validates: Requirements 7.1, 7.2
     """
     try:
@@ -93,19 +446,35 @@ async def startup_event():
         os.makedirs("models", exist_ok=True)
         logger.info("Đã tạo thư mục data/raw/user và models")
         
-        # Tải dữ liệu huấn luyện vào cache (nếu có)
-        try:
-            known_encodings, used_files = get_known_faces_cache()
-            logger.info(f"Đã tải {len(known_encodings)} ảnh huấn luyện thành công: {used_files}")
-        except (FileNotFoundError, ValueError) as e:
-            logger.warning(f"Chưa có dữ liệu huấn luyện: {str(e)}")
+        # Kiểm tra cấu hình detector ngay khi khởi động
+        get_detector(config.DETECTOR)
+        get_detector(config.TRAINING_DETECTOR)
+        logger.info(f"Detector: {config.DETECTOR} (xác thực), {config.TRAINING_DETECTOR} (huấn luyện)")
+        if config.COLLECT_STORE not in STORE_MODES:
+            raise ValueError(
+                f"FACE_COLLECT_STORE không hợp lệ: {config.COLLECT_STORE!r}. "
+                f"Giá trị hợp lệ: {', '.join(STORE_MODES)}."
+            )
         
-        logger.info("Hệ thống sẵn sàng nhận request.")
+        # Nạp model và gallery ở background: server nhận kết nối ngay, /api/v1/ready
+        # trả 200 khi các bước khởi động hoàn tất
+        startup_state.start()
+        logger.info("Server đã nhận kết nối, đang nạp model ở background.")
     except Exception as e:
         logger.error(f"Lỗi khi khởi động hệ thống: {str(e)}")
         raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """
+    Giải phóng executor, dừng theo dõi gallery và chờ fsync ảnh đã thu thập khi tắt server.
+    """
+    known_faces_store.stop_watcher()
+    shutdown_executor(wait=False)
+    flush_pending_writes()
+
+
 @app.get("/api/v1/health")
 async def health_check():
     """
@@ -116,72 +485,128 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/api/v1/ready", response_model=ReadinessResponse)
+async def readiness_check(response: Response):
+    """
+    Endpoint kiểm tra worker đã sẵn sàng phục vụ chưa (model đã nạp, gallery đã tải).
+    Trả 503 cho tới khi mọi bước khởi động hoàn tất; khác /api/v1/health (chỉ kiểm tra process còn sống).
+    """
+    snapshot = startup_state.snapshot()
+    if not snapshot["ready"]:
+        response.status_code = 503
+    return ReadinessResponse(**snapshot)
+
+
+def _serving_gallery_size():
+    # Gallery của mô hình đang phục vụ xác thực; myface/ khi chưa huấn luyện
+    model = model_holder.current()
+    if model is not None:
+        return len(model.gallery)
+    if not known_faces_store.is_loaded:
+        return None
+    return len(get_known_faces_cache()[0])
+
+
+metrics.gauge("face_gallery_size", "Số embedding trong gallery đang phục vụ xác thực.", _serving_gallery_size)
+metrics.gauge("face_gallery_version", "Phiên bản gallery (tăng mỗi lần tải lại).", lambda: known_faces_store.version)
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """
+    Endpoint xuất metrics theo định dạng text của Prometheus: số request, histogram thời gian
+    từng giai đoạn (multipart, decode, detect, encode, environment, compare...), kích thước gallery
+    và số lần hit/miss của các cache.
+    """
+    # Gauge kích thước gallery có thể phải nạp lại mô hình (worker khác vừa huấn luyện)
+    content = await run_in_threadpool(metrics.REGISTRY.render)
+    return Response(content=content, media_type=metrics.CONTENT_TYPE)
+
+
+def _gallery_status(message: str) -> GalleryStatusResponse:
+    status = known_faces_store.status()
+    num_images = None
+    if status["loaded"]:
+        num_images = len(get_known_faces_cache()[0])
+    shared_generation = shared_known_faces.generation if config.GALLERY_SHARED else None
+    return GalleryStatusResponse(
+        num_images=num_images, shared_generation=shared_generation, message=message, **status
+    )
+
+
+@app.get("/api/v1/gallery", response_model=GalleryStatusResponse)
+async def gallery_status():
+    """
+    Endpoint xem trạng thái gallery dữ liệu huấn luyện (phiên bản, đang tải lại, lỗi gần nhất).
+    """
+    return _gallery_status("Trạng thái gallery dữ liệu huấn luyện.")
+
+
+@app.post("/api/v1/gallery/reload", response_model=GalleryStatusResponse)
+async def reload_gallery(
+    wait: bool = Query(default=False)
+):
+    """
+    Endpoint yêu cầu tải lại dữ liệu huấn luyện mà không cần khởi động lại server.
+    
+    Gallery mới được build ở background; các request verify trong lúc đó vẫn dùng gallery cũ
+    và chuyển sang gallery mới ngay khi build xong.
+    
+    Args:
+        wait: Chờ build xong mới trả về
+        
+    Returns:
+        GalleryStatusResponse: Trạng thái gallery sau khi gửi yêu cầu
+    """
+    logger.info(f"Nhận request tải lại gallery: wait={wait}")
+    if wait:
+        started = await run_in_threadpool(known_faces_store.reload, True)
+    else:
+        started = known_faces_store.reload()
+    
+    if wait:
+        message = "Đã tải lại gallery." if known_faces_store.last_error is None \
+            else f"Tải lại gallery thất bại: {known_faces_store.last_error}"
+    elif started:
+        message = "Đang tải lại gallery ở background."
+    else:
+        message = "Gallery đang được tải lại, yêu cầu đã được xếp hàng."
+    return _gallery_status(message)
+
+
 @app.post("/api/v1/collect", response_model=CollectResponse)
 async def collect_face_image(
-    file: UploadFile = File(...)
+    file: UploadFile = File(...),
+    detector: Optional[str] = Query(default=None, description=DETECTOR_QUERY_DESCRIPTION),
+    dedupe: Optional[str] = Query(default=None, description=DEDUPE_QUERY_DESCRIPTION)
 ):
     """
     Endpoint thu thập dữ liệu khuôn mặt với kiểm tra môi trường.
     
     Args:
         file: File ảnh upload (jpg, jpeg, png)
+        detector: Detector khuôn mặt (mặc định FACE_DETECTOR)
+        dedupe: Không lưu ảnh gần trùng với ảnh đã lưu: off, recent hoặc all (mặc định FACE_DEDUP_MODE)
         
     Returns:
         CollectResponse: Kết quả thu thập với thông tin môi trường
         
     Validates: Requirements 1.1-1.11, 4.1-4.6, 7.3
     """
-    logger.info(f"Nhận request thu thập dữ liệu: filename={file.filename}, content_type={file.content_type}")
+    # Thời gian nhận body + parse multipart (trước khi vào endpoint)
+    metrics.mark_since_request_start("multipart")
     
-    # Validation content-type
-    valid_content_types = {"image/jpeg", "image/jpg", "image/png"}
-    if file.content_type not in valid_content_types:
-        logger.warning(f"Content-type không hợp lệ: {file.content_type}")
-        raise HTTPException(
-            status_code=400,
-            detail="File upload phải là ảnh (.jpg, .jpeg, .png)."
-        )
-    
-    # Đọc file bytes
-    file_bytes = await file.read()
-    file_size = len(file_bytes)
-    
-    # Kiểm tra kích thước file (max 10MB)
-    if file_size > MAX_FILE_SIZE:
-        logger.warning(f"File quá lớn: {file_size} bytes (max: {MAX_FILE_SIZE} bytes)")
-        raise HTTPException(
-            status_code=400,
-            detail=f"File quá lớn. Kích thước tối đa cho phép là {MAX_FILE_SIZE // (1024*1024)}MB."
-        )
-    
-    logger.info(f"Kích thước file: {file_size} bytes")
-    
-    # Validation bằng magic bytes
-    if not validate_image_magic_bytes(file_bytes):
-        logger.warning("File không phải là ảnh hợp lệ (magic bytes validation failed)")
-        raise HTTPException(
-            status_code=400,
-            detail="File không phải là ảnh hợp lệ. Vui lòng upload file ảnh thật (.jpg, .jpeg, .png)."
-        )
-    
-    # Chuyển đổi bytes thành ảnh BGR
-    logger.info("Đang đọc và decode ảnh...")
-    image_bgr = read_image_from_upload(file_bytes)
-    
-    # Chuyển đổi BGR sang RGB (face_recognition yêu cầu RGB)
-    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+    logger.info(f"Nhận request thu thập dữ liệu: filename={file.filename}, content_type={file.content_type}")
+    _check_detector(detector)
+    dedupe_mode = _check_dedupe_mode(dedupe)
     
-    # Trích xuất face embedding và location
-    logger.info("Đang trích xuất face embedding...")
-    unknown_encoding, face_location = extract_single_face_encoding(image_rgb)
-    logger.info(f"Đã trích xuất face embedding thành công. Face location: {face_location}")
+    # Validation content-type, kích thước và magic bytes
+    file_bytes = await _read_validated_upload(file)
     
-    # Phân tích môi trường
-    logger.info("Đang phân tích môi trường...")
-    env_info = analyze_environment(image_bgr, face_location)
-    logger.info(f"Kết quả phân tích môi trường: brightness={env_info['brightness']:.1f}, "
-                f"blur_score={env_info['blur_score']:.1f}, "
-                f"face_size_ratio={env_info['face_size_ratio']:.3f}")
+    # Decode, trích xuất embedding và phân tích môi trường trong executor
+    processed = await _run_face_pipeline(file_bytes, keep_image=True, detector=detector)
+    image_bgr = processed["image_bgr"]
+    env_info = processed["env_info"]
     
     # Kiểm tra môi trường có đạt yêu cầu không
     # Từ chối nếu quá tối, quá mờ, hoặc khuôn mặt quá nhỏ
@@ -197,52 +622,118 @@ async def collect_face_image(
     
     # Môi trường tốt - lưu ảnh
     # Tạo thư mục nếu chưa tồn tại
-    data_dir = "data/raw/user"
+    data_dir = image_catalog.data_dir
     os.makedirs(data_dir, exist_ok=True)
+    # Đối chiếu catalog trước khi ghi: ảnh sắp lưu được ghi nhận mà không phải quét lại thư mục
+    await run_in_threadpool(image_catalog.sync)
     
-    # Tạo tên file với timestamp
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"user_{timestamp}.jpg"
-    filepath = os.path.join(data_dir, filename)
-    
-    # Lưu ảnh
-    cv2.imwrite(filepath, image_bgr)
-    logger.info(f"Đã lưu ảnh thành công: {filepath}")
+    # So sánh hash + embedding với các ảnh đã lưu (index chỉ build khi dùng lần đầu)
+    image_hash = await run_in_threadpool(dedup.image_dhash, image_bgr)
+    match = None
+    if dedupe_mode != dedup.DEDUP_OFF:
+        with metrics.stage("dedupe"):
+            match = await run_in_threadpool(
+                dedup.duplicate_index.find, image_hash, processed["encoding"], dedupe_mode
+            )
+        metrics.COLLECT_DEDUP_DECISIONS.inc(result="saved" if match is None else "duplicate")
     
-    # Đếm tổng số ảnh đã thu thập
-    image_files = [
-        f for f in os.listdir(data_dir)
-        if os.path.isfile(os.path.join(data_dir, f)) and
-        f.lower().endswith(('.jpg', '.jpeg', '.png'))
-    ]
-    total_images = len(image_files)
+    if match is None:
+        # Mặc định lưu nguyên bytes đã upload (không encode lại JPEG)
+        face_location = processed["face_location"]
+        if config.COLLECT_STORE == STORE_REENCODE:
+            with metrics.stage("encode"):
+                image_data, scale = await run_in_executor(
+                    encode_for_storage, image_bgr, config.COLLECT_JPEG_QUALITY, config.COLLECT_MAX_DIMENSION
+                )
+            if scale != 1.0:
+                height, width = image_bgr.shape[:2]
+                face_location = _scale_face_location(face_location, scale, width, height)
+            extension = ".jpg"
+        else:
+            image_data, extension = file_bytes, image_extension(file_bytes)
+        
+        # Tên file ULID trong thư mục shard theo ngày (không trùng kể cả khi cùng một giây)
+        filename = await run_in_threadpool(image_store.allocate, extension)
+        filepath = os.path.join(data_dir, filename)
+        
+        # Ghi file (tạm + rename) và dòng catalog trong threadpool; tổng số ảnh đọc trong
+        # cùng transaction với dòng catalog
+        with metrics.stage("store"):
+            total_images = await run_in_threadpool(
+                _store_collected_image, filename, image_data, image_hash, face_location, env_info
+            )
+        logger.info(f"Đã lưu ảnh thành công: {filepath}")
+        dedup.duplicate_index.add(filename, image_hash, processed["encoding"])
+    else:
+        filepath = os.path.join(data_dir, match.filename)
+        logger.info(
+            f"Ảnh gần trùng với '{match.filename}' (hash: {match.hash_distance} bit, "
+            f"embedding: {match.embedding_distance}). Không lưu."
+        )
+        total_images = await run_in_threadpool(image_catalog.count)
     
     # Tạo response
-    response = CollectResponse(
-        message=f"Đã thu thập ảnh thành công! Tổng số ảnh: {total_images}",
-        saved_path=filepath,
-        total_images=total_images,
-        environment_info=EnvironmentInfo(**env_info)
-    )
+    if match is None:
+        response = CollectResponse(
+            message=f"Đã thu thập ảnh thành công! Tổng số ảnh: {total_images}",
+            saved_path=filepath,
+            total_images=total_images,
+            environment_info=EnvironmentInfo(**env_info)
+        )
+    else:
+        response = CollectResponse(
+            message=(f"Ảnh gần trùng với '{match.filename}' đã thu thập nên không được lưu. "
+                     f"Tổng số ảnh: {total_images}"),
+            saved_path=filepath,
+            total_images=total_images,
+            environment_info=EnvironmentInfo(**env_info),
+            saved=False,
+            duplicate_of=match.filename,
+            hash_distance=match.hash_distance,
+            embedding_distance=match.embedding_distance
+        )
     
     logger.info(f"Thu thập hoàn tất thành công. Tổng số ảnh: {total_images}")
     return response
 
 
-@app.post("/api/v1/train", response_model=TrainResponse)
-async def train_model_endpoint():
+def _store_collected_image(
+    filename: str,
+    image_data: bytes,
+    dhash: int,
+    face_location: Tuple[int, int, int, int],
+    env_info: Dict[str, Any]
+) -> int:
     """
-    Endpoint huấn luyện mô hình cá nhân từ dữ liệu đã thu thập.
-    
-    Returns:
-        TrainResponse: Kết quả huấn luyện với số lượng ảnh và embeddings
-        
-    Validates: Requirements 2.1, 2.2, 2.8
+    Ghi ảnh (atomic) và thêm vào catalog; trả về tổng số ảnh.
+    Nếu không ghi được catalog thì xóa ảnh vừa lưu để thư mục và catalog không lệch nhau.
     """
-    logger.info("Nhận request huấn luyện mô hình")
-    
-    # Kiểm tra thư mục data/raw/user/ tồn tại và không rỗng
-    data_dir = "data/raw/user"
+    stat = image_store.write(filename, image_data)
+    try:
+        return image_catalog.add(CatalogEntry(
+            path=filename,
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            captured_at=time.time(),
+            content_hash=hashlib.sha256(image_data).hexdigest(),
+            dhash=dhash,
+            face_box=tuple(face_location),
+            environment=env_info
+        ))
+    except Exception:
+        filepath = os.path.join(image_store.data_dir, filename)
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+
+
+def _check_training_data() -> None:
+    """
+    Kiểm tra thư mục data/raw/user/ tồn tại và có ảnh; HTTPException 400 nếu không.
+    Số ảnh đọc từ catalog (không quét thư mục); có thể phải đối chiếu catalog nên được gọi
+    trong threadpool.
+    """
+    data_dir = image_catalog.data_dir
     
     if not os.path.exists(data_dir) or not os.path.isdir(data_dir):
         logger.error(f"Thư mục '{data_dir}/' không tồn tại")
@@ -252,47 +743,128 @@ async def train_model_endpoint():
         )
     
     # Kiểm tra thư mục có ảnh không
-    valid_extensions = {'.jpg', '.jpeg', '.png'}
-    image_files = [
-        f for f in os.listdir(data_dir)
-        if os.path.isfile(os.path.join(data_dir, f)) and
-        os.path.splitext(f.lower())[1] in valid_extensions
-    ]
+    num_images = image_catalog.count()
     
-    if len(image_files) == 0:
+    if num_images == 0:
         logger.error(f"Không tìm thấy ảnh nào trong thư mục '{data_dir}/'")
         raise HTTPException(
             status_code=400,
             detail=f"Không tìm thấy ảnh nào trong thư mục '{data_dir}/'. Vui lòng thu thập ảnh trước khi huấn luyện."
         )
     
-    logger.info(f"Tìm thấy {len(image_files)} ảnh trong thư mục '{data_dir}/'")
+    logger.info(f"Tìm thấy {num_images} ảnh trong thư mục '{data_dir}/'")
+
+
+def _training_job_message(job: Dict[str, Any]) -> str:
+    """
+    Mô tả trạng thái job huấn luyện bằng tiếng Việt.
+    """
+    status = job["status"]
+    if status == training_jobs_module.STATUS_QUEUED:
+        return "Job huấn luyện đang chờ bắt đầu."
+    if status == training_jobs_module.STATUS_RUNNING:
+        if job.get("total"):
+            return f"Đang huấn luyện: đã xử lý {job['processed']}/{job['total']} ảnh."
+        return "Đang huấn luyện."
+    if status == training_jobs_module.STATUS_SUCCEEDED:
+        return (f"Huấn luyện hoàn tất thành công! Đã sử dụng "
+                f"{job['num_embeddings']}/{job['num_images']} ảnh.")
+    if status == training_jobs_module.STATUS_INTERRUPTED:
+        return "Job huấn luyện bị gián đoạn. Vui lòng chạy lại."
+    return f"Huấn luyện thất bại: {job.get('error')}"
+
+
+def _training_job_response(job: Dict[str, Any]) -> TrainingJobResponse:
+    # Các trường nội bộ của job (updated_at, error_type) bị bỏ qua khi tạo model
+    return TrainingJobResponse(message=_training_job_message(job), **job)
+
+
+@app.post("/api/v1/train", response_model=TrainResponse)
+async def train_model_endpoint():
+    """
+    Endpoint huấn luyện mô hình cá nhân từ dữ liệu đã thu thập (chờ tới khi xong).
+    
+    Huấn luyện chạy như một job nền (xem /api/v1/train/jobs); nếu đang có job chạy,
+    request được gộp vào job đó thay vì huấn luyện lần nữa.
     
-    # Gọi hàm huấn luyện
-    # FileNotFoundError và ValueError sẽ được xử lý bởi exception handlers
-    try:
-        num_images, num_embeddings = train_personal_model()
-        
-        # Tạo response
-        response = TrainResponse(
-            message=f"Huấn luyện hoàn tất thành công! Đã sử dụng {num_embeddings}/{num_images} ảnh.",
-            num_images=num_images,
-            num_embeddings=num_embeddings
-        )
-        
-        logger.info(f"Huấn luyện hoàn tất: {num_images} ảnh, {num_embeddings} embeddings")
-        return response
+    Returns:
+        TrainResponse: Kết quả huấn luyện với số lượng ảnh và embeddings
         
-    except (FileNotFoundError, ValueError) as e:
-        # Re-raise để exception handler xử lý
-        logger.error(f"Lỗi khi huấn luyện: {str(e)}")
-        raise
+    Validates: Requirements 2.1, 2.2, 2.8
+    """
+    logger.info("Nhận request huấn luyện mô hình")
+    
+    # Kiểm tra thư mục data/raw/user/ tồn tại và không rỗng
+    await run_in_threadpool(_check_training_data)
+    
+    job, _ = await run_in_threadpool(training_jobs.submit)
+    # Theo dõi bằng asyncio.sleep (job ở worker này hoặc ở worker process khác, qua file trạng thái):
+    # không giữ một slot threadpool suốt thời gian huấn luyện
+    while job is not None and job["status"] in training_jobs_module.ACTIVE_STATUSES:
+        await asyncio.sleep(TRAINING_JOB_POLL_SECONDS)
+        job = await run_in_threadpool(training_jobs.get, job["job_id"])
+    
+    if job is None or job["status"] != training_jobs_module.STATUS_SUCCEEDED:
+        error = job.get("error") if job else None
+        logger.error(f"Lỗi khi huấn luyện: {error}")
+        # FileNotFoundError và ValueError sẽ được xử lý bởi exception handlers
+        if job and job.get("error_type") == "FileNotFoundError":
+            raise FileNotFoundError(error)
+        raise ValueError(error or "Huấn luyện thất bại.")
+    
+    num_images, num_embeddings = job["num_images"], job["num_embeddings"]
+    response = TrainResponse(
+        message=f"Huấn luyện hoàn tất thành công! Đã sử dụng {num_embeddings}/{num_images} ảnh.",
+        num_images=num_images,
+        num_embeddings=num_embeddings
+    )
+    
+    logger.info(f"Huấn luyện hoàn tất: {num_images} ảnh, {num_embeddings} embeddings")
+    return response
+
+
+@app.post("/api/v1/train/jobs", response_model=TrainingJobResponse, status_code=202)
+async def create_training_job():
+    """
+    Bắt đầu huấn luyện ở background và trả về job id ngay.
+    
+    Nếu đang có job huấn luyện chạy, trả về job đó (các yêu cầu đồng thời được gộp lại).
+    
+    Returns:
+        TrainingJobResponse: Trạng thái job (theo dõi qua GET /api/v1/train/jobs/{job_id})
+    """
+    logger.info("Nhận request tạo job huấn luyện")
+    await run_in_threadpool(_check_training_data)
+    job, _ = await run_in_threadpool(training_jobs.submit)
+    return _training_job_response(job)
+
+
+@app.get("/api/v1/train/jobs", response_model=List[TrainingJobResponse])
+async def list_training_jobs(limit: int = Query(default=20, ge=1, le=training_jobs_module.MAX_STORED_JOBS)):
+    """
+    Các job huấn luyện gần nhất (mới nhất trước).
+    """
+    jobs = await run_in_threadpool(training_jobs.recent, limit)
+    return [_training_job_response(job) for job in jobs]
+
+
+@app.get("/api/v1/train/jobs/{job_id}", response_model=TrainingJobResponse)
+async def get_training_job(job_id: str):
+    """
+    Trạng thái và tiến độ của một job huấn luyện: số ảnh đã xử lý / bỏ qua / lỗi và ETA.
+    """
+    job = await run_in_threadpool(training_jobs.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy job huấn luyện '{job_id}'.")
+    return _training_job_response(job)
 
 
 @app.post("/api/v1/face/verify", response_model=VerifyResponse)
 async def verify_face(
     file: UploadFile = File(...),
-    threshold: float = Query(default=0.5, ge=0.0, le=1.0)
+    threshold: float = Query(default=0.5, ge=0.0, le=1.0),
+    top_k: int = Query(default=0, ge=0, le=100),
+    detector: Optional[str] = Query(default=None, description=DETECTOR_QUERY_DESCRIPTION)
 ):
     """
     Endpoint xác thực khuôn mặt.
@@ -300,94 +872,56 @@ async def verify_face(
     Args:
         file: File ảnh upload (jpg, jpeg, png)
         threshold: Ngưỡng so sánh (0.0 - 1.0), mặc định 0.5
+        top_k: Số ảnh huấn luyện gần nhất trả về trong top_matches (0 = không trả về)
+        detector: Detector khuôn mặt (mặc định FACE_DETECTOR)
         
     Returns:
         VerifyResponse: Kết quả xác thực với thông tin chi tiết
         
     Validates: Requirements 3.1, 3.2, 3.3, 3.4, 3.5, 3.6, 4.1, 4.2, 4.3, 5.1-5.7
     """
-    logger.info(f"Nhận request xác thực khuôn mặt: filename={file.filename}, content_type={file.content_type}, threshold={threshold}")
+    # Thời gian nhận body + parse multipart (trước khi vào endpoint)
+    metrics.mark_since_request_start("multipart")
     
-    # Validation content-type
-    valid_content_types = {"image/jpeg", "image/jpg", "image/png"}
-    if file.content_type not in valid_content_types:
-        logger.warning(f"Content-type không hợp lệ: {file.content_type}")
-        raise HTTPException(
-            status_code=400,
-            detail="File upload phải là ảnh (.jpg, .jpeg, .png)."
-        )
-    
-    # Đọc file bytes
-    file_bytes = await file.read()
-    file_size = len(file_bytes)
-    
-    # Kiểm tra kích thước file (max 10MB)
-    if file_size > MAX_FILE_SIZE:
-        logger.warning(f"File quá lớn: {file_size} bytes (max: {MAX_FILE_SIZE} bytes)")
-        raise HTTPException(
-            status_code=400,
-            detail=f"File quá lớn. Kích thước tối đa cho phép là {MAX_FILE_SIZE // (1024*1024)}MB."
-        )
-    
-    logger.info(f"Kích thước file: {file_size} bytes")
+    logger.info(f"Nhận request xác thực khuôn mặt: filename={file.filename}, content_type={file.content_type}, threshold={threshold}")
+    _check_detector(detector)
     
-    # Validation bằng magic bytes
-    if not validate_image_magic_bytes(file_bytes):
-        logger.warning("File không phải là ảnh hợp lệ (magic bytes validation failed)")
-        raise HTTPException(
-            status_code=400,
-            detail="File không phải là ảnh hợp lệ. Vui lòng upload file ảnh thật (.jpg, .jpeg, .png)."
-        )
+    # Validation content-type, kích thước và magic bytes
+    file_bytes = await _read_validated_upload(file)
     
-    # Chuyển đổi bytes thành ảnh BGR
+    # Decode, trích xuất embedding và phân tích môi trường trong executor
     # ValueError will be caught by exception handler
-    logger.info("Đang đọc và decode ảnh...")
-    image_bgr = read_image_from_upload(file_bytes)
-    
-    # Lấy kích thước ảnh
-    height, width = image_bgr.shape[:2]
-    logger.info(f"Kích thước ảnh: {width}x{height}")
-    
-    # Chuyển đổi BGR sang RGB (face_recognition yêu cầu RGB)
-    image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+    processed = await _run_face_pipeline(file_bytes, detector=detector)
+    unknown_encoding = processed["encoding"]
+    face_location = processed["face_location"]
+    env_info = processed["env_info"]
+    width, height = processed["width"], processed["height"]
     
-    # Trích xuất face embedding và location
-    # ValueError will be caught by exception handler
-    logger.info("Đang trích xuất face embedding...")
-    unknown_encoding, face_location = extract_single_face_encoding(image_rgb)
-    logger.info(f"Đã trích xuất face embedding thành công. Face location: {face_location}")
-    
-    # Phân tích môi trường
-    logger.info("Đang phân tích môi trường...")
-    env_info = analyze_environment(image_bgr, face_location)
-    logger.info(f"Kết quả phân tích môi trường: brightness={env_info['brightness']:.1f}, "
-                f"blur_score={env_info['blur_score']:.1f}, "
-                f"face_size_ratio={env_info['face_size_ratio']:.3f}")
-    
-    # Lấy dữ liệu huấn luyện từ cache
+    # Lấy mô hình đang phục vụ (snapshot, không đổi trong suốt request)
     # FileNotFoundError will be caught by exception handler
-    known_encodings, used_files = get_known_faces_cache()
-    logger.info(f"Đang so sánh với {len(known_encodings)} ảnh huấn luyện...")
+    model = await run_in_threadpool(_serving_model)
+    gallery, used_files = model.gallery, model.used_files
+    logger.info(f"Đang so sánh với {len(gallery)} ảnh huấn luyện (mô hình {model.version})...")
     
-    # So sánh với dữ liệu đã học
-    is_match, best_distance = compare_with_known_faces(
-        unknown_encoding,
-        known_encodings,
-        threshold
-    )
+    with metrics.stage("compare"):
+
+        # So sánh với dữ liệu đã học
+        is_match, best_distance = compare_with_known_faces(
+            unknown_encoding,
+            gallery,
+            threshold
+        )
+        
+        top_matches = None
+        if top_k > 0:
+            top_matches = [
+                MatchInfo(index=index, filename=used_files[index], distance=round(distance, 3))
+                for index, distance in find_top_k_matches(unknown_encoding, gallery, top_k)
+            ]
     logger.info(f"Kết quả so sánh: is_match={is_match}, distance={best_distance:.3f}, threshold={threshold}")
     
     # Tạo message bằng tiếng Việt
-    if is_match:
-        message = (
-            f"Đây là KHUÔN MẶT CỦA BẠN "
-            f"(khoảng cách = {best_distance:.3f} ≤ ngưỡng {threshold:.3f})."
-        )
-    else:
-        message = (
-            f"Đây KHÔNG PHẢI khuôn mặt của bạn "
-            f"(khoảng cách = {best_distance:.3f} > ngưỡng {threshold:.3f})."
-        )
+    message = _build_match_message(is_match, best_distance, threshold)
     
     # Tạo response
     top, right, bottom, left = face_location
@@ -408,11 +942,418 @@ async def verify_face(
             height=height
         ),
         environment_info=EnvironmentInfo(**env_info),
-        training_info=TrainingInfo(
-            num_images=len(used_files),
-            used_files_sample=used_files[:10]  # Chỉ lấy 10 file đầu tiên
-        )
+        training_info=_training_info(model),
+        top_matches=top_matches
     )
     
     logger.info(f"Xác thực hoàn tất thành công: {message}")
     return response
+
+
+
+async def _process_batch_item(file: UploadFile, detector: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Validate và xử lý một ảnh trong batch.
+    
+    Returns:
+        Kết quả của _process_face_image, hoặc {"error": message} nếu ảnh lỗi
+    """
+    try:
+        file_bytes = await _read_validated_upload(file)
+        return await _run_face_pipeline(file_bytes, detector=detector)
+    except HTTPException as e:
+        return {"error": str(e.detail)}
+    except ValueError as e:
+        logger.warning(f"Lỗi khi xử lý ảnh '{file.filename}' trong batch: {str(e)}")
+        return {"error": str(e)}
+    except Exception as e:
+        logger.error(f"Lỗi không mong muốn khi xử lý ảnh '{file.filename}' trong batch: {str(e)}",
+                     exc_info=True)
+        return {"error": f"Lỗi nội bộ: {str(e)}"}
+
+
+@app.post("/api/v1/face/verify/batch", response_model=BatchVerifyResponse)
+async def verify_face_batch(
+    files: List[UploadFile] = File(...),
+    threshold: float = Query(default=0.5, ge=0.0, le=1.0),
+    detector: Optional[str] = Query(default=None, description=DETECTOR_QUERY_DESCRIPTION)
+):
+    """
+    Endpoint xác thực nhiều ảnh trong một request.
+    
+    Các ảnh được decode và detect song song trong executor, sau đó toàn bộ
+    embeddings được so sánh với dữ liệu huấn luyện bằng một phép tính ma trận.
+    Ảnh lỗi không làm hỏng cả batch mà được trả về với trường error.
+    
+    Args:
+        files: Danh sách file ảnh upload (jpg, jpeg, png)
+        threshold: Ngưỡng so sánh (0.0 - 1.0), mặc định 0.5
+        detector: Detector khuôn mặt (mặc định FACE_DETECTOR)
+        
+    Returns:
+        BatchVerifyResponse: Kết quả cho từng ảnh theo đúng thứ tự upload
+    """
+    # Thời gian nhận body + parse multipart (trước khi vào endpoint)
+    metrics.mark_since_request_start("multipart")
+    
+    logger.info(f"Nhận request xác thực batch: {len(files)} ảnh, threshold={threshold}")
+    _check_detector(detector)
+    
+    if len(files) > config.MAX_BATCH_SIZE:
+        logger.warning(f"Batch quá lớn: {len(files)} ảnh (max: {config.MAX_BATCH_SIZE})")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch quá lớn. Số ảnh tối đa cho phép là {config.MAX_BATCH_SIZE}."
+        )
+    
+    # Lấy mô hình đang phục vụ (một snapshot cho cả batch)
+    # FileNotFoundError will be caught by exception handler
+    model = await run_in_threadpool(_serving_model)
+    
+    # Decode + detect song song
+    processed_items = await asyncio.gather(*(_process_batch_item(f, detector) for f in files))
+    
+    # So sánh tất cả embeddings hợp lệ trong một lần
+    valid_indices = [i for i, item in enumerate(processed_items) if "error" not in item]
+    is_match_arr, distances = np.zeros(0, dtype=bool), np.zeros(0)
+    if valid_indices:
+        unknown_encodings = np.vstack([processed_items[i]["encoding"] for i in valid_indices])
+        with metrics.stage("compare"):
+            is_match_arr, distances = compare_batch_with_known_faces(
+                unknown_encodings,
+                model.gallery,
+                threshold
+            )
+    match_by_index = {
+        idx: (bool(is_match_arr[pos]), float(distances[pos]))
+        for pos, idx in enumerate(valid_indices)
+    }
+    
+    results = []
+    for i, (file, item) in enumerate(zip(files, processed_items)):
+        if "error" in item:
+            results.append(BatchVerifyItem(index=i, filename=file.filename, error=item["error"]))
+            continue
+        
+        is_match, best_distance = match_by_index[i]
+        top, right, bottom, left = item["face_location"]
+        results.append(BatchVerifyItem(
+            index=i,
+            filename=file.filename,
+            is_match=is_match,
+            distance=round(best_distance, 3),
+            message=_build_match_message(is_match, best_distance, threshold),
+            face_box=FaceBox(top=top, right=right, bottom=bottom, left=left),
+            image_size=ImageSize(width=item["width"], height=item["height"]),
+            environment_info=EnvironmentInfo(**item["env_info"])
+        ))
+    
+    num_failed = len(files) - len(valid_indices)
+    num_matched = sum(1 for r in results if r.is_match)
+    logger.info(f"Xác thực batch hoàn tất: {num_matched} khớp, {num_failed} lỗi / {len(files)} ảnh")
+    
+    return BatchVerifyResponse(
+        threshold=threshold,
+        num_images=len(files),
+        num_matched=num_matched,
+        num_failed=num_failed,
+        results=results,
+        training_info=_training_info(model)
+    )
+
+
+def _process_stream_frame(tracker: FaceTracker, frame_bytes: bytes) -> Tuple[Dict[str, Any], FaceTracker]:
+    """
+    Xử lý một frame của luồng WebSocket: decode rồi bám / detect khuôn mặt và tính embedding
+    khi cần (FaceTracker). Được chạy trong executor.
+    
+    Trả về cả tracker đã cập nhật để trạng thái được giữ lại khi chạy trong process executor.
+    
+    Returns:
+        (kết quả, tracker): kết quả chứa encoding, face_location, width, height, detected,
+        tracked, reencoded; hoặc chỉ error nếu frame lỗi
+    """
+    try:
+        image_bgr = read_image_from_upload(frame_bytes, max_dimension=config.DECODE_MAX_DIMENSION)
+        height, width = image_bgr.shape[:2]
+        scale = _decoded_scale(frame_bytes, width, height) if config.DECODE_MAX_DIMENSION else 1.0
+        result = tracker.update(image_bgr)
+    except ValueError as e:
+        return {"error": str(e)}, tracker
+    
+    if scale != 1.0:
+        result["face_location"] = _scale_face_location(result["face_location"], scale, width, height)
+        width, height = int(round(width * scale)), int(round(height * scale))
+    result["width"], result["height"] = width, height
+    return result, tracker
+
+
+async def _receive_stream_frames(websocket: WebSocket, slot: LatestFrameSlot) -> None:
+    """
+    Nhận frame từ client vào slot (chỉ giữ frame mới nhất) cho tới khi client ngắt kết nối.
+    Message dạng text được đưa vào slot với dữ liệu None để báo lỗi cho frame đó.
+    """
+    sequence = 0
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            slot.put((sequence, message.get("bytes")))
+            sequence += 1
+    finally:
+        slot.close()
+
+
+def _validate_stream_frame(frame_bytes: Any) -> str:
+    """
+    Kiểm tra một frame của luồng WebSocket; trả về thông báo lỗi hoặc chuỗi rỗng nếu hợp lệ.
+    """
+    if not frame_bytes:
+        return "Frame phải là dữ liệu ảnh nhị phân (JPEG/PNG)."
+    if len(frame_bytes) > MAX_FILE_SIZE:
+        return f"Frame quá lớn. Kích thước tối đa cho phép là {MAX_FILE_SIZE // (1024*1024)}MB."
+    if not validate_image_magic_bytes(frame_bytes):
+        return "Frame không phải là ảnh hợp lệ (JPEG/PNG)."
+    return ""
+
+
+@app.websocket("/api/v1/face/verify/stream")
+async def verify_face_stream(
+    websocket: WebSocket,
+    threshold: float = Query(default=0.5, ge=0.0, le=1.0),
+    detector: Optional[str] = Query(default=None)
+):
+    """
+    Xác thực liên tục qua WebSocket.
+    
+    Client gửi mỗi frame là một message nhị phân (JPEG/PNG); server trả về một message JSON
+    (StreamVerifyFrame) cho mỗi frame đã xử lý. Khuôn mặt được bám giữa các frame nên detector
+    đầy đủ chỉ chạy mỗi FACE_STREAM_DETECT_EVERY frame hoặc khi mất dấu; embedding được dùng
+    lại khi vùng mặt gần như không đổi. Nếu client gửi nhanh hơn tốc độ xử lý, các frame cũ
+    chưa xử lý bị bỏ qua (dropped_frames) và chỉ frame mới nhất được xử lý.
+    
+    Args:
+        websocket: Kết nối WebSocket
+        threshold: Ngưỡng so sánh (0.0 - 1.0), mặc định 0.5
+        detector: Detector khuôn mặt khi detect đầy đủ (mặc định FACE_DETECTOR)
+    """
+    await websocket.accept()
+    logger.info(f"Mở luồng xác thực WebSocket: threshold={threshold}, detector={detector}")
+    
+    try:
+        if detector is not None:
+            get_detector(detector)
+        await run_in_threadpool(_serving_model)
+    except (FileNotFoundError, ValueError) as e:
+        logger.warning(f"Không mở được luồng xác thực: {str(e)}")
+        await websocket.send_json(jsonable_encoder(StreamVerifyFrame(frame=-1, threshold=threshold, error=str(e))))
+        await websocket.close(code=1011)
+        return
+    
+    slot = LatestFrameSlot()
+    receiver = asyncio.create_task(_receive_stream_frames(websocket, slot))
+    tracker = FaceTracker(detector=detector)
+    processed_frames = 0
+    
+    try:
+        while True:
+            item = await slot.get()
+            if item is None:
+                break
+            sequence, frame_bytes = item
+            start = time.perf_counter()
+            
+            error = _validate_stream_frame(frame_bytes)
+            if error:
+                result = {"error": error}
+            else:
+                result, tracker = await run_in_executor(_process_stream_frame, tracker, frame_bytes)
+            
+            if "error" not in result:
+                # Snapshot mô hình hiện tại (theo kịp huấn luyện / hot reload); việc nạp lại mô hình
+                # chạy trong threadpool, lỗi nạp chỉ làm hỏng frame này
+                try:
+                    model = await run_in_threadpool(_serving_model)
+                except (FileNotFoundError, ValueError) as e:
+                    logger.warning(f"Không lấy được mô hình cho frame {sequence}: {str(e)}")
+                    result = {"error": str(e)}
+            
+            if "error" in result:
+                frame = StreamVerifyFrame(
+                    frame=sequence,
+                    threshold=threshold,
+                    dropped_frames=slot.dropped,
+                    error=result["error"]
+                )
+            else:
+                is_match, best_distance = compare_with_known_faces(
+                    result["encoding"],
+                    model.gallery,
+                    threshold
+                )
+                top, right, bottom, left = result["face_location"]
+                frame = StreamVerifyFrame(
+                    frame=sequence,
+                    is_match=is_match,
+                    distance=round(best_distance, 3),
+                    threshold=threshold,
+                    message=_build_match_message(is_match, best_distance, threshold),
+                    face_box=FaceBox(top=top, right=right, bottom=bottom, left=left),
+                    image_size=ImageSize(width=result["width"], height=result["height"]),
+                    detected=result["detected"],
+                    tracked=result["tracked"],
+                    reencoded=result["reencoded"],
+                    dropped_frames=slot.dropped
+                )
+            
+            frame.processing_ms = round((time.perf_counter() - start) * 1000, 1)
+            await websocket.send_json(jsonable_encoder(frame))
+            processed_frames += 1
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        logger.info(f"Đóng luồng xác thực WebSocket: {processed_frames} frame đã xử lý, "
+                    f"{slot.dropped} frame bị bỏ qua")
+
+
+
+@app.post("/api/v1/face/identify", response_model=IdentifyResponse)
+async def identify_face(
+    file: UploadFile = File(...),
+    threshold: float = Query(default=0.5, ge=0.0, le=1.0),
+    top_k: int = Query(default=5, ge=1, le=50),
+    detector: Optional[str] = Query(default=None, description=DETECTOR_QUERY_DESCRIPTION)
+):
+    """
+    Endpoint nhận dạng khuôn mặt 1:N trên gallery nhiều danh tính.
+    
+    Args:
+        file: File ảnh upload (jpg, jpeg, png)
+        threshold: Ngưỡng so sánh (0.0 - 1.0), mặc định 0.5
+        top_k: Số danh tính gần nhất trả về, mặc định 5
+        detector: Detector khuôn mặt (mặc định FACE_DETECTOR)
+        
+    Returns:
+        IdentifyResponse: Danh tính khớp nhất (nếu có) và danh sách ứng viên
+    """
+    # Thời gian nhận body + parse multipart (trước khi vào endpoint)
+    metrics.mark_since_request_start("multipart")
+    
+    logger.info(f"Nhận request nhận dạng 1:N: filename={file.filename}, threshold={threshold}, top_k={top_k}")
+    _check_detector(detector)
+    
+    file_bytes = await _read_validated_upload(file)
+    
+    processed = await _run_face_pipeline(file_bytes, detector=detector)
+    
+    # FileNotFoundError will be caught by exception handler
+    gallery = await run_in_threadpool(get_identity_gallery)
+    with metrics.stage("search"):
+        matches = await run_in_threadpool(gallery.identify, processed["encoding"], top_k)
+    
+    candidates = [
+        IdentifyCandidate(
+            identity=identity,
+            distance=round(distance, 3),
+            is_match=distance <= threshold,
+            filename=filename
+        )
+        for identity, distance, filename in matches
+    ]
+    
+    best = candidates[0] if candidates else None
+    is_match = best is not None and best.is_match
+    if is_match:
+        message = f"Nhận dạng: {best.identity} (khoảng cách = {matches[0][1]:.3f} ≤ ngưỡng {threshold:.3f})."
+    else:
+        message = "Không tìm thấy danh tính nào khớp với khuôn mặt trong ảnh."
+    logger.info(f"Kết quả nhận dạng: {message}")
+    
+    top, right, bottom, left = processed["face_location"]
+    return IdentifyResponse(
+        is_match=is_match,
+        identity=best.identity if is_match else None,
+        threshold=threshold,
+        message=message,
+        candidates=candidates,
+        face_box=FaceBox(top=top, right=right, bottom=bottom, left=left),
+        image_size=ImageSize(width=processed["width"], height=processed["height"]),
+        environment_info=EnvironmentInfo(**processed["env_info"]),
+        gallery_size=len(gallery),
+        num_identities=gallery.num_identities
+    )
+
+
+def _store_enrolled_image(
+    identity: str,
+    filename: str,
+    image_data: bytes,
+    encoding: np.ndarray
+) -> identity_gallery.IdentityGallery:
+    """
+    Ghi ảnh (atomic) vào data/identities/<identity>/ rồi thêm embedding vào gallery.
+    Nếu không thêm được vào gallery thì xóa ảnh vừa lưu để thư mục và gallery không lệch nhau.
+    """
+    identity_dir = os.path.join(identity_gallery.IDENTITY_DATA_DIR, identity)
+    os.makedirs(identity_dir, exist_ok=True)
+    filepath = os.path.join(identity_dir, filename)
+    write_file_atomic(filepath, image_data)
+    try:
+        return enroll_embedding(encoding, identity, os.path.join(identity, filename))
+    except Exception:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        raise
+
+
+@app.post("/api/v1/identities/{identity}/enroll", response_model=EnrollResponse)
+async def enroll_identity(
+    identity: str,
+    file: UploadFile = File(...)
+):
+    """
+    Endpoint đăng ký thêm một ảnh cho danh tính trong gallery 1:N.
+    Embedding được insert tăng dần vào IVF index (chỉ chia lại cụm khi gallery đã lớn nhiều).
+    
+    Args:
+        identity: Tên danh tính (chữ, số, '_' hoặc '-', tối đa 64 ký tự)
+        file: File ảnh upload (jpg, jpeg, png)
+        
+    Returns:
+        EnrollResponse: Đường dẫn ảnh đã lưu và kích thước gallery
+    """
+    if not IDENTITY_NAME_PATTERN.fullmatch(identity):
+        raise HTTPException(
+            status_code=400,
+            detail="Tên danh tính chỉ được chứa chữ, số, '_' hoặc '-' (tối đa 64 ký tự)."
+        )
+    
+    # Thời gian nhận body + parse multipart (trước khi vào endpoint)
+    metrics.mark_since_request_start("multipart")
+    
+    logger.info(f"Nhận request đăng ký danh tính: identity={identity}, filename={file.filename}")
+    
+    file_bytes = await _read_validated_upload(file)
+    processed = await _run_face_pipeline(file_bytes)
+    
+    # Lưu ảnh gốc vào data/identities/<identity>/ và thêm embedding vào gallery
+    filename = f"{identity}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}{image_extension(file_bytes)}"
+    filepath = os.path.join(identity_gallery.IDENTITY_DATA_DIR, identity, filename)
+    gallery = await run_in_threadpool(
+        _store_enrolled_image,
+        identity,
+        filename,
+        file_bytes,
+        processed["encoding"]
+    )
+    logger.info(f"Đã đăng ký ảnh cho '{identity}'. Gallery: {len(gallery)} embeddings")
+    
+    return EnrollResponse(
+        message=f"Đã đăng ký ảnh cho danh tính '{identity}'.",
+        identity=identity,
+        saved_path=filepath,
+        gallery_size=len(gallery),
+        num_identities=gallery.num_identities
+    )
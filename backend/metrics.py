@@ -0,0 +1,354 @@
+"""
+Metrics module.
+Bộ đếm / histogram nhẹ (không phụ thuộc thư viện ngoài) xuất theo định dạng text của Prometheus
+trên /metrics, và bộ đo thời gian từng giai đoạn xử lý cho header Server-Timing.
+
+Đo theo giai đoạn:
+    with metrics.collect_stages() as timer:     # trong hàm chạy ở executor
+        with metrics.stage("decode"):
+            ...
+    return {..., "timings": timer.stages}
+
+    metrics.record_stages(result["timings"])    # trong endpoint (event loop)
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Bucket (giây) cho histogram thời gian: từ 1ms tới 10s
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} cần labels {self.labelnames}, nhận được {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """
+    Bộ đếm tăng dần.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Histogram với bucket cố định (số đếm tích luỹ theo chuẩn Prometheus khi render).
+    """
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [số đếm theo bucket (không tích luỹ, phần tử cuối = +Inf), tổng, số lần]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels: str) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            items = sorted((key, ([*counts], total, n)) for key, (counts, total, n) in self._series.items())
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Gauge đọc giá trị qua callback lúc render (ví dụ kích thước gallery).
+    Callback trả về None thì bỏ qua giá trị đó.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Optional[float]]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            value = self.callback()
+        except Exception:
+            value = None
+        lines = self._header()
+        if value is not None:
+            lines.append(f"{self.name} {_format_value(value)}")
+        return lines
+
+
+class Registry:
+    """
+    Tập metrics được xuất trên /metrics.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge(name: str, documentation: str, callback: Callable[[], Optional[float]]) -> Gauge:
+    return REGISTRY.register(Gauge(name, documentation, callback))
+
+
+# ============================================================================
+# Metrics dùng chung
+# ============================================================================
+
+HTTP_REQUESTS = counter(
+    "face_http_requests_total", "Số HTTP request theo route, method và status.", ("route", "method", "status")
+)
+HTTP_REQUEST_SECONDS = histogram(
+    "face_http_request_duration_seconds", "Thời gian xử lý HTTP request (giây).", ("route",)
+)
+STAGE_SECONDS = histogram(
+    "face_stage_duration_seconds", "Thời gian từng giai đoạn xử lý trong một request (giây).", ("route", "stage")
+)
+GALLERY_CACHE_LOOKUPS = counter(
+    "face_gallery_cache_lookups_total", "Số lần tra cache FaceGallery theo kết quả (hit/miss).", ("result",)
+)
+EMBEDDING_CACHE_LOOKUPS = counter(
+    "face_embedding_cache_lookups_total", "Số lần tra embedding cache khi huấn luyện (hit/miss).", ("result",)
+)
+COLLECT_DEDUP_DECISIONS = counter(
+    "face_collect_dedup_decisions_total", "Kết quả kiểm tra ảnh gần trùng khi thu thập (saved/duplicate).", ("result",)
+)
+
+
+# ============================================================================
+# Đo thời gian theo giai đoạn
+# ============================================================================
+
+class StageTimer:
+    """
+    Tổng thời gian (giây) của từng giai đoạn, giữ thứ tự xuất hiện.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def merge(self, stages: Dict[str, float]) -> None:
+        for name, seconds in stages.items():
+            self.add(name, seconds)
+
+
+_current_timer: ContextVar[Optional[StageTimer]] = ContextVar("face_stage_timer", default=None)
+
+
+@contextmanager
+def collect_stages() -> Iterator[StageTimer]:
+    """
+    Gắn một StageTimer mới cho context hiện tại (dùng trong hàm chạy ở executor).
+    """
+    timer = StageTimer()
+    token = _current_timer.set(timer)
+    try:
+        yield timer
+    finally:
+        _current_timer.reset(token)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Đo thời gian một giai đoạn vào StageTimer của context hiện tại (không làm gì nếu không có).
+    """
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def record_stages(stages: Optional[Dict[str, float]]) -> None:
+    """
+    Gộp thời gian các giai đoạn (ví dụ trả về từ executor) vào StageTimer của request hiện tại.
+    """
+    timer = _current_timer.get()
+    if timer is not None and stages:
+        timer.merge(stages)
+
+
+def mark_since_request_start(name: str) -> None:
+    """
+    Ghi giai đoạn từ lúc request bắt đầu tới hiện tại, ví dụ nhận body + parse multipart
+    (FastAPI làm trước khi gọi endpoint).
+    """
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.add(name, time.perf_counter() - timer.started_at)
+
+
+def format_server_timing(stages: Dict[str, float], total: Optional[float] = None) -> str:
+    """
+    Header Server-Timing: "decode;dur=12.3, detect;dur=410.2, total;dur=450.0" (mili giây).
+    """
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    endpoint = scope.get("endpoint")
+    return getattr(endpoint, "__name__", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: tạo StageTimer cho mỗi HTTP request, thêm header Server-Timing
+    và ghi số request / thời gian xử lý / thời gian từng giai đoạn vào histogram.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timer = StageTimer()
+        start = timer.started_at
+        token = _current_timer.set(timer)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                header = format_server_timing(timer.stages, time.perf_counter() - start)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", header.encode("latin-1")))
+                headers.append((b"timing-allow-origin", b"*"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_timer.reset(token)
+            elapsed = time.perf_counter() - start
+            route = _route_label(scope)
+            HTTP_REQUESTS.inc(route=route, method=scope.get("method", ""), status=str(status["code"]))
+            HTTP_REQUEST_SECONDS.observe(elapsed, route=route)
+            for name, seconds in timer.stages.items():
+                STAGE_SECONDS.observe(seconds, route=route, stage=name)
@@ -0,0 +1,267 @@
+"""
+Model artifact module.
+Một file duy nhất, có phiên bản, chứa mô hình cá nhân đã huấn luyện: embeddings (float32 hoặc
+float16), mean embedding, bình phương chuẩn tính sẵn, tên file nguồn, settings detector/encoder
+và checksum. Các section dữ liệu được căn lề để đọc zero-copy qua np.memmap, nên tải mô hình
+100k embeddings chỉ tốn vài mili giây.
+
+Định dạng (little-endian):
+    [0:8]    magic b"FACEMODL"
+    [8:12]   uint32 phiên bản định dạng
+    [12:16]  uint32 độ dài header JSON
+    [16:...] header JSON (utf-8), đệm tới bội số của ALIGNMENT
+    sections embeddings, mean, squared_norms, files; mỗi section bắt đầu tại bội số của ALIGNMENT
+"""
+
+import os
+import json
+import time
+import struct
+import hashlib
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+from backend.gallery import FaceGallery
+
+logger = logging.getLogger(__name__)
+
+MODEL_ARTIFACT_PATH = os.path.join("models", "user_model.bin")
+
+MAGIC = b"FACEMODL"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct("<8sII")
+
+# Kiểu dữ liệu được hỗ trợ cho embeddings
+EMBEDDING_DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+@dataclass
+class ModelArtifact:
+    """
+    Mô hình đã huấn luyện. Các mảng là view chỉ đọc trên file đã memmap (khi tải từ đĩa).
+    """
+    embeddings: np.ndarray
+    mean: np.ndarray
+    squared_norms: np.ndarray
+    files: np.ndarray
+    settings: str
+    num_images: int
+    created_at: float
+    checksum: str
+    path: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    @property
+    def dtype(self) -> str:
+        return "float16" if self.embeddings.dtype == np.float16 else "float32"
+
+    def filenames(self) -> List[str]:
+        """
+        Tên file nguồn của từng embedding (decode khi gọi, không giữ trong bộ nhớ).
+        """
+        return [name.decode("utf-8") for name in self.files.tolist()]
+
+    def gallery(self) -> FaceGallery:
+        """
+        FaceGallery dùng chung bộ nhớ với artifact (float32) và bình phương chuẩn đã lưu.
+        Embeddings float16 được chuyển sang float32 (một lần copy).
+        """
+        return FaceGallery.from_arrays(self.embeddings, self.squared_norms, self.filenames())
+
+
+def _section_payload(
+    embeddings: np.ndarray,
+    files: Sequence[str]
+) -> Dict[str, np.ndarray]:
+    matrix32 = embeddings.astype(np.float32)
+    mean = matrix32.mean(axis=0) if len(matrix32) else np.zeros(matrix32.shape[1], np.float32)
+    encoded = [name.encode("utf-8") for name in files]
+    width = max([len(name) for name in encoded] + [1])
+    return {
+        "embeddings": embeddings,
+        "mean": mean.astype("<f4"),
+        "squared_norms": np.einsum("ij,ij->i", matrix32, matrix32).astype("<f4"),
+        "files": np.array(encoded, dtype=f"S{width}"),
+    }
+
+
+def save_model_artifact(
+    embeddings: np.ndarray,
+    files: Sequence[str],
+    settings: str,
+    num_images: int,
+    path: str = MODEL_ARTIFACT_PATH,
+    dtype: str = "float32",
+    metadata: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    Ghi artifact mô hình: ghi ra file tạm cùng thư mục, fsync rồi rename, nên reader
+    không bao giờ thấy file ghi dở.
+
+    Args:
+        embeddings: Ma trận (N, D) embeddings đã trích xuất
+        files: Tên file nguồn của từng embedding
+        settings: Chuỗi settings detector/encoder (extraction_settings_key)
+        num_images: Số ảnh huấn luyện đã đọc
+        path: Đường dẫn artifact
+        dtype: "float32" hoặc "float16" cho embeddings
+        metadata: Thông tin bổ sung (JSON) lưu trong header
+
+    Returns:
+        Checksum (SHA-256 hex) của các section dữ liệu
+
+    Raises:
+        ValueError: Nếu dtype không hỗ trợ hoặc số file không khớp số embedding
+    """
+    if dtype not in EMBEDDING_DTYPES:
+        raise ValueError(f"dtype không hỗ trợ: {dtype!r}. Giá trị hợp lệ: {', '.join(EMBEDDING_DTYPES)}.")
+    matrix = np.ascontiguousarray(np.asarray(embeddings), dtype=EMBEDDING_DTYPES[dtype])
+    if matrix.ndim != 2:
+        raise ValueError(f"Embeddings phải là ma trận 2 chiều (N, D), nhận được shape {matrix.shape}")
+    if len(files) != matrix.shape[0]:
+        raise ValueError(f"Số file ({len(files)}) không khớp số embedding ({matrix.shape[0]})")
+
+    sections = _section_payload(matrix, files)
+
+    # Checksum trên dữ liệu các section theo đúng thứ tự ghi
+    digest = hashlib.sha256()
+    for array in sections.values():
+        digest.update(array.tobytes())
+    checksum = digest.hexdigest()
+
+    # Offset tính từ đầu vùng dữ liệu; header được đệm nên vùng dữ liệu bắt đầu ở bội số ALIGNMENT
+    layout = {}
+    offset = 0
+    for name, array in sections.items():
+        offset = _align(offset)
+        layout[name] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+        offset += array.nbytes
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]),
+        "dtype": dtype,
+        "settings": settings,
+        "num_images": int(num_images),
+        "created_at": time.time(),
+        "checksum": {"algorithm": "sha256", "value": checksum},
+        "metadata": metadata or {},
+        "sections": layout,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in sections.items():
+                f.seek(data_start + layout[name]["offset"])
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    logger.info(f"Đã lưu model artifact ({matrix.shape[0]} embeddings, {dtype}) vào: {path}")
+    return checksum
+
+
+def _read_header(path: str) -> Dict:
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) != _PREAMBLE.size:
+            raise ValueError(f"File mô hình '{path}' bị cắt cụt.")
+        magic, version, header_length = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"File '{path}' không phải model artifact.")
+        if version != FORMAT_VERSION:
+            raise ValueError(
+                f"Model artifact phiên bản {version} không được hỗ trợ (cần {FORMAT_VERSION}). "
+                f"Vui lòng huấn luyện lại mô hình."
+            )
+        header_bytes = f.read(header_length)
+    if len(header_bytes) != header_length:
+        raise ValueError(f"File mô hình '{path}' bị cắt cụt.")
+    header = json.loads(header_bytes.decode("utf-8"))
+    header["data_start"] = _align(_PREAMBLE.size + header_length)
+    return header
+
+
+def load_model_artifact(path: str = MODEL_ARTIFACT_PATH, verify: bool = False) -> ModelArtifact:
+    """
+    Tải artifact mô hình zero-copy: file được memmap một lần (chỉ đọc), mỗi section là
+    một view trên vùng nhớ đó. Dữ liệu chỉ được đọc từ đĩa khi truy cập.
+
+    Args:
+        path: Đường dẫn artifact
+        verify: Kiểm tra checksum (đọc toàn bộ dữ liệu, chậm hơn với mô hình lớn)
+
+    Returns:
+        ModelArtifact
+
+    Raises:
+        FileNotFoundError: Nếu file không tồn tại
+        ValueError: Nếu file hỏng, sai phiên bản hoặc sai checksum
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"File mô hình '{path}' không tồn tại.")
+
+    header = _read_header(path)
+    data_start = header["data_start"]
+    mapped = np.memmap(path, dtype=np.uint8, mode="r")
+
+    arrays = {}
+    for name, section in header["sections"].items():
+        dtype = np.dtype(section["dtype"])
+        shape = tuple(section["shape"])
+        count = int(np.prod(shape)) if shape else 1
+        start = data_start + section["offset"]
+        if start + count * dtype.itemsize > mapped.shape[0]:
+            raise ValueError(f"File mô hình '{path}' bị cắt cụt (section {name}).")
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count, offset=start).reshape(shape)
+
+    checksum = header["checksum"]["value"]
+    if verify:
+        digest = hashlib.sha256()
+        for name in ("embeddings", "mean", "squared_norms", "files"):
+            data = arrays[name].reshape(-1).view(np.uint8)
+            for begin in range(0, data.shape[0], _HASH_CHUNK_SIZE):
+                digest.update(data[begin:begin + _HASH_CHUNK_SIZE])
+        if digest.hexdigest() != checksum:
+            raise ValueError(f"Checksum của file mô hình '{path}' không khớp. Vui lòng huấn luyện lại mô hình.")
+
+    return ModelArtifact(
+        embeddings=arrays["embeddings"],
+        mean=arrays["mean"],
+        squared_norms=arrays["squared_norms"],
+        files=arrays["files"],
+        settings=header["settings"],
+        num_images=header["num_images"],
+        created_at=header["created_at"],
+        checksum=checksum,
+        path=path,
+        metadata=header.get("metadata", {})
+    )
@@ -2,7 +2,7 @@
 Pydantic models for request/response
 This file contains data models for API requests and responses
 """
-from typing import List
+from typing import Any, Dict, List, Optional
 from pydantic import BaseModel
 
 
@@ -29,10 +29,14 @@ class ImageSize(BaseModel):
 class TrainingInfo(BaseModel):
     """
     Thông tin về dữ liệu huấn luyện đã sử dụng.
+    model_version: phiên bản mô hình đang phục vụ (checksum artifact, hoặc "myface-v<N>" khi chưa huấn luyện)
+    model_source: "artifact" (models/user_model.bin) hoặc "myface" (gallery myface/)
     Validates: Requirements 5.7
     """
     num_images: int
     used_files_sample: List[str]
+    model_version: Optional[str] = None
+    model_source: Optional[str] = None
 
 
 class EnvironmentInfo(BaseModel):
@@ -53,12 +57,18 @@ class EnvironmentInfo(BaseModel):
 class CollectResponse(BaseModel):
     """
     Response cho API thu thập dữ liệu khuôn mặt.
+    Nếu ảnh gần trùng với một ảnh đã lưu (tham số dedupe), ảnh không được lưu: saved là False
+    và saved_path là đường dẫn ảnh đã lưu trước đó.
     Validates: Requirements 1.11
     """
     message: str
     saved_path: str
     total_images: int
     environment_info: EnvironmentInfo
+    saved: bool = True
+    duplicate_of: Optional[str] = None
+    hash_distance: Optional[int] = None
+    embedding_distance: Optional[float] = None
 
 
 class TrainResponse(BaseModel):
@@ -71,6 +81,38 @@ class TrainResponse(BaseModel):
     num_embeddings: int
 
 
+class TrainingJobResponse(BaseModel):
+    """
+    Trạng thái một job huấn luyện chạy nền.
+    status: queued, running, succeeded, failed hoặc interrupted (worker dừng khi job đang chạy).
+    """
+    job_id: str
+    status: str
+    message: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    total: Optional[int] = None
+    processed: int = 0
+    embedded: int = 0
+    skipped: int = 0
+    failed: int = 0
+    cached: int = 0
+    eta_seconds: Optional[float] = None
+    num_images: Optional[int] = None
+    num_embeddings: Optional[int] = None
+    error: Optional[str] = None
+
+
+class MatchInfo(BaseModel):
+    """
+    Một ảnh huấn luyện gần với khuôn mặt cần xác thực (dùng cho top-k).
+    """
+    index: int
+    filename: str
+    distance: float
+
+
 class VerifyResponse(BaseModel):
     """
     Response hoàn chỉnh cho API xác thực khuôn mặt.
@@ -84,3 +126,127 @@ class VerifyResponse(BaseModel):
     image_size: ImageSize
     environment_info: EnvironmentInfo
     training_info: TrainingInfo
+    top_matches: Optional[List[MatchInfo]] = None
+
+
+class BatchVerifyItem(BaseModel):
+    """
+    Kết quả xác thực cho một ảnh trong batch.
+    Nếu ảnh lỗi (không hợp lệ, không có khuôn mặt, ...) thì chỉ có trường error.
+    """
+    index: int
+    filename: Optional[str] = None
+    is_match: Optional[bool] = None
+    distance: Optional[float] = None
+    message: Optional[str] = None
+    face_box: Optional[FaceBox] = None
+    image_size: Optional[ImageSize] = None
+    environment_info: Optional[EnvironmentInfo] = None
+    error: Optional[str] = None
+
+
+class StreamVerifyFrame(BaseModel):
+    """
+    Kết quả xác thực cho một frame của luồng WebSocket.
+    Nếu frame lỗi (không hợp lệ, không có khuôn mặt, ...) thì các trường kết quả là None và có error.
+    """
+    frame: int
+    is_match: Optional[bool] = None
+    distance: Optional[float] = None
+    threshold: float
+    message: Optional[str] = None
+    face_box: Optional[FaceBox] = None
+    image_size: Optional[ImageSize] = None
+    detected: bool = False
+    tracked: bool = False
+    reencoded: bool = False
+    dropped_frames: int = 0
+    processing_ms: Optional[float] = None
+    error: Optional[str] = None
+
+
+class BatchVerifyResponse(BaseModel):
+    """
+    Response cho API xác thực nhiều ảnh trong một request.
+    """
+    threshold: float
+    num_images: int
+    num_matched: int
+    num_failed: int
+    results: List[BatchVerifyItem]
+    training_info: TrainingInfo
+
+
+class IdentifyCandidate(BaseModel):
+    """
+    Một danh tính ứng viên trong kết quả nhận dạng 1:N.
+    """
+    identity: str
+    distance: float
+    is_match: bool
+    filename: str
+
+
+class IdentifyResponse(BaseModel):
+    """
+    Response cho API nhận dạng khuôn mặt 1:N.
+    """
+    is_match: bool
+    identity: Optional[str] = None
+    threshold: float
+    message: str
+    candidates: List[IdentifyCandidate]
+    face_box: FaceBox
+    image_size: ImageSize
+    environment_info: EnvironmentInfo
+    gallery_size: int
+    num_identities: int
+
+
+class EnrollResponse(BaseModel):
+    """
+    Response cho API đăng ký thêm ảnh cho một danh tính.
+    """
+    message: str
+    identity: str
+    saved_path: str
+    gallery_size: int
+    num_identities: int
+
+
+class GalleryStatusResponse(BaseModel):
+    """
+    Trạng thái gallery dữ liệu huấn luyện (hot reload).
+    shared_generation: generation của gallery dùng chung giữa các worker (FACE_GALLERY_SHARED).
+    """
+    loaded: bool
+    version: int
+    loaded_at: Optional[float] = None
+    reloading: bool
+    last_error: Optional[str] = None
+    num_images: Optional[int] = None
+    shared_generation: Optional[int] = None
+    message: str
+
+
+class StartupStepInfo(BaseModel):
+    """
+    Trạng thái một bước khởi động (pending / running / done / failed).
+    details: chi tiết của bước (ví dụ thời gian cold/warm của từng worker ở bước warmup).
+    """
+    name: str
+    status: str
+    duration_ms: Optional[float] = None
+    message: Optional[str] = None
+    details: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class ReadinessResponse(BaseModel):
+    """
+    Response cho API readiness: ready=True khi model và gallery đã nạp xong.
+    """
+    ready: bool
+    status: str
+    uptime_seconds: float
+    steps: List[StartupStepInfo]
@@ -0,0 +1,95 @@
+"""
+Parallel extraction pipeline module.
+Chạy trích xuất embedding theo từng file trên nhiều process, giữ nguyên thứ tự kết quả
+để đầu ra giống hệt đường xử lý tuần tự.
+"""
+
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Kết quả cho từng file: (filepath, giá trị trả về, exception nếu có)
+FileResult = Tuple[str, Any, Optional[BaseException]]
+
+# Cách tạo worker process: fork một process đang có thread (uvicorn, threadpool, fsync nền) và
+# model dlib đã nạp có thể treo worker, nên worker được khởi động mới bằng spawn
+START_METHOD = "spawn"
+
+
+def _init_worker() -> None:
+    """
+    Initializer của mỗi worker process: import face_recognition một lần để
+    các model dlib (detector, landmark, encoder) được nạp sẵn cho mọi file sau đó.
+    """
+    try:
+        import face_recognition  # noqa: F401
+    except Exception as e:
+        logger.warning(f"Worker không import được face_recognition: {str(e)}")
+
+
+def map_files_ordered(
+    func: Callable[[str], Any],
+    filepaths: List[str],
+    workers: int = 1,
+    max_pending: Optional[int] = None
+) -> Iterator[FileResult]:
+    """
+    Áp dụng func cho từng file và trả về kết quả theo đúng thứ tự đầu vào.
+
+    Với workers > 1, các file được xử lý trong ProcessPoolExecutor. Số tác vụ đang
+    chờ được giới hạn bởi max_pending (mặc định 2 * workers) để bộ nhớ không tăng theo
+    số file, trong khi luôn có sẵn việc cho worker: đọc/decode file tiếp theo chồng lên
+    detection của file hiện tại.
+
+    Args:
+        func: Hàm cấp module (pickle được, import được trong process mới) nhận filepath
+        filepaths: Danh sách file cần xử lý
+        workers: Số process (<= 1 nghĩa là chạy tuần tự trong process hiện tại)
+        max_pending: Số tác vụ tối đa đang chờ trong pool
+
+    Yields:
+        (filepath, kết quả, None) nếu thành công, (filepath, None, exception) nếu lỗi
+    """
+    if workers <= 1 or len(filepaths) <= 1:
+        for filepath in filepaths:
+            try:
+                yield filepath, func(filepath), None
+            except Exception as e:
+                yield filepath, None, e
+        return
+
+    workers = min(workers, len(filepaths))
+    if max_pending is None:
+        max_pending = 2 * workers
+    max_pending = max(max_pending, workers)
+
+    logger.info(f"Trích xuất song song {len(filepaths)} file với {workers} process")
+
+    mp_context = multiprocessing.get_context(START_METHOD)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context, initializer=_init_worker) as executor:
+        pending = deque()
+        remaining = iter(filepaths)
+
+        def submit_next() -> bool:
+            filepath = next(remaining, None)
+            if filepath is None:
+                return False
+            pending.append((filepath, executor.submit(func, filepath)))
+            return True
+
+        for _ in range(max_pending):
+            if not submit_next():
+                break
+
+        while pending:
+            filepath, future = pending.popleft()
+            try:
+                result = (filepath, future.result(), None)
+            except Exception as e:
+                result = (filepath, None, e)
+            submit_next()
+            yield result
@@ -0,0 +1,77 @@
+"""
+Request size limit module.
+ASGI middleware giới hạn kích thước body của request trước khi Starlette parse multipart
+(và spool toàn bộ file upload ra bộ nhớ / file tạm).
+"""
+
+import logging
+from typing import Callable, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Phần dư cho boundary / header của multipart ngoài dữ liệu file
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Hàm trả về (giới hạn byte, thông báo lỗi) cho một path, hoặc None nếu không giới hạn
+LimitForPath = Callable[[str], Optional[Tuple[int, str]]]
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Từ chối request có body vượt giới hạn (HTTP 400, format {"detail": ...}):
+    - Có header Content-Length: kiểm tra ngay, không đọc body.
+    - Không có Content-Length (chunked): đếm byte khi body được nhận và dừng ngay khi vượt,
+      bằng cách ném HTTPException từ receive() (FastAPI chuyển tiếp tới exception handler).
+    """
+
+    def __init__(self, app, limit_for_path: LimitForPath):
+        self.app = app
+        self.limit_for_path = limit_for_path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("method") in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for_path(scope.get("path", ""))
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        max_bytes, detail = limit
+
+        content_length = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    content_length = None
+                break
+
+        if content_length is not None and content_length > max_bytes:
+            logger.warning(
+                f"Request quá lớn: {content_length} bytes (max: {max_bytes} bytes), path={scope.get('path')}"
+            )
+            response = JSONResponse(status_code=400, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    logger.warning(
+                        f"Request quá lớn: đã nhận {received} bytes (max: {max_bytes} bytes), "
+                        f"path={scope.get('path')}"
+                    )
+                    raise HTTPException(status_code=400, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,147 @@
+"""
+Serving model module.
+Giữ trong bộ nhớ mô hình đang phục vụ xác thực: artifact đã huấn luyện (models/user_model.bin)
+được memmap một lần khi khởi động (không trích xuất lại ảnh) và mọi request verify đọc cùng
+một snapshot. Sau mỗi lần huấn luyện thành công, snapshot mới được dựng xong rồi mới thay
+thế snapshot cũ bằng một phép gán (atomic swap): request đang chạy vẫn dùng bản cũ, request
+sau đó dùng bản mới, không có lúc nào không có mô hình.
+"""
+
+import os
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend import config
+from backend.gallery import FaceGallery, gallery_from_encodings
+from backend.model_artifact import MODEL_ARTIFACT_PATH, load_model_artifact
+
+logger = logging.getLogger(__name__)
+
+# Nguồn của mô hình đang phục vụ
+SOURCE_ARTIFACT = "artifact"
+SOURCE_KNOWN_FACES = "myface"
+
+
+@dataclass(frozen=True)
+class ServingModel:
+    """
+    Snapshot bất biến của mô hình phục vụ xác thực.
+    version: 12 ký tự đầu checksum của artifact (hoặc "myface-v<N>" khi chưa huấn luyện).
+    """
+    gallery: FaceGallery
+    used_files: List[str]
+    version: str
+    source: str
+    loaded_at: Optional[float]
+
+
+class ModelHolder:
+    """
+    Giữ snapshot ServingModel hiện tại của process.
+
+    - load(): đọc artifact và thay snapshot (gọi khi khởi động và sau khi huấn luyện).
+    - current(): snapshot hiện tại; nếu file artifact đã được thay (ví dụ worker khác vừa huấn
+      luyện) thì tự nạp lại, chi phí mỗi lần gọi chỉ là một os.stat.
+    """
+
+    def __init__(self, path: str = MODEL_ARTIFACT_PATH):
+        self.path = path
+        self._model: Optional[ServingModel] = None
+        self._identity: Optional[Tuple[int, int, int]] = None
+        self._failed_identity: Optional[Tuple[int, int, int]] = None
+        self._lock = threading.Lock()
+        self.swaps = 0
+        self.last_error: Optional[str] = None
+
+    def _file_identity(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> Optional[ServingModel]:
+        """
+        Nạp artifact hiện tại và thay snapshot đang phục vụ.
+
+        Returns:
+            Snapshot mới, None nếu chưa có artifact (chưa huấn luyện)
+
+        Raises:
+            ValueError: Nếu artifact hỏng (snapshot cũ được giữ nguyên)
+        """
+        with self._lock:
+            identity = self._file_identity()
+            if identity is None:
+                self._model, self._identity = None, None
+                return None
+
+            try:
+                artifact = load_model_artifact(self.path, verify=config.MODEL_VERIFY_CHECKSUM)
+            except FileNotFoundError:
+                self._model, self._identity = None, None
+                return None
+            except (ValueError, KeyError) as e:
+                self._failed_identity = identity
+                self.last_error = str(e)
+                logger.error(f"Không nạp được mô hình '{self.path}', giữ mô hình cũ: {str(e)}")
+                raise ValueError(f"Mô hình '{self.path}' không hợp lệ: {str(e)}") from e
+
+            used_files = artifact.filenames()
+            model = ServingModel(
+                gallery=FaceGallery.from_arrays(artifact.embeddings, artifact.squared_norms, used_files),
+                used_files=used_files,
+                version=artifact.checksum[:12],
+                source=SOURCE_ARTIFACT,
+                loaded_at=time.time()
+            )
+            # Swap: một phép gán, request đang giữ snapshot cũ không bị ảnh hưởng
+            self._model, self._identity = model, identity
+            self._failed_identity = None
+            self.last_error = None
+            self.swaps += 1
+
+        logger.info(f"Đang phục vụ mô hình {model.version}: {len(model.gallery)} embeddings")
+        return model
+
+    def current(self) -> Optional[ServingModel]:
+        """
+        Snapshot đang phục vụ, None nếu chưa có artifact.
+        """
+        model = self._model
+        identity = self._file_identity()
+        if identity is None:
+            return None
+        if identity == self._identity or identity == self._failed_identity:
+            return model
+        try:
+            return self.load()
+        except ValueError:
+            return model
+
+
+def known_faces_model(
+    known_encodings: Sequence[np.ndarray],
+    used_files: List[str],
+    version: int,
+    loaded_at: Optional[float] = None
+) -> ServingModel:
+    """
+    Snapshot từ gallery myface/ - dùng khi chưa có mô hình huấn luyện (hành vi trước đây).
+    """
+    return ServingModel(
+        gallery=gallery_from_encodings(known_encodings, used_files),
+        used_files=used_files,
+        version=f"myface-v{version}",
+        source=SOURCE_KNOWN_FACES,
+        loaded_at=loaded_at
+    )
+
+
+# Mô hình phục vụ của process (module singleton)
+model_holder = ModelHolder()
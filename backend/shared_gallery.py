@@ -0,0 +1,139 @@
+"""
+Shared gallery module.
+Cho phép nhiều worker (uvicorn --workers / gunicorn) dùng chung một gallery: một worker build
+ma trận embedding và ghi thành file model artifact (backend/model_artifact.py), các worker khác
+memmap file đó ở chế độ chỉ đọc - dữ liệu nằm một lần trong page cache của hệ điều hành thay vì
+mỗi process giữ một bản và tự trích xuất lại toàn bộ ảnh.
+
+Header của file lưu source key (dấu vân tay dữ liệu nguồn + settings) và generation (tăng mỗi
+lần build). Worker chỉ build lại khi source key khác; việc build được khoá bằng file lock nên
+các worker khởi động cùng lúc chỉ trích xuất một lần.
+"""
+
+import os
+import logging
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+
+from backend.gallery import FaceGallery
+from backend.model_artifact import ModelArtifact, load_model_artifact, save_model_artifact
+
+try:
+    import fcntl
+except ImportError:  # Windows: không có flock, các worker có thể build trùng (vẫn ghi nguyên tử)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def exclusive_file_lock(path: str) -> Iterator[None]:
+    """
+    Khoá độc quyền giữa các process bằng flock trên một file lock (chờ tới khi lấy được).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def file_identity(path: str) -> Optional[Tuple[int, int]]:
+    """
+    (inode, mtime_ns) của file, None nếu chưa có. File được thay bằng rename nên giá trị này
+    đổi mỗi khi có process ghi bản mới.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns
+
+
+class SharedGallery:
+    """
+    Gallery lưu trong file memmap dùng chung giữa các worker process.
+
+    - load(): attach vào file hiện có nếu source key khớp, ngược lại build (dưới file lock)
+      rồi attach. Trả về (FaceGallery, used_files) - FaceGallery dùng trực tiếp vùng nhớ của file.
+    - file_identity(): (inode, mtime) của file, đổi khi có generation mới (file được thay bằng rename).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        builder: Callable[[], Tuple[Sequence[np.ndarray], List[str]]],
+        source_key: Callable[[], str],
+        name: str = "gallery"
+    ):
+        """
+        Args:
+            path: Đường dẫn file gallery dùng chung
+            builder: Hàm trích xuất (encodings, used_files) từ dữ liệu nguồn (chậm)
+            source_key: Hàm trả về dấu vân tay của dữ liệu nguồn + settings trích xuất
+            name: Tên dùng trong log
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._builder = builder
+        self._source_key = source_key
+        self.name = name
+        self.generation: Optional[int] = None
+
+    def _read(self) -> Optional[ModelArtifact]:
+        try:
+            return load_model_artifact(self.path)
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError) as e:
+            logger.warning(f"File {self.name} dùng chung '{self.path}' không hợp lệ, sẽ build lại: {str(e)}")
+            return None
+
+    def _build(self, source_key: str, previous: Optional[ModelArtifact]) -> ModelArtifact:
+        encodings, used_files = self._builder()
+        generation = (previous.metadata.get("generation", 0) if previous is not None else 0) + 1
+        save_model_artifact(
+            np.asarray(encodings, dtype=np.float32),
+            used_files,
+            settings=source_key,
+            num_images=len(used_files),
+            path=self.path,
+            metadata={"generation": generation, "source": source_key}
+        )
+        logger.info(f"Đã build {self.name} dùng chung: generation {generation}, {len(used_files)} embeddings")
+        return load_model_artifact(self.path)
+
+    def load(self) -> Tuple[FaceGallery, List[str]]:
+        """
+        Attach vào gallery dùng chung, build trước nếu file chưa có hoặc đã cũ.
+
+        Raises:
+            FileNotFoundError, ValueError: Lỗi của builder khi phải build (không có dữ liệu nguồn)
+        """
+        source_key = self._source_key()
+        artifact = self._read()
+        if artifact is None or artifact.metadata.get("source") != source_key:
+            with exclusive_file_lock(self.lock_path):
+                # Worker khác có thể đã build xong trong lúc chờ lock
+                artifact = self._read()
+                if artifact is None or artifact.metadata.get("source") != source_key:
+                    artifact = self._build(source_key, artifact)
+
+        self.generation = artifact.metadata.get("generation")
+        used_files = artifact.filenames()
+        gallery = FaceGallery.from_arrays(artifact.embeddings, artifact.squared_norms, used_files)
+        logger.info(f"Đã attach {self.name} dùng chung: generation {self.generation}, {len(gallery)} embeddings")
+        return gallery, used_files
+
+    def file_identity(self) -> Optional[Tuple[int, int]]:
+        """
+        (inode, mtime_ns) của file dùng chung, None nếu chưa có.
+        """
+        return file_identity(self.path)
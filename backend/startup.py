@@ -0,0 +1,218 @@
+"""
+Startup module.
+Nạp các thành phần nặng (model dlib của face_recognition, gallery dữ liệu huấn luyện) ở một
+thread nền sau khi server đã nhận kết nối. /api/v1/health trả lời ngay khi process chạy
+(liveness); /api/v1/ready chỉ trả 200 khi mọi bước khởi động đã xong (readiness), để load
+balancer / autoscaler chỉ chuyển traffic tới worker đã sẵn sàng.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from backend import config
+from backend import warmup
+from backend.catalog import image_catalog
+from backend.data_loader import get_known_faces_cache, known_faces_store
+from backend.executor import get_executor
+from backend.lazy_imports import lazy_import
+from backend.serving_model import model_holder
+
+face_recognition = lazy_import("face_recognition")
+
+logger = logging.getLogger(__name__)
+
+STEP_PENDING = "pending"
+STEP_RUNNING = "running"
+STEP_DONE = "done"
+STEP_FAILED = "failed"
+
+STATUS_STARTING = "starting"
+STATUS_READY = "ready"
+STATUS_FAILED = "failed"
+
+
+class StartupStep:
+    """
+    Một bước khởi động: hàm `run` trả về thông báo (hoặc None) khi xong, raise khi thất bại.
+    `run` cũng có thể trả về dict chi tiết (key "message" là thông báo), được báo lại qua /api/v1/ready.
+    """
+
+    def __init__(self, name: str, run: Callable[[], Union[str, Dict[str, Any], None]]):
+        self.name = name
+        self._run = run
+        self.status = STEP_PENDING
+        self.duration_seconds: Optional[float] = None
+        self.message: Optional[str] = None
+        self.details: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+
+    def execute(self) -> bool:
+        self.status = STEP_RUNNING
+        start = time.perf_counter()
+        try:
+            result = self._run()
+            if isinstance(result, dict):
+                self.details = result
+                self.message = result.get("message")
+            else:
+                self.message = result
+            self.status = STEP_DONE
+        except Exception as e:
+            self.error = str(e)
+            self.status = STEP_FAILED
+            logger.error(f"Bước khởi động '{self.name}' thất bại: {str(e)}")
+        finally:
+            self.duration_seconds = time.perf_counter() - start
+        logger.info(f"Bước khởi động '{self.name}': {self.status} trong {self.duration_seconds:.2f}s")
+        return self.status == STEP_DONE
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "status": self.status,
+            "duration_ms": None if self.duration_seconds is None else self.duration_seconds * 1000.0,
+            "message": self.message,
+            "details": self.details,
+            "error": self.error,
+        }
+
+
+class StartupState:
+    """
+    Chạy tuần tự các bước khởi động trên một daemon thread; dừng ở bước thất bại đầu tiên.
+    """
+
+    def __init__(self, steps: List[Tuple[str, Callable[[], Union[str, Dict[str, Any], None]]]]):
+        self.steps = [StartupStep(name, run) for name, run in steps]
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> bool:
+        """
+        Bắt đầu chạy các bước ở background. Trả về False nếu đã được bắt đầu trước đó.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return False
+            self._thread = threading.Thread(target=self.run, name="startup-loader", daemon=True)
+            self._thread.start()
+            return True
+
+    def run(self) -> None:
+        for step in self.steps:
+            if not step.execute():
+                break
+        self.finished_at = time.time()
+        if self.ready:
+            logger.info(f"Hệ thống sẵn sàng nhận request sau {self.finished_at - self.created_at:.2f}s.")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Chờ các bước khởi động kết thúc. Trả về True nếu đã sẵn sàng.
+        """
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        return self.ready
+
+    @property
+    def ready(self) -> bool:
+        return all(step.status == STEP_DONE for step in self.steps)
+
+    @property
+    def status(self) -> str:
+        if self.ready:
+            return STATUS_READY
+        if any(step.status == STEP_FAILED for step in self.steps):
+            return STATUS_FAILED
+        return STATUS_STARTING
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "status": self.status,
+            "uptime_seconds": time.time() - self.created_at,
+            "steps": [step.to_dict() for step in self.steps],
+        }
+
+
+def load_face_models() -> str:
+    """
+    Import face_recognition (dlib + các file model), phần chậm nhất khi khởi động.
+    """
+    face_recognition.load()
+    return f"face_recognition đã nạp trong {face_recognition.load_seconds or 0.0:.2f}s"
+
+
+def warm_up_workers() -> Dict[str, Any]:
+    """
+    Warm-up detect + encode trong từng worker trước khi nhận traffic.
+
+    Với executor "process", gửi một tác vụ warm-up cho mỗi worker process (mỗi process đã tự
+    warm-up trong initializer, tác vụ chỉ lấy kết quả); với "thread", các thread dùng chung model
+    của process chính nên chỉ cần warm-up một lần ở đây.
+    """
+    if config.EXECUTOR_KIND == "process":
+        executor = get_executor()
+        futures = [executor.submit(warmup.ensure_warm) for _ in range(config.EXECUTOR_WORKERS)]
+        reports = list({report["pid"]: report for report in (f.result() for f in futures)}.values())
+    else:
+        reports = [warmup.ensure_warm()]
+
+    summary = warmup.summarize(reports)
+    warm_ms = "n/a" if summary["warm_ms"] is None else f"{summary['warm_ms']:.1f}ms"
+    summary["message"] = (
+        f"Đã warm-up {len(reports)} worker: cold {summary['cold_ms']:.1f}ms, warm {warm_ms}"
+    )
+    return summary
+
+
+def sync_image_catalog() -> str:
+    """
+    Đối chiếu catalog ảnh đã thu thập với data/raw/user/ (chỉ quét khi thư mục đã đổi).
+    """
+    image_catalog.sync()
+    return f"Catalog có {image_catalog.count()} ảnh."
+
+
+def load_known_faces() -> str:
+    """
+    Tải gallery dữ liệu huấn luyện. Chưa có dữ liệu không phải lỗi khởi động.
+    """
+    try:
+        known_encodings, used_files = get_known_faces_cache()
+    except (FileNotFoundError, ValueError) as e:
+        logger.warning(f"Chưa có dữ liệu huấn luyện: {str(e)}")
+        return f"Chưa có dữ liệu huấn luyện: {str(e)}"
+    logger.info(f"Đã tải {len(known_encodings)} ảnh huấn luyện thành công: {used_files}")
+    return f"Đã tải {len(known_encodings)} ảnh huấn luyện."
+
+
+def load_serving_model() -> str:
+    """
+    Nạp mô hình đã huấn luyện (memmap artifact, không trích xuất lại ảnh).
+    Chưa huấn luyện thì tải gallery myface/ như trước.
+    """
+    model = model_holder.load()
+    if model is None:
+        return load_known_faces()
+    return f"Đang phục vụ mô hình {model.version} ({len(model.gallery)} embeddings)."
+
+
+def start_gallery_watcher() -> None:
+    """
+    Theo dõi myface/ và tải lại gallery ở background khi có thay đổi.
+    """
+    known_faces_store.start_watcher(config.GALLERY_POLL_SECONDS)
+
+
+# Trạng thái khởi động của process (module singleton)
+startup_state = StartupState(
+    [("models", load_face_models)]
+    + ([("warmup", warm_up_workers)] if config.WARMUP_ENABLED else [])
+    + [("catalog", sync_image_catalog), ("gallery", load_serving_model), ("watcher", start_gallery_watcher)]
+)
@@ -5,19 +5,120 @@ Handles training data loading, embedding extraction, and model persistence.
 
 import os
 import logging
+from functools import partial
 import numpy as np
-import face_recognition
-from typing import Tuple
+from typing import Callable, Dict, Optional, Tuple
+
+from backend import config
+from backend.lazy_imports import lazy_import
+from backend import metrics
+from backend.detectors import DEFAULT_DETECTOR, get_detector, is_default_detector
+from backend.parallel import map_files_ordered
+from backend.catalog import image_catalog
+from backend.model_artifact import MODEL_ARTIFACT_PATH, save_model_artifact
+from backend.embedding_cache import (
+    EmbeddingCache,
+    CacheEntry,
+    STATUS_OK,
+    STATUS_NO_FACE,
+    STATUS_MULTIPLE_FACES
+)
+
+# dlib + model được import ở lần dùng đầu tiên (xem backend/lazy_imports.py)
+face_recognition = lazy_import("face_recognition")
 
 logger = logging.getLogger(__name__)
 
+# File cache embedding theo content hash cho dữ liệu huấn luyện
+EMBEDDING_CACHE_PATH = os.path.join("models", "embedding_cache.npz")
+
+# Tham số encoder đang dùng (giá trị mặc định của face_recognition); detector theo
+# FACE_TRAINING_DETECTOR (mặc định "hog", upsample 1)
+ENCODING_NUM_JITTERS = 1
+ENCODING_MODEL = "small"
+
+# Callback tiến độ huấn luyện, nhận dict: total, processed, embedded, skipped, failed, cached
+ProgressCallback = Callable[[Dict[str, int]], None]
+
+
+def extraction_settings_key(detector: str = DEFAULT_DETECTOR) -> str:
+    """
+    Chuỗi mô tả detector/encoder, dùng làm một phần key của embedding cache.
+    Đổi bất kỳ tham số nào sẽ vô hiệu hóa cache cũ.
+    """
+    version = getattr(face_recognition, "__version__", "unknown")
+    return (
+        f"face_recognition={version};{get_detector(detector).settings_key};"
+        f"jitters={ENCODING_NUM_JITTERS};landmarks={ENCODING_MODEL}"
+    )
+
+
+def extract_embedding_from_file(
+    filepath: str,
+    detector: str = DEFAULT_DETECTOR
+) -> Tuple[str, int, Optional[np.ndarray]]:
+    """
+    Trích xuất face embedding từ một file ảnh.
+    
+    Args:
+        filepath: Đường dẫn file ảnh
+        detector: Chuỗi detector (xem backend/detectors.py)
+        
+    Returns:
+        - status: STATUS_OK, STATUS_NO_FACE hoặc STATUS_MULTIPLE_FACES
+        - num_faces: Số khuôn mặt phát hiện được
+        - embedding: Face embedding (128-d) nếu status là STATUS_OK, ngược lại None
+        
+    Raises:
+        Exception: Nếu không đọc được ảnh
+    """
+    # Tải ảnh
+    image = face_recognition.load_image_file(filepath)
+    
+    # Tìm vị trí khuôn mặt
+    if is_default_detector(detector):
+        face_locations = face_recognition.face_locations(image)
+    else:
+        face_locations = get_detector(detector).detect(image)
+    
+    # Bỏ qua ảnh nếu không có hoặc có nhiều hơn 1 khuôn mặt
+    if len(face_locations) == 0:
+        return STATUS_NO_FACE, 0, None
+    elif len(face_locations) > 1:
+        return STATUS_MULTIPLE_FACES, len(face_locations), None
+    
+    # Trích xuất face embedding
+    face_encodings = face_recognition.face_encodings(image, face_locations)
+    
+    if len(face_encodings) == 0:
+        return STATUS_NO_FACE, 1, None
+    
+    return STATUS_OK, 1, face_encodings[0]
+
 
-def train_personal_model() -> Tuple[int, int]:
+def train_personal_model(
+    use_cache: bool = True,
+    workers: Optional[int] = None,
+    progress_callback: Optional[ProgressCallback] = None,
+    detector: Optional[str] = None
+) -> Tuple[int, int]:
     """
     Huấn luyện mô hình cá nhân từ dữ liệu đã thu thập.
     
     Đọc tất cả ảnh từ thư mục data/raw/user/, trích xuất face embeddings,
     tính embedding trung bình, và lưu vào file models/.
+    Embedding của các ảnh không đổi được lấy lại từ models/embedding_cache.npz.
+    Ngoài user_embeddings.npy / user_embedding_mean.npy, mô hình được ghi vào
+    models/user_model.bin (xem backend/model_artifact.py).
+    
+    Args:
+        use_cache: Dùng embedding cache theo content hash (mặc định True)
+        workers: Số process trích xuất song song (mặc định FACE_EXTRACTION_WORKERS)
+        progress_callback: Gọi sau mỗi ảnh tra cache, sau mỗi ảnh được trích xuất và trước khi
+            lưu cache / model (job dùng làm nhịp báo còn sống), với số ảnh total, processed
+            (= embedded + skipped + failed), embedded, skipped (không có hoặc nhiều khuôn mặt),
+            failed (lỗi đọc ảnh) và cached (lấy từ cache)
+        detector: Chuỗi detector (mặc định FACE_TRAINING_DETECTOR)
     
     Returns:
         - num_images: Số lượng ảnh đã đọc
@@ -25,12 +126,13 @@ def train_personal_model() -> Tuple[int, int]:
         
     Raises:
         - FileNotFoundError: Nếu thư mục data/raw/user/ không tồn tại hoặc rỗng
-        - ValueError: Nếu không trích xuất được embedding nào
+        - ValueError: Nếu không trích xuất được embedding nào hoặc detector không hợp lệ
         
     Validates: Requirements 2.1, 2.3, 2.4, 2.5, 2.6, 2.7, 7.4, 7.5
     """
-    data_dir = "data/raw/user"
+    data_dir = image_catalog.data_dir
     models_dir = "models"
+    detector = detector or config.TRAINING_DETECTOR
     
     logger.info(f"Bắt đầu huấn luyện mô hình từ thư mục '{data_dir}/'...")
     
@@ -46,15 +148,8 @@ def train_personal_model() -> Tuple[int, int]:
         logger.error(f"'{data_dir}/' không phải là thư mục")
         raise FileNotFoundError(f"'{data_dir}/' không phải là thư mục.")
     
-    # Các extension hợp lệ
-    valid_extensions = {'.jpg', '.jpeg', '.png'}
-    
-    # Quét thư mục và filter file theo extension
-    image_files = [
-        f for f in os.listdir(data_dir)
-        if os.path.isfile(os.path.join(data_dir, f)) and
-        os.path.splitext(f.lower())[1] in valid_extensions
-    ]
+    # Danh sách ảnh từ catalog (theo thứ tự thu thập), không quét thư mục
+    image_files = image_catalog.paths()
     
     num_images = len(image_files)
     
@@ -67,42 +162,117 @@ def train_personal_model() -> Tuple[int, int]:
     
     logger.info(f"Tìm thấy {num_images} file ảnh: {image_files}")
     
-    # Danh sách để lưu embeddings
+    # Danh sách để lưu embeddings (và tên file nguồn tương ứng)
     embeddings = []
+    embedding_files = []
+    
+    # Embedding cache theo content hash: chỉ xử lý ảnh mới hoặc đã thay đổi
+    cache = EmbeddingCache(EMBEDDING_CACHE_PATH, extraction_settings_key(detector)) if use_cache else None
+    if cache is not None:
+        cache.load()
+    new_entries = {}
     
-    # Xử lý từng ảnh
+    # Tiến độ theo số ảnh đã có kết quả
+    progress = {"total": num_images, "processed": 0, "embedded": 0, "skipped": 0, "failed": 0, "cached": 0}
+    
+    def count_result(result) -> None:
+        if isinstance(result, Exception):
+            progress["failed"] += 1
+        elif result[0] == STATUS_OK:
+            progress["embedded"] += 1
+        else:
+            progress["skipped"] += 1
+        progress["processed"] += 1
+    
+    # Bước 1: tra cache, gom các ảnh cần trích xuất mới
+    # results: filename -> (status, num_faces, embedding) hoặc Exception
+    results = {}
+    content_hashes = {}
+    pending_paths = []
     for filename in image_files:
         filepath = os.path.join(data_dir, filename)
-        
         try:
-            # Tải ảnh
-            image = face_recognition.load_image_file(filepath)
-            
-            # Tìm vị trí khuôn mặt
-            face_locations = face_recognition.face_locations(image)
-            
-            # Bỏ qua ảnh nếu không có hoặc có nhiều hơn 1 khuôn mặt
-            if len(face_locations) == 0:
-                logger.warning(
-                    f"Không tìm thấy khuôn mặt trong '{filename}'. Bỏ qua."
-                )
-                continue
-            elif len(face_locations) > 1:
-                logger.warning(
-                    f"Phát hiện {len(face_locations)} khuôn mặt trong '{filename}'. Bỏ qua."
-                )
-                continue
-            
-            # Trích xuất face embedding
-            face_encodings = face_recognition.face_encodings(image, face_locations)
-            
-            if len(face_encodings) > 0:
-                embeddings.append(face_encodings[0])
-                logger.info(f"Đã trích xuất embedding từ: {filename}")
-            
+            if cache is not None:
+                content_hashes[filename] = cache.lookup_hash(filepath, data_dir)
+                entry = cache.get(content_hashes[filename])
+                if entry is not None:
+                    new_entries[filename] = entry
+                    results[filename] = (entry.status, entry.num_faces, entry.embedding)
+                    progress["cached"] += 1
+                    count_result(results[filename])
+                    continue
+            pending_paths.append(filepath)
         except Exception as e:
-            logger.error(f"Lỗi khi xử lý '{filename}': {str(e)}. Bỏ qua.")
+            results[filename] = e
+            count_result(e)
+        finally:
+            # Hash lại nhiều ảnh có thể lâu: báo tiến độ theo từng ảnh để job không bị coi là treo
+            if progress_callback is not None:
+                progress_callback(dict(progress))
+    
+    # Bước 2: trích xuất embedding (song song nếu cấu hình nhiều worker)
+    workers = config.EXTRACTION_WORKERS if workers is None else workers
+    extract = partial(extract_embedding_from_file, detector=detector)
+    for filepath, value, error in map_files_ordered(extract, pending_paths, workers):
+        filename = os.path.relpath(filepath, data_dir)
+        results[filename] = error if error is not None else value
+        count_result(results[filename])
+        if progress_callback is not None:
+            progress_callback(dict(progress))
+        if error is not None:
             continue
+        
+        if cache is not None:
+            status, num_faces, embedding = value
+            stat = os.stat(filepath)
+            new_entries[filename] = CacheEntry(
+                content_hash=content_hashes[filename],
+                status=status,
+                num_faces=num_faces,
+                embedding=embedding,
+                size=stat.st_size,
+                mtime_ns=stat.st_mtime_ns
+            )
+    
+    # Bước 3: gom kết quả theo đúng thứ tự file (giống hệt đường xử lý tuần tự)
+    for filename in image_files:
+        result = results[filename]
+        
+        if isinstance(result, Exception):
+            logger.error(f"Lỗi khi xử lý '{filename}': {str(result)}. Bỏ qua.")
+            continue
+        
+        status, num_faces, embedding = result
+        
+        # Bỏ qua ảnh nếu không có hoặc có nhiều hơn 1 khuôn mặt
+        if status == STATUS_NO_FACE:
+            logger.warning(
+                f"Không tìm thấy khuôn mặt trong '{filename}'. Bỏ qua."
+            )
+            continue
+        elif status == STATUS_MULTIPLE_FACES:
+            logger.warning(
+                f"Phát hiện {num_faces} khuôn mặt trong '{filename}'. Bỏ qua."
+            )
+            continue
+        
+        embeddings.append(embedding)
+        embedding_files.append(filename)
+        logger.info(f"Đã trích xuất embedding từ: {filename}")
+    
+    if cache is not None:
+        logger.info(
+            f"Embedding cache: {cache.hits} hit, {cache.misses} miss "
+            f"({cache.misses} ảnh cần trích xuất mới)"
+        )
+        metrics.EMBEDDING_CACHE_LOOKUPS.inc(cache.hits, result="hit")
+        metrics.EMBEDDING_CACHE_LOOKUPS.inc(cache.misses, result="miss")
+        if progress_callback is not None:
+            progress_callback(dict(progress))
+        try:
+            cache.save(new_entries)
+        except Exception as e:
+            logger.warning(f"Không lưu được embedding cache: {str(e)}")
     
     num_embeddings = len(embeddings)
     
@@ -125,6 +295,10 @@ def train_personal_model() -> Tuple[int, int]:
     mean_embedding = np.mean(embeddings_array, axis=0)
     logger.info(f"Đã tính mean embedding. Shape: {mean_embedding.shape}")
     
+    # Nhịp báo còn sống trước khi ghi các file model
+    if progress_callback is not None:
+        progress_callback(dict(progress))
+    
     # Tạo thư mục models nếu chưa tồn tại
     os.makedirs(models_dir, exist_ok=True)
     
@@ -138,5 +312,15 @@ def train_personal_model() -> Tuple[int, int]:
     np.save(mean_path, mean_embedding)
     logger.info(f"Đã lưu mean embedding vào: {mean_path}")
     
+    # Lưu model artifact (một file có phiên bản, tải zero-copy)
+    save_model_artifact(
+        embeddings_array,
+        embedding_files,
+        extraction_settings_key(detector),
+        num_images,
+        path=MODEL_ARTIFACT_PATH,
+        dtype=config.MODEL_DTYPE
+    )
+    
     logger.info(f"Huấn luyện hoàn tất thành công!")
     return num_images, num_embeddings
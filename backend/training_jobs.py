@@ -0,0 +1,291 @@
+"""
+Training jobs module.
+Chạy huấn luyện như một job nền: POST trả về job id ngay, tiến độ (số ảnh đã xử lý / bỏ qua /
+lỗi, ETA) được cập nhật trong lúc chạy. Các yêu cầu huấn luyện đồng thời được gộp vào job đang
+chạy. Trạng thái job được lưu trong một file JSON nhỏ nên vẫn xem được sau khi worker khởi động lại.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from backend.shared_gallery import exclusive_file_lock
+
+logger = logging.getLogger(__name__)
+
+# File lưu trạng thái các job huấn luyện
+TRAINING_JOBS_PATH = os.path.join("models", "training_jobs.json")
+
+# Số job gần nhất được giữ trong file
+MAX_STORED_JOBS = 50
+
+# Khoảng thời gian tối thiểu (giây) giữa hai lần ghi tiến độ xuống đĩa
+PROGRESS_SAVE_INTERVAL = 1.0
+
+# Job đang chạy không cập nhật quá thời gian này (giây) được coi là đã bị gián đoạn
+# (worker chứa job đã dừng hoặc khởi động lại)
+STALE_JOB_SECONDS = 120.0
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_INTERRUPTED = "interrupted"
+
+ACTIVE_STATUSES = {STATUS_QUEUED, STATUS_RUNNING}
+
+
+class TrainingJobStore:
+    """
+    Lưu trạng thái job trong một file JSON (ghi ra file tạm rồi os.replace - nguyên tử).
+    Các lần đọc-sửa-ghi được khoá bằng file lock vì nhiều worker process dùng chung file.
+    """
+
+    def __init__(self, path: str = TRAINING_JOBS_PATH, max_jobs: int = MAX_STORED_JOBS):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.max_jobs = max_jobs
+        self._lock = threading.RLock()
+        self._file_locked = False
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Khoá file trạng thái (giữa các thread và các process); gọi lồng nhau được trong cùng thread.
+        """
+        with self._lock:
+            if self._file_locked:
+                yield
+                return
+            with exclusive_file_lock(self.lock_path):
+                self._file_locked = True
+                try:
+                    yield
+                finally:
+                    self._file_locked = False
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Không đọc được file trạng thái job '{self.path}': {str(e)}")
+            return {}
+        jobs = payload.get("jobs") if isinstance(payload, dict) else None
+        return {job["job_id"]: job for job in jobs or [] if isinstance(job, dict) and "job_id" in job}
+
+    def load(self) -> List[Dict[str, Any]]:
+        """
+        Danh sách job (cũ nhất trước).
+        """
+        with self._lock:
+            return list(self._read().values())
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read().get(job_id)
+
+    def save(self, job: Dict[str, Any]) -> None:
+        """
+        Thêm hoặc cập nhật một job; chỉ giữ max_jobs job gần nhất.
+        """
+        with self.locked():
+            jobs = self._read()
+            jobs.pop(job["job_id"], None)
+            jobs[job["job_id"]] = dict(job)
+            kept = list(jobs.values())[-self.max_jobs:]
+
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"jobs": kept}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+def _is_stale(job: Dict[str, Any], now: float) -> bool:
+    return job["status"] in ACTIVE_STATUSES and now - job.get("updated_at", 0) > STALE_JOB_SECONDS
+
+
+def _default_train(progress_callback) -> Tuple[int, int]:
+    # Tra cứu lúc chạy để tests có thể patch backend.training.train_personal_model
+    from backend import training
+    from backend.serving_model import model_holder
+    result = training.train_personal_model(progress_callback=progress_callback)
+    # Chuyển mô hình phục vụ xác thực sang artifact vừa huấn luyện
+    model_holder.load()
+    return result
+
+
+class TrainingJobManager:
+    """
+    Quản lý job huấn luyện chạy trong thread nền (tối đa một job chạy cùng lúc).
+
+    - submit(): tạo job mới, hoặc trả về job đang chạy nếu có (gộp yêu cầu đồng thời).
+    - get() / recent(): trạng thái job, đọc từ bộ nhớ cho job của process này và từ file cho job khác.
+    - wait(): chờ job kết thúc (dùng cho endpoint huấn luyện đồng bộ).
+    """
+
+    def __init__(
+        self,
+        store: TrainingJobStore,
+        train_func: Callable[[Callable[[Dict[str, int]], None]], Tuple[int, int]] = _default_train
+    ):
+        self.store = store
+        self.train_func = train_func
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._done: Dict[str, threading.Event] = {}
+        self._active_id: Optional[str] = None
+
+    def _persist(self, job: Dict[str, Any]) -> None:
+        try:
+            self.store.save(job)
+        except OSError as e:
+            logger.warning(f"Không lưu được trạng thái job {job['job_id']}: {str(e)}")
+
+    def _find_active(self) -> Optional[Dict[str, Any]]:
+        """
+        Job đang chạy: của process này, hoặc của process khác (theo file, chưa quá hạn).
+        """
+        if self._active_id is not None:
+            return dict(self._jobs[self._active_id])
+        now = time.time()
+        for job in reversed(self.store.load()):
+            if job["status"] in ACTIVE_STATUSES and not _is_stale(job, now):
+                return job
+        return None
+
+    def submit(self) -> Tuple[Dict[str, Any], bool]:
+        """
+        Bắt đầu một job huấn luyện.
+
+        Returns:
+            (job, created): created=False nếu yêu cầu được gộp vào job đang chạy
+        """
+        # File lock: worker process khác không thể cùng thấy "không có job chạy" rồi tạo job thứ hai
+        with self._lock, self.store.locked():
+            active = self._find_active()
+            if active is not None:
+                logger.info(f"Gộp yêu cầu huấn luyện vào job đang chạy {active['job_id']}")
+                return active, False
+
+            now = time.time()
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "status": STATUS_QUEUED,
+                "created_at": now,
+                "started_at": None,
+                "finished_at": None,
+                "updated_at": now,
+                "total": None,
+                "processed": 0,
+                "embedded": 0,
+                "skipped": 0,
+                "failed": 0,
+                "cached": 0,
+                "eta_seconds": None,
+                "num_images": None,
+                "num_embeddings": None,
+                "error": None,
+                "error_type": None,
+            }
+            self._jobs[job["job_id"]] = job
+            self._done[job["job_id"]] = threading.Event()
+            # Chỉ giữ trong bộ nhớ các job gần nhất (job cũ vẫn đọc được từ file)
+            for old_id in list(self._jobs)[:-MAX_STORED_JOBS]:
+                self._jobs.pop(old_id)
+                self._done.pop(old_id)
+            self._active_id = job["job_id"]
+            self._persist(job)
+            snapshot = dict(job)
+
+        thread = threading.Thread(
+            target=self._run, args=(job["job_id"],), name=f"training-job-{job['job_id'][:8]}", daemon=True
+        )
+        thread.start()
+        logger.info(f"Đã tạo job huấn luyện {job['job_id']}")
+        return snapshot, True
+
+    def _run(self, job_id: str) -> None:
+        job = self._jobs[job_id]
+        job["status"] = STATUS_RUNNING
+        job["started_at"] = job["updated_at"] = time.time()
+        self._persist(job)
+        last_saved = time.monotonic()
+
+        def on_progress(progress: Dict[str, int]) -> None:
+            nonlocal last_saved
+            now = time.time()
+            job.update(progress)
+            # ETA theo tốc độ các ảnh trích xuất mới (ảnh lấy từ cache gần như không tốn thời gian)
+            extracted = progress["processed"] - progress["cached"]
+            remaining = progress["total"] - progress["processed"]
+            if remaining == 0:
+                job["eta_seconds"] = 0.0
+            elif extracted > 0:
+                job["eta_seconds"] = round((now - job["started_at"]) / extracted * remaining, 1)
+            job["updated_at"] = now
+            if time.monotonic() - last_saved >= PROGRESS_SAVE_INTERVAL:
+                last_saved = time.monotonic()
+                self._persist(job)
+
+        try:
+            num_images, num_embeddings = self.train_func(on_progress)
+            job.update(status=STATUS_SUCCEEDED, num_images=num_images, num_embeddings=num_embeddings, eta_seconds=0.0)
+            logger.info(f"Job huấn luyện {job_id} hoàn tất: {num_embeddings}/{num_images} ảnh")
+        except Exception as e:
+            job.update(status=STATUS_FAILED, error=str(e), error_type=type(e).__name__, eta_seconds=None)
+            logger.error(f"Job huấn luyện {job_id} thất bại: {str(e)}")
+        finally:
+            job["finished_at"] = job["updated_at"] = time.time()
+            self._persist(job)
+            with self._lock:
+                if self._active_id == job_id:
+                    self._active_id = None
+            self._done[job_id].set()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Trạng thái job; job đang chạy ở process đã dừng được báo là interrupted.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return dict(job)
+        job = self.store.get(job_id)
+        if job is not None and _is_stale(job, time.time()):
+            job.update(status=STATUS_INTERRUPTED, error="Job bị gián đoạn do worker dừng hoặc khởi động lại.")
+            self._persist(job)
+        return job
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Các job gần nhất (mới nhất trước).
+        """
+        jobs = {job["job_id"]: job for job in self.store.load()}
+        jobs.update((job_id, dict(job)) for job_id, job in self._jobs.items())
+        ordered = sorted(jobs.values(), key=lambda job: job["created_at"], reverse=True)[:limit]
+        return [self.get(job["job_id"]) for job in ordered]
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Chờ job của process này kết thúc (không chờ được job của process khác).
+
+        Returns:
+            Trạng thái job sau khi chờ, None nếu không biết job
+        """
+        done = self._done.get(job_id)
+        if done is not None:
+            done.wait(timeout)
+        return self.get(job_id)
+
+
+training_jobs = TrainingJobManager(TrainingJobStore())
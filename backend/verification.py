@@ -8,6 +8,9 @@ import logging
 import numpy as np
 from typing import Tuple
 
+from backend import config
+from backend.model_artifact import MODEL_ARTIFACT_PATH, load_model_artifact
+
 logger = logging.getLogger(__name__)
 
 
@@ -15,14 +18,29 @@ def load_trained_model() -> np.ndarray:
     """
     Load mean embedding từ file đã huấn luyện.
     
+    Ưu tiên model artifact models/user_model.bin (tải zero-copy, kiểm tra checksum nếu
+    FACE_MODEL_VERIFY_CHECKSUM bật); nếu chưa có thì dùng models/user_embedding_mean.npy.
+    
     Returns:
         mean_embedding: Mean face embedding (128-d vector)
         
     Raises:
         FileNotFoundError: Nếu file mô hình không tồn tại
+        ValueError: Nếu file mô hình hỏng hoặc có shape không hợp lệ
         
     Validates: Requirements 3.1, 3.2
     """
+    if os.path.exists(MODEL_ARTIFACT_PATH):
+        logger.info(f"Đang tải mô hình từ '{MODEL_ARTIFACT_PATH}'...")
+        try:
+            artifact = load_model_artifact(MODEL_ARTIFACT_PATH, verify=config.MODEL_VERIFY_CHECKSUM)
+        except Exception as e:
+            logger.error(f"Lỗi khi tải mô hình: {str(e)}")
+            raise
+        _validate_mean_shape(artifact.mean)
+        logger.info(f"Đã tải mô hình thành công: {len(artifact)} embeddings ({artifact.dtype})")
+        return artifact.mean
+    
     model_path = "models/user_embedding_mean.npy"
     
     logger.info(f"Đang tải mô hình từ '{model_path}'...")
@@ -40,13 +58,7 @@ def load_trained_model() -> np.ndarray:
         mean_embedding = np.load(model_path)
         logger.info(f"Đã tải mô hình thành công. Shape: {mean_embedding.shape}")
         
-        # Validate shape
-        if mean_embedding.shape != (128,):
-            logger.error(f"Shape của mô hình không hợp lệ: {mean_embedding.shape}, expected (128,)")
-            raise ValueError(
-                f"File mô hình có shape không hợp lệ: {mean_embedding.shape}. "
-                f"Expected shape (128,). Vui lòng huấn luyện lại mô hình."
-            )
+        _validate_mean_shape(mean_embedding)
         
         return mean_embedding
         
@@ -55,6 +67,14 @@ def load_trained_model() -> np.ndarray:
         raise
 
 
+def _validate_mean_shape(mean_embedding: np.ndarray) -> None:
+    if mean_embedding.shape != (128,):
+        logger.error(f"Shape của mô hình không hợp lệ: {mean_embedding.shape}, expected (128,)")
+        raise ValueError(
+            f"File mô hình có shape không hợp lệ: {mean_embedding.shape}. "
+            f"Expected shape (128,). Vui lòng huấn luyện lại mô hình."
+        )
+
 
 def compare_embeddings(
     embedding1: np.ndarray,
@@ -0,0 +1,148 @@
+"""
+Warm-up module.
+Lần detect/encode đầu tiên trong mỗi process chậm hơn nhiều lần so với trạng thái ổn định
+(khởi tạo model dlib, cấp phát bộ nhớ lần đầu, page fault trên file model). Module này chạy
+pipeline detect + encode trên một ảnh mẫu ngay khi khởi động, trong từng worker của executor,
+và ghi lại thời gian cold (lượt đầu) và warm (các lượt sau) để báo qua /api/v1/ready.
+"""
+
+import logging
+import os
+import statistics
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from backend import config
+from backend.face_processor import detect_face_locations, load_image_bgr_from_bytes
+from backend.lazy_imports import lazy_import
+
+face_recognition = lazy_import("face_recognition")
+
+logger = logging.getLogger(__name__)
+
+# Kích thước ảnh tổng hợp (tương đương một khung hình webcam)
+SYNTHETIC_IMAGE_SIZE = (480, 640)
+
+# Vùng khuôn mặt giả định (top, right, bottom, left) khi ảnh mẫu không có khuôn mặt:
+# encoder vẫn chạy đủ shape predictor + mạng ResNet trên vùng này
+SYNTHETIC_FACE_LOCATION = (120, 440, 360, 200)
+
+# Kết quả warm-up của process hiện tại (mỗi process chỉ warm-up một lần)
+_process_report: Optional[Dict[str, Any]] = None
+_process_report_lock = threading.Lock()
+
+
+def synthetic_image() -> np.ndarray:
+    """
+    Ảnh RGB tổng hợp cố định: gradient + nhiễu, để detector duyệt toàn bộ ảnh như ảnh thật.
+    """
+    height, width = SYNTHETIC_IMAGE_SIZE
+    rng = np.random.default_rng(0)
+    gradient = np.linspace(40, 200, width, dtype=np.float32)[None, :, None]
+    noise = rng.normal(0, 20, size=(height, width, 3)).astype(np.float32)
+    return np.clip(gradient + noise, 0, 255).astype(np.uint8)
+
+
+def load_warmup_image(path: str = "") -> Tuple[np.ndarray, str]:
+    """
+    Ảnh RGB dùng để warm-up và tên nguồn của nó.
+
+    Raises:
+        FileNotFoundError: Nếu path được chỉ định nhưng không tồn tại
+        ValueError: Nếu không decode được ảnh
+    """
+    if not path:
+        return synthetic_image(), "synthetic"
+    with open(path, "rb") as f:
+        image_bgr = load_image_bgr_from_bytes(f.read(), config.DECODE_MAX_DIMENSION)
+    return cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB), os.path.basename(path)
+
+
+def _warmup_pass(image_rgb: np.ndarray) -> Dict[str, float]:
+    start = time.perf_counter()
+    locations = detect_face_locations(
+        image_rgb,
+        max_dimension=config.DETECTION_MAX_DIMENSION,
+        grayscale=config.DETECTION_GRAYSCALE,
+        upsample=config.DETECTION_UPSAMPLE,
+        detector=config.DETECTOR
+    )
+    detected = time.perf_counter()
+    location = locations[0] if len(locations) > 0 else SYNTHETIC_FACE_LOCATION
+    face_recognition.face_encodings(image_rgb, [location])
+    encoded = time.perf_counter()
+    return {
+        "detect_ms": (detected - start) * 1000.0,
+        "encode_ms": (encoded - detected) * 1000.0,
+        "total_ms": (encoded - start) * 1000.0,
+    }
+
+
+def run_warmup(image_path: str = "", rounds: int = 3) -> Dict[str, Any]:
+    """
+    Chạy detect + encode `rounds` lượt trên ảnh mẫu.
+
+    Returns:
+        Dict gồm pid, image, rounds, cold (lượt đầu) và warm (trung vị các lượt sau,
+        None nếu rounds = 1); mỗi mục có detect_ms, encode_ms, total_ms
+    """
+    image_rgb, image_name = load_warmup_image(image_path)
+    passes = [_warmup_pass(image_rgb) for _ in range(max(1, rounds))]
+    warm_passes = passes[1:]
+    warm = None
+    if warm_passes:
+        warm = {key: statistics.median(p[key] for p in warm_passes) for key in passes[0]}
+    report = {
+        "pid": os.getpid(),
+        "image": image_name,
+        "rounds": len(passes),
+        "cold": passes[0],
+        "warm": warm,
+    }
+    warm_total = f"{warm['total_ms']:.1f}ms" if warm else "n/a"
+    logger.info(
+        f"Warm-up process {report['pid']} ({image_name}): "
+        f"cold {passes[0]['total_ms']:.1f}ms, warm {warm_total}"
+    )
+    return report
+
+
+def ensure_warm() -> Dict[str, Any]:
+    """
+    Warm-up process hiện tại (một lần) và trả về kết quả.
+    Dùng làm initializer cho ProcessPoolExecutor và làm tác vụ gửi vào executor khi khởi động.
+    """
+    global _process_report
+
+    with _process_report_lock:
+        if _process_report is None:
+            _process_report = run_warmup(config.WARMUP_IMAGE, config.WARMUP_ROUNDS)
+        return _process_report
+
+
+def initialize_worker() -> None:
+    """
+    Initializer của worker process: warm-up trước khi nhận tác vụ đầu tiên.
+    Lỗi warm-up chỉ được log - worker vẫn phục vụ request (chậm hơn ở request đầu).
+    """
+    try:
+        ensure_warm()
+    except Exception as e:
+        logger.error(f"Warm-up worker process {os.getpid()} thất bại: {str(e)}")
+
+
+def summarize(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Gộp kết quả warm-up của các worker: cold/warm tổng (ms) lớn nhất giữa các worker.
+    """
+    cold = [report["cold"]["total_ms"] for report in reports]
+    warm = [report["warm"]["total_ms"] for report in reports if report["warm"] is not None]
+    return {
+        "workers": reports,
+        "cold_ms": max(cold) if cold else None,
+        "warm_ms": max(warm) if warm else None,
+    }
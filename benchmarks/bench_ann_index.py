@@ -0,0 +1,99 @@
+"""
+Benchmark IVF index vs tìm kiếm chính xác (FaceGallery) trên gallery tổng hợp.
+
+Chạy:
+    python -m benchmarks.bench_ann_index --identities 10000 --per-identity 5
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from backend.ann_index import IVFIndex
+from backend.gallery import FaceGallery
+
+
+def make_dataset(num_identities: int, per_identity: int, num_queries: int, seed: int):
+    """
+    Gallery dạng cụm (mỗi danh tính là một cụm nhỏ) + queries là biến thể nhiễu của ảnh trong gallery.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(scale=0.3, size=(num_identities, 128)).astype(np.float32)
+    gallery = np.repeat(centres, per_identity, axis=0)
+    gallery += rng.normal(scale=0.05, size=gallery.shape).astype(np.float32)
+
+    picks = rng.choice(len(gallery), num_queries, replace=False)
+    queries = gallery[picks] + rng.normal(scale=0.05, size=(num_queries, 128)).astype(np.float32)
+    return gallery, queries
+
+
+def run(args) -> dict:
+    gallery, queries = make_dataset(args.identities, args.per_identity, args.queries, args.seed)
+    exact = FaceGallery(gallery)
+
+    start = time.perf_counter()
+    index = IVFIndex(num_lists=args.num_lists)
+    index.build(gallery, seed=args.seed)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact_ids, _ = exact.search(queries, 10)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    results = {
+        "gallery_size": len(gallery),
+        "num_lists": index.num_lists,
+        "build_seconds": round(build_seconds, 3),
+        "exact_ms_per_query": round(exact_ms, 3),
+        "probes": []
+    }
+
+    for num_probes in args.probes:
+        recall_at_1 = 0
+        recall_at_10 = 0
+        start = time.perf_counter()
+        for q, query in enumerate(queries):
+            ids, _ = index.search(query, 10, num_probes=num_probes)
+            recall_at_1 += int(len(ids) > 0 and ids[0] == exact_ids[q, 0])
+            recall_at_10 += len(set(ids.tolist()) & set(exact_ids[q].tolist()))
+        ivf_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        results["probes"].append({
+            "num_probes": num_probes,
+            "ms_per_query": round(ivf_ms, 3),
+            "recall_at_1": round(recall_at_1 / len(queries), 4),
+            "recall_at_10": round(recall_at_10 / (10 * len(queries)), 4)
+        })
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark IVF index vs exact search")
+    parser.add_argument("--identities", type=int, default=10000)
+    parser.add_argument("--per-identity", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--num-lists", type=int, default=0, help="0 = tự động sqrt(N)")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", default=None, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    print(f"Gallery: {results['gallery_size']} vectors, {results['num_lists']} cụm "
+          f"(build {results['build_seconds']}s)")
+    print(f"Exact search: {results['exact_ms_per_query']} ms/query")
+    print(f"{'n_probe':>8} {'ms/query':>10} {'recall@1':>10} {'recall@10':>10}")
+    for row in results["probes"]:
+        print(f"{row['num_probes']:>8} {row['ms_per_query']:>10} {row['recall_at_1']:>10} {row['recall_at_10']:>10}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
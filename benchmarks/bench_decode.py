@@ -0,0 +1,87 @@
+"""
+Benchmark decode JPEG: đủ kích thước vs decode thu nhỏ trong miền DCT (FACE_DECODE_MAX_DIM).
+
+Đo thời gian decode và bộ nhớ cấp phát cao nhất (tracemalloc, gồm mảng kết quả của OpenCV)
+trên ảnh JPEG tổng hợp kích thước điện thoại (mặc định 4000x3000) hoặc ảnh từ --image.
+
+Chạy:
+    python -m benchmarks.bench_decode --max-dim 0 640 1024 1600
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+from backend.face_processor import load_image_bgr_from_bytes
+
+
+def synthetic_jpeg(width: int, height: int, quality: int = 92) -> bytes:
+    """
+    Ảnh tổng hợp có gradient + nhiễu (nén JPEG gần giống ảnh chụp thật hơn nhiễu thuần).
+    """
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (x[None, :] * 0.6 + y * 0.4)
+    image = np.stack([base, 255 - base, (base * 0.5 + 64)], axis=2)
+    image += rng.normal(scale=12, size=image.shape).astype(np.float32)
+    ok, buffer = cv2.imencode(".jpg", np.clip(image, 0, 255).astype(np.uint8), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buffer.tobytes()
+
+
+def measure_decode(data: bytes, max_dimension: int, repeat: int) -> dict:
+    load_image_bgr_from_bytes(data, max_dimension)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        image = load_image_bgr_from_bytes(data, max_dimension)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    image = load_image_bgr_from_bytes(data, max_dimension)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "max_dimension": max_dimension,
+        "decoded_size": f"{image.shape[1]}x{image.shape[0]}",
+        "p50_ms": round(float(np.percentile(times, 50)) * 1000, 2),
+        "peak_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark reduced-resolution JPEG decode")
+    parser.add_argument("--image", default=None, help="File JPEG (mặc định: ảnh tổng hợp)")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--max-dim", type=int, nargs="+", default=[0, 640, 1024, 1600])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--json", dest="json_path", default=None, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            data = f.read()
+    else:
+        data = synthetic_jpeg(args.width, args.height)
+
+    rows = [measure_decode(data, max_dimension, args.repeat) for max_dimension in args.max_dim]
+
+    print(f"JPEG {len(data) / 1024 / 1024:.1f}MB")
+    print(f"{'max_dim':>8} {'decoded':>12} {'p50 ms':>10} {'peak MB':>10}")
+    for row in rows:
+        print(f"{row['max_dimension']:>8} {row['decoded_size']:>12} {row['p50_ms']:>10} {row['peak_mb']:>10}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"jpeg_bytes": len(data), "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
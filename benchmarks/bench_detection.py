@@ -0,0 +1,122 @@
+"""
+Benchmark phát hiện khuôn mặt: ảnh gốc vs thu nhỏ rồi detect (FACE_DETECTION_MAX_DIM).
+
+So sánh trên từng ảnh:
+- Thời gian detect + encode
+- Khoảng cách giữa embedding của hai cách (embedding luôn tính trên ảnh gốc)
+- Khoảng cách match tới dữ liệu huấn luyện (models/user_embeddings.npy, nếu có)
+
+Chạy:
+    python -m benchmarks.bench_detection --data-dir data/raw/user --max-dim 640 1024
+"""
+
+import os
+import json
+import time
+import argparse
+from typing import Optional
+
+import cv2
+import numpy as np
+import face_recognition
+
+from backend.face_processor import detect_face_locations
+from backend.gallery import FaceGallery
+
+VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+
+def encode(image_rgb: np.ndarray, max_dimension: int, grayscale: bool, upsample: int):
+    """
+    Detect + encode một ảnh, trả về (encoding hoặc None, số giây).
+    """
+    start = time.perf_counter()
+    locations = detect_face_locations(image_rgb, max_dimension, grayscale, upsample)
+    encoding = None
+    if len(locations) == 1:
+        encodings = face_recognition.face_encodings(image_rgb, locations)
+        encoding = encodings[0] if encodings else None
+    return encoding, time.perf_counter() - start
+
+
+def load_gallery(path: str) -> Optional[FaceGallery]:
+    if not os.path.exists(path):
+        return None
+    return FaceGallery(np.load(path))
+
+
+def run(args) -> dict:
+    files = sorted(
+        f for f in os.listdir(args.data_dir)
+        if os.path.splitext(f.lower())[1] in VALID_EXTENSIONS
+    )[:args.limit or None]
+    gallery = load_gallery(args.embeddings)
+
+    modes = [("original", 0)] + [(f"max_dim={d}", d) for d in args.max_dim]
+    stats = {name: {"seconds": [], "delta": [], "match_distance": [], "missed": 0} for name, _ in modes}
+
+    for filename in files:
+        image_bgr = cv2.imread(os.path.join(args.data_dir, filename))
+        if image_bgr is None:
+            continue
+        image_rgb = cv2.cvtColor(image_bgr, cv2.COLOR_BGR2RGB)
+
+        reference = None
+        for name, max_dimension in modes:
+            encoding, seconds = encode(image_rgb, max_dimension, args.grayscale and max_dimension > 0, args.upsample)
+            stats[name]["seconds"].append(seconds)
+            if encoding is None:
+                stats[name]["missed"] += 1
+                continue
+            if max_dimension == 0:
+                reference = encoding
+            elif reference is not None:
+                stats[name]["delta"].append(float(np.linalg.norm(encoding - reference)))
+            if gallery is not None:
+                stats[name]["match_distance"].append(float(gallery.nearest(encoding)[1][0]))
+
+    def mean(values):
+        return round(float(np.mean(values)), 4) if values else None
+
+    return {
+        "num_images": len(files),
+        "grayscale": args.grayscale,
+        "modes": {
+            name: {
+                "mean_ms": mean([s * 1000 for s in values["seconds"]]),
+                "p95_ms": round(float(np.percentile(values["seconds"], 95)) * 1000, 2) if values["seconds"] else None,
+                "missed": values["missed"],
+                "mean_encoding_delta": mean(values["delta"]),
+                "mean_match_distance": mean(values["match_distance"]),
+            }
+            for name, values in stats.items()
+        }
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark downscale-then-detect")
+    parser.add_argument("--data-dir", default=os.path.join("data", "raw", "user"))
+    parser.add_argument("--embeddings", default=os.path.join("models", "user_embeddings.npy"))
+    parser.add_argument("--max-dim", type=int, nargs="+", default=[640, 1024])
+    parser.add_argument("--grayscale", action="store_true")
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=0, help="Số ảnh tối đa (0 = tất cả)")
+    parser.add_argument("--json", dest="json_path", default=None, help="Ghi kết quả ra file JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    print(f"{results['num_images']} ảnh từ '{args.data_dir}' (grayscale={args.grayscale})")
+    print(f"{'mode':>14} {'mean ms':>10} {'p95 ms':>10} {'missed':>8} {'Δ encoding':>12} {'match dist':>12}")
+    for name, row in results["modes"].items():
+        print(f"{name:>14} {row['mean_ms']!s:>10} {row['p95_ms']!s:>10} {row['missed']:>8} "
+              f"{row['mean_encoding_delta']!s:>12} {row['mean_match_distance']!s:>12}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
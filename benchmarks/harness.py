@@ -0,0 +1,139 @@
+"""
+Công cụ đo cho bộ benchmark: chạy hàm nhiều lần, tính thống kê độ trễ/throughput,
+lưu kết quả JSON và so sánh với baseline để phát hiện regression.
+"""
+
+import json
+import os
+import platform
+import statistics
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Phiên bản định dạng file kết quả
+RESULTS_FORMAT_VERSION = 1
+
+# Chỉ số dùng để so sánh với baseline (ổn định hơn mean khi có nhiễu)
+COMPARE_METRIC = "p50_ms"
+
+
+def measure(
+    func: Callable[[], Any],
+    min_runs: int = 5,
+    min_time: float = 0.5,
+    max_runs: int = 1000,
+    warmup: int = 1,
+    items_per_call: int = 1
+) -> Dict[str, float]:
+    """
+    Đo độ trễ của func: chạy warmup lần (không tính), sau đó chạy tới khi đủ min_runs
+    và tổng thời gian >= min_time (tối đa max_runs lần).
+
+    Args:
+        func: Hàm không tham số cần đo
+        items_per_call: Số phần tử xử lý mỗi lần gọi (để tính throughput theo phần tử)
+
+    Returns:
+        Dictionary: runs, mean_ms, p50_ms, p95_ms, min_ms, stdev_ms, items_per_sec
+    """
+    for _ in range(warmup):
+        func()
+
+    samples: List[float] = []
+    total = 0.0
+    while len(samples) < max_runs and (len(samples) < min_runs or total < min_time):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        total += elapsed
+
+    samples_ms = np.array(samples) * 1000
+    mean_ms = float(samples_ms.mean())
+    return {
+        "runs": len(samples),
+        "mean_ms": round(mean_ms, 4),
+        "p50_ms": round(float(np.percentile(samples_ms, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples_ms, 95)), 4),
+        "min_ms": round(float(samples_ms.min()), 4),
+        "stdev_ms": round(statistics.pstdev(samples_ms.tolist()), 4),
+        "items_per_sec": round(items_per_call * 1000 / mean_ms, 2) if mean_ms > 0 else None,
+    }
+
+
+def environment_info() -> Dict[str, Any]:
+    """
+    Thông tin máy chạy benchmark (so sánh baseline chỉ có ý nghĩa trên cùng loại máy).
+    """
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(path: str, results: Dict[str, Dict[str, Any]], skipped: Optional[Dict[str, str]] = None) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    payload = {
+        "version": RESULTS_FORMAT_VERSION,
+        "environment": environment_info(),
+        "results": results,
+        "skipped": skipped or {},
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+
+
+def load_results(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Đọc phần results của file kết quả.
+
+    Raises:
+        FileNotFoundError: Nếu file không tồn tại
+        ValueError: Nếu file không đúng định dạng
+    """
+    with open(path) as f:
+        payload = json.load(f)
+    if payload.get("version") != RESULTS_FORMAT_VERSION or "results" not in payload:
+        raise ValueError(f"File kết quả '{path}' không đúng định dạng.")
+    return payload["results"]
+
+
+def find_regressions(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    max_regression_pct: float,
+    metric: str = COMPARE_METRIC
+) -> List[str]:
+    """
+    So sánh kết quả với baseline.
+
+    Args:
+        results: Kết quả lần chạy hiện tại
+        baseline: Kết quả baseline
+        max_regression_pct: Mức chậm hơn tối đa cho phép (%)
+        metric: Chỉ số so sánh
+
+    Returns:
+        Danh sách mô tả các benchmark chậm hơn baseline quá ngưỡng
+        (chỉ xét benchmark có trong cả hai)
+    """
+    regressions = []
+    for name in sorted(set(results) & set(baseline)):
+        current = results[name].get(metric)
+        reference = baseline[name].get(metric)
+        if not current or not reference:
+            continue
+        change_pct = (current - reference) / reference * 100
+        if change_pct > max_regression_pct:
+            regressions.append(
+                f"{name}: {metric} {reference:.3f} -> {current:.3f} ({change_pct:+.1f}% > {max_regression_pct:.1f}%)"
+            )
+    return regressions
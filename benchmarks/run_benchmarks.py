@@ -0,0 +1,344 @@
+"""
+Bộ benchmark cho pipeline nhận diện khuôn mặt.
+
+Đo độ trễ / throughput của:
+- load_image_bgr_from_bytes, extract_single_face_embedding, analyze_environment (ảnh trong data/raw/user)
+- Các detector (backend/detectors.py): độ trễ và tỉ lệ khớp kết quả với detector mặc định (hog)
+- compare_with_known_faces trên gallery tổng hợp (mặc định 10 -> 1M vectors)
+- train_personal_model (cache lạnh / cache nóng, chạy trong thư mục tạm)
+- Endpoint end-to-end qua ASGI app (/api/v1/health, /api/v1/face/verify)
+
+Kết quả ghi ra JSON; nếu có --baseline, thoát với mã 1 khi có benchmark chậm hơn
+baseline quá --max-regression phần trăm.
+
+Chạy:
+    python -m benchmarks.run_benchmarks --output benchmarks/results/latest.json
+    python -m benchmarks.run_benchmarks --baseline benchmarks/baseline.json --max-regression 20
+    python -m benchmarks.run_benchmarks --only compare --gallery-sizes 10 1000 100000
+    python -m benchmarks.run_benchmarks --only detector --detectors hog haar "haar>hog" cnn
+"""
+
+import argparse
+import contextlib
+import io
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+
+from benchmarks.harness import find_regressions, load_results, measure, save_results
+
+VALID_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+DEFAULT_GALLERY_SIZES = [10, 1000, 100000, 1000000]
+
+# Cạnh dài ảnh xám cho benchmark phân tích môi trường theo ROI
+ENV_BENCH_MAX_DIMENSION = 256
+
+DEFAULT_BENCH_DETECTORS = ["hog", "haar", "haar>hog"]
+
+# IoU tối thiểu để hai box được coi là cùng một khuôn mặt khi so detector
+AGREEMENT_MIN_IOU = 0.5
+
+
+def load_sample_images(data_dir: str, limit: int) -> List[Tuple[str, bytes]]:
+    """
+    Đọc tối đa `limit` ảnh (tên file, bytes) từ data_dir. Nếu thư mục không có ảnh,
+    tạo một ảnh JPEG tổng hợp để các benchmark decode/environment vẫn chạy được.
+    """
+    images = []
+    if os.path.isdir(data_dir):
+        for filename in sorted(os.listdir(data_dir)):
+            if os.path.splitext(filename.lower())[1] in VALID_EXTENSIONS:
+                with open(os.path.join(data_dir, filename), "rb") as f:
+                    images.append((filename, f.read()))
+            if len(images) >= limit:
+                break
+
+    if not images:
+        rng = np.random.default_rng(0)
+        synthetic = rng.integers(0, 256, (960, 1280, 3), dtype=np.uint8)
+        ok, encoded = cv2.imencode(".jpg", synthetic)
+        images.append(("synthetic.jpg", encoded.tobytes()))
+
+    return images
+
+
+class Cycle:
+    """Trả lần lượt từng phần tử của danh sách, quay vòng."""
+
+    def __init__(self, items):
+        self.items = items
+        self.position = 0
+
+    def next(self):
+        item = self.items[self.position % len(self.items)]
+        self.position += 1
+        return item
+
+
+@contextlib.contextmanager
+def working_directory(path: str):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def bench_image_functions(images, args) -> Dict[str, Dict]:
+    from backend.face_processor import (
+        load_image_bgr_from_bytes,
+        extract_single_face_embedding,
+        analyze_environment,
+    )
+
+    results = {}
+    payloads = Cycle([data for _, data in images])
+    results["load_image_bgr_from_bytes"] = measure(
+        lambda: load_image_bgr_from_bytes(payloads.next()), min_time=args.min_time
+    )
+
+    decoded = [load_image_bgr_from_bytes(data) for _, data in images]
+    rgb_images = [cv2.cvtColor(image, cv2.COLOR_BGR2RGB) for image in decoded]
+
+    # Chỉ dùng ảnh có đúng một khuôn mặt cho extract/environment
+    faces = []
+    for image_bgr, image_rgb in zip(decoded, rgb_images):
+        try:
+            _, location = extract_single_face_embedding(image_rgb)
+        except ValueError:
+            continue
+        faces.append((image_bgr, image_rgb, location))
+
+    if not faces:
+        logging.warning("Không có ảnh nào chứa đúng một khuôn mặt; bỏ qua extract/environment.")
+        return results
+
+    samples = Cycle(faces)
+    results["extract_single_face_embedding"] = measure(
+        lambda: extract_single_face_embedding(samples.next()[1]), min_time=args.min_time
+    )
+
+    def environment():
+        image_bgr, _, location = samples.next()
+        analyze_environment(image_bgr, location)
+
+    results["analyze_environment"] = measure(environment, min_time=args.min_time)
+
+    def environment_bounded():
+        image_bgr, _, location = samples.next()
+        analyze_environment(image_bgr, location, max_dimension=ENV_BENCH_MAX_DIMENSION, face_roi=True)
+
+    results[f"analyze_environment[roi,max_dim={ENV_BENCH_MAX_DIMENSION}]"] = measure(
+        environment_bounded, min_time=args.min_time
+    )
+    return results
+
+
+def box_iou(a, b) -> float:
+    """IoU của hai box (top, right, bottom, left)."""
+    height = min(a[2], b[2]) - max(a[0], b[0])
+    width = min(a[1], b[1]) - max(a[3], b[3])
+    if height <= 0 or width <= 0:
+        return 0.0
+    intersection = height * width
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return intersection / float(area_a + area_b - intersection)
+
+
+def detections_agree(reference, locations) -> bool:
+    """Cùng số khuôn mặt và mỗi box tham chiếu khớp (IoU) với một box của detector."""
+    if len(reference) != len(locations):
+        return False
+    return all(
+        any(box_iou(expected, box) >= AGREEMENT_MIN_IOU for box in locations)
+        for expected in reference
+    )
+
+
+def bench_detectors(images, args) -> Dict[str, Dict]:
+    from backend.detectors import DEFAULT_DETECTOR, get_detector
+    from backend.face_processor import load_image_bgr_from_bytes
+
+    results = {}
+    rgb_images = [cv2.cvtColor(load_image_bgr_from_bytes(data), cv2.COLOR_BGR2RGB) for _, data in images]
+    reference = [get_detector(DEFAULT_DETECTOR).detect(image) for image in rgb_images]
+
+    for spec in args.detectors:
+        detector = get_detector(spec)
+        try:
+            locations = [detector.detect(image) for image in rgb_images]
+        except (FileNotFoundError, AttributeError) as e:
+            # Thiếu file cascade hoặc bản OpenCV không có CascadeClassifier
+            logging.warning(f"Bỏ qua detector '{spec}': {str(e)}")
+            continue
+
+        samples = Cycle(rgb_images)
+        row = measure(lambda: detector.detect(samples.next()), min_time=args.min_time)
+        agreed = sum(detections_agree(ref, found) for ref, found in zip(reference, locations))
+        row["agreement"] = round(agreed / len(rgb_images), 4)
+        row["images_with_faces"] = sum(1 for found in locations if found)
+        results[f"detect[{spec}]"] = row
+
+    return results
+
+
+def bench_compare(args) -> Dict[str, Dict]:
+    from backend.face_processor import compare_with_known_faces
+    from backend.gallery import FaceGallery
+
+    results = {}
+    rng = np.random.default_rng(0)
+    queries = Cycle(list(rng.normal(scale=0.1, size=(64, 128))))
+
+    for size in args.gallery_sizes:
+        gallery = FaceGallery(rng.normal(scale=0.1, size=(size, 128)).astype(np.float32))
+        results[f"compare_with_known_faces[{size}]"] = measure(
+            lambda: compare_with_known_faces(queries.next(), gallery, 0.5),
+            min_time=args.min_time,
+            items_per_call=size
+        )
+        del gallery
+
+    return results
+
+
+def bench_training(images, args) -> Dict[str, Dict]:
+    from backend.training import train_personal_model
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, "data", "raw", "user")
+        os.makedirs(data_dir)
+        for filename, data in images[:args.train_images]:
+            with open(os.path.join(data_dir, filename), "wb") as f:
+                f.write(data)
+
+        with working_directory(tmp):
+            def cold():
+                shutil.rmtree("models", ignore_errors=True)
+                train_personal_model(use_cache=False)
+
+            results["train_personal_model[cold]"] = measure(
+                cold, min_runs=1, min_time=0, warmup=0, items_per_call=len(os.listdir(data_dir))
+            )
+
+            train_personal_model(use_cache=True)
+            results["train_personal_model[cached]"] = measure(
+                lambda: train_personal_model(use_cache=True),
+                min_runs=3, min_time=0, items_per_call=len(os.listdir(data_dir))
+            )
+
+    return results
+
+
+def bench_endpoints(images, args) -> Dict[str, Dict]:
+    from fastapi.testclient import TestClient
+    from backend.data_loader import get_known_faces_cache
+    from backend.main import app
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        myface_dir = os.path.join(tmp, "myface")
+        os.makedirs(myface_dir)
+        for filename, data in images[:args.train_images]:
+            with open(os.path.join(myface_dir, filename), "wb") as f:
+                f.write(data)
+
+        with working_directory(tmp):
+            get_known_faces_cache.cache_clear()
+            client = TestClient(app)
+
+            results["endpoint[GET /api/v1/health]"] = measure(
+                lambda: client.get("/api/v1/health"), min_time=args.min_time
+            )
+
+            try:
+                get_known_faces_cache()
+            except (FileNotFoundError, ValueError) as e:
+                logging.warning(f"Bỏ qua benchmark verify: {str(e)}")
+                return results
+
+            payloads = Cycle([data for _, data in images])
+
+            def verify():
+                client.post(
+                    "/api/v1/face/verify",
+                    files={"file": ("bench.jpg", io.BytesIO(payloads.next()), "image/jpeg")}
+                )
+
+            results["endpoint[POST /api/v1/face/verify]"] = measure(verify, min_time=args.min_time)
+            get_known_faces_cache.cache_clear()
+
+    return results
+
+
+SUITES: Dict[str, Callable] = {
+    "image": lambda images, args: bench_image_functions(images, args),
+    "detector": lambda images, args: bench_detectors(images, args),
+    "compare": lambda images, args: bench_compare(args),
+    "train": lambda images, args: bench_training(images, args),
+    "endpoint": lambda images, args: bench_endpoints(images, args),
+}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark suite cho face pipeline")
+    parser.add_argument("--data-dir", default=os.path.join("data", "raw", "user"))
+    parser.add_argument("--images", type=int, default=20, help="Số ảnh mẫu tối đa")
+    parser.add_argument("--train-images", type=int, default=10, help="Số ảnh cho benchmark train/endpoint")
+    parser.add_argument("--gallery-sizes", type=int, nargs="+", default=DEFAULT_GALLERY_SIZES)
+    parser.add_argument("--detectors", nargs="+", default=DEFAULT_BENCH_DETECTORS,
+                        help="Các detector cần đo (so với detector mặc định hog)")
+    parser.add_argument("--min-time", type=float, default=0.5, help="Thời gian đo tối thiểu mỗi benchmark (giây)")
+    parser.add_argument("--only", nargs="+", choices=sorted(SUITES), default=None, help="Chỉ chạy các nhóm này")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "results", "latest.json"))
+    parser.add_argument("--baseline", default=None, help="File kết quả baseline để so sánh")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Mức chậm hơn baseline tối đa (%%)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+
+    images = load_sample_images(args.data_dir, args.images)
+    results: Dict[str, Dict] = {}
+    skipped: Dict[str, str] = {}
+
+    for name in args.only or list(SUITES):
+        try:
+            results.update(SUITES[name](images, args))
+        except ImportError as e:
+            skipped[name] = f"Thiếu thư viện: {str(e)}"
+            logging.warning(f"Bỏ qua nhóm '{name}': {skipped[name]}")
+
+    width = max((len(name) for name in results), default=10)
+    print(f"{'benchmark':<{width}} {'p50 ms':>10} {'p95 ms':>10} {'items/s':>12} {'runs':>6}")
+    for name, row in results.items():
+        agreement = f"  agreement={row['agreement']:.2%}" if "agreement" in row else ""
+        print(f"{name:<{width}} {row['p50_ms']:>10.3f} {row['p95_ms']:>10.3f} "
+              f"{row['items_per_sec'] or 0:>12.1f} {row['runs']:>6}{agreement}")
+
+    save_results(args.output, results, skipped)
+    print(f"Đã ghi kết quả: {args.output}")
+
+    if args.baseline:
+        regressions = find_regressions(results, load_results(args.baseline), args.max_regression)
+        if regressions:
+            print("Regression so với baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"Không có regression > {args.max_regression:.1f}% so với baseline.")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""
+Tests for the IVF index, the identity gallery and /api/v1/face/identify.
+"""
+
+import io
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend.ann_index import IVFIndex, kmeans
+from backend.gallery import FaceGallery
+from backend import identity_gallery
+from backend.identity_gallery import IdentityGallery, enroll_embedding, get_identity_gallery
+from backend.main import app
+
+
+client = TestClient(app)
+
+
+def clustered_embeddings(num_identities, per_identity, seed=0):
+    """Synthetic gallery: tight clusters around random identity centres."""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(scale=0.3, size=(num_identities, 128))
+    embeddings = np.repeat(centres, per_identity, axis=0)
+    embeddings += rng.normal(scale=0.02, size=embeddings.shape)
+    labels = [f"person_{i}" for i in range(num_identities) for _ in range(per_identity)]
+    return embeddings, labels
+
+
+def create_image_bytes():
+    image = Image.new('RGB', (100, 100), color='red')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class TestKMeans:
+
+    def test_recovers_separated_clusters(self):
+        data, labels = clustered_embeddings(4, 25)
+        centroids, assignments = kmeans(data, 4, seed=1)
+
+        assert centroids.shape == (4, 128)
+        # Each true identity lands in exactly one cluster
+        for i in range(4):
+            assert len(set(assignments[i * 25:(i + 1) * 25])) == 1
+        assert len(set(assignments)) == 4
+
+    def test_invalid_cluster_count(self):
+        with pytest.raises(ValueError):
+            kmeans(np.zeros((3, 128)), 4)
+
+
+class TestIVFIndex:
+
+    def test_recall_matches_exact_search(self):
+        data, _ = clustered_embeddings(50, 10)
+        index = IVFIndex(num_lists=10, num_probes=3)
+        index.build(data)
+        exact = FaceGallery(data)
+
+        rng = np.random.default_rng(5)
+        queries = data[rng.choice(len(data), 40, replace=False)] + rng.normal(scale=0.01, size=(40, 128))
+        hits = 0
+        for query in queries:
+            ids, distances = index.search(query, 1)
+            hits += int(ids[0] == exact.nearest(query)[0][0])
+            assert distances[0] == pytest.approx(np.linalg.norm(data[ids[0]] - query), abs=1e-4)
+        assert hits / len(queries) >= 0.95
+
+    def test_all_probes_is_exact(self):
+        data, _ = clustered_embeddings(20, 5, seed=3)
+        index = IVFIndex(num_lists=6)
+        index.build(data)
+        query = np.random.default_rng(9).normal(scale=0.3, size=128)
+
+        ids, distances = index.search(query, 10, num_probes=6)
+        exact_ids, exact_distances = FaceGallery(data).search(query, 10)
+
+        np.testing.assert_array_equal(ids, exact_ids[0])
+        np.testing.assert_allclose(distances, exact_distances[0], atol=1e-4)
+
+    def test_add_is_searchable(self):
+        data, _ = clustered_embeddings(10, 5)
+        index = IVFIndex(num_lists=4, num_probes=4)
+        index.build(data)
+
+        new_vector = np.full(128, 0.7)
+        index.add(new_vector, np.array([999]))
+
+        assert len(index) == 51
+        ids, distances = index.search(new_vector, 1)
+        assert ids[0] == 999
+        assert distances[0] == pytest.approx(0.0, abs=1e-2)
+
+    def test_add_before_build_rejected(self):
+        with pytest.raises(ValueError):
+            IVFIndex().add(np.zeros(128), np.array([0]))
+
+    def test_save_load_round_trip(self, tmp_path):
+        data, _ = clustered_embeddings(10, 5)
+        index = IVFIndex(num_lists=5, num_probes=2)
+        index.build(data)
+        path = str(tmp_path / "index.npz")
+        index.save(path)
+
+        loaded = IVFIndex.load(path)
+
+        assert len(loaded) == len(index)
+        assert loaded.num_probes == 2
+        for query in data[::7]:
+            np.testing.assert_array_equal(loaded.search(query, 5)[0], index.search(query, 5)[0])
+
+    def test_load_missing_file(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            IVFIndex.load(str(tmp_path / "missing.npz"))
+
+    def test_index_grown_from_one_vector_is_reclustered(self):
+        data, _ = clustered_embeddings(10, 10)
+        index = IVFIndex(num_probes=2)
+        index.build(data[:1])
+        assert index.num_lists == 1
+
+        for i in range(1, len(data)):
+            index.add(data[i], np.array([i]))
+            index.retrain_if_outgrown()
+
+        assert index.num_lists >= 8
+        assert sorted(index.vectors()[1]) == list(range(len(data)))
+        exact = FaceGallery(data.astype(np.float32))
+        for query in data[::9]:
+            ids, _ = index.search(query, 1, num_probes=index.num_lists)
+            assert ids[0] == exact.nearest(query[None, :])[0][0]
+
+    def test_retrain_waits_until_lists_double(self):
+        data, _ = clustered_embeddings(4, 4)
+        index = IVFIndex(num_lists=2)
+        index.build(data)
+
+        assert not index.retrain_if_outgrown(num_lists=3)
+        assert index.retrain_if_outgrown(num_lists=4)
+        assert index.num_lists == 4
+        assert len(index) == 16
+
+
+class TestIdentityGallery:
+
+    def test_identify_returns_one_candidate_per_identity(self):
+        data, labels = clustered_embeddings(8, 6)
+        files = [f"{label}/{i}.jpg" for i, label in enumerate(labels)]
+        gallery = IdentityGallery.build(data, labels, files, num_lists=4, num_probes=4)
+
+        candidates = gallery.identify(data[13], top_k=3)
+
+        assert len(candidates) == 3
+        assert candidates[0][0] == "person_2"
+        assert candidates[0][2] == files[13]
+        assert len({c[0] for c in candidates}) == 3
+        assert [c[1] for c in candidates] == sorted(c[1] for c in candidates)
+
+    def test_save_load_round_trip(self, tmp_path):
+        data, labels = clustered_embeddings(4, 3)
+        files = [f"{i}.jpg" for i in range(len(labels))]
+        gallery = IdentityGallery.build(data, labels, files, num_lists=2)
+        gallery.add(np.full(128, 0.9), "new_person", "new.jpg")
+
+        gallery_path = str(tmp_path / "gallery.npz")
+        gallery.save(gallery_path)
+        loaded = IdentityGallery.load(gallery_path, str(tmp_path / "missing_index.npz"))
+
+        # Nhãn và index nằm trong cùng một file
+        assert os.listdir(str(tmp_path)) == ["gallery.npz"]
+        assert len(loaded) == 13
+        assert loaded.num_identities == 5
+        assert loaded.identify(np.full(128, 0.9), top_k=1)[0][0] == "new_person"
+
+    def test_loads_legacy_two_file_gallery(self, tmp_path):
+        data, labels = clustered_embeddings(4, 3)
+        files = [f"{i}.jpg" for i in range(len(labels))]
+        gallery = IdentityGallery.build(data, labels, files, num_lists=2)
+        gallery_path, index_path = str(tmp_path / "gallery.npz"), str(tmp_path / "index.npz")
+        np.savez(gallery_path, labels=np.array(labels), files=np.array(files))
+        gallery.index.save(index_path)
+
+        loaded = IdentityGallery.load(gallery_path, index_path)
+
+        assert loaded.files == files
+        assert loaded.identify(data[4], top_k=1)[0][0] == labels[4]
+
+    def test_load_missing_gallery(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            IdentityGallery.load(str(tmp_path / "g.npz"), str(tmp_path / "i.npz"))
+
+    @pytest.fixture
+    def fresh_gallery(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(identity_gallery, "_identity_gallery", None)
+        monkeypatch.setattr(identity_gallery, "_identity_gallery_file", None)
+        monkeypatch.setattr(identity_gallery, "_identity_gallery_failed_file", None)
+
+    def test_enroll_merges_with_gallery_saved_by_other_worker(self, fresh_gallery):
+        data, labels = clustered_embeddings(3, 1)
+
+        enroll_embedding(data[0], labels[0], "a.jpg")
+        # Worker khác thêm một ảnh vào file gallery
+        other = IdentityGallery.load()
+        other.add(data[1], labels[1], "b.jpg")
+        other.save()
+        gallery = enroll_embedding(data[2], labels[2], "c.jpg")
+
+        assert gallery.files == ["a.jpg", "b.jpg", "c.jpg"]
+        assert IdentityGallery.load().files == ["a.jpg", "b.jpg", "c.jpg"]
+        assert get_identity_gallery() is gallery
+
+    def test_gallery_saved_by_other_worker_is_reloaded(self, fresh_gallery):
+        data, labels = clustered_embeddings(3, 1)
+        enroll_embedding(data[0], labels[0], "a.jpg")
+        loaded = get_identity_gallery()
+        assert get_identity_gallery() is loaded
+
+        # Worker khác đăng ký thêm một ảnh
+        other = IdentityGallery.load()
+        other.add(data[1], labels[1], "b.jpg")
+        other.save()
+
+        assert get_identity_gallery().files == ["a.jpg", "b.jpg"]
+        assert get_identity_gallery().identify(data[1], top_k=1)[0][0] == labels[1]
+
+    def test_unreadable_gallery_file_keeps_loaded_gallery(self, fresh_gallery):
+        data, labels = clustered_embeddings(2, 1)
+        gallery = enroll_embedding(data[0], labels[0], "a.jpg")
+
+        os.remove(identity_gallery.IDENTITY_GALLERY_PATH)
+        np.savez(identity_gallery.IDENTITY_GALLERY_PATH, labels=np.array(["x", "y"]), files=np.array(["x", "y"]))
+
+        assert get_identity_gallery() is gallery
+
+
+class TestIdentifyEndpoint:
+
+    def test_identify_best_candidate(self):
+        data, labels = clustered_embeddings(5, 4)
+        gallery = IdentityGallery.build(data, labels, [f"{i}.jpg" for i in range(20)], num_lists=3)
+
+        with patch('backend.main.get_identity_gallery') as mock_gallery, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_gallery.return_value = gallery
+            mock_extract.return_value = (data[9], (10, 90, 90, 10))
+
+            response = client.post(
+                "/api/v1/face/identify",
+                files={"file": ("test.jpg", create_image_bytes(), "image/jpeg")},
+                params={"threshold": 0.5, "top_k": 3}
+            )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["is_match"] is True
+        assert body["identity"] == "person_2"
+        assert body["gallery_size"] == 20
+        assert body["num_identities"] == 5
+        assert len(body["candidates"]) == 3
+        assert body["candidates"][0]["is_match"] is True
+
+    def test_identify_no_match(self):
+        data, labels = clustered_embeddings(3, 2)
+        gallery = IdentityGallery.build(data, labels, [f"{i}.jpg" for i in range(6)], num_lists=2)
+
+        with patch('backend.main.get_identity_gallery') as mock_gallery, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_gallery.return_value = gallery
+            mock_extract.return_value = (np.full(128, 5.0), (10, 90, 90, 10))
+
+            response = client.post(
+                "/api/v1/face/identify",
+                files={"file": ("test.jpg", create_image_bytes(), "image/jpeg")}
+            )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["is_match"] is False
+        assert body["identity"] is None
+
+    def test_identify_without_gallery(self):
+        with patch('backend.main.get_identity_gallery') as mock_gallery, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_gallery.side_effect = FileNotFoundError("Chưa có gallery danh tính.")
+            mock_extract.return_value = (np.zeros(128), (10, 90, 90, 10))
+
+            response = client.post(
+                "/api/v1/face/identify",
+                files={"file": ("test.jpg", create_image_bytes(), "image/jpeg")}
+            )
+
+        assert response.status_code == 500
+
+    def test_enroll_rejects_invalid_identity(self):
+        response = client.post(
+            "/api/v1/identities/..%2Fetc/enroll",
+            files={"file": ("test.jpg", create_image_bytes(), "image/jpeg")}
+        )
+        assert response.status_code in (400, 404)
+
+    def test_enroll_rejects_trailing_newline(self):
+        response = client.post(
+            "/api/v1/identities/alice%0A/enroll",
+            files={"file": ("test.jpg", create_image_bytes(), "image/jpeg")}
+        )
+        assert response.status_code == 400
+
+    def test_failed_enroll_removes_saved_image(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(identity_gallery, "IDENTITY_DATA_DIR", str(tmp_path))
+        with patch('backend.main.extract_single_face_encoding') as mock_extract, \
+             patch('backend.main.enroll_embedding', side_effect=OSError("disk full")):
+            mock_extract.return_value = (np.zeros(128), (10, 90, 90, 10))
+            with pytest.raises(OSError):
+                client.post(
+                    "/api/v1/identities/alice/enroll",
+                    files={"file": ("test.jpg", create_image_bytes(), "image/jpeg")}
+                )
+
+        assert os.listdir(str(tmp_path / "alice")) == []
@@ -0,0 +1,146 @@
+"""
+Tests for batch verification: vectorized comparison and /api/v1/face/verify/batch.
+"""
+
+import io
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from hypothesis import given, settings, strategies as st
+from PIL import Image
+
+from backend.main import app
+from backend.face_processor import compare_batch_with_known_faces
+from backend import config
+
+
+client = TestClient(app)
+
+
+def create_image_bytes(format='JPEG'):
+    """Helper to create a small valid image"""
+    img = Image.new('RGB', (120, 120), color='green')
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format=format)
+    return img_bytes.getvalue()
+
+
+class TestCompareBatchWithKnownFaces:
+    """Vectorized comparison must match per-pair Euclidean distances."""
+
+    @settings(max_examples=30, deadline=None)
+    @given(
+        num_unknown=st.integers(min_value=1, max_value=8),
+        num_known=st.integers(min_value=1, max_value=20),
+        threshold=st.floats(min_value=0.0, max_value=1.0),
+        seed=st.integers(min_value=0, max_value=2**31 - 1)
+    )
+    def test_property_matches_bruteforce(self, num_unknown, num_known, threshold, seed):
+        rng = np.random.default_rng(seed)
+        unknown = rng.normal(scale=0.1, size=(num_unknown, 128))
+        known = [rng.normal(scale=0.1, size=128) for _ in range(num_known)]
+
+        is_match, distances = compare_batch_with_known_faces(unknown, known, threshold)
+
+        expected = np.array([
+            min(np.linalg.norm(k - u) for k in known) for u in unknown
+        ])
+        np.testing.assert_allclose(distances, expected, atol=1e-5)
+        np.testing.assert_array_equal(is_match, distances <= threshold)
+
+    def test_identical_encoding_has_zero_distance(self):
+        known = [np.full(128, 0.05), np.zeros(128)]
+        is_match, distances = compare_batch_with_known_faces(np.zeros((1, 128)), known, 0.0)
+        assert distances[0] == 0.0
+        assert bool(is_match[0]) is True
+
+    def test_empty_batch(self):
+        is_match, distances = compare_batch_with_known_faces(
+            np.zeros((0, 128)), [np.zeros(128)], 0.5
+        )
+        assert is_match.shape == (0,)
+        assert distances.shape == (0,)
+
+    def test_empty_gallery_rejected(self):
+        with pytest.raises(ValueError):
+            compare_batch_with_known_faces(np.zeros((1, 128)), [], 0.5)
+
+
+class TestBatchVerifyEndpoint:
+    """Endpoint tests with face detection mocked out."""
+
+    def test_batch_returns_one_result_per_image_in_order(self):
+        known = [np.zeros(128), np.ones(128)]
+        encodings = [np.zeros(128), np.full(128, 10.0)]
+        env_info = {
+            'brightness': 120.0, 'is_too_dark': False, 'is_too_bright': False,
+            'blur_score': 150.0, 'is_too_blurry': False,
+            'face_size_ratio': 0.3, 'is_face_too_small': False, 'warnings': []
+        }
+
+        with patch('backend.main.get_known_faces_cache') as mock_cache, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract, \
+             patch('backend.main.analyze_environment') as mock_analyze:
+            mock_cache.return_value = (known, ["a.jpg", "b.jpg"])
+            mock_extract.side_effect = [(e, (10, 90, 90, 10)) for e in encodings]
+            mock_analyze.return_value = env_info
+
+            files = [
+                ("files", ("first.jpg", create_image_bytes(), "image/jpeg")),
+                ("files", ("bad.txt", b"not an image", "text/plain")),
+                ("files", ("second.jpg", create_image_bytes(), "image/jpeg")),
+            ]
+            response = client.post(
+                "/api/v1/face/verify/batch", files=files, params={"threshold": 0.5}
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["num_images"] == 3
+        assert data["num_failed"] == 1
+        assert data["training_info"]["num_images"] == 2
+
+        results = data["results"]
+        assert [r["index"] for r in results] == [0, 1, 2]
+        assert [r["filename"] for r in results] == ["first.jpg", "bad.txt", "second.jpg"]
+
+        # Detection happens in parallel, so only check the set of outcomes
+        ok = [r for r in results if r["error"] is None]
+        assert len(ok) == 2
+        assert sorted(r["is_match"] for r in ok) == [False, True]
+        assert data["num_matched"] == 1
+
+        assert results[1]["error"] is not None
+        assert "File upload phải là ảnh" in results[1]["error"]
+        assert results[1]["is_match"] is None
+
+    def test_per_image_detection_error(self):
+        with patch('backend.main.get_known_faces_cache') as mock_cache, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_cache.return_value = ([np.zeros(128)], ["a.jpg"])
+            mock_extract.side_effect = ValueError("Không tìm thấy khuôn mặt nào trong ảnh.")
+
+            response = client.post(
+                "/api/v1/face/verify/batch",
+                files=[("files", ("x.jpg", create_image_bytes(), "image/jpeg"))]
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["num_failed"] == 1
+        assert "Không tìm thấy khuôn mặt" in data["results"][0]["error"]
+
+    def test_batch_too_large_rejected(self):
+        image = create_image_bytes()
+        files = [
+            ("files", (f"{i}.jpg", image, "image/jpeg"))
+            for i in range(config.MAX_BATCH_SIZE + 1)
+        ]
+        with patch('backend.main.get_known_faces_cache') as mock_cache:
+            mock_cache.return_value = ([np.zeros(128)], ["a.jpg"])
+            response = client.post("/api/v1/face/verify/batch", files=files)
+
+        assert response.status_code == 400
+        assert "Batch quá lớn" in response.json()["detail"]
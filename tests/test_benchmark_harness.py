@@ -0,0 +1,72 @@
+"""
+Tests for the benchmark harness: measurement, result files and regression detection.
+"""
+
+import json
+
+import pytest
+
+from benchmarks.harness import find_regressions, load_results, measure, save_results
+
+
+class TestMeasure:
+
+    def test_runs_until_min_runs(self):
+        calls = []
+        result = measure(lambda: calls.append(1), min_runs=7, min_time=0, warmup=2)
+
+        assert result["runs"] == 7
+        assert len(calls) == 9
+        assert result["p50_ms"] <= result["p95_ms"]
+        assert result["min_ms"] <= result["mean_ms"]
+
+    def test_respects_max_runs(self):
+        result = measure(lambda: None, min_runs=1, min_time=10, max_runs=20, warmup=0)
+        assert result["runs"] == 20
+
+
+class TestResultsFile:
+
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "out" / "results.json")
+        results = {"decode": {"p50_ms": 1.5, "mean_ms": 1.6}}
+
+        save_results(path, results, skipped={"train": "missing dlib"})
+
+        assert load_results(path) == results
+        with open(path) as f:
+            payload = json.load(f)
+        assert payload["skipped"] == {"train": "missing dlib"}
+        assert "cpu_count" in payload["environment"]
+
+    def test_invalid_file_rejected(self, tmp_path):
+        path = tmp_path / "bad.json"
+        path.write_text(json.dumps({"foo": 1}))
+        with pytest.raises(ValueError):
+            load_results(str(path))
+
+
+class TestFindRegressions:
+
+    def test_flags_only_slowdowns_over_threshold(self):
+        baseline = {
+            "decode": {"p50_ms": 10.0},
+            "detect": {"p50_ms": 100.0},
+            "compare": {"p50_ms": 1.0},
+        }
+        results = {
+            "decode": {"p50_ms": 11.0},     # +10%
+            "detect": {"p50_ms": 150.0},    # +50%
+            "compare": {"p50_ms": 0.5},     # faster
+            "new_bench": {"p50_ms": 5.0},   # not in baseline
+        }
+
+        regressions = find_regressions(results, baseline, max_regression_pct=20)
+
+        assert len(regressions) == 1
+        assert regressions[0].startswith("detect:")
+        assert "+50.0%" in regressions[0]
+
+    def test_no_regressions(self):
+        baseline = {"decode": {"p50_ms": 10.0}}
+        assert find_regressions({"decode": {"p50_ms": 10.5}}, baseline, 10) == []
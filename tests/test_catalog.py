@@ -0,0 +1,178 @@
+"""
+Tests for the SQLite image catalog: directory sync, transactional collect and catalog-backed counts.
+"""
+
+import io
+import os
+import sqlite3
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import catalog, dedup, main
+from backend.catalog import CatalogEntry, ImageCatalog, catalog_path_for
+from backend.dedup import DuplicateIndex
+from backend.image_store import iter_image_files
+
+
+client = TestClient(main.app)
+
+GOOD_ENVIRONMENT = {
+    'brightness': 120.0, 'is_too_dark': False, 'is_too_bright': False,
+    'blur_score': 300.0, 'is_too_blurry': False,
+    'face_size_ratio': 0.2, 'is_face_too_small': False, 'warnings': []
+}
+
+# mtime đủ cũ để không rơi vào cửa sổ racy của lần đối chiếu
+OLD_MTIME_NS = 1_000_000_000_000_000_000
+
+
+def write_image(directory, name, color=0):
+    image = np.full((32, 32, 3), color, dtype=np.uint8)
+    cv2.imwrite(os.path.join(directory, name), image)
+
+
+def settle(directory):
+    os.utime(directory, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    directory = tmp_path / "user"
+    directory.mkdir()
+    for i in range(3):
+        write_image(str(directory), f"user_{i}.jpg", color=i * 40)
+    (directory / "notes.txt").write_text("not an image")
+    settle(str(directory))
+    return str(directory)
+
+
+class TestImageCatalog:
+
+    def test_catalog_lives_next_to_the_directory(self, data_dir):
+        assert catalog_path_for(data_dir) == data_dir + ".catalog.db"
+        assert ImageCatalog(data_dir).db_path == data_dir + ".catalog.db"
+
+    def test_sync_indexes_existing_images_once(self, data_dir):
+        images = ImageCatalog(data_dir)
+
+        assert images.sync()
+        assert images.paths() == ["user_0.jpg", "user_1.jpg", "user_2.jpg"]
+        assert not images.sync()
+        # Process khác (instance mới) dùng mtime đã lưu trong catalog, không quét lại
+        assert not ImageCatalog(data_dir).sync()
+
+    def test_external_changes_are_picked_up(self, data_dir):
+        images = ImageCatalog(data_dir)
+        assert images.count() == 3
+
+        os.remove(os.path.join(data_dir, "user_0.jpg"))
+        write_image(data_dir, "manual.png")
+
+        assert images.count() == 3
+        assert sorted(images.paths()) == ["manual.png", "user_1.jpg", "user_2.jpg"]
+
+    def test_add_records_the_write_without_rescanning(self, data_dir):
+        images = ImageCatalog(data_dir)
+        images.sync()
+
+        write_image(data_dir, "user_3.jpg")
+        size, mtime_ns, content_hash = catalog.describe_file(os.path.join(data_dir, "user_3.jpg"))
+        entry = CatalogEntry(
+            path="user_3.jpg", size=size, mtime_ns=mtime_ns, captured_at=2e9,
+            content_hash=content_hash, dhash=(1 << 63) + 5, face_box=(1, 30, 30, 1),
+            environment=dict(GOOD_ENVIRONMENT, is_too_bright=np.bool_(True))
+        )
+
+        assert images.add(entry) == 4
+        assert not images.sync()
+        stored = images.get("user_3.jpg")
+        assert stored.dhash == (1 << 63) + 5
+        assert stored.face_box == (1, 30, 30, 1)
+        assert stored.environment["is_too_bright"] is True
+        assert stored.environment["blur_score"] == 300.0
+        assert images.paths()[-1] == "user_3.jpg"
+
+    def test_generation_changes_on_every_write(self, data_dir):
+        images = ImageCatalog(data_dir)
+        images.sync()
+        generations = [images.generation()]
+
+        images.set_dhashes({"user_0.jpg": 7})
+        generations.append(images.generation())
+        images.rename({"user_0.jpg": "renamed.jpg"})
+        generations.append(ImageCatalog(data_dir).generation())
+        images.remove(["renamed.jpg"])
+        generations.append(images.generation())
+
+        assert len(set(generations)) == 4
+        assert not images.sync()
+        assert images.generation() == generations[-1]
+
+    def test_recently_changed_directory_is_rescanned(self, data_dir):
+        images = ImageCatalog(data_dir)
+        write_image(data_dir, "user_3.jpg")
+
+        assert images.sync()
+        # mtime thư mục nằm trong cửa sổ racy: chưa tin, lần sau quét lại
+        assert images.sync()
+
+    def test_schema_version_mismatch_rebuilds(self, data_dir):
+        ImageCatalog(data_dir).sync()
+        with sqlite3.connect(catalog_path_for(data_dir)) as conn:
+            conn.execute("UPDATE meta SET value = '0' WHERE key = 'schema_version'")
+        catalog._initialized_catalogs.clear()
+
+        assert ImageCatalog(data_dir).count() == 3
+
+
+class TestCatalogBackedEndpoints:
+
+    @pytest.fixture
+    def collect_env(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(dedup, "duplicate_index", DuplicateIndex(os.path.join("data", "raw", "user")))
+        with patch('backend.main.extract_single_face_encoding') as mock_extract, \
+             patch('backend.main.analyze_environment') as mock_analyze:
+            mock_extract.return_value = (np.zeros(128), (50, 150, 150, 50))
+            mock_analyze.return_value = dict(GOOD_ENVIRONMENT)
+            yield
+
+    def post(self, color):
+        image = cv2.resize(
+            np.random.default_rng(color).integers(0, 256, (6, 8, 3), dtype=np.uint8), (320, 240)
+        )
+        files = {"file": ("test.jpg", io.BytesIO(cv2.imencode(".jpg", image)[1].tobytes()), "image/jpeg")}
+        return client.post("/api/v1/collect", files=files)
+
+    def test_collect_writes_catalog_row(self, collect_env):
+        with patch('backend.main.os.listdir', side_effect=AssertionError("directory scan")):
+            response = self.post(1)
+
+        assert response.status_code == 200
+        assert response.json()["total_images"] == 1
+        filename = os.path.relpath(response.json()["saved_path"], main.image_catalog.data_dir)
+        entry = main.image_catalog.get(filename)
+        assert entry.face_box == (50, 150, 150, 50)
+        assert entry.environment["face_size_ratio"] == pytest.approx(0.2)
+        assert entry.content_hash == catalog.describe_file(response.json()["saved_path"])[2]
+        assert entry.dhash is not None
+
+    def test_failed_catalog_write_removes_saved_image(self, collect_env):
+        with patch.object(main.image_catalog, "add", side_effect=sqlite3.OperationalError("locked")):
+            with pytest.raises(sqlite3.OperationalError):
+                self.post(2)
+
+        assert list(iter_image_files(os.path.join("data", "raw", "user"))) == []
+
+    def test_training_check_counts_from_catalog(self, collect_env):
+        os.makedirs(os.path.join("data", "raw", "user"))
+        with pytest.raises(main.HTTPException) as exc_info:
+            main._check_training_data()
+        assert exc_info.value.status_code == 400
+
+        self.post(3)
+        main._check_training_data()
@@ -12,10 +12,16 @@ from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
 
 from backend.main import app
+from backend.image_store import iter_image_files
 
 client = TestClient(app)
 
 
+def list_images(data_dir):
+    """Image paths in the collection directory, including date shard subdirectories."""
+    return [path for path, _ in iter_image_files(data_dir)]
+
+
 # Strategy for generating images with controlled environment properties
 @st.composite
 def image_with_environment(draw, poor_environment=False):
@@ -130,7 +136,7 @@ def test_property_collection_rejection_for_poor_environment(image_data):
         import os
         data_dir = "data/raw/user"
         os.makedirs(data_dir, exist_ok=True)
-        files_before = set(os.listdir(data_dir))
+        files_before = set(list_images(data_dir))
         
         # Create file upload
         files = {
@@ -141,7 +147,7 @@ def test_property_collection_rejection_for_poor_environment(image_data):
         response = client.post("/api/v1/collect", files=files)
         
         # Count files after request
-        files_after = set(os.listdir(data_dir))
+        files_after = set(list_images(data_dir))
         new_files = files_after - files_before
         
         # Assert HTTP 400 for poor environment
@@ -202,7 +208,7 @@ def test_property_collection_success_for_good_environment(image_data):
         import os
         data_dir = "data/raw/user"
         os.makedirs(data_dir, exist_ok=True)
-        files_before = os.listdir(data_dir)
+        files_before = list_images(data_dir)
         files_before_count = len([f for f in files_before if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
         
         # Create file upload
@@ -215,7 +221,7 @@ def test_property_collection_success_for_good_environment(image_data):
             response = client.post("/api/v1/collect", files=files)
             
             # Count files after request
-            files_after = os.listdir(data_dir)
+            files_after = list_images(data_dir)
             files_after_count = len([f for f in files_after if f.lower().endswith(('.jpg', '.jpeg', '.png'))])
             
             # Assert HTTP 200 for good environment
@@ -252,7 +258,7 @@ def test_property_collection_success_for_good_environment(image_data):
                 f"New file {new_file} should exist in {data_dir}"
         finally:
             # Cleanup: remove the test file if it was created
-            files_after = os.listdir(data_dir)
+            files_after = list_images(data_dir)
             new_files = set(files_after) - set(files_before)
             for new_file in new_files:
                 try:
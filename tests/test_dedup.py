@@ -0,0 +1,236 @@
+"""
+Tests for near-duplicate suppression at collection time and the dedupe command.
+"""
+
+import io
+import os
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import dedup
+from backend.catalog import CatalogEntry, ImageCatalog, describe_file
+from backend.dedup import (
+    DuplicateIndex,
+    Sample,
+    dedupe_directory,
+    file_dhash,
+    find_near_duplicate,
+    hash_distance,
+    image_dhash
+)
+from backend.main import app
+
+client = TestClient(app)
+
+GOOD_ENVIRONMENT = {
+    'brightness': 120.0,
+    'is_too_dark': False,
+    'is_too_bright': False,
+    'blur_score': 300.0,
+    'is_too_blurry': False,
+    'face_size_ratio': 0.2,
+    'is_face_too_small': False,
+    'warnings': []
+}
+
+
+def gradient_image(seed, size=(240, 320)):
+    """Smooth random image: small pixel noise does not change its dHash."""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+    return cv2.resize(coarse, (size[1], size[0]), interpolation=cv2.INTER_CUBIC)
+
+
+def jpeg_bytes(image):
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+class TestDifferenceHash:
+
+    def test_hash_is_stable_across_resize_and_recompression(self):
+        image = gradient_image(1)
+        resized = cv2.resize(image, (160, 120), interpolation=cv2.INTER_AREA)
+        recompressed = cv2.imdecode(np.frombuffer(jpeg_bytes(image), np.uint8), cv2.IMREAD_COLOR)
+
+        assert hash_distance(image_dhash(image), image_dhash(resized)) <= 2
+        assert hash_distance(image_dhash(image), image_dhash(recompressed)) <= 2
+
+    def test_different_images_have_distant_hashes(self):
+        assert hash_distance(image_dhash(gradient_image(1)), image_dhash(gradient_image(2))) > 10
+
+    def test_file_hash_matches_in_memory_hash(self, tmp_path):
+        image = gradient_image(3, size=(480, 640))
+        path = str(tmp_path / "a.jpg")
+        cv2.imwrite(path, image)
+        assert hash_distance(file_dhash(path), image_dhash(image)) <= 2
+
+    def test_unreadable_file_raises(self, tmp_path):
+        path = tmp_path / "broken.jpg"
+        path.write_bytes(b"not an image")
+        with pytest.raises(ValueError):
+            file_dhash(str(path))
+
+
+class TestFindNearDuplicate:
+
+    def test_requires_both_hash_and_embedding_to_be_close(self):
+        encoding = np.zeros(128)
+        samples = [
+            Sample("far_hash.jpg", 0xFFFF, np.zeros(128)),
+            Sample("far_embedding.jpg", 0x1, np.full(128, 0.1)),
+        ]
+        assert find_near_duplicate(0x0, encoding, samples, 4, 0.2) is None
+
+    def test_picks_closest_sample(self):
+        encoding = np.zeros(128)
+        samples = [
+            Sample("a.jpg", 0b111, np.zeros(128)),
+            Sample("b.jpg", 0b1, np.full(128, 0.001)),
+        ]
+        match = find_near_duplicate(0x0, encoding, samples, 4, 0.2)
+        assert match.filename == "b.jpg"
+        assert match.hash_distance == 1
+        assert match.embedding_distance == pytest.approx(np.sqrt(128) * 0.001)
+
+    def test_hash_only_when_embedding_unknown(self):
+        match = find_near_duplicate(0x0, np.zeros(128), [Sample("a.jpg", 0b11)], 4, 0.2)
+        assert match.filename == "a.jpg"
+        assert match.embedding_distance is None
+
+
+class TestDuplicateIndex:
+
+    @pytest.fixture
+    def data_dir(self, tmp_path):
+        for i, seed in enumerate((10, 11)):
+            cv2.imwrite(str(tmp_path / f"user_{i}.jpg"), gradient_image(seed))
+        return tmp_path
+
+    def test_builds_from_directory_and_finds_duplicate(self, data_dir):
+        index = DuplicateIndex(str(data_dir))
+        match = index.find(image_dhash(gradient_image(10)), np.zeros(128))
+
+        assert index.loaded and len(index) == 2
+        assert match.filename == "user_0.jpg"
+
+    def test_recent_mode_only_checks_latest_samples(self, data_dir):
+        index = DuplicateIndex(str(data_dir))
+        dhash = image_dhash(gradient_image(10))
+        assert index.find(dhash, None, mode=dedup.DEDUP_RECENT, recent=1) is None
+        assert index.find(dhash, None, mode=dedup.DEDUP_ALL) is not None
+
+    def test_added_samples_are_matched(self, data_dir):
+        index = DuplicateIndex(str(data_dir))
+        index.find(0, None)
+        cv2.imwrite(str(data_dir / "user_2.jpg"), gradient_image(12))
+        index.add("user_2.jpg", image_dhash(gradient_image(12)), None)
+
+        assert index.find(image_dhash(gradient_image(12)), None).filename == "user_2.jpg"
+
+    def test_removed_files_are_dropped(self, data_dir):
+        index = DuplicateIndex(str(data_dir))
+        dhash = image_dhash(gradient_image(10))
+        index.find(dhash, None)
+        os.remove(data_dir / "user_0.jpg")
+
+        assert index.find(dhash, None) is None
+        assert len(index) == 1
+
+    def test_images_collected_by_other_worker_are_matched(self, data_dir):
+        index = DuplicateIndex(str(data_dir))
+        index.find(0, None)
+
+        # Worker khác lưu ảnh và ghi vào catalog; index của process này không được add()
+        image = gradient_image(12)
+        cv2.imwrite(str(data_dir / "user_2.jpg"), image)
+        size, mtime_ns, content_hash = describe_file(str(data_dir / "user_2.jpg"))
+        ImageCatalog(str(data_dir)).add(CatalogEntry(
+            "user_2.jpg", size, mtime_ns, captured_at=2e9, content_hash=content_hash, dhash=image_dhash(image)
+        ))
+
+        assert index.find(image_dhash(image), None).filename == "user_2.jpg"
+        assert len(index) == 3
+
+    def test_add_is_noop_before_build(self, data_dir):
+        index = DuplicateIndex(str(data_dir))
+        index.add("x.jpg", 0, None)
+        assert len(index) == 0
+
+
+class TestDedupeDirectory:
+
+    def test_keeps_first_of_each_burst(self, tmp_path):
+        images = [gradient_image(20), gradient_image(20), gradient_image(21), gradient_image(20)]
+        for i, image in enumerate(images):
+            path = str(tmp_path / f"user_{i}.jpg")
+            cv2.imwrite(path, image)
+            os.utime(path, ns=(i * 10**9, i * 10**9))
+
+        with patch('backend.dedup.extract_embedding_from_file') as mock_extract:
+            mock_extract.return_value = ("ok", 1, np.zeros(128))
+            kept, duplicates = dedupe_directory(str(tmp_path))
+
+        assert kept == ["user_0.jpg", "user_2.jpg"]
+        assert [(name, match.filename) for name, match in duplicates] == [
+            ("user_1.jpg", "user_0.jpg"), ("user_3.jpg", "user_0.jpg")
+        ]
+
+    def test_different_embeddings_are_kept(self, tmp_path):
+        for i in range(2):
+            cv2.imwrite(str(tmp_path / f"user_{i}.jpg"), gradient_image(30))
+
+        encodings = {"user_0.jpg": np.zeros(128), "user_1.jpg": np.full(128, 0.1)}
+        with patch('backend.dedup.extract_embedding_from_file') as mock_extract:
+            mock_extract.side_effect = lambda path, detector: ("ok", 1, encodings[os.path.basename(path)])
+            kept, duplicates = dedupe_directory(str(tmp_path))
+
+        assert len(kept) == 2 and duplicates == []
+
+    def test_missing_directory_raises(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            dedupe_directory(str(tmp_path / "missing"))
+
+
+class TestCollectDedupe:
+
+    @pytest.fixture
+    def collect_env(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(dedup, "duplicate_index", DuplicateIndex(os.path.join("data", "raw", "user")))
+        with patch('backend.main.extract_single_face_encoding') as mock_extract, \
+             patch('backend.main.analyze_environment') as mock_analyze:
+            mock_extract.return_value = (np.zeros(128), (50, 150, 150, 50))
+            mock_analyze.return_value = dict(GOOD_ENVIRONMENT)
+            yield
+
+    def post(self, image, dedupe=None):
+        params = {"dedupe": dedupe} if dedupe else {}
+        files = {"file": ("test.jpg", io.BytesIO(jpeg_bytes(image)), "image/jpeg")}
+        return client.post("/api/v1/collect", files=files, params=params)
+
+    def test_near_duplicate_is_not_saved(self, collect_env):
+        first = self.post(gradient_image(40), dedupe="all")
+        assert first.status_code == 200
+        assert first.json()["saved"] is True
+
+        second = self.post(gradient_image(40), dedupe="all")
+        data = second.json()
+        assert second.status_code == 200
+        assert data["saved"] is False
+        assert data["duplicate_of"] == os.path.relpath(first.json()["saved_path"], os.path.join("data", "raw", "user"))
+        assert data["saved_path"] == first.json()["saved_path"]
+        assert data["embedding_distance"] == pytest.approx(0.0)
+        assert data["total_images"] == 1
+
+    def test_dedupe_off_saves_every_image(self, collect_env):
+        response = self.post(gradient_image(41))
+        assert response.json()["saved"] is True
+        assert response.json()["duplicate_of"] is None
+
+    def test_invalid_mode_returns_400(self, collect_env):
+        response = self.post(gradient_image(42), dedupe="sometimes")
+        assert response.status_code == 400
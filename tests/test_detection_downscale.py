@@ -0,0 +1,103 @@
+"""
+Tests for downscale-then-detect face location mode.
+"""
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from backend import config
+from backend.face_processor import detect_face_locations, extract_single_face_embedding
+
+
+class TestDetectFaceLocations:
+
+    def test_default_path_detects_on_original_image(self):
+        image = np.zeros((300, 400, 3), dtype=np.uint8)
+        with patch('backend.face_processor.face_recognition') as mock_fr:
+            mock_fr.face_locations.return_value = [(10, 60, 60, 10)]
+            locations = detect_face_locations(image)
+
+        mock_fr.face_locations.assert_called_once_with(image)
+        assert locations == [(10, 60, 60, 10)]
+
+    def test_small_image_is_not_resized(self):
+        image = np.zeros((300, 400, 3), dtype=np.uint8)
+        with patch('backend.face_processor.face_recognition') as mock_fr:
+            mock_fr.face_locations.return_value = []
+            detect_face_locations(image, max_dimension=1024)
+
+        assert mock_fr.face_locations.call_args[0][0] is image
+
+    def test_downscaled_detection_maps_box_back(self):
+        image = np.zeros((3000, 4000, 3), dtype=np.uint8)
+        with patch('backend.face_processor.face_recognition') as mock_fr:
+            mock_fr.face_locations.return_value = [(100, 300, 300, 100)]
+            locations = detect_face_locations(image, max_dimension=1000, upsample=0)
+
+        detect_image = mock_fr.face_locations.call_args[0][0]
+        assert detect_image.shape == (750, 1000, 3)
+        assert mock_fr.face_locations.call_args[1] == {"number_of_times_to_upsample": 0}
+        assert locations == [(400, 1200, 1200, 400)]
+
+    def test_grayscale_detection(self):
+        image = np.zeros((2000, 1000, 3), dtype=np.uint8)
+        with patch('backend.face_processor.face_recognition') as mock_fr:
+            mock_fr.face_locations.return_value = []
+            detect_face_locations(image, max_dimension=500, grayscale=True)
+
+        assert mock_fr.face_locations.call_args[0][0].shape == (500, 250)
+
+    @settings(max_examples=50, deadline=None)
+    @given(
+        height=st.integers(min_value=50, max_value=4000),
+        width=st.integers(min_value=50, max_value=4000),
+        max_dimension=st.integers(min_value=32, max_value=1024),
+        box=st.tuples(*(st.floats(min_value=0.0, max_value=1.0) for _ in range(4)))
+    )
+    def test_property_mapped_box_within_original_image(self, height, width, max_dimension, box):
+        image = np.zeros((height, width, 3), dtype=np.uint8)
+
+        def fake_locations(detect_image, number_of_times_to_upsample=1):
+            h, w = detect_image.shape[:2]
+            top, bottom = sorted((int(box[0] * h), int(box[1] * h)))
+            left, right = sorted((int(box[2] * w), int(box[3] * w)))
+            return [(top, right, bottom, left)]
+
+        with patch('backend.face_processor.face_recognition') as mock_fr:
+            mock_fr.face_locations.side_effect = fake_locations
+            (top, right, bottom, left), = detect_face_locations(image, max_dimension=max_dimension)
+
+        assert 0 <= top <= bottom <= height
+        assert 0 <= left <= right <= width
+
+
+class TestExtractWithDownscale:
+
+    def test_encoding_computed_on_full_resolution(self, monkeypatch):
+        monkeypatch.setattr(config, "DETECTION_MAX_DIMENSION", 500)
+        image = np.zeros((2000, 2000, 3), dtype=np.uint8)
+        encoding = np.random.rand(128)
+
+        with patch('backend.face_processor.face_recognition') as mock_fr:
+            mock_fr.face_locations.return_value = [(50, 150, 150, 50)]
+            mock_fr.face_encodings.return_value = [encoding]
+
+            result, location = extract_single_face_embedding(image)
+
+        assert location == (200, 600, 600, 200)
+        encode_image, encode_locations = mock_fr.face_encodings.call_args[0]
+        assert encode_image is image
+        assert encode_locations == [(200, 600, 600, 200)]
+        np.testing.assert_array_equal(result, encoding)
+
+    def test_multiple_faces_still_rejected(self, monkeypatch):
+        monkeypatch.setattr(config, "DETECTION_MAX_DIMENSION", 500)
+        image = np.zeros((2000, 2000, 3), dtype=np.uint8)
+
+        with patch('backend.face_processor.face_recognition') as mock_fr:
+            mock_fr.face_locations.return_value = [(0, 10, 10, 0), (20, 40, 40, 20)]
+            with pytest.raises(ValueError, match="Phát hiện 2 khuôn mặt"):
+                extract_single_face_embedding(image)
@@ -0,0 +1,246 @@
+"""
+Tests for pluggable face detector backends.
+"""
+
+import io
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend import config
+from backend import detectors
+from backend.detectors import (
+    CascadeDetector,
+    DlibDetector,
+    PrefilterDetector,
+    cascade_path,
+    get_detector,
+)
+from backend.face_processor import detect_face_locations
+from backend.main import app
+from backend.training import extraction_settings_key, train_personal_model
+from benchmarks.run_benchmarks import box_iou, detections_agree
+
+
+class FakeCascade:
+    """CascadeClassifier giả: trả về các box (x, y, w, h) cố định và ghi lại ảnh đầu vào."""
+
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.images = []
+
+    def detectMultiScale(self, gray, scaleFactor, minNeighbors, minSize):
+        self.images.append(gray)
+        return np.array(self.boxes, dtype=np.int32).reshape(-1, 4)
+
+
+@pytest.fixture(autouse=True)
+def cascade_dir(tmp_path, monkeypatch):
+    """Thư mục cascade giả (file rỗng; _load_cascade được patch khi cần detect)."""
+    directory = tmp_path / "cascades"
+    directory.mkdir()
+    for filename in detectors.CASCADE_FILES.values():
+        (directory / filename).write_text("<opencv_storage/>")
+    monkeypatch.setattr(config, "CASCADE_DIR", str(directory))
+    monkeypatch.setattr(detectors, "_detectors", {})
+    return directory
+
+
+class TestDetectorSpec:
+
+    def test_dlib_specs(self):
+        assert isinstance(get_detector("hog"), DlibDetector)
+        assert get_detector("hog:2").upsample == 2
+        assert get_detector("cnn").model == "cnn"
+        assert get_detector("HOG ").name == "hog"
+
+    def test_default_upsample_applies_without_explicit_value(self):
+        assert get_detector("hog", upsample=0).upsample == 0
+        assert get_detector("hog:2", upsample=0).upsample == 2
+
+    def test_prefilter_spec(self):
+        detector = get_detector("haar>cnn")
+        assert isinstance(detector, PrefilterDetector)
+        assert isinstance(detector.prefilter, CascadeDetector)
+        assert detector.prefilter.min_neighbors == detectors.PREFILTER_MIN_NEIGHBORS
+        assert detector.detector.model == "cnn"
+
+    @pytest.mark.parametrize("spec", ["bogus", "hog:x", "hog:-1", "haar:2", "hog>haar", "haar>lbp>hog"])
+    def test_invalid_specs(self, spec):
+        with pytest.raises(ValueError):
+            get_detector(spec)
+
+    def test_cascade_path_resolved_when_parsing(self, cascade_dir):
+        detector = get_detector("lbp>hog")
+        assert detector.prefilter.path == str(cascade_dir / detectors.CASCADE_FILES["lbp"])
+
+    def test_missing_cascade_rejected_when_parsing(self, cascade_dir, monkeypatch):
+        (cascade_dir / detectors.CASCADE_FILES["lbp"]).unlink()
+        monkeypatch.setattr(detectors.cv2, "data", None, raising=False)
+        with pytest.raises(ValueError, match="cascade"):
+            get_detector("lbp")
+        with pytest.raises(ValueError, match="cascade"):
+            get_detector("lbp>hog")
+
+    def test_detectors_are_cached(self):
+        assert get_detector("haar>hog") is get_detector("haar>hog")
+
+
+class TestBackends:
+
+    def test_dlib_detector_passes_model_and_upsample(self):
+        with patch('backend.detectors.face_recognition') as mock_fr:
+            mock_fr.face_locations.return_value = [(1, 2, 3, 4)]
+            image = np.zeros((40, 40, 3), dtype=np.uint8)
+            assert DlibDetector("cnn", 2).detect(image) == [(1, 2, 3, 4)]
+
+        mock_fr.face_locations.assert_called_once_with(image, number_of_times_to_upsample=2, model="cnn")
+
+    def test_cascade_converts_and_rescales_boxes(self):
+        fake = FakeCascade([(10, 20, 30, 40)])
+        image = np.zeros((400, 800, 3), dtype=np.uint8)
+
+        with patch('backend.detectors._load_cascade', return_value=fake):
+            locations = CascadeDetector("haar", max_dimension=200).detect(image)
+
+        assert fake.images[0].shape == (100, 200)
+        assert locations == [(80, 160, 240, 40)]
+
+    def test_prefilter_rejects_without_running_main_detector(self):
+        main = MagicMock()
+        detector = PrefilterDetector(CascadeDetector("haar"), main)
+
+        with patch('backend.detectors._load_cascade', return_value=FakeCascade([])):
+            assert detector.detect(np.zeros((50, 50, 3), dtype=np.uint8)) == []
+
+        main.detect.assert_not_called()
+
+    def test_prefilter_returns_main_detector_boxes(self):
+        main = MagicMock()
+        main.detect.return_value = [(5, 45, 45, 5)]
+        detector = PrefilterDetector(CascadeDetector("haar"), main)
+
+        with patch('backend.detectors._load_cascade', return_value=FakeCascade([(1, 1, 30, 30)])):
+            assert detector.detect(np.zeros((50, 50, 3), dtype=np.uint8)) == [(5, 45, 45, 5)]
+
+    def test_missing_cascade_file(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(config, "CASCADE_DIR", str(tmp_path))
+        monkeypatch.setattr(detectors.cv2, "data", None, raising=False)
+        with pytest.raises(FileNotFoundError):
+            cascade_path("lbp")
+
+        (tmp_path / detectors.CASCADE_FILES["lbp"]).write_text("<opencv_storage/>")
+        assert cascade_path("lbp") == str(tmp_path / detectors.CASCADE_FILES["lbp"])
+
+
+class TestCallSites:
+
+    def test_detect_face_locations_uses_selected_backend(self):
+        fake = FakeCascade([(10, 10, 20, 20)])
+        image = np.zeros((100, 100, 3), dtype=np.uint8)
+
+        with patch('backend.detectors._load_cascade', return_value=fake), \
+             patch('backend.face_processor.face_recognition') as mock_fr:
+            locations = detect_face_locations(image, detector="haar")
+
+        assert locations == [(10, 30, 30, 10)]
+        mock_fr.face_locations.assert_not_called()
+
+    def test_default_cache_key_unchanged(self):
+        key = extraction_settings_key()
+        assert ";detector=hog;upsample=1;jitters=1;landmarks=small" in key
+        assert extraction_settings_key("haar>hog") != key
+
+    def test_training_with_prefilter_detector(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        data_dir = tmp_path / "data" / "raw" / "user"
+        data_dir.mkdir(parents=True)
+        for name in ("a.jpg", "b.jpg"):
+            Image.new('RGB', (64, 64), color='red').save(data_dir / name)
+
+        # Bộ lọc chỉ thấy khuôn mặt trong ảnh đầu tiên
+        prefilter = MagicMock()
+        prefilter.detectMultiScale.side_effect = [np.array([[5, 5, 40, 40]]), np.empty((0, 4))]
+        with patch('backend.detectors._load_cascade', return_value=prefilter), \
+             patch('backend.detectors.face_recognition') as mock_detect, \
+             patch('backend.training.face_recognition') as mock_fr:
+            mock_fr.load_image_file.side_effect = lambda path: np.asarray(Image.open(path))
+            mock_detect.face_locations.return_value = [(5, 60, 60, 5)]
+            mock_fr.face_encodings.return_value = [np.zeros(128)]
+            result = train_personal_model(use_cache=False, workers=1, detector="haar>hog")
+
+        assert result == (2, 1)
+        assert mock_detect.face_locations.call_count == 1
+        mock_fr.face_locations.assert_not_called()
+
+
+class TestDetectorQueryParameter:
+
+    def test_invalid_detector_rejected(self):
+        client = TestClient(app)
+        image = io.BytesIO()
+        Image.new('RGB', (64, 64), color='red').save(image, format='JPEG')
+
+        response = client.post(
+            "/api/v1/face/verify?detector=bogus",
+            files={"file": ("face.jpg", image.getvalue(), "image/jpeg")}
+        )
+
+        assert response.status_code == 400
+        assert "bogus" in response.json()["detail"]
+
+    def test_missing_cascade_rejected(self, cascade_dir, monkeypatch):
+        (cascade_dir / detectors.CASCADE_FILES["lbp"]).unlink()
+        monkeypatch.setattr(detectors.cv2, "data", None, raising=False)
+        client = TestClient(app)
+        image = io.BytesIO()
+        Image.new('RGB', (64, 64), color='red').save(image, format='JPEG')
+
+        response = client.post(
+            "/api/v1/face/verify?detector=lbp>hog",
+            files={"file": ("face.jpg", image.getvalue(), "image/jpeg")}
+        )
+
+        assert response.status_code == 400
+        assert "cascade" in response.json()["detail"]
+
+    def test_missing_cascade_fails_startup(self, cascade_dir, monkeypatch):
+        (cascade_dir / detectors.CASCADE_FILES["haar"]).unlink()
+        monkeypatch.setattr(detectors.cv2, "data", None, raising=False)
+        monkeypatch.setattr(config, "DETECTOR", "haar>hog")
+        monkeypatch.chdir(cascade_dir)
+
+        with pytest.raises(ValueError, match="cascade"):
+            with TestClient(app):
+                pass
+
+    def test_detector_forwarded_to_extraction(self):
+        client = TestClient(app)
+        image = io.BytesIO()
+        Image.new('RGB', (64, 64), color='red').save(image, format='JPEG')
+        known = ([np.zeros(128)], ["user_1.jpg"])
+
+        with patch('backend.main.get_known_faces_cache', return_value=known), \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_extract.return_value = (np.zeros(128), (10, 50, 50, 10))
+            response = client.post(
+                "/api/v1/face/verify?detector=haar>hog",
+                files={"file": ("face.jpg", image.getvalue(), "image/jpeg")}
+            )
+
+        assert response.status_code == 200
+        assert mock_extract.call_args[1]["detector"] == "haar>hog"
+
+
+class TestDetectorAgreement:
+
+    def test_detections_agree(self):
+        assert box_iou((0, 10, 10, 0), (0, 10, 10, 0)) == 1.0
+        assert box_iou((0, 10, 10, 0), (20, 30, 30, 20)) == 0.0
+        assert detections_agree([(0, 10, 10, 0)], [(1, 10, 10, 1)])
+        assert not detections_agree([(0, 10, 10, 0)], [(20, 30, 30, 20)])
+        assert not detections_agree([], [(0, 10, 10, 0)])
+        assert detections_agree([], [])
@@ -0,0 +1,192 @@
+"""
+Tests for the content-hash embedding cache used by train_personal_model.
+"""
+
+import os
+import shutil
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend.embedding_cache import (
+    EmbeddingCache,
+    CacheEntry,
+    compute_file_hash,
+    STATUS_OK,
+    STATUS_NO_FACE
+)
+from backend.training import train_personal_model, EMBEDDING_CACHE_PATH
+
+
+def write_image(filepath, color):
+    Image.new('RGB', (64, 64), color=color).save(filepath)
+
+
+def fake_encoding_for(image):
+    """Deterministic fake encoding derived from the image content."""
+    return np.full(128, float(np.asarray(image).mean()) / 255.0)
+
+
+@pytest.fixture
+def temp_data_dir():
+    """Create temporary data/raw/user and models directories."""
+    data_exists = os.path.exists("data")
+    models_exists = os.path.exists("models")
+    if data_exists:
+        shutil.move("data", "data_backup")
+    if models_exists:
+        shutil.move("models", "models_backup")
+
+    os.makedirs("data/raw/user", exist_ok=True)
+    os.makedirs("models", exist_ok=True)
+
+    yield "data/raw/user"
+
+    shutil.rmtree("data", ignore_errors=True)
+    shutil.rmtree("models", ignore_errors=True)
+    if data_exists:
+        shutil.move("data_backup", "data")
+    if models_exists:
+        shutil.move("models_backup", "models")
+
+
+@pytest.fixture
+def mock_fr():
+    """Patch face_recognition in training with a deterministic fake."""
+    with patch('backend.training.face_recognition') as mock:
+        mock.load_image_file.side_effect = lambda path: np.asarray(Image.open(path))
+        mock.face_locations.return_value = [(5, 60, 60, 5)]
+        mock.face_encodings.side_effect = lambda image, locations: [fake_encoding_for(image)]
+        yield mock
+
+
+class TestEmbeddingCacheStorage:
+    """Round-trip and invalidation of the on-disk cache."""
+
+    def test_round_trip(self, tmp_path):
+        path = str(tmp_path / "cache.npz")
+        cache = EmbeddingCache(path, "settings-a")
+        embedding = np.arange(128, dtype=np.float64)
+        cache.save({
+            "a.jpg": CacheEntry("h1", STATUS_OK, 1, embedding, 10, 20),
+            "b.jpg": CacheEntry("h2", STATUS_NO_FACE, 0, None, 11, 21),
+        })
+
+        reloaded = EmbeddingCache(path, "settings-a")
+        reloaded.load()
+        assert len(reloaded) == 2
+        np.testing.assert_array_equal(reloaded.get("h1").embedding, embedding)
+        assert reloaded.get("h2").status == STATUS_NO_FACE
+        assert reloaded.get("h2").embedding is None
+        assert reloaded.get("missing") is None
+        assert (reloaded.hits, reloaded.misses) == (3, 1)
+
+    def test_settings_change_invalidates(self, tmp_path):
+        path = str(tmp_path / "cache.npz")
+        EmbeddingCache(path, "settings-a").save({
+            "a.jpg": CacheEntry("h1", STATUS_OK, 1, np.zeros(128), 10, 20)
+        })
+
+        other = EmbeddingCache(path, "settings-b")
+        other.load()
+        assert len(other) == 0
+
+    def test_corrupt_file_ignored(self, tmp_path):
+        path = tmp_path / "cache.npz"
+        path.write_bytes(b"not a npz file")
+        cache = EmbeddingCache(str(path), "settings-a")
+        cache.load()
+        assert len(cache) == 0
+
+    def test_lookup_reuses_hash_of_sharded_path(self, tmp_path):
+        data_dir = tmp_path / "user"
+        shard = data_dir / "2025" / "01" / "02"
+        shard.mkdir(parents=True)
+        filepath = str(shard / "user_a.jpg")
+        write_image(filepath, "red")
+        stat = os.stat(filepath)
+        cache = EmbeddingCache(str(tmp_path / "cache.npz"), "settings-a")
+        cache.save({
+            os.path.join("2025", "01", "02", "user_a.jpg"):
+                CacheEntry("stored-hash", STATUS_OK, 1, np.zeros(128), stat.st_size, stat.st_mtime_ns)
+        })
+        cache.load()
+
+        with patch('backend.embedding_cache.compute_file_hash') as mock_hash:
+            assert cache.lookup_hash(filepath, str(data_dir)) == "stored-hash"
+        mock_hash.assert_not_called()
+
+        # Ảnh cùng tên ở shard khác không dùng nhầm hash đã lưu
+        other = data_dir / "2025" / "01" / "03"
+        other.mkdir()
+        shutil.copy(filepath, str(other / "user_a.jpg"))
+        os.utime(str(other / "user_a.jpg"), ns=(stat.st_mtime_ns, stat.st_mtime_ns))
+        assert cache.lookup_hash(str(other / "user_a.jpg"), str(data_dir)) == compute_file_hash(filepath)
+
+    def test_file_hash_depends_on_content_only(self, tmp_path):
+        a = tmp_path / "a.bin"
+        b = tmp_path / "b.bin"
+        a.write_bytes(b"same content")
+        b.write_bytes(b"same content")
+        assert compute_file_hash(str(a)) == compute_file_hash(str(b))
+        b.write_bytes(b"other content")
+        assert compute_file_hash(str(a)) != compute_file_hash(str(b))
+
+
+class TestIncrementalTraining:
+    """Retraining only extracts embeddings for new or changed images."""
+
+    def test_retrain_only_processes_new_files(self, temp_data_dir, mock_fr):
+        write_image(os.path.join(temp_data_dir, "user_0001.jpg"), "red")
+        write_image(os.path.join(temp_data_dir, "user_0002.jpg"), "blue")
+
+        assert train_personal_model() == (2, 2)
+        assert mock_fr.face_locations.call_count == 2
+        first_embeddings = np.load("models/user_embeddings.npy")
+
+        # Retrain without changes: nothing is re-extracted, result identical
+        mock_fr.face_locations.reset_mock()
+        assert train_personal_model() == (2, 2)
+        assert mock_fr.face_locations.call_count == 0
+        np.testing.assert_array_equal(np.load("models/user_embeddings.npy"), first_embeddings)
+
+        # Add one image: only that image is processed
+        write_image(os.path.join(temp_data_dir, "user_0003.jpg"), "green")
+        assert train_personal_model() == (3, 3)
+        assert mock_fr.face_locations.call_count == 1
+
+    def test_changed_and_deleted_files(self, temp_data_dir, mock_fr):
+        write_image(os.path.join(temp_data_dir, "user_0001.jpg"), "red")
+        write_image(os.path.join(temp_data_dir, "user_0002.jpg"), "blue")
+        train_personal_model()
+
+        # Overwrite one image with different content, delete the other
+        write_image(os.path.join(temp_data_dir, "user_0001.jpg"), "yellow")
+        os.remove(os.path.join(temp_data_dir, "user_0002.jpg"))
+        mock_fr.face_locations.reset_mock()
+
+        assert train_personal_model() == (1, 1)
+        assert mock_fr.face_locations.call_count == 1
+
+        with np.load(EMBEDDING_CACHE_PATH) as data:
+            assert list(data["filenames"]) == ["user_0001.jpg"]
+
+    def test_skipped_images_are_cached(self, temp_data_dir, mock_fr):
+        write_image(os.path.join(temp_data_dir, "user_0001.jpg"), "red")
+        write_image(os.path.join(temp_data_dir, "user_0002.jpg"), "blue")
+        mock_fr.face_locations.side_effect = [[(5, 60, 60, 5)], []]
+        assert train_personal_model() == (2, 1)
+
+        mock_fr.face_locations.reset_mock()
+        mock_fr.face_locations.side_effect = None
+        assert train_personal_model() == (2, 1)
+        assert mock_fr.face_locations.call_count == 0
+
+    def test_cache_disabled(self, temp_data_dir, mock_fr):
+        write_image(os.path.join(temp_data_dir, "user_0001.jpg"), "red")
+        train_personal_model(use_cache=False)
+        train_personal_model(use_cache=False)
+        assert mock_fr.face_locations.call_count == 2
+        assert not os.path.exists(EMBEDDING_CACHE_PATH)
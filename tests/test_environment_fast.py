@@ -0,0 +1,135 @@
+"""
+Tests for bounded-size / face-ROI environment analysis.
+"""
+
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from backend.face_processor import (
+    analyze_environment,
+    detect_face_locations,
+    downscaled_gray,
+    gray_statistics,
+)
+
+
+def textured_image(height, width, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+class TestGrayStatistics:
+
+    @settings(max_examples=50, deadline=None)
+    @given(
+        height=st.integers(min_value=3, max_value=120),
+        width=st.integers(min_value=3, max_value=120),
+        seed=st.integers(min_value=0, max_value=2**32 - 1)
+    )
+    def test_property_matches_float64_reference(self, height, width, seed):
+        gray = np.random.default_rng(seed).integers(0, 256, (height, width), dtype=np.uint8)
+
+        brightness, blur_score = gray_statistics(gray)
+
+        assert brightness == pytest.approx(float(np.mean(gray)), abs=1e-6)
+        assert blur_score == pytest.approx(float(np.var(cv2.Laplacian(gray, cv2.CV_64F))), rel=1e-6, abs=1e-6)
+
+    def test_extreme_laplacian_does_not_overflow(self):
+        gray = np.zeros((9, 9), dtype=np.uint8)
+        gray[::2, ::2] = 255
+        gray[1::2, 1::2] = 255
+
+        _, blur_score = gray_statistics(gray)
+
+        assert blur_score == pytest.approx(float(np.var(cv2.Laplacian(gray, cv2.CV_64F))))
+
+
+class TestDownscaledGray:
+
+    def test_bounds_longest_side(self):
+        gray = downscaled_gray(np.zeros((3000, 4000, 3), dtype=np.uint8), 500)
+        assert gray.shape == (375, 500)
+        assert gray.dtype == np.uint8
+
+    def test_small_or_gray_input_kept(self):
+        image = np.zeros((100, 80), dtype=np.uint8)
+        assert downscaled_gray(image, 500) is image
+        assert downscaled_gray(np.zeros((100, 80, 3), dtype=np.uint8)).shape == (100, 80)
+
+
+class TestAnalyzeEnvironmentModes:
+
+    def test_default_mode_matches_full_frame_reference(self):
+        image = textured_image(120, 160)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        result = analyze_environment(image, (20, 100, 100, 20), max_dimension=0, face_roi=False)
+
+        assert result["brightness"] == pytest.approx(float(np.mean(gray)))
+        assert result["blur_score"] == pytest.approx(float(np.var(cv2.Laplacian(gray, cv2.CV_64F))))
+
+    def test_roi_mode_only_looks_at_face(self):
+        # Khuôn mặt có texture ở giữa, nền phẳng tối
+        image = np.zeros((400, 400, 3), dtype=np.uint8)
+        image[150:250, 150:250] = textured_image(100, 100)
+        face_box = (150, 250, 250, 150)
+
+        full = analyze_environment(image, face_box, max_dimension=0, face_roi=False)
+        roi = analyze_environment(image, face_box, max_dimension=0, face_roi=True)
+
+        assert roi["brightness"] > full["brightness"]
+        assert roi["blur_score"] > full["blur_score"]
+        assert roi["face_size_ratio"] == full["face_size_ratio"]
+
+    def test_bounded_mode_uses_small_image(self):
+        image = textured_image(1200, 1600)
+
+        with patch('backend.face_processor.gray_statistics', wraps=gray_statistics) as mock_stats:
+            result = analyze_environment(image, (100, 700, 700, 100), max_dimension=200, face_roi=False)
+
+        assert max(mock_stats.call_args[0][0].shape) == 200
+        assert 0 <= result["brightness"] <= 255
+        assert result["face_size_ratio"] == pytest.approx(600 * 600 / (1200 * 1600))
+
+    def test_reuses_precomputed_gray(self):
+        image = textured_image(800, 600)
+        gray = downscaled_gray(image, 300)
+
+        with patch('backend.face_processor.cv2.cvtColor') as mock_cvt:
+            result = analyze_environment(image, (100, 500, 500, 100), max_dimension=300, face_roi=True, gray=gray)
+
+        mock_cvt.assert_not_called()
+        assert result["blur_score"] >= 0
+
+    @settings(max_examples=50, deadline=None)
+    @given(
+        height=st.integers(min_value=20, max_value=300),
+        width=st.integers(min_value=20, max_value=300),
+        max_dimension=st.integers(min_value=0, max_value=128),
+        box=st.tuples(*(st.floats(min_value=0.0, max_value=1.0) for _ in range(4)))
+    )
+    def test_property_roi_mode_metrics_in_range(self, height, width, max_dimension, box):
+        image = textured_image(height, width)
+        top, bottom = sorted((int(box[0] * height), int(box[1] * height)))
+        left, right = sorted((int(box[2] * width), int(box[3] * width)))
+
+        result = analyze_environment(image, (top, right, bottom, left), max_dimension=max_dimension, face_roi=True)
+
+        assert 0 <= result["brightness"] <= 255
+        assert result["blur_score"] >= 0
+        assert 0.0 <= result["face_size_ratio"] <= 1.0
+
+
+def test_detection_reuses_precomputed_gray():
+    image = np.zeros((2000, 1000, 3), dtype=np.uint8)
+    gray = downscaled_gray(image, 500, cv2.COLOR_RGB2GRAY)
+
+    with patch('backend.face_processor.face_recognition') as mock_fr:
+        mock_fr.face_locations.return_value = []
+        detect_face_locations(image, max_dimension=500, grayscale=True, gray=gray)
+
+    assert mock_fr.face_locations.call_args[0][0] is gray
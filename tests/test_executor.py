@@ -0,0 +1,107 @@
+"""
+Unit tests for the CPU-bound executor layer.
+"""
+
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from backend.executor import create_executor, run_in_executor
+from backend import executor as executor_module
+
+
+def _slow_square(x):
+    time.sleep(0.2)
+    return x * x
+
+
+def _raise_value_error():
+    raise ValueError("Không tìm thấy khuôn mặt nào trong ảnh.")
+
+
+class TestCreateExecutor:
+    """Tests for executor construction from config values."""
+
+    def test_thread_executor(self):
+        executor = create_executor("thread", 2)
+        try:
+            assert executor.submit(lambda: 1 + 1).result() == 2
+        finally:
+            executor.shutdown()
+
+    def test_process_executor(self):
+        executor = create_executor("process", 1)
+        try:
+            assert executor.submit(abs, -3).result() == 3
+        finally:
+            executor.shutdown()
+
+    def test_process_executor_spawns_workers(self):
+        with patch('backend.executor.ProcessPoolExecutor', wraps=executor_module.ProcessPoolExecutor) as pool:
+            executor = create_executor("process", 1)
+        try:
+            assert pool.call_args.kwargs["mp_context"].get_start_method() == "spawn"
+            assert executor.submit(abs, -3).result() == 3
+        finally:
+            executor.shutdown()
+
+    def test_invalid_kind_rejected(self):
+        with pytest.raises(ValueError):
+            create_executor("fiber", 2)
+
+    def test_invalid_worker_count_rejected(self):
+        with pytest.raises(ValueError):
+            create_executor("thread", 0)
+
+
+class TestRunInExecutor:
+    """Tests that CPU-bound work leaves the event loop free."""
+
+    def test_runs_off_event_loop_thread(self):
+        async def scenario():
+            loop_thread = threading.get_ident()
+            worker_thread = await run_in_executor(threading.get_ident)
+            return loop_thread, worker_thread
+
+        loop_thread, worker_thread = asyncio.run(scenario())
+        assert loop_thread != worker_thread
+
+    def test_event_loop_not_blocked(self):
+        """
+        Một tác vụ chậm trong executor không được chặn các coroutine khác.
+        """
+        async def scenario():
+            events = []
+
+            async def tick():
+                await asyncio.sleep(0.01)
+                events.append("tick")
+
+            async def slow():
+                result = await run_in_executor(_slow_square, 7)
+                events.append("slow")
+                return result
+
+            result, _ = await asyncio.gather(slow(), tick())
+            return result, events
+
+        result, events = asyncio.run(scenario())
+        assert result == 49
+        assert events == ["tick", "slow"]
+
+    def test_exceptions_propagate(self):
+        with pytest.raises(ValueError, match="Không tìm thấy khuôn mặt"):
+            asyncio.run(run_in_executor(_raise_value_error))
+
+    def test_kwargs_forwarded(self):
+        result = asyncio.run(run_in_executor(int, "ff", base=16))
+        assert result == 255
+
+    def test_shutdown_recreates_lazily(self):
+        first = executor_module.get_executor()
+        executor_module.shutdown_executor()
+        second = executor_module.get_executor()
+        assert first is not second
@@ -0,0 +1,149 @@
+"""
+Tests for the float32 face gallery and top-k nearest-neighbour search.
+"""
+
+import io
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from hypothesis import given, settings, strategies as st
+from PIL import Image
+
+from backend.gallery import FaceGallery, gallery_from_encodings
+from backend.face_processor import compare_with_known_faces, find_top_k_matches
+from backend.main import app
+
+
+client = TestClient(app)
+
+
+def random_gallery(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.normal(scale=0.1, size=(n, 128))
+
+
+class TestFaceGallery:
+    """Layout and distance computations of FaceGallery."""
+
+    def test_matrix_is_contiguous_float32(self):
+        gallery = FaceGallery(list(random_gallery(10)))
+        assert gallery.matrix.dtype == np.float32
+        assert gallery.matrix.flags["C_CONTIGUOUS"]
+        assert gallery.squared_norms.shape == (10,)
+        np.testing.assert_allclose(
+            gallery.squared_norms, np.sum(gallery.matrix.astype(np.float64) ** 2, axis=1), rtol=1e-5
+        )
+
+    @settings(max_examples=30, deadline=None)
+    @given(n=st.integers(min_value=1, max_value=200), seed=st.integers(0, 10_000))
+    def test_property_distances_match_bruteforce(self, n, seed):
+        known = random_gallery(n, seed)
+        query = random_gallery(1, seed + 1)[0]
+        gallery = FaceGallery(known)
+
+        expected = np.linalg.norm(known - query, axis=1)
+        np.testing.assert_allclose(gallery.distances(query), expected, atol=1e-5)
+
+        indices, best = gallery.nearest(query)
+        assert indices[0] == int(np.argmin(expected))
+        assert best[0] == pytest.approx(expected.min(), abs=1e-5)
+
+    @settings(max_examples=30, deadline=None)
+    @given(
+        n=st.integers(min_value=1, max_value=100),
+        k=st.integers(min_value=1, max_value=120),
+        seed=st.integers(0, 10_000)
+    )
+    def test_property_search_returns_sorted_top_k(self, n, k, seed):
+        known = random_gallery(n, seed)
+        queries = random_gallery(3, seed + 1)
+        gallery = FaceGallery(known)
+
+        indices, distances = gallery.search(queries, k)
+
+        expected_k = min(k, n)
+        assert indices.shape == distances.shape == (3, expected_k)
+        for q in range(3):
+            exact = np.linalg.norm(known - queries[q], axis=1)
+            assert np.all(np.diff(distances[q]) >= 0)
+            np.testing.assert_allclose(np.sort(exact)[:expected_k], distances[q], atol=1e-5)
+            np.testing.assert_allclose(exact[indices[q]], distances[q], atol=1e-5)
+
+    def test_empty_gallery(self):
+        gallery = FaceGallery([])
+        assert len(gallery) == 0
+        with pytest.raises(ValueError):
+            gallery.nearest(np.zeros(128))
+
+    def test_label_count_mismatch_rejected(self):
+        with pytest.raises(ValueError):
+            FaceGallery(random_gallery(3), labels=["a.jpg"])
+
+    def test_dimension_mismatch_rejected(self):
+        with pytest.raises(ValueError):
+            FaceGallery(random_gallery(3)).distances(np.zeros(64))
+
+
+class TestGalleryCache:
+    """Gallery is rebuilt only when the encodings list object changes."""
+
+    def test_same_list_reuses_gallery(self):
+        encodings = list(random_gallery(5))
+        assert gallery_from_encodings(encodings) is gallery_from_encodings(encodings)
+
+    def test_new_list_rebuilds_gallery(self):
+        first = gallery_from_encodings(list(random_gallery(5)))
+        second = gallery_from_encodings(list(random_gallery(5)))
+        assert first is not second
+
+    def test_gallery_passthrough(self):
+        gallery = FaceGallery(random_gallery(5))
+        assert gallery_from_encodings(gallery) is gallery
+
+
+class TestComparisonApi:
+    """compare_with_known_faces / find_top_k_matches with a FaceGallery."""
+
+    def test_compare_with_gallery(self):
+        known = random_gallery(20)
+        gallery = FaceGallery(known)
+        query = known[7] + 0.001
+
+        is_match, distance = compare_with_known_faces(query, gallery, 0.5)
+
+        assert is_match is True
+        assert distance == pytest.approx(np.linalg.norm(known[7] - query), abs=1e-4)
+
+    def test_find_top_k_matches(self):
+        known = random_gallery(20)
+        matches = find_top_k_matches(known[3], list(known), 3)
+        assert len(matches) == 3
+        assert matches[0][0] == 3
+        assert matches[0][1] == pytest.approx(0.0, abs=1e-3)
+
+    def test_verify_endpoint_returns_top_matches(self):
+        known = list(random_gallery(6))
+        files = [f"img_{i}.jpg" for i in range(6)]
+        image = Image.new('RGB', (100, 100), color='blue')
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG')
+
+        with patch('backend.main.get_known_faces_cache') as mock_cache, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_cache.return_value = (known, files)
+            mock_extract.return_value = (known[2], (10, 90, 90, 10))
+
+            response = client.post(
+                "/api/v1/face/verify",
+                files={"file": ("test.jpg", buffer.getvalue(), "image/jpeg")},
+                params={"top_k": 3}
+            )
+
+        assert response.status_code == 200
+        top_matches = response.json()["top_matches"]
+        assert len(top_matches) == 3
+        assert top_matches[0]["index"] == 2
+        assert top_matches[0]["filename"] == "img_2.jpg"
+        assert [m["distance"] for m in top_matches] == sorted(m["distance"] for m in top_matches)
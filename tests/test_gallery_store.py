@@ -0,0 +1,205 @@
+"""
+Tests for the hot-reloadable gallery store and /api/v1/gallery endpoints.
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.gallery_store import GalleryStore, directory_manifest
+from backend.data_loader import get_known_faces_cache
+from backend.main import app
+
+
+client = TestClient(app)
+
+
+class Counter:
+    """Loader that returns a new object per call, optionally blocking on an event."""
+
+    def __init__(self, gate=None):
+        self.calls = 0
+        self.gate = gate
+
+    def __call__(self):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        return {"generation": self.calls}
+
+
+class TestGalleryStore:
+
+    def test_get_loads_once(self):
+        loader = Counter()
+        store = GalleryStore(loader)
+
+        first = store.get()
+        assert store.get() is first
+        assert loader.calls == 1
+        assert store.version == 1
+
+    def test_load_error_is_not_cached(self):
+        attempts = []
+
+        def loader():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise FileNotFoundError("missing")
+            return "ok"
+
+        store = GalleryStore(loader)
+        with pytest.raises(FileNotFoundError):
+            store.get()
+        assert store.get() == "ok"
+
+    def test_readers_keep_old_snapshot_during_reload(self):
+        gate = threading.Event()
+        loader = Counter()
+        store = GalleryStore(loader)
+        old = store.get()
+
+        loader.gate = gate
+        store.reload()
+        assert store.is_reloading
+
+        # Readers are not blocked by the in-progress rebuild
+        start = time.perf_counter()
+        assert store.get() is old
+        assert time.perf_counter() - start < 0.5
+
+        gate.set()
+        store.reload(wait=True)
+        new = store.get()
+        assert new is not old
+        assert new["generation"] >= 2
+        assert not store.is_reloading
+
+    def test_failed_reload_keeps_old_snapshot(self):
+        results = iter(["v1"])
+
+        def loader():
+            try:
+                return next(results)
+            except StopIteration:
+                raise ValueError("broken image set")
+
+        store = GalleryStore(loader)
+        assert store.get() == "v1"
+
+        store.reload(wait=True)
+
+        assert store.get() == "v1"
+        assert store.version == 1
+        assert "broken image set" in store.last_error
+
+    def test_concurrent_reloads_are_coalesced(self):
+        gate = threading.Event()
+        loader = Counter()
+        store = GalleryStore(loader)
+        store.get()
+
+        loader.gate = gate
+        assert store.reload() is True
+        assert store.reload() is False
+        assert store.reload() is False
+        gate.set()
+        store.reload(wait=True)
+        while store.is_reloading:
+            time.sleep(0.01)
+
+        # Initial load + running reload + at most one queued rebuild (+ the final waited one)
+        assert loader.calls <= 4
+        assert store.get()["generation"] == loader.calls
+
+    def test_check_for_changes_uses_fingerprint(self):
+        fingerprint = ["a"]
+        loader = Counter()
+        store = GalleryStore(loader, lambda: fingerprint[0])
+        store.get()
+
+        assert store.check_for_changes() is False
+
+        fingerprint[0] = "b"
+        assert store.check_for_changes() is True
+        store.reload(wait=True)
+        while store.is_reloading:
+            time.sleep(0.01)
+        assert store.check_for_changes() is False
+        assert loader.calls >= 2
+
+    def test_clear_forces_sync_reload(self):
+        loader = Counter()
+        store = GalleryStore(loader)
+        first = store.get()
+        store.clear()
+        assert store.get() is not first
+        assert loader.calls == 2
+
+
+class TestDirectoryManifest:
+
+    def test_detects_added_and_modified_files(self, tmp_path):
+        (tmp_path / "a.jpg").write_bytes(b"1")
+        (tmp_path / "notes.txt").write_bytes(b"x")
+        extensions = {".jpg", ".png"}
+
+        first = directory_manifest(str(tmp_path), extensions)
+        assert [entry[0] for entry in first] == ["a.jpg"]
+
+        (tmp_path / "notes.txt").write_bytes(b"changed")
+        assert directory_manifest(str(tmp_path), extensions) == first
+
+        (tmp_path / "b.png").write_bytes(b"2")
+        second = directory_manifest(str(tmp_path), extensions)
+        assert second != first
+
+        (tmp_path / "a.jpg").write_bytes(b"longer")
+        assert directory_manifest(str(tmp_path), extensions) != second
+
+    def test_missing_directory(self, tmp_path):
+        assert directory_manifest(str(tmp_path / "missing")) == ()
+
+
+class TestKnownFacesStore:
+
+    def setup_method(self):
+        get_known_faces_cache.cache_clear()
+
+    def teardown_method(self):
+        get_known_faces_cache.cache_clear()
+
+    def test_cache_clear_compatibility(self):
+        with patch('backend.data_loader.load_known_face_encodings') as mock_load:
+            mock_load.return_value = ([np.zeros(128)], ["a.jpg"])
+            first = get_known_faces_cache()
+            get_known_faces_cache.cache_clear()
+            mock_load.return_value = ([np.ones(128)], ["b.jpg"])
+            second = get_known_faces_cache()
+
+        assert first[1] == ["a.jpg"]
+        assert second[1] == ["b.jpg"]
+
+    def test_reload_endpoint_swaps_gallery(self):
+        with patch('backend.data_loader.load_known_face_encodings') as mock_load:
+            mock_load.return_value = ([np.zeros(128)], ["a.jpg"])
+            get_known_faces_cache()
+
+            mock_load.return_value = ([np.zeros(128), np.ones(128)], ["a.jpg", "b.jpg"])
+            response = client.post("/api/v1/gallery/reload", params={"wait": True})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body["loaded"] is True
+        assert body["num_images"] == 2
+        assert body["last_error"] is None
+        assert get_known_faces_cache()[1] == ["a.jpg", "b.jpg"]
+
+    def test_status_endpoint(self):
+        response = client.get("/api/v1/gallery")
+        assert response.status_code == 200
+        assert response.json()["loaded"] is False
@@ -0,0 +1,253 @@
+"""
+Tests for the image store: ULID filenames in date shards, shard-aware catalog sync, the flat-layout
+migration and atomic writes of the original upload bytes.
+"""
+
+import io
+import os
+import re
+import stat
+import time
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import dedup, image_store, main
+from backend.catalog import CatalogEntry, ImageCatalog
+from backend.dedup import DuplicateIndex
+from backend.gallery_store import directory_manifest
+from backend.image_store import (
+    ImageStore,
+    encode_for_storage,
+    iter_image_files,
+    migrate_flat_images,
+    new_image_id,
+    write_file_atomic
+)
+
+client = TestClient(main.app)
+
+GOOD_ENVIRONMENT = {
+    'brightness': 120.0, 'is_too_dark': False, 'is_too_bright': False,
+    'blur_score': 300.0, 'is_too_blurry': False,
+    'face_size_ratio': 0.2, 'is_face_too_small': False, 'warnings': []
+}
+
+# mtime đủ cũ để không rơi vào cửa sổ racy của lần đối chiếu
+OLD_MTIME_NS = 1_000_000_000_000_000_000
+
+SHARDED_NAME = re.compile(r"^\d{4}/\d{2}/\d{2}/user_[0-9A-HJKMNP-TV-Z]{26}\.jpg$")
+
+
+def write_image(path, color=0):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    cv2.imwrite(path, np.full((32, 32, 3), color, dtype=np.uint8))
+
+
+def settle(data_dir):
+    for root, directories, _ in os.walk(data_dir):
+        os.utime(root, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+
+
+class TestImageIds:
+
+    def test_ids_are_unique_and_time_ordered(self):
+        ids = [new_image_id() for _ in range(1000)]
+        assert len(set(ids)) == 1000
+        assert ids == sorted(ids)
+        assert all(len(image_id) == 26 for image_id in ids)
+
+    def test_same_second_uploads_get_distinct_paths(self, tmp_path):
+        store = ImageStore(str(tmp_path))
+        now = time.time()
+        first, second = store.allocate(captured_at=now), store.allocate(captured_at=now)
+
+        assert first != second
+        assert SHARDED_NAME.match(first)
+        assert first.startswith(time.strftime("%Y/%m/%d/", time.gmtime(now)))
+        assert os.path.isdir(os.path.join(str(tmp_path), os.path.dirname(first)))
+
+    def test_iter_image_files_walks_shards_in_order(self, tmp_path):
+        write_image(str(tmp_path / "2025" / "01" / "02" / "b.jpg"))
+        write_image(str(tmp_path / "2024" / "12" / "31" / "a.png"))
+        write_image(str(tmp_path / "flat.jpg"))
+        (tmp_path / "notes.txt").write_text("x")
+
+        paths = [path for path, _ in iter_image_files(str(tmp_path))]
+        assert paths == ["2024/12/31/a.png", "2025/01/02/b.jpg", "flat.jpg"]
+
+    def test_manifest_sees_changes_inside_shards(self, tmp_path):
+        write_image(str(tmp_path / "2025" / "01" / "02" / "a.jpg"))
+        before = directory_manifest(str(tmp_path))
+        write_image(str(tmp_path / "2025" / "01" / "02" / "b.jpg"))
+        assert directory_manifest(str(tmp_path)) != before
+
+
+class TestShardedCatalog:
+
+    @pytest.fixture
+    def data_dir(self, tmp_path):
+        directory = str(tmp_path / "user")
+        for day in ("01", "02"):
+            write_image(os.path.join(directory, "2025", "01", day, f"user_{day}.jpg"))
+        settle(directory)
+        return directory
+
+    def test_sync_indexes_shards_and_skips_unchanged_tree(self, data_dir):
+        images = ImageCatalog(data_dir)
+
+        assert images.paths() == ["2025/01/01/user_01.jpg", "2025/01/02/user_02.jpg"]
+        assert not images.sync()
+
+    def test_changes_inside_a_shard_are_picked_up(self, data_dir):
+        images = ImageCatalog(data_dir)
+        images.sync()
+
+        write_image(os.path.join(data_dir, "2025", "01", "02", "manual.jpg"))
+        write_image(os.path.join(data_dir, "2025", "02", "01", "new_shard.jpg"))
+        assert images.count() == 4
+
+        for name in os.listdir(os.path.join(data_dir, "2025", "01", "01")):
+            os.remove(os.path.join(data_dir, "2025", "01", "01", name))
+        os.rmdir(os.path.join(data_dir, "2025", "01", "01"))
+        assert images.count() == 3
+
+    def test_add_to_new_shard_does_not_rescan(self, data_dir):
+        images = ImageCatalog(data_dir)
+        images.sync()
+
+        path = ImageStore(data_dir).allocate()
+        write_image(os.path.join(data_dir, path))
+        stat = os.stat(os.path.join(data_dir, path))
+        assert images.add(CatalogEntry(path, stat.st_size, stat.st_mtime_ns, time.time())) == 3
+        assert not images.sync()
+
+
+class TestMigration:
+
+    @pytest.fixture
+    def flat_dir(self, tmp_path):
+        directory = str(tmp_path / "user")
+        for i, name in enumerate(["user_20240101_120000.jpg", "user_20240102_120000.jpg"]):
+            write_image(os.path.join(directory, name), color=i * 50)
+            os.utime(os.path.join(directory, name), (1704110400 + i * 86400,) * 2)
+        return directory
+
+    def test_dry_run_does_not_move_files(self, flat_dir):
+        moves = migrate_flat_images(flat_dir, dry_run=True)
+
+        assert [old for old, _ in moves] == ["user_20240101_120000.jpg", "user_20240102_120000.jpg"]
+        assert sorted(os.listdir(flat_dir)) == ["user_20240101_120000.jpg", "user_20240102_120000.jpg"]
+
+    def test_migration_moves_files_and_keeps_catalog_metadata(self, flat_dir):
+        images = ImageCatalog(flat_dir)
+        images.sync()
+        images.set_dhashes({"user_20240101_120000.jpg": 42})
+
+        moves = migrate_flat_images(flat_dir)
+
+        assert [new[:11] for _, new in moves] == ["2024/01/01/", "2024/01/02/"]
+        assert all(SHARDED_NAME.match(new) for _, new in moves)
+        assert [path for path, _ in iter_image_files(flat_dir)] == [new for _, new in moves]
+        assert images.paths() == [new for _, new in moves]
+        assert images.get(moves[0][1]).dhash == 42
+        assert migrate_flat_images(flat_dir) == []
+
+    def test_missing_directory_raises(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            image_store.migrate_flat_images(str(tmp_path / "missing"))
+
+
+class TestAtomicWrites:
+
+    def test_write_replaces_atomically_without_leftovers(self, tmp_path):
+        filepath = str(tmp_path / "image.jpg")
+        result = write_file_atomic(filepath, b"first")
+        write_file_atomic(filepath, b"second")
+
+        with open(filepath, "rb") as f:
+            assert f.read() == b"second"
+        assert os.listdir(str(tmp_path)) == ["image.jpg"]
+        umask = os.umask(0)
+        os.umask(umask)
+        assert stat.S_IMODE(result.st_mode) == 0o666 & ~umask
+
+    def test_failed_write_removes_temp_file(self, tmp_path):
+        with patch("backend.image_store.os.replace", side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                write_file_atomic(str(tmp_path / "image.jpg"), b"data")
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_fsync_runs_in_background_when_enabled(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(image_store.config, "COLLECT_FSYNC", True)
+        synced = []
+        with patch("backend.image_store._fsync_file", side_effect=synced.append):
+            store = ImageStore(str(tmp_path))
+            path = store.allocate()
+            store.write(path, b"data")
+            image_store.flush_pending_writes()
+        assert synced == [os.path.join(str(tmp_path), path)]
+
+    def test_reencode_is_bounded(self):
+        image = np.random.default_rng(0).integers(0, 256, (400, 800, 3), dtype=np.uint8)
+        data, scale = encode_for_storage(image, quality=50, max_dimension=200)
+
+        assert scale == pytest.approx(0.25)
+        assert cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR).shape == (100, 200, 3)
+        assert encode_for_storage(image, quality=50)[1] == 1.0
+
+
+class TestCollectStorage:
+
+    @pytest.fixture
+    def collect_env(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(dedup, "duplicate_index", DuplicateIndex(os.path.join("data", "raw", "user")))
+        with patch('backend.main.extract_single_face_encoding') as mock_extract, \
+             patch('backend.main.analyze_environment') as mock_analyze:
+            mock_extract.return_value = (np.zeros(128), (40, 200, 200, 40))
+            mock_analyze.return_value = dict(GOOD_ENVIRONMENT)
+            yield
+
+    def post(self, data, content_type="image/jpeg"):
+        files = {"file": ("upload", io.BytesIO(data), content_type)}
+        return client.post("/api/v1/collect", files=files)
+
+    def image(self, extension):
+        image = cv2.resize(np.random.default_rng(7).integers(0, 256, (6, 8, 3), dtype=np.uint8), (320, 240))
+        return cv2.imencode(extension, image)[1].tobytes()
+
+    def test_original_jpeg_bytes_are_stored_without_encoding(self, collect_env):
+        upload = self.image(".jpg")
+        with patch("backend.main.cv2.imwrite", side_effect=AssertionError("imwrite")), \
+             patch("backend.image_store.cv2.imencode", side_effect=AssertionError("imencode")):
+            response = self.post(upload)
+
+        assert response.status_code == 200
+        saved_path = response.json()["saved_path"]
+        with open(saved_path, "rb") as f:
+            assert f.read() == upload
+        filename = os.path.relpath(saved_path, main.image_catalog.data_dir)
+        assert main.image_catalog.get(filename).content_hash == main.hashlib.sha256(upload).hexdigest()
+
+    def test_png_upload_keeps_png_extension(self, collect_env):
+        upload = self.image(".png")
+        response = self.post(upload, "image/png")
+
+        assert response.json()["saved_path"].endswith(".png")
+        with open(response.json()["saved_path"], "rb") as f:
+            assert f.read() == upload
+
+    def test_reencode_mode_scales_face_box(self, collect_env, monkeypatch):
+        monkeypatch.setattr(main.config, "COLLECT_STORE", image_store.STORE_REENCODE)
+        monkeypatch.setattr(main.config, "COLLECT_MAX_DIMENSION", 160)
+        response = self.post(self.image(".png"), "image/png")
+
+        saved_path = response.json()["saved_path"]
+        assert saved_path.endswith(".jpg")
+        assert cv2.imread(saved_path).shape == (120, 160, 3)
+        entry = main.image_catalog.get(os.path.relpath(saved_path, main.image_catalog.data_dir))
+        assert entry.face_box == (20, 100, 100, 20)
@@ -0,0 +1,140 @@
+"""
+Tests for the metrics registry, stage timers, Server-Timing header and /metrics.
+"""
+
+import io
+import re
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend import main, metrics
+from backend.main import app
+from backend.serving_model import known_faces_model
+
+
+client = TestClient(app)
+
+
+def create_image_bytes():
+    image = Image.new('RGB', (100, 100), color='blue')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class TestMetricTypes:
+
+    def test_histogram_renders_cumulative_buckets(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 3.0):
+            histogram.observe(value, stage="decode")
+
+        lines = histogram.render()
+
+        assert 'test_seconds_bucket{stage="decode",le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{stage="decode",le="1"} 3' in lines
+        assert 'test_seconds_bucket{stage="decode",le="+Inf"} 4' in lines
+        assert 'test_seconds_count{stage="decode"} 4' in lines
+        assert 'test_seconds_sum{stage="decode"} 4.05' in lines
+        assert "# TYPE test_seconds histogram" in lines
+
+    def test_counter_and_label_validation(self):
+        counter = metrics.Counter("test_total", "Test.", ("result",))
+        counter.inc(result="hit")
+        counter.inc(2, result="hit")
+
+        assert counter.value(result="hit") == 3
+        assert 'test_total{result="hit"} 3' in counter.render()
+        with pytest.raises(ValueError):
+            counter.inc(outcome="hit")
+
+    def test_gauge_skips_unavailable_value(self):
+        assert len(metrics.Gauge("g", "Test.", lambda: None).render()) == 2
+        assert metrics.Gauge("g", "Test.", lambda: 7).render()[-1] == "g 7"
+
+    def test_label_values_are_escaped(self):
+        counter = metrics.Counter("escaped_total", "Test.", ("route",))
+        counter.inc(route='a"b')
+        assert 'escaped_total{route="a\\"b"} 1' in counter.render()
+
+
+class TestStageTimer:
+
+    def test_stage_without_timer_is_noop(self):
+        with metrics.stage("decode"):
+            pass
+
+    def test_collect_stages_accumulates(self):
+        with metrics.collect_stages() as timer:
+            with metrics.stage("detect"):
+                pass
+            with metrics.stage("detect"):
+                pass
+            metrics.record_stages({"encode": 0.25})
+
+        assert list(timer.stages) == ["detect", "encode"]
+        assert timer.stages["encode"] == 0.25
+        assert timer.stages["detect"] >= 0
+
+    def test_server_timing_format(self):
+        header = metrics.format_server_timing({"decode": 0.0123, "detect": 0.4}, total=0.5)
+        assert header == "decode;dur=12.3, detect;dur=400.0, total;dur=500.0"
+
+
+class TestInstrumentedEndpoints:
+
+    def _verify(self):
+        with patch('backend.main.get_known_faces_cache') as mock_cache, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_cache.return_value = ([np.zeros(128)], ["a.jpg"])
+            mock_extract.return_value = (np.zeros(128), (10, 90, 90, 10))
+            return client.post(
+                "/api/v1/face/verify",
+                files={"file": ("test.jpg", create_image_bytes(), "image/jpeg")}
+            )
+
+    def test_verify_has_server_timing_header(self):
+        response = self._verify()
+
+        assert response.status_code == 200
+        header = response.headers["server-timing"]
+        stages = dict(re.findall(r"(\w+);dur=([\d.]+)", header))
+        for stage in ("multipart", "read", "decode", "to_rgb", "environment", "compare", "total"):
+            assert stage in stages, header
+        assert float(stages["total"]) >= float(stages["decode"])
+
+    def test_metrics_endpoint_exports_stage_histograms(self):
+        self._verify()
+
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        body = response.text
+        assert 'face_stage_duration_seconds_count{route="/api/v1/face/verify",stage="decode"}' in body
+        assert re.search(
+            r'face_http_requests_total\{route="/api/v1/face/verify",method="POST",status="200"\} \d+', body
+        )
+        assert "face_gallery_cache_lookups_total" in body
+        assert "# TYPE face_gallery_size gauge" in body
+
+    def test_gallery_size_reports_serving_model(self):
+        model = known_faces_model([np.zeros(128)] * 3, ["a.jpg", "b.jpg", "c.jpg"], version=1)
+        with patch.object(main.model_holder, "current", return_value=model):
+            body = client.get("/metrics").text
+        assert re.search(r"^face_gallery_size 3$", body, re.MULTILINE)
+
+    def test_error_responses_are_counted(self):
+        before = metrics.HTTP_REQUESTS.value(route="/api/v1/face/verify", method="POST", status="400")
+        client.post("/api/v1/face/verify", files={"file": ("x.txt", b"text", "text/plain")})
+        after = metrics.HTTP_REQUESTS.value(route="/api/v1/face/verify", method="POST", status="400")
+        assert after == before + 1
+
+    def test_health_response_unchanged(self):
+        response = client.get("/api/v1/health")
+        assert response.json() == {"status": "ok"}
+        assert "server-timing" in response.headers
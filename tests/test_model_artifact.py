@@ -0,0 +1,200 @@
+"""
+Tests for the versioned, memory-mapped model artifact (models/user_model.bin).
+"""
+
+import os
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend import model_artifact
+from backend.gallery import FaceGallery
+from backend.model_artifact import (
+    ALIGNMENT,
+    load_model_artifact,
+    save_model_artifact
+)
+from backend.training import train_personal_model
+from backend.verification import load_trained_model
+
+
+def random_embeddings(count, seed=0):
+    return np.random.default_rng(seed).normal(scale=0.1, size=(count, 128))
+
+
+@pytest.fixture
+def artifact_path(tmp_path):
+    return str(tmp_path / "models" / "user_model.bin")
+
+
+class TestRoundTrip:
+
+    def test_float32_round_trip(self, artifact_path):
+        embeddings = random_embeddings(5)
+        files = ["user_1.jpg", "user_2.jpg", "ảnh_3.jpg", "d.png", "e.jpg"]
+        checksum = save_model_artifact(embeddings, files, "settings-a", num_images=7, path=artifact_path)
+
+        artifact = load_model_artifact(artifact_path, verify=True)
+        assert len(artifact) == 5
+        assert artifact.dtype == "float32"
+        assert artifact.checksum == checksum
+        assert artifact.settings == "settings-a"
+        assert artifact.num_images == 7
+        assert artifact.filenames() == files
+        np.testing.assert_allclose(artifact.embeddings, embeddings.astype(np.float32))
+        np.testing.assert_allclose(artifact.mean, embeddings.mean(axis=0), rtol=1e-5, atol=1e-7)
+        np.testing.assert_allclose(artifact.squared_norms, (embeddings ** 2).sum(axis=1), rtol=1e-5)
+
+    def test_float16_round_trip(self, artifact_path):
+        embeddings = random_embeddings(100)
+        files = [f"{i}.jpg" for i in range(100)]
+        save_model_artifact(embeddings, files, "s", 100, path=artifact_path)
+        float32_size = os.path.getsize(artifact_path)
+        save_model_artifact(embeddings, files, "s", 100, path=artifact_path, dtype="float16")
+
+        artifact = load_model_artifact(artifact_path, verify=True)
+        assert artifact.dtype == "float16"
+        assert artifact.embeddings.dtype == np.float16
+        np.testing.assert_allclose(artifact.embeddings, embeddings, atol=1e-3)
+        assert float32_size - os.path.getsize(artifact_path) >= 100 * 128 * 2 - ALIGNMENT
+
+    def test_invalid_arguments(self, artifact_path):
+        with pytest.raises(ValueError):
+            save_model_artifact(random_embeddings(2), ["a"], "s", 2, path=artifact_path)
+        with pytest.raises(ValueError):
+            save_model_artifact(random_embeddings(2), ["a", "b"], "s", 2, path=artifact_path, dtype="int8")
+
+
+class TestZeroCopyLoad:
+
+    def test_sections_are_aligned_readonly_views_on_the_file(self, artifact_path):
+        save_model_artifact(random_embeddings(10), [f"{i}.jpg" for i in range(10)], "s", 10, path=artifact_path)
+        artifact = load_model_artifact(artifact_path)
+
+        for array in (artifact.embeddings, artifact.mean, artifact.squared_norms, artifact.files):
+            assert not array.flags.owndata
+            assert not array.flags.writeable
+            assert isinstance(array.base, np.memmap) or isinstance(array.base.base, np.memmap)
+        assert artifact.embeddings.ctypes.data % ALIGNMENT == 0
+
+    def test_gallery_shares_artifact_memory(self, artifact_path):
+        embeddings = random_embeddings(20)
+        save_model_artifact(embeddings, [f"{i}.jpg" for i in range(20)], "s", 20, path=artifact_path)
+        artifact = load_model_artifact(artifact_path)
+        gallery = artifact.gallery()
+
+        assert np.shares_memory(gallery.matrix, artifact.embeddings)
+        query = embeddings[3] + 0.01
+        np.testing.assert_allclose(
+            gallery.distances(query), FaceGallery(embeddings).distances(query), rtol=1e-4, atol=1e-5
+        )
+        assert gallery.labels[3] == "3.jpg"
+
+    def test_large_model_loads_in_milliseconds(self, artifact_path):
+        count = 100_000
+        embeddings = np.random.default_rng(0).random((count, 128), dtype=np.float32)
+        save_model_artifact(embeddings, [f"user_{i:06d}.jpg" for i in range(count)], "s", count, path=artifact_path)
+
+        start = time.perf_counter()
+        artifact = load_model_artifact(artifact_path)
+        elapsed = time.perf_counter() - start
+
+        assert artifact.embeddings.shape == (count, 128)
+        assert elapsed < 0.05
+
+
+class TestIntegrity:
+
+    def write(self, artifact_path):
+        save_model_artifact(random_embeddings(3), ["a", "b", "c"], "s", 3, path=artifact_path)
+
+    def test_checksum_detects_corruption(self, artifact_path):
+        self.write(artifact_path)
+        with open(artifact_path, "r+b") as f:
+            f.seek(-8, os.SEEK_END)
+            f.write(b"\xff" * 8)
+
+        load_model_artifact(artifact_path)
+        with pytest.raises(ValueError, match="Checksum"):
+            load_model_artifact(artifact_path, verify=True)
+
+    def test_rejects_wrong_magic_and_version(self, artifact_path):
+        self.write(artifact_path)
+        with open(artifact_path, "r+b") as f:
+            f.seek(8)
+            f.write((99).to_bytes(4, "little"))
+        with pytest.raises(ValueError, match="phiên bản"):
+            load_model_artifact(artifact_path)
+
+        with open(artifact_path, "r+b") as f:
+            f.write(b"NOTMODEL")
+        with pytest.raises(ValueError):
+            load_model_artifact(artifact_path)
+
+    def test_rejects_truncated_file(self, artifact_path):
+        self.write(artifact_path)
+        with open(artifact_path, "r+b") as f:
+            f.truncate(os.path.getsize(artifact_path) - 100)
+        with pytest.raises(ValueError, match="cắt cụt"):
+            load_model_artifact(artifact_path)
+
+    def test_missing_file_raises(self, artifact_path):
+        with pytest.raises(FileNotFoundError):
+            load_model_artifact(artifact_path)
+
+    def test_failed_write_keeps_previous_model(self, artifact_path):
+        self.write(artifact_path)
+        before = load_model_artifact(artifact_path).checksum
+
+        with patch('backend.model_artifact.os.fsync', side_effect=OSError("disk full")):
+            with pytest.raises(OSError):
+                save_model_artifact(random_embeddings(3, seed=1), ["x", "y", "z"], "s", 3, path=artifact_path)
+
+        assert load_model_artifact(artifact_path, verify=True).checksum == before
+        assert os.listdir(os.path.dirname(artifact_path)) == ["user_model.bin"]
+
+
+class TestLoadTrainedModel:
+
+    def test_prefers_artifact_over_legacy_npy(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        os.makedirs("models")
+        np.save("models/user_embedding_mean.npy", np.zeros(128))
+        embeddings = random_embeddings(3)
+        save_model_artifact(embeddings, ["a", "b", "c"], "s", 3)
+
+        mean = load_trained_model()
+        np.testing.assert_allclose(mean, embeddings.mean(axis=0), rtol=1e-5, atol=1e-7)
+
+    def test_falls_back_to_legacy_npy(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        os.makedirs("models")
+        np.save("models/user_embedding_mean.npy", np.ones(128))
+
+        np.testing.assert_array_equal(load_trained_model(), np.ones(128))
+
+
+class TestTrainingWritesArtifact:
+
+    def test_train_personal_model_writes_artifact(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        os.makedirs("data/raw/user")
+        for i in range(3):
+            Image.new('RGB', (64, 64), color=(i * 40, 0, 0)).save(f"data/raw/user/user_{i}.jpg")
+
+        with patch('backend.training.face_recognition') as mock_fr:
+            mock_fr.load_image_file.side_effect = lambda path: np.asarray(Image.open(path))
+            mock_fr.face_locations.return_value = [(5, 60, 60, 5)]
+            mock_fr.face_encodings.side_effect = lambda image, locations: [
+                np.full(128, float(np.asarray(image).mean()) / 255.0)
+            ]
+            train_personal_model(use_cache=False, workers=1)
+
+        artifact = load_model_artifact(model_artifact.MODEL_ARTIFACT_PATH, verify=True)
+        assert sorted(artifact.filenames()) == ["user_0.jpg", "user_1.jpg", "user_2.jpg"]
+        assert artifact.num_images == 3
+        assert "jitters=" in artifact.settings
+        np.testing.assert_allclose(artifact.mean, np.load("models/user_embedding_mean.npy"), rtol=1e-6)
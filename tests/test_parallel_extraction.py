@@ -0,0 +1,131 @@
+"""
+Tests for the parallel, order-preserving extraction pipeline.
+"""
+
+import multiprocessing
+import os
+import shutil
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend import parallel
+from backend.parallel import map_files_ordered
+from backend.training import train_personal_model
+from backend.data_loader import load_known_face_encodings
+
+
+requires_fork = pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="Mocks are only inherited by worker processes with the fork start method"
+)
+
+
+@pytest.fixture
+def fork_workers(monkeypatch):
+    """Start workers with fork so they inherit the patched face_recognition."""
+    monkeypatch.setattr(parallel, "START_METHOD", "fork")
+
+
+def _name_length(filepath):
+    if "bad" in filepath:
+        raise ValueError(f"cannot read {filepath}")
+    return len(os.path.basename(filepath))
+
+
+def _fake_load_image(path):
+    return np.asarray(Image.open(path))
+
+
+def _fake_encodings(image, locations):
+    return [np.full(128, float(image.mean()) / 255.0)]
+
+
+class TestMapFilesOrdered:
+    """Results come back in input order with per-file errors."""
+
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_order_and_errors(self, workers):
+        paths = [f"dir/{'x' * i}.jpg" for i in range(1, 9)] + ["dir/bad.jpg", "dir/yy.jpg"]
+
+        results = list(map_files_ordered(_name_length, paths, workers=workers, max_pending=2))
+
+        assert [r[0] for r in results] == paths
+        for filepath, value, error in results:
+            if "bad" in filepath:
+                assert value is None
+                assert isinstance(error, ValueError)
+            else:
+                assert error is None
+                assert value == len(os.path.basename(filepath))
+
+    def test_empty_input(self):
+        assert list(map_files_ordered(_name_length, [], workers=4)) == []
+
+    def test_workers_are_spawned(self):
+        with patch('backend.parallel.ProcessPoolExecutor', wraps=parallel.ProcessPoolExecutor) as pool:
+            list(map_files_ordered(_name_length, ["a.jpg", "bb.jpg"], workers=2))
+        assert pool.call_args.kwargs["mp_context"].get_start_method() == "spawn"
+
+
+@pytest.fixture
+def temp_dirs():
+    """Create temporary data/raw/user, myface and models directories."""
+    backups = {}
+    for name in ("data", "myface", "models"):
+        if os.path.exists(name):
+            backups[name] = f"{name}_backup"
+            shutil.move(name, backups[name])
+
+    os.makedirs("data/raw/user", exist_ok=True)
+    os.makedirs("myface", exist_ok=True)
+    os.makedirs("models", exist_ok=True)
+
+    colors = ["red", "green", "blue", "white", "black", "yellow", "purple", "orange"]
+    for i, color in enumerate(colors):
+        for directory in ("data/raw/user", "myface"):
+            Image.new('RGB', (48, 48), color=color).save(os.path.join(directory, f"user_{i:04d}.jpg"))
+    with open("data/raw/user/user_9999.jpg", "wb") as f:
+        f.write(b"corrupt")
+
+    yield
+
+    for name in ("data", "myface", "models"):
+        shutil.rmtree(name, ignore_errors=True)
+        if name in backups:
+            shutil.move(backups[name], name)
+
+
+@requires_fork
+@pytest.mark.usefixtures("fork_workers")
+class TestParallelMatchesSerial:
+    """Parallel extraction must produce exactly the serial output."""
+
+    def test_training_output_identical(self, temp_dirs):
+        with patch('backend.training.face_recognition') as mock_fr:
+            mock_fr.load_image_file.side_effect = _fake_load_image
+            mock_fr.face_locations.return_value = [(2, 40, 40, 2)]
+            mock_fr.face_encodings.side_effect = _fake_encodings
+
+            serial = train_personal_model(use_cache=False, workers=1)
+            serial_embeddings = np.load("models/user_embeddings.npy")
+
+            parallel = train_personal_model(use_cache=False, workers=3)
+            parallel_embeddings = np.load("models/user_embeddings.npy")
+
+        assert serial == parallel == (9, 8)
+        np.testing.assert_array_equal(serial_embeddings, parallel_embeddings)
+
+    def test_data_loader_output_identical(self, temp_dirs):
+        with patch('backend.data_loader.face_recognition') as mock_fr:
+            mock_fr.load_image_file.side_effect = _fake_load_image
+            mock_fr.face_locations.return_value = [(2, 40, 40, 2)]
+            mock_fr.face_encodings.side_effect = _fake_encodings
+
+            serial_encodings, serial_files = load_known_face_encodings(workers=1)
+            parallel_encodings, parallel_files = load_known_face_encodings(workers=3)
+
+        assert serial_files == parallel_files
+        np.testing.assert_array_equal(np.array(serial_encodings), np.array(parallel_encodings))
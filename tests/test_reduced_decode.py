@@ -0,0 +1,108 @@
+"""
+Tests for header-only dimension parsing and reduced-resolution JPEG decoding.
+"""
+
+import io
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from hypothesis import given, settings, strategies as st
+from PIL import Image
+
+from backend import config
+from backend.face_processor import (
+    load_image_bgr_from_bytes,
+    read_image_dimensions,
+    reduced_decode_flag,
+)
+from backend.main import app
+
+
+client = TestClient(app)
+
+
+def encode(width, height, ext=".jpg", params=()):
+    image = np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    ok, buffer = cv2.imencode(ext, image, list(params))
+    assert ok
+    return buffer.tobytes()
+
+
+class TestReadImageDimensions:
+
+    @settings(max_examples=25, deadline=None)
+    @given(width=st.integers(1, 600), height=st.integers(1, 600), ext=st.sampled_from([".jpg", ".png"]))
+    def test_property_matches_decoded_size(self, width, height, ext):
+        assert read_image_dimensions(encode(width, height, ext)) == (width, height)
+
+    def test_progressive_jpeg(self):
+        data = encode(320, 240, params=(cv2.IMWRITE_JPEG_PROGRESSIVE, 1))
+        assert read_image_dimensions(data) == (320, 240)
+
+    def test_jpeg_with_exif_segment(self):
+        image = Image.new('RGB', (123, 45), color='red')
+        exif = Image.Exif()
+        exif[0x010F] = "camera" * 50
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', exif=exif.tobytes())
+        assert read_image_dimensions(buffer.getvalue()) == (123, 45)
+
+    @pytest.mark.parametrize("data", [
+        b"",
+        b"not an image at all",
+        b"\xFF\xD8\xFF\xE0\x00\x10JFIF",      # truncated before SOF
+        b"\xFF\xD8\xFF\xDA\x00\x08" + b"x" * 10,  # SOS before SOF
+    ])
+    def test_invalid_headers(self, data):
+        assert read_image_dimensions(data) is None
+
+
+class TestReducedDecode:
+
+    def test_flag_selection(self):
+        assert reduced_decode_flag(4000, 3000, 0) == (cv2.IMREAD_COLOR, 1)
+        assert reduced_decode_flag(4000, 3000, 500) == (cv2.IMREAD_REDUCED_COLOR_8, 8)
+        assert reduced_decode_flag(4000, 3000, 1000) == (cv2.IMREAD_REDUCED_COLOR_4, 4)
+        assert reduced_decode_flag(4000, 3000, 1500) == (cv2.IMREAD_REDUCED_COLOR_2, 2)
+        assert reduced_decode_flag(4000, 3000, 2500) == (cv2.IMREAD_COLOR, 1)
+
+    def test_large_jpeg_decoded_reduced(self):
+        data = encode(1600, 1200)
+        assert load_image_bgr_from_bytes(data).shape == (1200, 1600, 3)
+        assert load_image_bgr_from_bytes(data, max_dimension=400).shape == (300, 400, 3)
+        assert load_image_bgr_from_bytes(data, max_dimension=700).shape == (600, 800, 3)
+
+    def test_png_always_full_size(self):
+        data = encode(800, 600, ".png")
+        assert load_image_bgr_from_bytes(data, max_dimension=100).shape == (600, 800, 3)
+
+    def test_invalid_bytes_still_raise(self):
+        with pytest.raises(ValueError):
+            load_image_bgr_from_bytes(b"\xFF\xD8\xFF" + b"\x00" * 50, max_dimension=100)
+
+
+class TestVerifyWithReducedDecode:
+
+    def test_face_box_reported_in_original_coordinates(self, monkeypatch):
+        monkeypatch.setattr(config, "DECODE_MAX_DIMENSION", 200)
+        data = encode(1600, 1200)
+
+        with patch('backend.main.get_known_faces_cache') as mock_cache, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_cache.return_value = ([np.zeros(128)], ["a.jpg"])
+            mock_extract.return_value = (np.zeros(128), (10, 90, 90, 10))
+
+            response = client.post(
+                "/api/v1/face/verify",
+                files={"file": ("big.jpg", data, "image/jpeg")}
+            )
+
+        assert response.status_code == 200
+        # Decoded at 1/8 (200x150); detector saw the reduced image
+        assert mock_extract.call_args[0][0].shape == (150, 200, 3)
+        body = response.json()
+        assert body["image_size"] == {"width": 1600, "height": 1200}
+        assert body["face_box"] == {"top": 80, "right": 720, "bottom": 720, "left": 80}
@@ -0,0 +1,138 @@
+"""
+Tests for the in-memory serving model: verification from trained artifacts and atomic swap.
+"""
+
+import io
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend import main, training_jobs
+from backend.model_artifact import save_model_artifact
+from backend.serving_model import SOURCE_ARTIFACT, SOURCE_KNOWN_FACES, ModelHolder
+
+
+client = TestClient(main.app)
+
+ENV_INFO = {
+    'brightness': 120.0, 'is_too_dark': False, 'is_too_bright': False,
+    'blur_score': 150.0, 'is_too_blurry': False,
+    'face_size_ratio': 0.3, 'is_face_too_small': False, 'warnings': []
+}
+
+
+@pytest.fixture
+def holder(tmp_path):
+    return ModelHolder(str(tmp_path / "models" / "user_model.bin"))
+
+
+def train(holder, embeddings, files):
+    save_model_artifact(np.asarray(embeddings), files, "s", len(files), path=holder.path)
+
+
+def create_image_bytes():
+    img_bytes = io.BytesIO()
+    Image.new('RGB', (120, 120), color='green').save(img_bytes, format='JPEG')
+    return img_bytes.getvalue()
+
+
+class TestModelHolder:
+
+    def test_no_artifact_means_no_model(self, holder):
+        assert holder.load() is None
+        assert holder.current() is None
+
+    def test_serves_artifact_without_reextraction(self, holder):
+        embeddings = np.random.default_rng(0).normal(size=(4, 128))
+        train(holder, embeddings, ["a.jpg", "b.jpg", "c.jpg", "d.jpg"])
+
+        model = holder.load()
+        assert model.source == SOURCE_ARTIFACT
+        assert len(model.version) == 12
+        assert model.used_files == ["a.jpg", "b.jpg", "c.jpg", "d.jpg"]
+        assert not model.gallery.matrix.flags.owndata
+        assert holder.current() is model
+
+    def test_new_artifact_is_swapped_in_and_old_snapshot_stays_usable(self, holder):
+        train(holder, np.zeros((2, 128)), ["a.jpg", "b.jpg"])
+        old = holder.load()
+
+        train(holder, np.ones((3, 128)), ["x.jpg", "y.jpg", "z.jpg"])
+        new = holder.current()
+
+        assert new is not old
+        assert new.version != old.version
+        assert len(new.gallery) == 3
+        assert holder.swaps == 2
+        np.testing.assert_allclose(old.gallery.distances(np.zeros(128)), [0.0, 0.0])
+
+    def test_corrupt_artifact_keeps_previous_model(self, holder):
+        train(holder, np.zeros((2, 128)), ["a.jpg", "b.jpg"])
+        old = holder.load()
+        with open(holder.path, "r+b") as f:
+            f.write(b"garbage!")
+        os.utime(holder.path, ns=(1, 1))
+
+        assert holder.current() is old
+        assert holder.last_error is not None
+        with pytest.raises(ValueError):
+            holder.load()
+
+    def test_training_job_swaps_serving_model(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        holder = ModelHolder()
+
+        def fake_train(progress_callback=None):
+            train(holder, np.zeros((2, 128)), ["a.jpg", "b.jpg"])
+            return 2, 2
+
+        with patch('backend.training.train_personal_model', side_effect=fake_train), \
+             patch('backend.serving_model.model_holder', holder):
+            training_jobs._default_train(None)
+
+        assert holder.swaps == 1
+        assert holder.current().used_files == ["a.jpg", "b.jpg"]
+
+
+class TestVerifyUsesServingModel:
+
+    def verify(self):
+        with patch('backend.main.extract_single_face_encoding') as mock_extract, \
+             patch('backend.main.analyze_environment') as mock_analyze:
+            mock_extract.return_value = (np.zeros(128), (10, 90, 90, 10))
+            mock_analyze.return_value = ENV_INFO
+            return client.post(
+                "/api/v1/face/verify",
+                files={"file": ("me.jpg", create_image_bytes(), "image/jpeg")},
+                params={"threshold": 0.5}
+            )
+
+    def test_verify_serves_trained_artifact(self, holder):
+        train(holder, [np.zeros(128), np.ones(128)], ["user_1.jpg", "user_2.jpg"])
+        model = holder.load()
+
+        with patch('backend.main.model_holder', holder), \
+             patch('backend.main.get_known_faces_cache', side_effect=AssertionError("re-extraction")):
+            response = self.verify()
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["is_match"] is True
+        assert data["training_info"]["num_images"] == 2
+        assert data["training_info"]["model_version"] == model.version
+        assert data["training_info"]["model_source"] == SOURCE_ARTIFACT
+
+    def test_verify_falls_back_to_myface_before_first_training(self, holder):
+        with patch('backend.main.model_holder', holder), \
+             patch('backend.main.get_known_faces_cache') as mock_cache:
+            mock_cache.return_value = ([np.ones(128)], ["me.jpg"])
+            response = self.verify()
+
+        assert response.status_code == 200
+        info = response.json()["training_info"]
+        assert info["model_source"] == SOURCE_KNOWN_FACES
+        assert info["model_version"].startswith("myface-v")
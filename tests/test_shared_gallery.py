@@ -0,0 +1,140 @@
+"""
+Tests for the gallery shared between worker processes through a memory-mapped file.
+"""
+
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from backend import config, data_loader
+from backend.gallery import FaceGallery
+from backend.shared_gallery import SharedGallery
+
+
+class Source:
+    """Fake myface/ source: builder counts calls, key can be changed to simulate new images."""
+
+    def __init__(self, count=5, delay=0.0):
+        self.key = "v1"
+        self.builds = 0
+        self.count = count
+        self.delay = delay
+
+    def build(self):
+        self.builds += 1
+        time.sleep(self.delay)
+        rng = np.random.default_rng(self.builds)
+        encodings = [rng.normal(size=128) for _ in range(self.count)]
+        return encodings, [f"img_{i}.jpg" for i in range(self.count)]
+
+    def source_key(self):
+        return self.key
+
+
+@pytest.fixture
+def shared_path(tmp_path):
+    return str(tmp_path / "models" / "known_faces.bin")
+
+
+def worker(path, source):
+    return SharedGallery(path, source.build, source.source_key)
+
+
+class TestSharedGallery:
+
+    def test_second_worker_attaches_without_rebuilding(self, shared_path):
+        source = Source()
+        gallery_a, files_a = worker(shared_path, source).load()
+        gallery_b, files_b = worker(shared_path, source).load()
+
+        assert source.builds == 1
+        assert files_a == files_b == [f"img_{i}.jpg" for i in range(5)]
+        np.testing.assert_array_equal(gallery_a.matrix, gallery_b.matrix)
+        assert isinstance(gallery_b, FaceGallery)
+        assert not gallery_b.matrix.flags.writeable
+        assert not gallery_b.matrix.flags.owndata
+
+    def test_concurrent_startup_builds_once(self, shared_path):
+        source = Source(delay=0.2)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(worker(shared_path, source).load()))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+
+        assert source.builds == 1
+        assert len(results) == 4
+
+    def test_source_change_bumps_generation(self, shared_path):
+        source = Source()
+        first, second = worker(shared_path, source), worker(shared_path, source)
+        first.load()
+        second.load()
+        identity = second.file_identity()
+        assert first.generation == second.generation == 1
+
+        source.key = "v2"
+        first.load()
+        assert first.generation == 2
+        assert source.builds == 2
+        assert second.file_identity() != identity
+
+        second.load()
+        assert second.generation == 2
+        assert source.builds == 2
+
+    def test_corrupt_file_is_rebuilt(self, shared_path):
+        source = Source()
+        worker(shared_path, source).load()
+        with open(shared_path, "r+b") as f:
+            f.write(b"garbage!")
+
+        gallery, _ = worker(shared_path, source).load()
+        assert source.builds == 2
+        assert len(gallery) == 5
+
+    def test_builder_errors_propagate(self, shared_path):
+        def failing_builder():
+            raise FileNotFoundError("myface/ missing")
+
+        with pytest.raises(FileNotFoundError):
+            SharedGallery(shared_path, failing_builder, lambda: "k").load()
+        assert not os.path.exists(shared_path)
+
+
+class TestKnownFacesSharedMode:
+
+    def test_known_faces_loader_uses_shared_file(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        os.makedirs("myface")
+        monkeypatch.setattr(config, "GALLERY_SHARED", True)
+        encodings = [np.full(128, 0.1 * i) for i in range(3)]
+
+        with patch('backend.data_loader.load_known_face_encodings') as mock_load:
+            mock_load.return_value = (encodings, ["a.jpg", "b.jpg", "c.jpg"])
+            gallery, used_files = data_loader._load_known_faces()
+            data_loader._load_known_faces()
+
+        assert mock_load.call_count == 1
+        assert used_files == ["a.jpg", "b.jpg", "c.jpg"]
+        np.testing.assert_allclose(gallery.matrix, np.array(encodings), rtol=1e-6)
+        assert os.path.exists(data_loader.SHARED_GALLERY_PATH)
+
+    def test_fingerprint_tracks_shared_file(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setattr(config, "GALLERY_SHARED", True)
+        before = data_loader._known_faces_fingerprint()
+
+        with patch('backend.data_loader.load_known_face_encodings') as mock_load:
+            mock_load.return_value = ([np.zeros(128)], ["a.jpg"])
+            data_loader._load_known_faces()
+
+        assert data_loader._known_faces_fingerprint() != before
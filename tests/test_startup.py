@@ -0,0 +1,118 @@
+"""
+Tests for lazy heavy imports, background startup loading and the readiness endpoint.
+"""
+
+import sys
+import threading
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from backend import main, startup
+from backend.lazy_imports import LazyModule, lazy_import
+from backend.startup import StartupState
+
+
+class TestLazyModule:
+
+    def test_import_happens_on_first_attribute_access(self):
+        module = LazyModule("json")
+        assert not module.loaded
+
+        assert module.dumps({"a": 1}) == '{"a": 1}'
+        assert module.loaded
+        assert module.load() is sys.modules["json"]
+        assert module.load_seconds is not None
+
+    def test_lazy_import_returns_shared_proxy(self):
+        assert lazy_import("face_recognition") is lazy_import("face_recognition")
+
+    def test_concurrent_first_access_imports_once(self):
+        module = LazyModule("json")
+        calls = []
+
+        def counting_import(name):
+            calls.append(name)
+            return sys.modules[name]
+
+        with patch("backend.lazy_imports.importlib.import_module", side_effect=counting_import):
+            threads = [threading.Thread(target=module.load) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+        assert calls == ["json"]
+
+    def test_backend_modules_do_not_import_face_recognition_eagerly(self):
+        from backend import data_loader, detectors, face_processor, training
+
+        for module in (data_loader, detectors, face_processor, training):
+            assert isinstance(module.face_recognition, LazyModule)
+
+
+class TestStartupState:
+
+    def test_steps_run_in_background_until_ready(self):
+        release = threading.Event()
+        state = StartupState([("models", lambda: release.wait(5) and None), ("gallery", lambda: "ok")])
+
+        assert state.start()
+        assert not state.start()
+        assert not state.ready
+        assert state.status == startup.STATUS_STARTING
+
+        release.set()
+        assert state.wait(5)
+        snapshot = state.snapshot()
+        assert snapshot["status"] == startup.STATUS_READY
+        assert [step["status"] for step in snapshot["steps"]] == [startup.STEP_DONE] * 2
+        assert snapshot["steps"][1]["message"] == "ok"
+        assert snapshot["steps"][0]["duration_ms"] >= 0
+
+    def test_failed_step_stops_startup(self):
+        def fail():
+            raise RuntimeError("model missing")
+
+        state = StartupState([("models", fail), ("gallery", lambda: None)])
+        state.run()
+
+        assert not state.ready
+        assert state.status == startup.STATUS_FAILED
+        models, gallery = state.steps
+        assert models.error == "model missing"
+        assert gallery.status == startup.STEP_PENDING
+
+    def test_missing_training_data_is_not_a_startup_failure(self):
+        with patch("backend.startup.get_known_faces_cache", side_effect=FileNotFoundError("myface/ trống")):
+            message = startup.load_known_faces()
+        assert "myface/ trống" in message
+
+
+class TestReadinessEndpoint:
+
+    def test_not_ready_returns_503_while_health_is_ok(self):
+        client = TestClient(main.app)
+        state = StartupState([("models", lambda: None)])
+
+        with patch("backend.main.startup_state", state):
+            response = client.get("/api/v1/ready")
+            assert client.get("/api/v1/health").status_code == 200
+
+        assert response.status_code == 503
+        assert response.json()["ready"] is False
+        assert response.json()["steps"][0]["status"] == startup.STEP_PENDING
+
+    def test_ready_returns_200(self):
+        client = TestClient(main.app)
+        state = StartupState([("models", lambda: None), ("gallery", lambda: "Đã tải 3 ảnh huấn luyện.")])
+        state.run()
+
+        with patch("backend.main.startup_state", state):
+            response = client.get("/api/v1/ready")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["ready"] is True
+        assert data["status"] == "ready"
+        assert [step["name"] for step in data["steps"]] == ["models", "gallery"]
@@ -0,0 +1,200 @@
+"""
+Tests for WebSocket streaming verification and face tracking between frames.
+"""
+
+import asyncio
+import pickle
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from backend.face_tracking import FaceTracker, LatestFrameSlot
+from backend.main import app
+
+
+FACE_SIZE = 80
+
+
+def make_frame(top, left, height=240, width=320, seed=0):
+    """Frame nền phẳng với một 'khuôn mặt' có texture tại (top, left)."""
+    frame = np.full((height, width, 3), 90, dtype=np.uint8)
+    rng = np.random.default_rng(seed)
+    face = cv2.GaussianBlur(rng.integers(0, 256, (FACE_SIZE, FACE_SIZE, 3), dtype=np.uint8), (5, 5), 0)
+    frame[top:top + FACE_SIZE, left:left + FACE_SIZE] = face
+    return frame
+
+
+def face_box(top, left):
+    return (top, left + FACE_SIZE, top + FACE_SIZE, left)
+
+
+def encode_png(frame):
+    ok, buffer = cv2.imencode(".png", frame)
+    return buffer.tobytes()
+
+
+class TestFaceTracker:
+
+    def test_tracks_between_detections(self):
+        tracker = FaceTracker(detect_every=3, track_max_dimension=320, reencode_diff=0)
+        positions = [(50, 60), (53, 64), (56, 68), (59, 72)]
+
+        with patch('backend.face_tracking.detect_single_face') as mock_detect, \
+             patch('backend.face_tracking.encode_face') as mock_encode:
+            mock_detect.side_effect = [face_box(*positions[0]), face_box(*positions[3])]
+            mock_encode.return_value = np.zeros(128)
+            results = [tracker.update(make_frame(*p)) for p in positions]
+
+        assert [r["detected"] for r in results] == [True, False, False, True]
+        assert mock_detect.call_count == 2
+        for result, position in zip(results, positions):
+            assert result["face_location"] == face_box(*position)
+
+    def test_lost_track_triggers_detection(self):
+        tracker = FaceTracker(detect_every=10, track_max_dimension=320, reencode_diff=0)
+
+        with patch('backend.face_tracking.detect_single_face') as mock_detect, \
+             patch('backend.face_tracking.encode_face') as mock_encode:
+            mock_detect.side_effect = [face_box(50, 60), face_box(40, 200)]
+            mock_encode.return_value = np.zeros(128)
+            tracker.update(make_frame(50, 60))
+            # Khuôn mặt khác hẳn, ở xa vị trí cũ
+            result = tracker.update(make_frame(40, 200, seed=1))
+
+        assert result["detected"] is True
+        assert result["face_location"] == face_box(40, 200)
+
+    def test_skips_reencoding_for_unchanged_face(self):
+        tracker = FaceTracker(detect_every=10, track_max_dimension=320, reencode_diff=4)
+
+        with patch('backend.face_tracking.detect_single_face') as mock_detect, \
+             patch('backend.face_tracking.encode_face') as mock_encode:
+            mock_detect.return_value = face_box(50, 60)
+            mock_encode.return_value = np.ones(128)
+            first = tracker.update(make_frame(50, 60))
+            second = tracker.update(make_frame(52, 62))
+            third = tracker.update(make_frame(52, 62, seed=2))
+
+        assert first["reencoded"] is True
+        assert second["reencoded"] is False
+        assert second["tracked"] is True
+        np.testing.assert_array_equal(second["encoding"], first["encoding"])
+        assert third["reencoded"] is True
+        assert mock_encode.call_count == 2
+
+    def test_detection_failure_resets_state(self):
+        tracker = FaceTracker(detect_every=10, track_max_dimension=320)
+
+        with patch('backend.face_tracking.detect_single_face') as mock_detect, \
+             patch('backend.face_tracking.encode_face') as mock_encode:
+            mock_detect.side_effect = ValueError("Không tìm thấy khuôn mặt nào trong ảnh.")
+            mock_encode.return_value = np.zeros(128)
+            with pytest.raises(ValueError):
+                tracker.update(make_frame(50, 60))
+
+        assert tracker.box is None
+        assert tracker.encoding is None
+
+    def test_tracker_is_picklable(self):
+        tracker = FaceTracker(detect_every=5, track_max_dimension=320)
+        with patch('backend.face_tracking.detect_single_face', return_value=face_box(50, 60)), \
+             patch('backend.face_tracking.encode_face', return_value=np.zeros(128)):
+            tracker.update(make_frame(50, 60))
+
+        restored = pickle.loads(pickle.dumps(tracker))
+        assert restored.box == tracker.box
+        np.testing.assert_array_equal(restored.template, tracker.template)
+
+
+class TestLatestFrameSlot:
+
+    def test_keeps_only_latest_frame(self):
+        async def scenario():
+            slot = LatestFrameSlot()
+            for i in range(5):
+                slot.put(i)
+            first = await slot.get()
+            slot.put(5)
+            second = await slot.get()
+            slot.close()
+            return first, second, await slot.get(), slot.dropped
+
+        assert asyncio.run(scenario()) == (4, 5, None, 4)
+
+    def test_get_waits_for_frame(self):
+        async def scenario():
+            slot = LatestFrameSlot()
+            waiter = asyncio.create_task(slot.get())
+            await asyncio.sleep(0)
+            assert not waiter.done()
+            slot.put("frame")
+            return await waiter
+
+        assert asyncio.run(scenario()) == "frame"
+
+
+class TestStreamEndpoint:
+
+    def test_per_frame_verdicts(self):
+        known = ([np.zeros(128)], ["user_1.jpg"])
+        client = TestClient(app)
+
+        with patch('backend.main.get_known_faces_cache', return_value=known), \
+             patch('backend.face_tracking.detect_single_face', return_value=face_box(50, 60)), \
+             patch('backend.face_tracking.encode_face', return_value=np.full(128, 0.01)):
+            with client.websocket_connect("/api/v1/face/verify/stream?threshold=0.5") as websocket:
+                websocket.send_bytes(encode_png(make_frame(50, 60)))
+                first = websocket.receive_json()
+                websocket.send_bytes(encode_png(make_frame(51, 61)))
+                second = websocket.receive_json()
+                websocket.send_bytes(b"not an image at all")
+                invalid = websocket.receive_json()
+
+        assert first["frame"] == 0
+        assert first["is_match"] is True
+        assert first["detected"] is True
+        assert first["face_box"] == {"top": 50, "right": 140, "bottom": 130, "left": 60}
+        assert first["image_size"] == {"width": 320, "height": 240}
+        assert second["frame"] == 1
+        assert second["tracked"] is True
+        assert invalid["frame"] == 2
+        assert invalid["error"]
+        assert invalid["is_match"] is None
+
+    def test_missing_training_data_closes_stream(self):
+        client = TestClient(app)
+
+        with patch('backend.main.get_known_faces_cache', side_effect=FileNotFoundError("Thư mục myface/ không tồn tại.")):
+            with client.websocket_connect("/api/v1/face/verify/stream") as websocket:
+                message = websocket.receive_json()
+
+        assert message["frame"] == -1
+        assert "myface" in message["error"]
+
+    def test_model_reload_error_fails_only_that_frame(self):
+        known = ([np.zeros(128)], ["user_1.jpg"])
+        client = TestClient(app)
+        model_errors = [None, ValueError("Mô hình 'models/user_model.bin' không hợp lệ"), None]
+
+        def cache():
+            error = model_errors.pop(0)
+            if error is not None:
+                raise error
+            return known
+
+        with patch('backend.main.get_known_faces_cache', side_effect=cache), \
+             patch('backend.face_tracking.detect_single_face', return_value=face_box(50, 60)), \
+             patch('backend.face_tracking.encode_face', return_value=np.full(128, 0.01)):
+            with client.websocket_connect("/api/v1/face/verify/stream") as websocket:
+                websocket.send_bytes(encode_png(make_frame(50, 60)))
+                failed = websocket.receive_json()
+                websocket.send_bytes(encode_png(make_frame(51, 61)))
+                recovered = websocket.receive_json()
+
+        assert failed["frame"] == 0
+        assert "không hợp lệ" in failed["error"]
+        assert recovered["frame"] == 1
+        assert recovered["is_match"] is True
@@ -0,0 +1,343 @@
+"""
+Tests for background training jobs with progress reporting.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from unittest.mock import patch
+
+import anyio
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from backend import main, training_jobs as training_jobs_module
+from backend.main import app
+from backend.training import train_personal_model
+from backend.training_jobs import (
+    TrainingJobManager,
+    TrainingJobStore,
+    STATUS_FAILED,
+    STATUS_INTERRUPTED,
+    STATUS_RUNNING,
+    STATUS_SUCCEEDED,
+)
+
+
+client = TestClient(app)
+
+
+class BlockingTrain:
+    """Hàm huấn luyện giả: báo tiến độ rồi chờ được cho phép kết thúc."""
+
+    def __init__(self, total=4, result=(4, 3), error=None):
+        self.total = total
+        self.result = result
+        self.error = error
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+
+    def __call__(self, progress_callback):
+        self.calls += 1
+        progress_callback({"total": self.total, "processed": 1, "embedded": 1, "skipped": 0, "failed": 0, "cached": 1})
+        progress_callback({"total": self.total, "processed": 2, "embedded": 1, "skipped": 1, "failed": 0, "cached": 1})
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TrainingJobStore(str(tmp_path / "training_jobs.json"))
+
+
+class TestTrainingJobStore:
+
+    def test_round_trip_and_update(self, store):
+        store.save({"job_id": "a", "status": "queued", "created_at": 1.0})
+        store.save({"job_id": "a", "status": "running", "created_at": 1.0})
+
+        assert store.get("a")["status"] == "running"
+        assert len(store.load()) == 1
+        assert store.get("missing") is None
+
+    def test_keeps_most_recent_jobs(self, tmp_path):
+        store = TrainingJobStore(str(tmp_path / "jobs.json"), max_jobs=3)
+        for i in range(5):
+            store.save({"job_id": str(i), "status": "succeeded", "created_at": float(i)})
+
+        assert [job["job_id"] for job in store.load()] == ["2", "3", "4"]
+
+    def test_corrupt_file_ignored(self, tmp_path):
+        path = tmp_path / "jobs.json"
+        path.write_text("{not json")
+        assert TrainingJobStore(str(path)).load() == []
+
+
+class TestTrainingJobManager:
+
+    def test_job_reports_progress_and_result(self, store):
+        train = BlockingTrain()
+        manager = TrainingJobManager(store, train)
+
+        job, created = manager.submit()
+        assert created
+        assert train.started.wait(5)
+
+        running = manager.get(job["job_id"])
+        assert running["status"] == STATUS_RUNNING
+        assert (running["total"], running["processed"], running["skipped"]) == (4, 2, 1)
+        assert running["eta_seconds"] is not None
+
+        train.release.set()
+        finished = manager.wait(job["job_id"], timeout=5)
+        assert finished["status"] == STATUS_SUCCEEDED
+        assert (finished["num_images"], finished["num_embeddings"]) == (4, 3)
+        assert store.get(job["job_id"])["status"] == STATUS_SUCCEEDED
+
+    def test_concurrent_submits_collapse_into_running_job(self, store):
+        train = BlockingTrain()
+        manager = TrainingJobManager(store, train)
+
+        first, created_first = manager.submit()
+        second, created_second = manager.submit()
+        train.release.set()
+        manager.wait(first["job_id"], timeout=5)
+
+        assert created_first and not created_second
+        assert second["job_id"] == first["job_id"]
+        assert train.calls == 1
+
+        # Job đã xong: yêu cầu tiếp theo tạo job mới
+        third, created_third = manager.submit()
+        manager.wait(third["job_id"], timeout=5)
+        assert created_third and third["job_id"] != first["job_id"]
+
+    def test_failed_job_records_error(self, store):
+        train = BlockingTrain(error=ValueError("Không thể trích xuất face embedding"))
+        train.release.set()
+        manager = TrainingJobManager(store, train)
+
+        job, _ = manager.submit()
+        finished = manager.wait(job["job_id"], timeout=5)
+
+        assert finished["status"] == STATUS_FAILED
+        assert finished["error_type"] == "ValueError"
+        assert "embedding" in finished["error"]
+
+    def test_state_survives_restart(self, store):
+        train = BlockingTrain()
+        train.release.set()
+        manager = TrainingJobManager(store, train)
+        job, _ = manager.submit()
+        manager.wait(job["job_id"], timeout=5)
+
+        restarted = TrainingJobManager(store, train)
+        assert restarted.get(job["job_id"])["status"] == STATUS_SUCCEEDED
+
+    def test_stale_running_job_reported_interrupted(self, store):
+        store.save({
+            "job_id": "dead", "status": STATUS_RUNNING, "created_at": 1.0,
+            "updated_at": time.time() - training_jobs_module.STALE_JOB_SECONDS - 1,
+        })
+        manager = TrainingJobManager(store, BlockingTrain())
+
+        assert manager.get("dead")["status"] == STATUS_INTERRUPTED
+        assert store.get("dead")["status"] == STATUS_INTERRUPTED
+
+    def test_running_job_of_other_worker_is_reused(self, store):
+        store.save({
+            "job_id": "other", "status": STATUS_RUNNING, "created_at": time.time(), "updated_at": time.time(),
+        })
+        train = BlockingTrain()
+        manager = TrainingJobManager(store, train)
+
+        job, created = manager.submit()
+
+        assert not created
+        assert job["job_id"] == "other"
+        assert train.calls == 0
+
+    def test_submit_waits_for_file_lock_of_other_worker(self, store):
+        # Worker khác đang giữ file lock (đang kiểm tra / tạo job)
+        other = TrainingJobStore(store.path)
+        train = BlockingTrain()
+        manager = TrainingJobManager(store, train)
+        result = []
+        with other.locked():
+            thread = threading.Thread(target=lambda: result.append(manager.submit()))
+            thread.start()
+            thread.join(0.3)
+            assert thread.is_alive()
+            other.save({
+                "job_id": "other", "status": STATUS_RUNNING, "created_at": time.time(), "updated_at": time.time(),
+            })
+        thread.join(5)
+
+        job, created = result[0]
+        assert not created
+        assert job["job_id"] == "other"
+        assert train.calls == 0
+
+    def test_store_lock_is_reentrant(self, store):
+        with store.locked():
+            store.save({"job_id": "a", "status": STATUS_SUCCEEDED})
+        assert store.get("a")["status"] == STATUS_SUCCEEDED
+
+
+class TestTrainingProgressCallback:
+
+    def test_progress_counts(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        data_dir = tmp_path / "data" / "raw" / "user"
+        data_dir.mkdir(parents=True)
+        for name, color in [("a.jpg", "red"), ("b.jpg", "blue"), ("c.jpg", "green")]:
+            Image.new('RGB', (64, 64), color=color).save(data_dir / name)
+        (data_dir / "d.jpg").write_bytes(b"broken")
+
+        updates = []
+        with patch('backend.training.face_recognition') as mock_fr:
+            def load(path):
+                return np.asarray(Image.open(path))
+            mock_fr.load_image_file.side_effect = load
+            # Ảnh xanh dương không có khuôn mặt
+            mock_fr.face_locations.side_effect = lambda image: [] if image[0, 0, 2] > 200 else [(5, 60, 60, 5)]
+            mock_fr.face_encodings.side_effect = lambda image, locations: [np.zeros(128)]
+            result = train_personal_model(use_cache=False, workers=1, progress_callback=updates.append)
+
+        assert result == (4, 2)
+        assert updates[0]["processed"] == 0
+        assert updates[-1] == {"total": 4, "processed": 4, "embedded": 2, "skipped": 1, "failed": 1, "cached": 0}
+        # Một lần cho mỗi ảnh tra cache, mỗi ảnh trích xuất, rồi một nhịp trước khi lưu model
+        assert [u["processed"] for u in updates] == [0, 0, 0, 0, 1, 2, 3, 4, 4]
+
+    def test_cache_lookup_reports_each_file(self, tmp_path, monkeypatch):
+        # Lần huấn luyện toàn cache hit vẫn báo tiến độ từng ảnh (job không bị coi là treo khi hash)
+        monkeypatch.chdir(tmp_path)
+        data_dir = tmp_path / "data" / "raw" / "user"
+        data_dir.mkdir(parents=True)
+        for name in ("a.jpg", "b.jpg", "c.jpg"):
+            Image.new('RGB', (64, 64), color='red').save(data_dir / name)
+
+        updates = []
+        with patch('backend.training.face_recognition') as mock_fr:
+            mock_fr.load_image_file.side_effect = lambda path: np.asarray(Image.open(path))
+            mock_fr.face_locations.return_value = [(5, 60, 60, 5)]
+            mock_fr.face_encodings.return_value = [np.zeros(128)]
+            train_personal_model(use_cache=True, workers=1)
+            train_personal_model(use_cache=True, workers=1, progress_callback=updates.append)
+
+        # Tra cache từng ảnh, rồi một nhịp trước khi lưu cache và một nhịp trước khi lưu model
+        assert [(u["processed"], u["cached"]) for u in updates] == [(1, 1), (2, 2), (3, 3), (3, 3), (3, 3)]
+
+
+class TestTrainingJobEndpoints:
+
+    @pytest.fixture
+    def manager(self, store, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        os.makedirs("data/raw/user")
+        Image.new('RGB', (64, 64), color='red').save("data/raw/user/user_1.jpg")
+        train = BlockingTrain(result=(1, 1))
+        manager = TrainingJobManager(store, train)
+        with patch('backend.main.training_jobs', manager):
+            yield manager, train
+
+    def test_create_and_poll_job(self, manager):
+        manager, train = manager
+
+        response = client.post("/api/v1/train/jobs")
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert response.json()["status"] in ("queued", "running")
+
+        train.release.set()
+        manager.wait(job_id, timeout=5)
+        status = client.get(f"/api/v1/train/jobs/{job_id}")
+        assert status.status_code == 200
+        assert status.json()["status"] == "succeeded"
+        assert status.json()["num_embeddings"] == 1
+
+        listing = client.get("/api/v1/train/jobs")
+        assert [job["job_id"] for job in listing.json()] == [job_id]
+
+    def test_unknown_job_returns_404(self, manager):
+        response = client.get("/api/v1/train/jobs/does-not-exist")
+        assert response.status_code == 404
+        assert "detail" in response.json()
+
+    def test_sync_train_waits_for_job(self, manager):
+        manager, train = manager
+        train.release.set()
+
+        response = client.post("/api/v1/train")
+
+        assert response.status_code == 200
+        assert response.json()["num_images"] == 1
+        assert response.json()["num_embeddings"] == 1
+
+    def test_sync_train_does_not_hold_threadpool_slot(self, manager, monkeypatch):
+        manager, train = manager
+        monkeypatch.setattr(main, "TRAINING_JOB_POLL_SECONDS", 0.01)
+
+        async def scenario():
+            # Threadpool chỉ có một slot: request chờ huấn luyện không được chiếm nó
+            anyio.to_thread.current_default_thread_limiter().total_tokens = 1
+            request = asyncio.ensure_future(main.train_model_endpoint())
+            await asyncio.get_running_loop().run_in_executor(None, train.started.wait, 5)
+            other = await asyncio.wait_for(main.run_in_threadpool(lambda: "done"), timeout=2)
+            train.release.set()
+            return other, await asyncio.wait_for(request, timeout=5)
+
+        other, response = asyncio.run(scenario())
+
+        assert other == "done"
+        assert response.num_embeddings == 1
+
+    def test_sync_train_maps_job_error(self, manager):
+        manager, train = manager
+        train.error = ValueError("Không thể trích xuất face embedding từ bất kỳ ảnh nào")
+        train.release.set()
+
+        response = client.post("/api/v1/train")
+
+        assert response.status_code == 400
+        assert "embedding" in response.json()["detail"]
+
+    def test_missing_data_rejected_before_job(self, manager, tmp_path):
+        manager, train = manager
+        os.remove("data/raw/user/user_1.jpg")
+
+        response = client.post("/api/v1/train/jobs")
+
+        assert response.status_code == 400
+        assert train.calls == 0
+
+    @pytest.mark.parametrize("path", ["/api/v1/train", "/api/v1/train/jobs"])
+    def test_catalog_count_and_submit_run_off_event_loop(self, manager, path):
+        manager, train = manager
+        train.release.set()
+        on_loop = []
+
+        def record(function):
+            def wrapper(*args, **kwargs):
+                try:
+                    asyncio.get_running_loop()
+                    on_loop.append(function.__name__)
+                except RuntimeError:
+                    pass
+                return function(*args, **kwargs)
+            return wrapper
+
+        with patch.object(main.image_catalog, "count", record(main.image_catalog.count)), \
+             patch.object(manager, "submit", record(manager.submit)):
+            response = client.post(path)
+
+        assert response.status_code in (200, 202)
+        assert on_loop == []
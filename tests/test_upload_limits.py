@@ -0,0 +1,158 @@
+"""
+Tests for streaming, size-capped upload ingestion.
+"""
+
+import asyncio
+import io
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi import HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+from starlette.datastructures import Headers
+
+from backend import main
+from backend.main import app, _read_validated_upload
+
+
+client = TestClient(app)
+
+
+def create_image_bytes():
+    image = Image.new('RGB', (100, 100), color='green')
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+class CountingFile(io.BytesIO):
+    """BytesIO that records how many bytes were read."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def make_upload(data, size=None, content_type="image/jpeg"):
+    file = CountingFile(data)
+    upload = UploadFile(
+        file=file, size=size, filename="x.jpg", headers=Headers({"content-type": content_type})
+    )
+    return upload, file
+
+
+class TestReadValidatedUpload:
+
+    def test_returns_single_buffer(self):
+        data = create_image_bytes()
+        upload, _ = make_upload(data)
+
+        result = asyncio.run(_read_validated_upload(upload))
+
+        assert isinstance(result, bytearray)
+        assert result == data
+        # Decoder reads straight from the buffer (no bytes copy)
+        array = np.frombuffer(result, np.uint8)
+        result[5] ^= 0xFF
+        assert array[5] == result[5]
+
+    def test_invalid_magic_bytes_rejected_after_first_chunk(self, monkeypatch):
+        monkeypatch.setattr(main, "UPLOAD_CHUNK_SIZE", 1024)
+        upload, file = make_upload(b"GIF89a" + b"x" * 100_000)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(_read_validated_upload(upload))
+
+        assert "không phải là ảnh hợp lệ" in exc_info.value.detail
+        assert file.bytes_read == 1024
+
+    def test_aborts_as_soon_as_cap_exceeded(self, monkeypatch):
+        monkeypatch.setattr(main, "UPLOAD_CHUNK_SIZE", 1000)
+        monkeypatch.setattr(main, "MAX_FILE_SIZE", 5000)
+        upload, file = make_upload(b"\xFF\xD8\xFF" + b"x" * 100_000)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(_read_validated_upload(upload))
+
+        assert "quá lớn" in exc_info.value.detail
+        assert file.bytes_read == 6000
+
+    def test_known_size_rejected_without_reading(self, monkeypatch):
+        monkeypatch.setattr(main, "MAX_FILE_SIZE", 5000)
+        upload, file = make_upload(b"\xFF\xD8\xFF" + b"x" * 10_000, size=10_003)
+
+        with pytest.raises(HTTPException):
+            asyncio.run(_read_validated_upload(upload))
+
+        assert file.bytes_read == 0
+
+    def test_short_file_rejected(self):
+        upload, _ = make_upload(b"\xFF\xD8")
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(_read_validated_upload(upload))
+        assert "không phải là ảnh hợp lệ" in exc_info.value.detail
+
+
+class TestRequestSizeLimitMiddleware:
+
+    def test_content_length_rejected_before_endpoint(self):
+        large = b"\xFF\xD8\xFF" + b"x" * (11 * 1024 * 1024)
+        with patch('backend.main._read_validated_upload') as mock_read:
+            response = client.post(
+                "/api/v1/face/verify",
+                files={"file": ("large.jpg", large, "image/jpeg")}
+            )
+
+        assert response.status_code == 400
+        assert "quá lớn" in response.json()["detail"]
+        mock_read.assert_not_called()
+
+    def test_chunked_body_aborted_mid_stream(self, monkeypatch):
+        monkeypatch.setattr(main, "MAX_FILE_SIZE", 100_000)
+        boundary = "testboundary"
+        head = (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="big.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + b"\xFF\xD8\xFF"
+        sent = []
+
+        def body():
+            yield head
+            for _ in range(100):
+                sent.append(1)
+                yield b"x" * 65536
+            yield f"\r\n--{boundary}--\r\n".encode()
+
+        response = client.post(
+            "/api/v1/face/verify",
+            content=body(),
+            headers={"content-type": f"multipart/form-data; boundary={boundary}"}
+        )
+
+        assert response.status_code == 400
+        assert "quá lớn" in response.json()["detail"]
+
+    def test_batch_limit_scales_with_batch_size(self):
+        max_bytes, detail = main._request_body_limit("/api/v1/face/verify/batch")
+        single, _ = main._request_body_limit("/api/v1/face/verify")
+        assert max_bytes > single
+        assert "quá lớn" in detail
+
+    def test_normal_upload_unaffected(self):
+        with patch('backend.main.get_known_faces_cache') as mock_cache, \
+             patch('backend.main.extract_single_face_encoding') as mock_extract:
+            mock_cache.return_value = ([np.zeros(128)], ["a.jpg"])
+            mock_extract.return_value = (np.zeros(128), (10, 90, 90, 10))
+            response = client.post(
+                "/api/v1/face/verify",
+                files={"file": ("ok.jpg", create_image_bytes(), "image/jpeg")}
+            )
+        assert response.status_code == 200
@@ -0,0 +1,118 @@
+"""
+Tests for the startup warm-up of the detection/encoding models.
+"""
+
+import importlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from backend import config, startup, warmup
+
+
+@pytest.fixture
+def fresh_process(monkeypatch):
+    monkeypatch.setattr(warmup, "_process_report", None)
+
+
+@pytest.fixture
+def models():
+    """Patch face_recognition in the detection and warm-up modules (no face found by default)."""
+    with patch('backend.face_processor.face_recognition') as mock_detect, \
+            patch('backend.warmup.face_recognition') as mock_encode:
+        mock_detect.face_locations.return_value = []
+        mock_encode.face_encodings.return_value = [np.zeros(128)]
+        yield mock_detect, mock_encode
+
+
+class TestRunWarmup:
+
+    def test_reports_cold_and_warm_timings(self, models):
+        mock_detect, mock_encode = models
+        report = warmup.run_warmup(rounds=3)
+
+        assert report["pid"] == os.getpid()
+        assert report["image"] == "synthetic"
+        assert report["rounds"] == 3
+        assert mock_detect.face_locations.call_count == 3
+        assert set(report["cold"]) == set(report["warm"]) == {"detect_ms", "encode_ms", "total_ms"}
+        # Ảnh tổng hợp không có khuôn mặt: encoder chạy trên vùng giả định
+        image, locations = mock_encode.face_encodings.call_args[0]
+        assert image.shape == warmup.SYNTHETIC_IMAGE_SIZE + (3,)
+        assert locations == [warmup.SYNTHETIC_FACE_LOCATION]
+
+    def test_single_round_has_no_warm_timing(self, models):
+        report = warmup.run_warmup(rounds=1)
+        assert report["warm"] is None
+        assert warmup.summarize([report])["warm_ms"] is None
+
+    def test_uses_detected_face_of_known_image(self, models, tmp_path):
+        mock_detect, mock_encode = models
+        mock_detect.face_locations.return_value = [(10, 90, 60, 40)]
+        path = tmp_path / "me.jpg"
+        Image.new('RGB', (200, 100), color=(10, 20, 30)).save(path)
+
+        report = warmup.run_warmup(str(path), rounds=2)
+
+        assert report["image"] == "me.jpg"
+        image, locations = mock_encode.face_encodings.call_args[0]
+        assert image.shape == (100, 200, 3)
+        assert locations == [(10, 90, 60, 40)]
+
+    def test_missing_image_raises(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            warmup.run_warmup(str(tmp_path / "missing.jpg"))
+
+    def test_image_path_keeps_its_case(self, monkeypatch):
+        monkeypatch.setenv("FACE_WARMUP_IMAGE", " /data/Warmup/Me.JPG ")
+        try:
+            assert importlib.reload(config).WARMUP_IMAGE == "/data/Warmup/Me.JPG"
+        finally:
+            monkeypatch.delenv("FACE_WARMUP_IMAGE")
+            importlib.reload(config)
+
+
+class TestWorkerWarmup:
+
+    def test_ensure_warm_runs_once_per_process(self, fresh_process):
+        with patch('backend.warmup.run_warmup', return_value={"pid": 1}) as mock_run:
+            assert warmup.ensure_warm() is warmup.ensure_warm()
+        assert mock_run.call_count == 1
+
+    def test_thread_executor_warms_current_process(self, models, fresh_process, monkeypatch):
+        monkeypatch.setattr(config, "EXECUTOR_KIND", "thread")
+        summary = startup.warm_up_workers()
+
+        assert [report["pid"] for report in summary["workers"]] == [os.getpid()]
+        assert summary["cold_ms"] >= 0
+        assert "Đã warm-up 1 worker" in summary["message"]
+
+    def test_process_executor_warms_each_worker(self, fresh_process, monkeypatch):
+        monkeypatch.setattr(config, "EXECUTOR_KIND", "process")
+        monkeypatch.setattr(config, "EXECUTOR_WORKERS", 2)
+        monkeypatch.setattr(config, "WARMUP_ROUNDS", 2)
+        executor = ProcessPoolExecutor(max_workers=2, initializer=warmup.initialize_worker)
+        try:
+            with patch('backend.startup.get_executor', return_value=executor):
+                summary = startup.warm_up_workers()
+        finally:
+            executor.shutdown()
+
+        pids = [report["pid"] for report in summary["workers"]]
+        assert 1 <= len(pids) <= 2
+        assert os.getpid() not in pids
+        assert all(report["rounds"] == 2 for report in summary["workers"])
+
+    def test_warmup_details_are_reported_by_readiness_step(self):
+        details = {"workers": [], "cold_ms": 120.0, "warm_ms": 30.0, "message": "ok"}
+        state = startup.StartupState([("warmup", lambda: details)])
+        state.run()
+
+        step = state.snapshot()["steps"][0]
+        assert step["message"] == "ok"
+        assert step["details"]["cold_ms"] == 120.0
+        assert step["details"]["warm_ms"] == 30.0
@@ -9,11 +9,15 @@ import cv2
 import numpy as np
 from typing import Dict, Optional, Tuple
 import io
+import time
 from PIL import Image
 
 # Backend URL configuration
 BACKEND_URL = "http://localhost:8000"
 
+# Chu kỳ (giây) hỏi trạng thái job huấn luyện
+TRAINING_POLL_SECONDS = 1.0
+
 
 # ============================================================================
 # API Client Functions
@@ -73,42 +77,60 @@ def call_collect_api(image_bytes: bytes) -> Dict:
         }
 
 
+def _api_result(response: requests.Response) -> Dict:
+    """
+    Chuyển response của backend thành {'success', 'data'} hoặc {'success', 'error', 'status_code'}.
+    """
+    response_data = response.json()
+    if response.status_code in (200, 202):
+        return {
+            'success': True,
+            'data': response_data
+        }
+    # Xử lý lỗi từ backend
+    error_detail = response_data.get('detail', 'Lỗi không xác định')
+    return {
+        'success': False,
+        'error': error_detail,
+        'status_code': response.status_code
+    }
+
+
 def call_train_api() -> Dict:
     """
-    Gọi API huấn luyện mô hình.
+    Bắt đầu job huấn luyện mô hình chạy nền (trả về ngay, không chờ huấn luyện xong).
     
     Returns:
-        Dict: Response JSON từ API
-        
-    Raises:
-        requests.exceptions.RequestException: Lỗi khi gọi API
+        Dict: Trạng thái job (job_id, status, ...) từ API
         
     Validates: Requirements 5.5
     """
     try:
-        # Gọi POST /api/v1/train
-        response = requests.post(
-            f"{BACKEND_URL}/api/v1/train",
-            timeout=60  # Training có thể mất nhiều thời gian hơn
-        )
-        
-        # Parse JSON response
-        response_data = response.json()
+        # Gọi POST /api/v1/train/jobs
+        response = requests.post(f"{BACKEND_URL}/api/v1/train/jobs", timeout=10)
+        return _api_result(response)
+            
+    except requests.exceptions.RequestException as e:
+        return {
+            'success': False,
+            'error': f"Lỗi kết nối đến backend: {str(e)}",
+            'status_code': None
+        }
+
+
+def call_training_job_api(job_id: str) -> Dict:
+    """
+    Lấy trạng thái / tiến độ của job huấn luyện.
+    
+    Args:
+        job_id: Id job trả về từ call_train_api
         
-        # Kiểm tra status code
-        if response.status_code == 200:
-            return {
-                'success': True,
-                'data': response_data
-            }
-        else:
-            # Xử lý lỗi từ backend
-            error_detail = response_data.get('detail', 'Lỗi không xác định')
-            return {
-                'success': False,
-                'error': error_detail,
-                'status_code': response.status_code
-            }
+    Returns:
+        Dict: Trạng thái job từ API
+    """
+    try:
+        response = requests.get(f"{BACKEND_URL}/api/v1/train/jobs/{job_id}", timeout=10)
+        return _api_result(response)
             
     except requests.exceptions.RequestException as e:
         return {
@@ -454,8 +476,24 @@ def main():
             with st.spinner("Đang huấn luyện mô hình... Vui lòng đợi."):
                 result = call_train_api()
                 
+                # Theo dõi tiến độ job cho tới khi kết thúc
+                progress_bar = st.progress(0.0)
+                status_text = st.empty()
+                while result['success'] and result['data']['status'] in ("queued", "running"):
+                    job = result['data']
+                    if job.get('total'):
+                        progress_bar.progress(min(1.0, job['processed'] / job['total']))
+                    eta = f", còn khoảng {job['eta_seconds']:.0f}s" if job.get('eta_seconds') is not None else ""
+                    status_text.text(f"{job['message']} Bỏ qua: {job['skipped']}, lỗi: {job['failed']}{eta}")
+                    time.sleep(TRAINING_POLL_SECONDS)
+                    result = call_training_job_api(job['job_id'])
+                
+                if result['success'] and result['data']['status'] != "succeeded":
+                    result = {'success': False, 'error': result['data']['message']}
+                
                 if result['success']:
                     data = result['data']
+                    progress_bar.progress(1.0)
                     st.success(data['message'])
                     
                     # Hiển thị thông tin